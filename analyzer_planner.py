@@ -0,0 +1,234 @@
+## Analyzer setup planner.
+## Picks span, RBW, VBW, detector and sweep points per measurement instead of the one preset setup. A swept
+## analyzer needs about SWEEP_FACTOR * span / RBW^2 per sweep, so the planner takes the widest RBW that keeps the
+## weakest signal of the measurement margin_db above the noise floor (DANL + 10 log RBW) and, with two tones,
+## still keeps the tones and IM3 products apart, and the narrowest span that shows them all. When a reading comes
+## back closer to the noise floor than planned the weakest level is lowered and the setup planned again. The sweep
+## time the analyzer reports for the setup is queried back and kept with the other settings for the records.
+## Two tone measurements can also be read in zero span on each tone in turn, which needs no span at all and only
+## a few RBW periods per tone; the planner takes whichever of the two has the shorter estimated time per point.
+
+import math
+
+import scpi
+
+
+# Sweep time of a swept analyzer with a gaussian RBW filter and the VBW at or above the RBW (s Hz^2 / Hz)
+SWEEP_FACTOR = 2.5
+
+# RBWs the FSV can set, 1-2-3-5 steps from 1 Hz to 10 MHz
+RBW_STEPS_HZ = sorted([mantissa * 10 ** exponent for exponent in range(0, 7) for mantissa in (1, 2, 3, 5)] + [10e6])
+
+# Weakest signal each measurement reads (dBm at the analyzer), the wanted tone / the IM3 products
+DEFAULT_MIN_LEVELS_DBM = {
+    'tone': -60,
+    'two_tone': -90,
+}
+
+# Span either side of the outermost signal, in RBWs
+SPAN_MARGIN_RBWS = 5
+
+# Zero span sweep time in RBW periods, long enough for the RBW filter to settle and the RMS detector to average
+ZERO_SPAN_RBW_PERIODS = 10
+
+# Signals read by a two tone measurement, the two tones and their IM3 products
+TWO_TONE_SIGNALS = 4
+
+
+##########################################################################################################
+# Plans the analyzer setup for each kind of measurement
+##########################################################################################################
+class AnalyzerPlanner:
+
+    ######################################################################################################
+    # params:   min_levels_dbm ({measurement: dBm}, defaults above), danl_dbm_hz (displayed average noise level),
+    #           margin_db (weakest signal above the noise floor), separation_rbws (tone separation in RBWs),
+    #           max_rbw_hz, bins_per_rbw, min_points, max_points, min_sweep_time_s,
+    #           max_sweep_time_s (longest sweep update() narrows the RBW to),
+    #           retune_s (moving the analyzer and waiting for it, once per sweep),
+    #           modes (two tone modes the planner may pick from)
+    ######################################################################################################
+    def __init__(self, min_levels_dbm=None, danl_dbm_hz=-150, margin_db=10, separation_rbws=10, max_rbw_hz=1e6,
+                 bins_per_rbw=2, min_points=101, max_points=32001, min_sweep_time_s=1e-3, max_sweep_time_s=10,
+                 retune_s=0.05, modes=('wide', 'narrow')):
+        self.min_levels_dbm = dict(DEFAULT_MIN_LEVELS_DBM)
+        if min_levels_dbm is not None:
+            self.min_levels_dbm.update(min_levels_dbm)
+        self.danl_dbm_hz = danl_dbm_hz
+        self.margin_db = margin_db
+        self.separation_rbws = separation_rbws
+        self.max_rbw_hz = max_rbw_hz
+        self.bins_per_rbw = bins_per_rbw
+        self.min_points = min_points
+        self.max_points = max_points
+        self.min_sweep_time_s = min_sweep_time_s
+        self.max_sweep_time_s = max_sweep_time_s
+        self.retune_s = retune_s
+        self.modes = modes
+
+    ######################################################################################################
+    # Widest RBW that keeps a signal margin_db above the noise floor
+    # params:   min_level_dbm
+    # returns:  rbw_hz
+    ######################################################################################################
+    def noise_limited_rbw(self, min_level_dbm):
+        return 10 ** ((min_level_dbm - self.margin_db - self.danl_dbm_hz) / 10)
+
+    ######################################################################################################
+    # Sweep time of a setup, what the analyzer would pick with the sweep time coupled to span and RBW
+    # params:   span_hz, rbw_hz
+    # returns:  sweep_time_s
+    ######################################################################################################
+    def estimate_sweep_time(self, span_hz, rbw_hz):
+        return max(self.min_sweep_time_s, SWEEP_FACTOR * span_hz / rbw_hz ** 2)
+
+    ######################################################################################################
+    # Plan the setup for a measurement
+    # 'tone' reads one CW tone (conversion gain, P1dB), 'two_tone' reads two tones and their IM3 products,
+    # either from one wide sweep ('wide') or in zero span on each of them ('narrow')
+    # params:   measurement, tone_separation_hz (two_tone only), mode (None picks the quicker one of modes)
+    # returns:  {'measurement', 'mode', 'tone_separation_hz', 'span_hz', 'rbw_hz', 'vbw_hz', 'detector', 'points',
+    #           'sweep_time_s', 'point_time_s' (estimated time to read every signal of a point)}
+    ######################################################################################################
+    def plan(self, measurement, tone_separation_hz=None, mode=None):
+
+        if measurement not in self.min_levels_dbm:
+            raise ValueError("Invalid measurement '{}'".format(measurement))
+        if mode is None and len(self.modes) == 1:
+            mode = self.modes[0]
+
+        limit_hz = min(self.max_rbw_hz, self.noise_limited_rbw(self.min_levels_dbm[measurement]))
+        if measurement == 'two_tone':
+            if tone_separation_hz is None:
+                raise ValueError("two_tone needs the tone separation")
+            limit_hz = min(limit_hz, tone_separation_hz / self.separation_rbws)
+
+        rbws_hz = [rbw_hz for rbw_hz in RBW_STEPS_HZ if rbw_hz <= limit_hz]
+        if not rbws_hz:
+            raise ValueError("No RBW reads {} dBm {} dB above the noise floor".format(
+                self.min_levels_dbm[measurement], self.margin_db))
+        rbw_hz = rbws_hz[-1]
+
+        # The outer products of two tones are 3 separations apart
+        span_hz = 2 * SPAN_MARGIN_RBWS * rbw_hz
+        if measurement == 'two_tone':
+            span_hz = span_hz + 3 * tone_separation_hz
+
+        # Enough points for a few bins per RBW, the RMS detector then reads the tones and the noise right. Past
+        # max_points the bins are wider than the RBW and only the peak detector still catches every tone
+        points = int(math.ceil(self.bins_per_rbw * span_hz / rbw_hz)) + 1
+        detector = 'RMS'
+        if points > self.max_points:
+            points = self.max_points
+            detector = 'POS'
+        points = max(self.min_points, points + (points + 1) % 2)
+
+        sweep_time_s = self.estimate_sweep_time(span_hz, rbw_hz)
+        wide = {
+            'measurement': measurement,
+            'mode': 'wide',
+            'tone_separation_hz': tone_separation_hz,
+            'span_hz': span_hz,
+            'rbw_hz': rbw_hz,
+            'vbw_hz': min(3 * rbw_hz, RBW_STEPS_HZ[-1]),
+            'detector': detector,
+            'points': points,
+            'sweep_time_s': sweep_time_s,
+            'point_time_s': self.retune_s + sweep_time_s,
+        }
+        if measurement != 'two_tone' or mode == 'wide':
+            return wide
+
+        # Same RBW in zero span on every signal, only the centre frequency moves between them
+        sweep_time_s = max(self.min_sweep_time_s, ZERO_SPAN_RBW_PERIODS / rbw_hz)
+        narrow = dict(wide, mode='narrow', span_hz=0, detector='RMS', points=self.min_points,
+                      sweep_time_s=sweep_time_s, point_time_s=TWO_TONE_SIGNALS * (self.retune_s + sweep_time_s))
+        if mode == 'narrow' or narrow['point_time_s'] < wide['point_time_s']:
+            return narrow
+
+        return wide
+
+    ######################################################################################################
+    # Check the weakest reading against the noise floor of its setup
+    # A reading within margin_db of the floor is mostly noise, the signal is taken as what is left after the
+    # noise is taken off, or margin_db under the floor when nothing is left, and becomes the new weakest level
+    # params:   settings, level_dbm (weakest reading taken with them)
+    # returns:  new settings (possibly in the other mode), None when the reading is fine or no narrower RBW
+    #           reads a point within max_sweep_time_s
+    ######################################################################################################
+    def update(self, settings, level_dbm):
+
+        noise_dbm = self.danl_dbm_hz + 10 * math.log10(settings['rbw_hz'])
+        if level_dbm - noise_dbm >= self.margin_db:
+            return None
+
+        estimate_dbm = noise_dbm - self.margin_db
+        excess_mw = 10 ** (level_dbm / 10) - 10 ** (noise_dbm / 10)
+        if excess_mw > 0:
+            estimate_dbm = max(estimate_dbm, 10 * math.log10(excess_mw))
+
+        measurement = settings['measurement']
+        self.min_levels_dbm[measurement] = min(self.min_levels_dbm[measurement], estimate_dbm)
+
+        try:
+            planned = self.plan(measurement, settings['tone_separation_hz'])
+        except ValueError:
+            return None
+
+        if planned['rbw_hz'] >= settings['rbw_hz'] or planned['point_time_s'] > self.max_sweep_time_s:
+            return None
+
+        return planned
+
+    ######################################################################################################
+    # Dispatcher commands for a setup, VBW / detector / points / sweep time go out as raw SCPI (the caching proxy's
+    # set_vbw etc.), so an analyzer without a SCPI resource only gets span and RBW
+    # Zero span gets its sweep time set, a wide span has it coupled to span and RBW again
+    # params:   specan, settings
+    # returns:  commands [(instrument, method, args, fallback_s)]
+    ######################################################################################################
+    def commands(self, specan, settings):
+
+        commands = [
+            (specan, 'set_span', (settings['span_hz'],), 0),
+            (specan, 'set_rbw', (settings['rbw_hz'],), 0),
+        ]
+        if hasattr(specan, 'set_vbw') and scpi.supports_scpi(specan):
+            commands.extend([
+                (specan, 'set_vbw', (settings['vbw_hz'],), 0),
+                (specan, 'set_detector', (settings['detector'],), 0),
+                (specan, 'set_sweep_points', (settings['points'],), 0),
+                (specan, 'set_sweep_time', (settings['sweep_time_s'] if settings['span_hz'] == 0 else None,), 0),
+            ])
+
+        return commands
+
+    ######################################################################################################
+    # Read back the sweep time the analyzer picked for the setup, the estimate stays when it cannot be queried
+    # The settler's sweep timeout is raised to cover it, so *OPC? after a trigger does not give up mid sweep
+    # params:   specan, settings, settler
+    # returns:  settings with sweep_time_s
+    ######################################################################################################
+    def sweep_time(self, specan, settings, settler=None):
+
+        if scpi.supports_scpi(specan):
+            try:
+                settings = dict(settings, sweep_time_s=float(scpi.query(specan, 'SWE:TIME?')))
+            except Exception:
+                pass
+
+        if settler is not None:
+            settler.timeouts_s['sweep'] = max(settler.timeouts_s['sweep'], 2 * settings['sweep_time_s'])
+
+        return settings
+
+
+##########################################################################################################
+# One line summary of a setup for the notes sheet and the console
+# params:   settings
+# returns:  description
+##########################################################################################################
+def describe(settings):
+    return "{} {}: span {:g} MHz, RBW {:g} kHz, VBW {:g} kHz, {} detector, {} points, sweep {:.3g} ms".format(
+        settings['measurement'], settings['mode'], settings['span_hz'] / 1e6, settings['rbw_hz'] / 1e3, settings['vbw_hz'] / 1e3,
+        settings['detector'], settings['points'], settings['sweep_time_s'] * 1e3)
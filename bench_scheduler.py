@@ -0,0 +1,189 @@
+## Runs test jobs on several benches at once from one controller.
+## Every bench gets its own worker process that works through its jobs by calling main() of the test script with
+## that bench's instrument addresses. The controller collects the results, reports throughput, and kills a bench
+## whose job runs past the timeout (hung instrument) without holding up the other benches.
+##
+## Usage: python bench_scheduler.py <plan.json>
+## plan.json: {"script": "main.py", "job_timeout_s": 3600,
+##             "benches": [{"name": "bench1", "instruments": {"if_rf_mxg": ..., "lo_mxg": ..., "specan": ...,
+##                          "if_rf_mxg2": ...}, "simulate": null}, ...],
+##             "jobs": [{"dut": "SN001", "test": "UPCONVERT", "bench": "bench1"}, ...]}
+## Jobs without a bench are shared out between the benches in turn.
+
+import importlib.util
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+
+
+##########################################################################################################
+# Load a test script as a module, conversion-sweep.py cannot be imported by name
+# params:   script_path
+# returns:  module
+##########################################################################################################
+def load_script(script_path):
+
+    name = os.path.splitext(os.path.basename(script_path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, script_path)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+
+    return script
+
+
+##########################################################################################################
+# Worker process for one bench, runs its jobs in order and reports every start and finish
+# The test output goes to <bench name>.log so the benches do not print over each other
+# params:   script_path, bench, jobs, results
+# returns:  none
+##########################################################################################################
+def bench_worker(script_path, bench, jobs, results):
+
+    sys.stdout = open('{}.log'.format(bench['name']), 'a')
+    script = load_script(script_path)
+
+    for job in jobs:
+        result = {'bench': bench['name'], 'dut': job['dut'], 'test': job['test']}
+        results.put(dict(result, state='started', time=time.time()))
+
+        start = time.time()
+        try:
+            spreadsheet_name = script.main(test=job['test'], instruments=bench['instruments'],
+                                           simulate=bench.get('simulate'), dut=job['dut'])
+            results.put(dict(result, state='done', elapsed_s=time.time() - start, spreadsheet=spreadsheet_name))
+        except Exception:
+            results.put(dict(result, state='failed', elapsed_s=time.time() - start, error=traceback.format_exc()))
+
+        sys.stdout.flush()
+
+
+##########################################################################################################
+# Split the jobs over the benches, jobs naming a bench go to it, the rest are dealt out in turn
+# params:   benches, jobs
+# returns:  {bench name: [jobs]}
+##########################################################################################################
+def assign_jobs(benches, jobs):
+
+    names = [bench['name'] for bench in benches]
+    assigned = dict((name, []) for name in names)
+
+    turn = 0
+    for job in jobs:
+        name = job.get('bench')
+        if name is None:
+            name = names[turn % len(names)]
+            turn = turn + 1
+        if name not in assigned:
+            raise ValueError("Job for DUT {} names unknown bench '{}'".format(job['dut'], name))
+        assigned[name].append(job)
+
+    return assigned
+
+
+##########################################################################################################
+# Run every job, one worker process per bench
+# params:   script_path, benches, jobs, job_timeout_s, poll_interval_s
+# returns:  results (one entry per job, state 'done' / 'failed' / 'timeout' / 'skipped')
+##########################################################################################################
+def run(script_path, benches, jobs, job_timeout_s=3600, poll_interval_s=0.5):
+
+    script_path = os.path.abspath(script_path)
+    tests = load_script(script_path).TESTS
+    for job in jobs:
+        if job['test'] not in tests:
+            raise ValueError("Unknown test '{}' for DUT {}".format(job['test'], job['dut']))
+
+    assigned = assign_jobs(benches, jobs)
+    results = multiprocessing.Queue()
+
+    workers = {}
+    for bench in benches:
+        if not assigned[bench['name']]:
+            continue
+        process = multiprocessing.Process(target=bench_worker, name=bench['name'],
+                                          args=(script_path, bench, assigned[bench['name']], results))
+        process.start()
+        workers[bench['name']] = {'process': process, 'pending': list(assigned[bench['name']]), 'started': None}
+
+    finished = []
+    while workers:
+        try:
+            result = results.get(timeout=poll_interval_s)
+        except queue.Empty:
+            result = None
+
+        if result is not None:
+            worker = workers[result['bench']]
+            if result['state'] == 'started':
+                worker['started'] = result['time']
+            else:
+                worker['pending'].pop(0)
+                worker['started'] = None
+                finished.append(result)
+                print("{:10s} {:10s} {:12s} {:7s} {:8.1f} s".format(
+                    result['bench'], result['dut'], result['test'], result['state'], result['elapsed_s']))
+                if not worker['pending']:
+                    worker['process'].join()
+                    del workers[result['bench']]
+            continue
+
+        # Nothing new, look for hung or dead benches
+        for name in list(workers):
+            worker = workers[name]
+            hung = worker['started'] is not None and time.time() - worker['started'] > job_timeout_s
+            if not hung and (worker['process'].is_alive() or not results.empty()):
+                continue
+
+            worker['process'].terminate()
+            worker['process'].join()
+
+            state = 'timeout' if hung else 'failed'
+            for job in worker['pending']:
+                finished.append({'bench': name, 'dut': job['dut'], 'test': job['test'], 'state': state,
+                                 'elapsed_s': 0})
+                print("{:10s} {:10s} {:12s} {:7s}".format(name, job['dut'], job['test'], state))
+                state = 'skipped'
+            del workers[name]
+
+    return finished
+
+
+##########################################################################################################
+# Throughput of a run, a DUT counts once all of its jobs are done
+# params:   results, run_time_s
+# returns:  summary string
+##########################################################################################################
+def summary(results, run_time_s):
+
+    duts = {}
+    for result in results:
+        duts[result['dut']] = duts.get(result['dut'], True) and result['state'] == 'done'
+    completed = len([dut for dut in duts if duts[dut]])
+
+    lines = ["{} of {} DUTs complete in {:.1f} s, {:.1f} DUTs/hour".format(
+        completed, len(duts), run_time_s, completed * 3600 / max(run_time_s, 1e-9))]
+
+    benches = sorted(set(result['bench'] for result in results))
+    for bench in benches:
+        states = [result['state'] for result in results if result['bench'] == bench]
+        lines.append("  {:10s} {} jobs done, {} not".format(
+            bench, states.count('done'), len(states) - states.count('done')))
+
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bench_scheduler.py <plan.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as plan_file:
+        plan = json.load(plan_file)
+
+    start = time.time()
+    results = run(plan.get('script', 'main.py'), plan['benches'], plan['jobs'], plan.get('job_timeout_s', 3600))
+    print(summary(results, time.time() - start))
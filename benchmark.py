@@ -0,0 +1,954 @@
+## Hardware free benchmarks of the sweep code against the simulated instruments.
+## Usage: python benchmark.py <benchmark name>
+
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+import xlsxwriter
+
+import bench_scheduler
+import main
+import scpi
+from analyzer_planner import AnalyzerPlanner
+from compression import analyze_compression, stack_curves
+from dispatch import Dispatcher
+from instrument_cache import CachedInstrument
+from list_sweep import ListSweep
+from loss_table import LossTable
+from p1db_search import P1dbSearch
+from path_calibration import calibrate_paths
+from pipeline import RecordLog, Resume
+from reprocess import reprocess
+from result_store import ResultStore, load_results
+from run_database import RunDatabase
+from settling import Settler
+from sheet_writer import SheetWriter
+from simulated_instruments import SimulatedBench, SimulatedSignalGenerator, SimulatedSignalAnalyzer
+from source_leveling import SourceLeveler, level_paths
+from sweep_engine import compile_sweep
+from sweep_planner import RETUNE_COSTS_S, plan_order, order_cost
+from tone_readers import MarkerToneReader, MultiMarkerToneReader, TraceToneReader
+from warm_start import WarmStart
+
+
+##########################################################################################################
+# Build a simulated IF MXG, LO MXG and specan
+# params:   none
+# returns:  if_mxg, lo_mxg, specan
+##########################################################################################################
+def simulated_bench():
+
+    if_mxg = SimulatedSignalGenerator('SIM-MXG2')
+    lo_mxg = SimulatedSignalGenerator('SIM-RF-MXG')
+    specan = SimulatedSignalAnalyzer('SIM-FSV40', sources=[if_mxg, lo_mxg])
+
+    return if_mxg, lo_mxg, specan
+
+
+##########################################################################################################
+# Run a small upconversion sweep with the fixed delays and with the adaptive settling
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_settling():
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 19, 20, 21]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    results = {}
+    for mode in ('fixed', 'adaptive'):
+        workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_settling_{}.xlsx'.format(mode)))
+        if_mxg, lo_mxg, specan = simulated_bench()
+        settler = Settler(mode)
+
+        start = time.time()
+        main.upconversion_sweep(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, if_mxg, lo_mxg, specan,
+                                1, 1, 1, settler=settler)
+        results[mode] = time.time() - start
+        workbook.close()
+
+        print("{:8s} {:6.2f} s   {}".format(mode, results[mode], settler.summary()))
+
+    print("Speedup {:.1f}x".format(results['fixed'] / results['adaptive']))
+
+
+##########################################################################################################
+# Compare the retune cost of the hand-written loop order against the planned order
+# Uses the conversion-sweep.py upconversion grid (IF power outside the RF loop) and the TX OIP3 grid
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_planner():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 42, 43,
+                   44, 45, 46]
+    if_pin_dbm = [-30, -27, -25, -23, -20, -17, -15, -13, -10, -5, 0, 5, 7, 10]
+    tone_separation_mhz = [20, 80, 160, 200]
+
+    # Upconversion with the IF power sweep
+    upconversion_points = []
+    for i in range(0, len(if_freq_ghz)):
+        for k in range(0, len(if_pin_dbm)):
+            for j in range(0, len(rf_freq_ghz)):
+                upconversion_points.append({'if': if_freq_ghz[i], 'pin': if_pin_dbm[k], 'rf': rf_freq_ghz[j],
+                                            'lo': rf_freq_ghz[j] + if_freq_ghz[i]})
+    upconversion_costs_s = {
+        'if': RETUNE_COSTS_S['source_frequency'],
+        'pin': RETUNE_COSTS_S['amplitude'],
+        'rf': RETUNE_COSTS_S['specan_frequency'] + RETUNE_COSTS_S['marker'],
+        'lo': RETUNE_COSTS_S['lo_frequency'],
+    }
+
+    # Two tone OIP3
+    oip3_points = []
+    for i in range(0, len(if_freq_ghz)):
+        for k in range(0, len(tone_separation_mhz)):
+            for j in range(0, len(rf_freq_ghz)):
+                oip3_points.append({'if': if_freq_ghz[i], 'tone': tone_separation_mhz[k], 'rf': rf_freq_ghz[j],
+                                    'lo': (rf_freq_ghz[j] + if_freq_ghz[i]) / 4})
+    oip3_costs_s = {
+        'if': 2 * RETUNE_COSTS_S['source_frequency'],
+        'tone': 2 * RETUNE_COSTS_S['source_frequency'] + RETUNE_COSTS_S['span'],
+        'rf': RETUNE_COSTS_S['specan_frequency'],
+        'lo': RETUNE_COSTS_S['lo_frequency'],
+    }
+
+    grids = [
+        ('UPCONVERT', upconversion_points, ['if', 'pin', 'rf'], upconversion_costs_s),
+        ('TX_OIP3', oip3_points, ['if', 'tone', 'rf'], oip3_costs_s),
+    ]
+
+    for name, points, dimensions, costs_s in grids:
+        start = time.time()
+        order = plan_order(points, dimensions, costs_s)
+        plan_time_s = time.time() - start
+
+        report_cost_s = order_cost(points, list(range(0, len(points))), costs_s)
+        planned_cost_s = order_cost(points, order, costs_s)
+
+        print("{:10s} {:5d} points, report order {:7.1f} s, planned order {:7.1f} s (planned in {:.2f} s)".format(
+            name, len(points), report_cost_s, planned_cost_s, plan_time_s))
+
+
+##########################################################################################################
+# Run a small upconversion sweep with serial and with concurrent dispatch to the three boxes
+# The simulated boxes get a realistic LAN latency and settle time
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_dispatch():
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 19, 20, 21]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    for mode in ('fixed', 'adaptive'):
+        results = {}
+        for concurrent in (False, True):
+            workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_dispatch.xlsx'))
+            if_mxg = SimulatedSignalGenerator('SIM-MXG2', latency_s=0.02, settle_s=0.2)
+            lo_mxg = SimulatedSignalGenerator('SIM-RF-MXG', latency_s=0.02, settle_s=0.2)
+            specan = SimulatedSignalAnalyzer('SIM-FSV40', sources=[if_mxg, lo_mxg], latency_s=0.02, settle_s=0.2)
+            settler = Settler(mode)
+            dispatcher = Dispatcher(settler, concurrent=concurrent)
+
+            start = time.time()
+            main.upconversion_sweep(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, if_mxg, lo_mxg, specan,
+                                    1, 1, 1, settler=settler, dispatcher=dispatcher)
+            results[concurrent] = time.time() - start
+            dispatcher.close()
+            workbook.close()
+
+        print("{:8s} serial {:5.2f} s, concurrent {:5.2f} s, speedup {:.1f}x".format(
+            mode, results[False], results[True], results[False] / results[True]))
+
+
+##########################################################################################################
+# Time per OIP3 point reading the four tones with marker 1 moves, the multi-marker single sweep and the trace
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_oip3_readout():
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 19, 20]
+    tone_separation_mhz = [20]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    for mode in ('fixed', 'adaptive'):
+        results = {}
+        for reader in (MarkerToneReader, MultiMarkerToneReader, TraceToneReader):
+            workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_oip3_readout.xlsx'))
+            if_mxg_1 = SimulatedSignalGenerator('SIM-MXG2', latency_s=0.02)
+            if_mxg_2 = SimulatedSignalGenerator('SIM-CAL-SG', latency_s=0.02)
+            lo_mxg = SimulatedSignalGenerator('SIM-RF-MXG', latency_s=0.02)
+            specan = SimulatedSignalAnalyzer('SIM-FSV40', sources=[if_mxg_1, if_mxg_2, lo_mxg], latency_s=0.02,
+                                             sweep_time_s=0.2)
+            settler = Settler(mode)
+
+            # Time only the tone readout
+            tone_reader = reader(specan, settler)
+            read = tone_reader.read
+            readout = [0]
+
+            def timed_read(frequencies_hz):
+                start = time.time()
+                powers = read(frequencies_hz)
+                readout[0] = readout[0] + time.time() - start
+                return powers
+
+            tone_reader.read = timed_read
+            main.tx_oip3(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, if_mxg_1, if_mxg_2, lo_mxg, specan,
+                         1, 1, 1, 1, tone_separation_mhz, settler=settler, tone_reader=tone_reader)
+            results[reader.__name__] = readout[0] / len(rf_freq_ghz)
+            workbook.close()
+
+        print("{:8s} marker 1 moves {:5.2f} s/point, multi-marker {:5.2f} s/point, trace {:5.2f} s/point".format(
+            mode, results['MarkerToneReader'], results['MultiMarkerToneReader'], results['TraceToneReader']))
+
+
+##########################################################################################################
+# Analyzer sweep time per OIP3 setup with the preset 1 kHz RBW and 6 x separation span against the planned setup,
+# then TX OIP3 runs with the planner on a swept analyzer, where the IM3 products sit close enough to the noise
+# floor for the planner to narrow the RBW, with wide sweeps only and with the zero span mode allowed as well
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_analyzer_setup():
+
+    tone_separation_mhz = [20, 80, 200]
+    planner = AnalyzerPlanner()
+    specan = CachedInstrument(SimulatedSignalAnalyzer('SIM-FSV40', latency_s=0, swept=True, sweep_time_s=1e-3))
+    for separation_mhz in tone_separation_mhz:
+        specan.set_span(6 * separation_mhz * 1e6)
+        specan.set_rbw(1e3)
+        fixed_s = float(scpi.query(specan, 'SWE:TIME?'))
+
+        settings = planner.plan('two_tone', separation_mhz * 1e6)
+        for instrument, method, args, fallback_s in planner.commands(specan, settings):
+            getattr(instrument, method)(*args)
+        settings = planner.sweep_time(specan, settings)
+
+        print("{:4d} MHz  preset {:8.1f} s/sweep   planned {:8.4f} s/sweep ({:g} MHz span, {:g} kHz RBW, {})".format(
+            separation_mhz, fixed_s, settings['sweep_time_s'], settings['span_hz'] / 1e6, settings['rbw_hz'] / 1e3,
+            settings['mode']))
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 20]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+    for modes in (('wide',), ('wide', 'narrow')):
+        bench = SimulatedBench('SIM-RF-MXG', lo_mult=4, timing='fast')
+        generators = [CachedInstrument(bench.generator(address)) for address in ('SIM-MXG2', 'SIM-CAL-SG', 'SIM-RF-MXG')]
+        specan = CachedInstrument(SimulatedSignalAnalyzer('SIM-FSV40', latency_s=0, settle_s=0, sweep_time_s=1e-3,
+                                                          dut=bench.dut, swept=True))
+        settler = Settler()
+        planner = AnalyzerPlanner(modes=modes)
+        directory = tempfile.mkdtemp()
+        workbook = xlsxwriter.Workbook(os.path.join(directory, 'benchmark_analyzer_setup.xlsx'))
+        record_log = RecordLog(os.path.join(directory, 'benchmark_analyzer_setup.jsonl'))
+
+        start = time.time()
+        main.tx_oip3(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, generators[0], generators[1],
+                     generators[2], specan, 0, 0, 0, 0, tone_separation_mhz, settler=settler,
+                     tone_reader=MultiMarkerToneReader(specan, settler), record_log=record_log,
+                     analyzer_planner=planner)
+        run_time_s = time.time() - start
+        record_log.close()
+        workbook.close()
+
+        with open(record_log.path) as log_file:
+            records = [json.loads(line) for line in log_file]
+        errors_db = [record['raw_pout_tone_low'] + (record['raw_pout_tone_low'] - record['raw_pout_im_low']) / 2
+                     - bench.dut.oip3_dbm for record in records]
+        rbws_khz = sorted(set(record['analyzer']['rbw_hz'] / 1e3 for record in records))
+        narrow = len([record for record in records if record['analyzer']['mode'] == 'narrow'])
+        print("{:12s} {} points ({} zero span) in {:5.2f} s, RBW {} kHz, OIP3 error {:+.2f} to {:+.2f} dB".format(
+            '/'.join(modes), len(records), narrow, run_time_s, rbws_khz, min(errors_db), max(errors_db)))
+
+
+##########################################################################################################
+# Run a small TX P1dB sweep on the bare simulated instruments and behind the write-through cache
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_cache():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19]
+    if_pin_dbm = main.power_sweep_range(-15, -10, 1, 5)
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    for cached in (False, True):
+        workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_cache.xlsx'))
+        if_mxg, lo_mxg, specan = simulated_bench()
+        instruments = [if_mxg, lo_mxg, specan]
+        if cached:
+            instruments = [CachedInstrument(instrument) for instrument in instruments]
+        settler = Settler()
+
+        start = time.time()
+        main.tx_p1db(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, if_pin_dbm, 15, instruments[0], instruments[1],
+                     instruments[2], 1, 1, 1, settler=settler)
+        run_time_s = time.time() - start
+        workbook.close()
+
+        round_trips = len(if_mxg.log) + len(lo_mxg.log) + len(specan.log)
+        print("{:8s} {:6.2f} s, {} round trips, {}".format(
+            'cached' if cached else 'uncached', run_time_s, round_trips, settler.summary()))
+        if cached:
+            for instrument in instruments:
+                print("         " + instrument.summary())
+
+
+##########################################################################################################
+# Run a small upconversion sweep sending every command on its own and chained into one message per instrument
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_batch():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19, 20, 21]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    for batch in (False, True):
+        workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_batch.xlsx'))
+        if_mxg = SimulatedSignalGenerator('SIM-MXG2', latency_s=0.02, settle_s=0.01)
+        lo_mxg = SimulatedSignalGenerator('SIM-RF-MXG', latency_s=0.02, settle_s=0.01)
+        specan = SimulatedSignalAnalyzer('SIM-FSV40', sources=[if_mxg, lo_mxg], latency_s=0.02, settle_s=0.01,
+                                         sweep_time_s=0.01)
+        instruments = [CachedInstrument(instrument) for instrument in (if_mxg, lo_mxg, specan)]
+        settler = Settler()
+        dispatcher = Dispatcher(settler, batch=batch)
+
+        start = time.time()
+        main.upconversion_sweep(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, instruments[0],
+                                instruments[1], instruments[2], 1, 1, 1, settler=settler, dispatcher=dispatcher)
+        run_time_s = time.time() - start
+        dispatcher.close()
+        workbook.close()
+
+        round_trips = len(if_mxg.log) + len(lo_mxg.log) + len(specan.log)
+        print("{:8s} {:6.2f} s, {} round trips, {}".format(
+            'chained' if batch else 'single', run_time_s, round_trips, settler.summary()))
+
+
+##########################################################################################################
+# Upconversion grid stepped point by point against the same grid run from the list memory
+# The simulated boxes raise if the lists are started out of order, so this also checks the sequencing
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_list_sweep():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+
+    results = {}
+    for mode in ('step', 'list'):
+        workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_list_{}.xlsx'.format(mode)))
+        if_mxg, lo_mxg, specan = simulated_bench()
+        settler = Settler()
+        list_sweep = ListSweep(specan, settler, dwell_s=0.05) if mode == 'list' else None
+
+        start = time.time()
+        main.upconversion_sweep(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, if_mxg, lo_mxg, specan,
+                                1, 1, 1, settler=settler, list_sweep=list_sweep)
+        results[mode] = time.time() - start
+        workbook.close()
+
+        round_trips = len(if_mxg.log) + len(lo_mxg.log) + len(specan.log)
+        print("{:4s} {:6.2f} s, {} round trips".format(mode, results[mode], round_trips))
+
+    print("Speedup {:.1f}x".format(results['step'] / results['list']))
+
+
+##########################################################################################################
+# TX P1dB on the simulated mixer, stepping every power against the adaptive search, both cold and warm started
+# The prior runs come from a first board, the second board compresses 0.5 dB higher
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_p1db_search():
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 20, 22, 24, 26, 28, 30, 32, 34, 36]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+    if_pin_dbm = main.power_sweep_range(-15, 15, 1, 5)
+    prior_path = os.path.join(tempfile.mkdtemp(), 'benchmark_p1db_prior.json')
+
+    # name, search, warm start, board p1db_out_dbm
+    modes = [
+        ('sweep', False, None, -12),
+        ('sweep warm', False, 'neighbour', -12),
+        ('sweep prior', False, 'prior', -11.5),
+        ('search', True, None, -12),
+        ('search warm', True, 'neighbour', -12),
+        ('search prior', True, 'prior', -11.5),
+    ]
+
+    for name, search, warm, p1db_out_dbm in modes:
+        workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_p1db.xlsx'))
+        record_path = os.path.join(tempfile.mkdtemp(), 'benchmark_p1db.jsonl')
+        record_log = RecordLog(record_path)
+        bench = SimulatedBench('SIM-RF-MXG', timing='realtime', p1db_out_dbm=p1db_out_dbm)
+        if_mxg = CachedInstrument(bench.generator('SIM-MXG2'))
+        lo_mxg = CachedInstrument(bench.generator('SIM-RF-MXG'))
+        specan = CachedInstrument(bench.analyzer('SIM-FSV40'))
+        settler = Settler()
+        settler.poll_interval_s = bench.timing['poll_interval_s']
+        dispatcher = Dispatcher(settler)
+
+        # Nothing stored yet for the first board, it only has the neighbouring columns to go on
+        warm_start = None
+        if warm is not None:
+            warm_start = WarmStart(prior_path, 'SIM', 'TX_P1DB_SEARCH' if search else 'TX_P1DB')
+
+        start = time.time()
+        if not search:
+            main.tx_p1db(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, if_pin_dbm, 15, if_mxg, lo_mxg, specan,
+                         1, 1, 1, settler=settler, dispatcher=dispatcher, record_log=record_log, warm_start=warm_start)
+        else:
+            main.tx_p1db_search(workbook, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -15, 15, if_mxg, lo_mxg, specan,
+                                1, 1, 1, P1dbSearch(5), settler=settler, dispatcher=dispatcher, record_log=record_log,
+                                warm_start=warm_start)
+        run_time_s = time.time() - start
+        dispatcher.close()
+        record_log.close()
+        workbook.close()
+
+        # The first board's results are the prior run of the second
+        if warm == 'neighbour':
+            warm_start.save()
+
+        with open(record_path) as record_file:
+            records = [json.loads(line) for line in record_file]
+
+        if not search:
+            points = len(records)
+            cols = sorted(set(record['col'] for record in records))
+            columns = [sorted((record['index'], record['pin'], record['raw_pout']) for record in records
+                              if record['col'] == col) for col in cols]
+            pin_dbm, pout_dbm = stack_curves([[point[1] for point in column] for column in columns],
+                                             [[point[2] for point in column] for column in columns])
+            ip1db_dbm = [round(float(ip), 2) for ip in analyze_compression(pin_dbm, pout_dbm)['ip_dbm'][1]]
+        else:
+            points = len([record for record in records if record['kind'] == 'point'])
+            ip1db_dbm = [record['ip1db'] and round(record['ip1db'], 2) for record in records if record['kind'] == 'p1db']
+
+        print("{:12s} {:6.2f} s, {:3d} points, IP1dB {}".format(name, run_time_s, points, ip1db_dbm))
+
+
+##########################################################################################################
+# Compression analysis of a fleet worth of noisy Rapp curves, one call per curve against one call for all
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_compression():
+
+    curves = 5000
+    generator = numpy.random.default_rng(0)
+    pin_dbm = numpy.arange(-20, 10.01, 0.5)
+    gain_db = generator.uniform(-12, -6, curves)[:, numpy.newaxis]
+    psat_dbm = generator.uniform(-10, 0, curves)[:, numpy.newaxis]
+    smoothness = 2
+
+    # Rapp model, true IP1dB solved from the model
+    linear_mw = 10 ** ((pin_dbm + gain_db) / 10)
+    pout_dbm = 10 * numpy.log10(linear_mw / (1 + (linear_mw / 10 ** (psat_dbm / 10)) ** smoothness) ** (1 / smoothness))
+    pout_dbm = pout_dbm + generator.normal(0, 0.02, pout_dbm.shape)
+    ratio = (10 ** (smoothness / 10) - 1) ** (1 / smoothness)
+    true_ip1db_dbm = (psat_dbm + 10 * math.log10(ratio) - gain_db)[:, 0]
+
+    start = time.time()
+    for curve in range(0, curves):
+        analyze_compression(pin_dbm, pout_dbm[curve])
+    single_s = time.time() - start
+
+    start = time.time()
+    results = analyze_compression(pin_dbm, pout_dbm)
+    batch_s = time.time() - start
+
+    error_db = results['ip_dbm'][1] - true_ip1db_dbm
+    print("{} curves: one by one {:.2f} s, batched {:.3f} s ({:.0f}x)".format(
+        curves, single_s, batch_s, single_s / batch_s))
+    print("IP1dB error on 0.5 dB steps: mean {:.3f} dB, max {:.3f} dB".format(
+        numpy.nanmean(numpy.abs(error_db)), numpy.nanmax(numpy.abs(error_db))))
+
+
+##########################################################################################################
+# A long OIP3 sized sheet written in planned order, cell writes into the default workbook against
+# write_row / end_row through a SheetWriter into a constant_memory workbook
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_spreadsheet():
+
+    points = []
+    for if_ghz in numpy.linspace(5, 6, 4):
+        for tone_mhz in range(10, 260, 10):
+            for rf_ghz in numpy.linspace(18, 36, 500):
+                points.append({'if': if_ghz, 'tone': tone_mhz, 'rf': rf_ghz})
+    order = plan_order(points, ['if', 'tone', 'rf'], {'if': 0.2, 'tone': 0.3, 'rf': 0.05})
+    columns = 20
+
+    for name in ('cell writes', 'streamed'):
+        path = os.path.join(tempfile.mkdtemp(), 'benchmark_spreadsheet.xlsx')
+
+        tracemalloc.start()
+        start = time.time()
+        if name == 'cell writes':
+            workbook = xlsxwriter.Workbook(path)
+            worksheet = workbook.add_worksheet('Up_Conversion_IP3')
+            for index in order:
+                for col in range(0, columns):
+                    worksheet.write(index + 1, col, points[index]['rf'] + col)
+        else:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+            worksheet = SheetWriter(workbook.add_worksheet('Up_Conversion_IP3'))
+            worksheet.end_row(0)
+            for index in order:
+                worksheet.write_row(index + 1, 0, [points[index]['rf'] + col for col in range(0, columns)])
+                worksheet.end_row(index + 1)
+            worksheet.close()
+        write_s = time.time() - start
+
+        start = time.time()
+        workbook.close()
+        close_s = time.time() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        print("{:12s} {} rows x {} columns: writes {:.2f} s, close {:.2f} s, peak memory {:.1f} MB".format(
+            name, len(points), columns, write_s, close_s, peak_mb))
+
+
+##########################################################################################################
+# A million upconversion points into the xlsx, the record log and the result store, then the mean gain at
+# one RF frequency read back from the record log and from the memory mapped columns
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_result_store():
+
+    rows = 1000000
+    generator = numpy.random.default_rng(0)
+    rf_ghz = numpy.repeat(numpy.linspace(18, 36, 1000), rows // 1000)
+    raw_pout_dbm = generator.normal(-20, 1, rows)
+    path = tempfile.mkdtemp()
+
+    start = time.time()
+    workbook = xlsxwriter.Workbook(os.path.join(path, 'benchmark.xlsx'), {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Up_Conversion')
+    for row in range(0, rows):
+        worksheet.write_row(row + 1, 0, [5.25, rf_ghz[row] - 5.25, rf_ghz[row], raw_pout_dbm[row],
+                                         raw_pout_dbm[row] + 3.3, -20, 15, raw_pout_dbm[row] + 23.3])
+    workbook.close()
+    xlsx_s = time.time() - start
+
+    start = time.time()
+    record_log = RecordLog(os.path.join(path, 'benchmark.jsonl'))
+    result_store = ResultStore(os.path.join(path, 'benchmark.results'), {'board': 'benchmark'})
+    for row in range(0, rows):
+        record = {'index': row, 'if': 5.25, 'lo': rf_ghz[row] - 5.25, 'rf': rf_ghz[row], 'raw_pout': raw_pout_dbm[row]}
+        record_log.write('UPCONVERT', record)
+        result_store.add('UPCONVERT', {'if_ghz': 5.25, 'lo_ghz': rf_ghz[row] - 5.25, 'rf_ghz': rf_ghz[row],
+                                       'pin_dbm': -20, 'raw_pout_dbm': raw_pout_dbm[row],
+                                       'pout_dbm': raw_pout_dbm[row] + 3.3, 'gain_db': raw_pout_dbm[row] + 23.3})
+    record_log.close()
+    result_store.close()
+    store_s = time.time() - start
+
+    def size_mb(name):
+        if os.path.isfile(name):
+            return os.path.getsize(name) / 1e6
+        return sum(os.path.getsize(os.path.join(folder, f)) for folder, _, files in os.walk(name) for f in files) / 1e6
+
+    print("{} rows written: xlsx {:.1f} s, record log and result store {:.1f} s".format(rows, xlsx_s, store_s))
+    print("On disk: xlsx {:.1f} MB, record log {:.1f} MB, result store {:.1f} MB".format(
+        size_mb(os.path.join(path, 'benchmark.xlsx')), size_mb(os.path.join(path, 'benchmark.jsonl')),
+        size_mb(os.path.join(path, 'benchmark.results'))))
+
+    start = time.time()
+    gains = []
+    with open(os.path.join(path, 'benchmark.jsonl')) as log_file:
+        for line in log_file:
+            record = json.loads(line)
+            if record['rf'] == rf_ghz[0]:
+                gains.append(record['raw_pout'] + 23.3)
+    log_s = time.time() - start
+
+    start = time.time()
+    metadata, columns = load_results(os.path.join(path, 'benchmark.results'), 'UPCONVERT')
+    gain_db = columns['gain_db'][columns['rf_ghz'] == rf_ghz[0]]
+    store_mean_db = float(numpy.mean(gain_db))
+    load_s = time.time() - start
+
+    print("Mean gain at {} GHz: record log {:.3f} dB in {:.2f} s, result store {:.3f} dB in {:.3f} s ({:.0f}x)".format(
+        rf_ghz[0], sum(gains) / len(gains), log_s, store_mean_db, load_s, log_s / load_s))
+
+
+##########################################################################################################
+# Record log cost per point with a disk sync after every record against the batched syncs, and the time to
+# find the measured points of a long run again for --resume
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_journal():
+
+    records = 2000
+    path = tempfile.mkdtemp()
+
+    for sync_records in (1, 32):
+        record_log = RecordLog(os.path.join(path, 'journal_{}.jsonl'.format(sync_records)), sync_records=sync_records)
+        start = time.time()
+        for index in range(0, records):
+            record_log.write('TX_OIP3', {'if': 5.25, 'tone': 20, 'rf': 18 + index * 0.01, 'lo': 5.8, 'index': index,
+                                         'raw_pout_im_low': -80.0, 'raw_pout_tone_low': -20.0,
+                                         'raw_pout_tone_high': -20.0, 'raw_pout_im_high': -80.0})
+        record_log.close()
+        print("sync every {:2d} records: {:.3f} ms per record".format(sync_records, (time.time() - start) / records * 1e3))
+
+    start = time.time()
+    resume = Resume(os.path.join(path, 'journal_32.jsonl'))
+    found = 0
+    for index in range(0, records):
+        point = {'if': 5.25, 'tone': 20, 'rf': 18 + index * 0.01, 'lo': 5.8, 'index': index}
+        found = found + (resume.find('TX_OIP3', point) is not None)
+    print("Resume found {} of {} points in {:.3f} s".format(found, records, time.time() - start))
+
+
+##########################################################################################################
+# Gain history of one frequency over the latest runs of a board, out of a database with a few thousand runs of
+# both boards, and the index the query runs on
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_run_database():
+
+    runs = 2000
+    rf_ghz = numpy.arange(18, 45.5, 1.0)
+    if_ghz = numpy.array([5.25, 5.57])
+    path = tempfile.mkdtemp()
+    run_database = RunDatabase(os.path.join(path, 'runs.sqlite'))
+
+    start = time.time()
+    for index in range(0, runs):
+        board = ('ADMV1139', 'MAMX-011054')[index % 2]
+        results = {'UPCONVERT': {
+            'if_ghz': numpy.repeat(if_ghz, len(rf_ghz)),
+            'rf_ghz': numpy.tile(rf_ghz, len(if_ghz)),
+            'pin_dbm': numpy.full(len(if_ghz) * len(rf_ghz), -20.0),
+            'gain_db': numpy.random.normal(2.5, 0.2, len(if_ghz) * len(rf_ghz)),
+        }}
+        metadata = {'board': board, 'dut': 'SN{:05d}'.format(index), 'test': 'UPCONVERT',
+                    'started': '2026-{:02d}-{:02d}T{:02d}:00:00'.format(1 + index // 600, 1 + index // 24 % 25, index % 24)}
+        run_database.add_run(metadata, results)
+    print("Added {} runs of {} points in {:.2f} s".format(runs, len(if_ghz) * len(rf_ghz), time.time() - start))
+
+    start = time.time()
+    history = run_database.history('ADMV1139', 'UPCONVERT', 'gain_db', 28, runs=500)
+    history_s = time.time() - start
+    print("Gain at 28 GHz over the last 500 ADMV1139 runs: {} points in {:.2f} ms".format(len(history), history_s * 1e3))
+
+    plan = run_database.query(
+        "EXPLAIN QUERY PLAN SELECT gain_db FROM points WHERE board = ? AND test = ? AND rf_ghz BETWEEN ? AND ?",
+        ('ADMV1139', 'UPCONVERT', 28, 28))
+    print("Query plan: {}".format(plan[0][-1]))
+    run_database.close()
+
+
+##########################################################################################################
+# Re-processing a long stored P1dB run with new losses, against the hours the sweep took
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_reprocess():
+
+    if_ghz = numpy.array([5.25, 5.57])
+    rf_ghz = numpy.arange(18, 46, 0.1)
+    pin_dbm = numpy.arange(-30, 10, 0.25)
+    grid_if, grid_rf, grid_pin = [grid.ravel() for grid in numpy.meshgrid(if_ghz, rf_ghz, pin_dbm, indexing='ij')]
+    # 2.5 dB of gain compressing around 0 dBm in, read through 3.3 dB of output loss
+    raw_pout_dbm = grid_pin + 2.5 - 3.3 - 10 * numpy.log10(1 + 10 ** (grid_pin / 10))
+
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.results')
+    result_store = ResultStore(path, {'losses': {'path1_loss_5': 7.96, 'out_cable_loss_40': 3.3},
+                                      'loss_paths': {'input': ['path1_loss_5'], 'output': ['out_cable_loss_40']}})
+    result_store.add_columns('TX_P1DB', {
+        'if_ghz': grid_if, 'rf_ghz': grid_rf, 'pin_dbm': grid_pin, 'input_loss_db': numpy.full(len(grid_pin), 7.96),
+        'output_loss_db': numpy.full(len(grid_pin), 3.3), 'raw_pout_dbm': raw_pout_dbm,
+        'pout_dbm': raw_pout_dbm + 3.3, 'gain_db': raw_pout_dbm + 3.3 - grid_pin,
+    })
+    result_store.close()
+
+    start = time.time()
+    output, corrected, summaries = reprocess(path, {'path1_loss_5': 8.4, 'out_cable_loss_40': 3.9}, report=False)
+    reprocess_s = time.time() - start
+
+    # The sweep itself at 0.1 s per point
+    sweep_s = len(grid_pin) * 0.1
+    print("Re-processed {} points, {} P1dB curves in {:.2f} s, the sweep took about {:.1f} h".format(
+        len(grid_pin), len(summaries['TX_P1DB']['op1db_dbm']), reprocess_s, sweep_s / 3600))
+
+
+##########################################################################################################
+# Loss of every point of a long sweep from a calibration table, one lookup per point against all at once
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_loss_table():
+
+    cal_ghz = numpy.arange(18, 47.01, 0.05)
+    cal_db = 2 + 0.1 * (cal_ghz - 18) + 0.05 * numpy.sin(cal_ghz * 7)
+    rf_ghz = numpy.repeat(numpy.arange(18, 46, 0.1), 160)
+
+    table = LossTable(cal_ghz, cal_db)
+    start = time.time()
+    looped_db = [float(numpy.interp(freq, cal_ghz, cal_db)) for freq in rf_ghz.tolist()]
+    looped_s = time.time() - start
+
+    start = time.time()
+    table_db = table.loss(rf_ghz)
+    table_s = time.time() - start
+
+    start = time.time()
+    table.loss(rf_ghz)
+    cached_s = time.time() - start
+
+    start = time.time()
+    for freq in rf_ghz.tolist():
+        table.loss(freq)
+    scalar_s = time.time() - start
+
+    print("{} points: per point {:.3f} s, table {:.4f} s, again from the cache {:.4f} s, per point from the cache "
+          "{:.3f} s, largest difference {:.2g} dB".format(len(rf_ghz), looped_s, table_s, cached_s, scalar_s,
+                                                         numpy.max(numpy.abs(table_db - looped_db))))
+
+
+##########################################################################################################
+# Calibrating every path of the ADMV1139 plan, point by point and from the list memory
+# Each connection puts a known loss between the generator and the analyzer, the calibration has to find it
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_calibration():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+    paths = {
+        'if_cable_loss_db': if_freq_ghz, 'lo_cable_loss_db': lo_freq_ghz, 'rf_cable_loss_db': rf_freq_ghz,
+        'path1_loss_5': if_freq_ghz, 'path2_loss_5': if_freq_ghz, 'path1_loss_40': rf_freq_ghz,
+        'path2_loss_40': rf_freq_ghz, 'out_cable_loss_5': if_freq_ghz, 'out_cable_loss_40': rf_freq_ghz,
+    }
+    losses = {'reference': 0, 'if_cable_loss_db': 1.28, 'lo_cable_loss_db': 1.36, 'rf_cable_loss_db': 3.3,
+              'path1_loss_5': 7.96, 'path2_loss_5': 8, 'path1_loss_40': 15, 'path2_loss_40': 14.5,
+              'out_cable_loss_5': 1, 'out_cable_loss_40': 3.3}
+
+    results = {}
+    for mode in ('step', 'list'):
+        if_mxg, lo_mxg, specan = simulated_bench()
+        settler = Settler()
+        list_sweep = ListSweep(specan, settler, dwell_s=0.05) if mode == 'list' else None
+
+        def connect(name):
+            specan.level_dbm = -30 - losses[name]
+
+        start = time.time()
+        tables = calibrate_paths(paths, if_mxg, specan, settler, Dispatcher(settler), -30, list_sweep, connect)
+        results[mode] = time.time() - start
+
+        error_db = max(abs(loss - losses[name]) for name in tables for loss in tables[name].loss_db)
+        points = sum(len(tables[name].freq_ghz) for name in tables)
+        print("{:4s} {:6.2f} s for {} points, largest error {:.3f} dB".format(mode, results[mode], points, error_db))
+
+    print("Speedup {:.1f}x".format(results['step'] / results['list']))
+
+
+##########################################################################################################
+# Leveling the IF and RF input paths through a simulated thru whose input loss is 0.7 dB off the typed one
+# The first run steps every frequency in, the second starts from the cached corrections
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_leveling():
+
+    if_freq_ghz = [5.25, 5.57]
+    rf_freq_ghz = [18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36]
+    paths = {
+        'path1_loss_5': {'generator': 'if_rf_mxg', 'freq_ghz': if_freq_ghz, 'loss': 7.96, 'output_loss': 1},
+        'path1_loss_40': {'generator': 'if_rf_mxg', 'freq_ghz': rf_freq_ghz, 'loss': 15, 'output_loss': 3.3},
+    }
+    addresses = {'if_rf_mxg': 'SIM-MXG2'}
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark_leveling.json')
+
+    for run in ('first', 'cached'):
+        bench = SimulatedBench('SIM-RF-MXG', timing='realtime')
+        generators = {'if_rf_mxg': CachedInstrument(bench.generator('SIM-MXG2'))}
+        specan = CachedInstrument(bench.analyzer('SIM-FSV40'))
+        settler = Settler(poll_interval_s=bench.timing['poll_interval_s'])
+        leveler = SourceLeveler(path)
+
+        def connect(name):
+            bench.connect_thru(paths[name]['loss'] + 0.7, paths[name]['output_loss'])
+
+        start = time.time()
+        tables = level_paths(paths, generators, addresses, specan, settler, Dispatcher(settler), leveler, -10, connect)
+        leveler.save()
+
+        corrections = [correction for name in tables for correction in tables[name].loss_db]
+        print("{:6s} {:5.2f} s, {} reads for {} frequencies, corrections {:.2f} to {:.2f} dB (0.70 expected)".format(
+            run, time.time() - start, leveler.reads, leveler.leveled, min(corrections), max(corrections)))
+
+
+##########################################################################################################
+# The P1dB tests through the sweep engine, which plans their frequency order like every other test
+# Before the engine they stepped every RF within each IF in report order
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_sweep_engine():
+
+    if_freq_ghz = [5.25, 5.57, 5.89]
+    rf_freq_ghz = [18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 42, 43,
+                   44, 45, 46]
+
+    specs = [
+        ('TX_P1DB', main.tx_p1db_spec(if_freq_ghz, rf_freq_ghz, -15, 15, None, None, None, 1, 1, 1)),
+        ('RX_P1DB', main.rx_p1db_spec(if_freq_ghz, rf_freq_ghz, -20, 15, None, None, None, 1, 1, 1)),
+    ]
+
+    for name, spec in specs:
+        start = time.time()
+        plan = compile_sweep(spec)
+        compile_time_s = time.time() - start
+
+        report_cost_s = order_cost(plan['points'], list(range(0, len(plan['points']))), plan['costs_s'])
+        planned_cost_s = order_cost(plan['points'], plan['order'], plan['costs_s'])
+
+        print("{:10s} {:5d} curves, report order {:6.1f} s, planned order {:6.1f} s (compiled in {:.3f} s)".format(
+            name, len(plan['points']), report_cost_s, planned_cost_s, compile_time_s))
+
+
+##########################################################################################################
+# Every test in main() against the simulated mixer, at full speed and with the bench delays
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_simulated_tests():
+
+    if_freq_ghz = [5.25]
+    rf_freq_ghz = [18, 24, 30, 36]
+    lo_freq_ghz = main.synth_freq_gen(if_freq_ghz, rf_freq_ghz, "lower", 4)
+    tx_pin_dbm = main.power_sweep_range(-15, 10, 1, 5)
+    rx_pin_dbm = main.power_sweep_range(-20, 10, 1, 5)
+
+    tests = [
+        ('UPCONVERT', lambda wb, mxg, mxg2, lo, sa, st, dp: main.upconversion_sweep(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, mxg, lo, sa, 1, 1, 1, settler=st, dispatcher=dp)),
+        ('DOWNCONVERT', lambda wb, mxg, mxg2, lo, sa, st, dp: main.downconversion_sweep(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -40, 15, mxg, lo, sa, 1, 1, 1, settler=st, dispatcher=dp)),
+        ('TX_P1DB', lambda wb, mxg, mxg2, lo, sa, st, dp: main.tx_p1db(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, tx_pin_dbm, 15, mxg, lo, sa, 1, 1, 1, settler=st, dispatcher=dp)),
+        ('RX_P1DB', lambda wb, mxg, mxg2, lo, sa, st, dp: main.rx_p1db(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, rx_pin_dbm, 15, mxg, lo, sa, 1, 1, 1, settler=st, dispatcher=dp)),
+        ('TX_OIP3', lambda wb, mxg, mxg2, lo, sa, st, dp: main.tx_oip3(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -20, 15, mxg, mxg2, lo, sa, 1, 1, 1, 1, [20, 80],
+            settler=st, dispatcher=dp, tone_reader=MultiMarkerToneReader(sa, st))),
+        ('RX_OIP3', lambda wb, mxg, mxg2, lo, sa, st, dp: main.rx_oip3(
+            wb, if_freq_ghz, lo_freq_ghz, rf_freq_ghz, -40, 15, mxg, mxg2, lo, sa, 1, 1, 1, 1, [20, 80],
+            settler=st, dispatcher=dp, tone_reader=MultiMarkerToneReader(sa, st))),
+    ]
+
+    for name, test in tests:
+        line = "{:12s}".format(name)
+        for timing in ('fast', 'realtime'):
+            workbook = xlsxwriter.Workbook(os.path.join(tempfile.mkdtemp(), 'benchmark_{}.xlsx'.format(name)))
+            bench = SimulatedBench('SIM-RF-MXG', lo_mult=4, timing=timing)
+            mxg = CachedInstrument(bench.generator('SIM-MXG2'))
+            mxg2 = CachedInstrument(bench.generator('SIM-CAL-SG'))
+            lo_mxg = CachedInstrument(bench.generator('SIM-RF-MXG'))
+            specan = CachedInstrument(bench.analyzer('SIM-FSV40'))
+            specan.preset()
+            specan.set_marker_state(1, 'ON')
+            specan.set_span(.1e9)
+            specan.set_rbw(1e3)
+
+            settler = Settler(poll_interval_s=bench.timing['poll_interval_s'])
+            dispatcher = Dispatcher(settler)
+
+            start = time.time()
+            test(workbook, mxg, mxg2, lo_mxg, specan, settler, dispatcher)
+            line = line + " {:8s} {:6.2f} s".format(timing, time.time() - start)
+
+            dispatcher.close()
+            workbook.close()
+
+        print(line)
+
+
+##########################################################################################################
+# Six DUTs through UPCONVERT on one simulated bench and on three in parallel, bench delays on
+# params:   none
+# returns:  none
+##########################################################################################################
+def benchmark_scheduler():
+
+    jobs = [{'dut': 'SIM{:03d}'.format(dut), 'test': 'UPCONVERT'} for dut in range(0, 6)]
+    script_path = os.path.abspath(main.__file__)
+
+    # Keep the spreadsheets and bench logs out of the source tree
+    os.chdir(tempfile.mkdtemp())
+
+    for count in (1, 3):
+        benches = []
+        for bench in range(0, count):
+            instruments = dict((name, 'SIM{}-{}'.format(bench, address)) for name, address in main.INSTRUMENTS.items())
+            benches.append({'name': 'sim{}'.format(bench), 'instruments': instruments, 'simulate': 'realtime'})
+
+        start = time.time()
+        results = bench_scheduler.run(script_path, benches, jobs)
+        print(bench_scheduler.summary(results, time.time() - start))
+
+
+BENCHMARKS = {
+    'settling': benchmark_settling,
+    'planner': benchmark_planner,
+    'dispatch': benchmark_dispatch,
+    'oip3_readout': benchmark_oip3_readout,
+    'analyzer_setup': benchmark_analyzer_setup,
+    'cache': benchmark_cache,
+    'batch': benchmark_batch,
+    'list_sweep': benchmark_list_sweep,
+    'p1db_search': benchmark_p1db_search,
+    'compression': benchmark_compression,
+    'spreadsheet': benchmark_spreadsheet,
+    'result_store': benchmark_result_store,
+    'journal': benchmark_journal,
+    'run_database': benchmark_run_database,
+    'reprocess': benchmark_reprocess,
+    'loss_table': benchmark_loss_table,
+    'calibration': benchmark_calibration,
+    'leveling': benchmark_leveling,
+    'sweep_engine': benchmark_sweep_engine,
+    'simulated_tests': benchmark_simulated_tests,
+    'scheduler': benchmark_scheduler,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Benchmarks: \n" + " \n".join(BENCHMARKS))
+        sys.exit(1)
+
+    BENCHMARKS[sys.argv[1]]()
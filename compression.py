@@ -0,0 +1,83 @@
+## Compression analysis of power sweeps.
+## Works on every curve of a sweep at once: pin / pout are (curves, points) arrays, shorter curves padded with
+## NaN. The small signal gain comes from the lowest power points, the compression at each point is
+## pin + gain - pout, and each compression level is interpolated between the two points either side of its last
+## upward crossing, so a noisy point that pokes over the level early does not end the curve. Steps do not need
+## to be 1 dB or even.
+
+import numpy
+
+
+# Compression levels reported by default (dB)
+DEFAULT_LEVELS_DB = (0.1, 1, 3)
+
+
+##########################################################################################################
+# Analyse the compression of a batch of power sweeps
+# params:   pin_dbm (points) or (curves, points), ascending along each curve
+#           pout_dbm (curves, points) or (points) for a single curve, NaN where a curve has no point
+#           levels_db, linear_points (lowest valid points the small signal gain is averaged over)
+# returns:  {'gain_db': (curves), 'ip_dbm': {level: (curves)}, 'op_dbm': {level: (curves)},
+#           'psat_dbm': (curves), 'pin_sat_dbm': (curves)}, NaN where a curve never reaches a level
+##########################################################################################################
+def analyze_compression(pin_dbm, pout_dbm, levels_db=DEFAULT_LEVELS_DB, linear_points=3):
+
+    pout_dbm = numpy.atleast_2d(numpy.asarray(pout_dbm, dtype=numpy.float64))
+    pin_dbm = numpy.broadcast_to(numpy.asarray(pin_dbm, dtype=numpy.float64), pout_dbm.shape)
+    curves = numpy.arange(pout_dbm.shape[0])
+
+    # Small signal gain over the first valid points of each curve
+    valid = numpy.isfinite(pin_dbm) & numpy.isfinite(pout_dbm)
+    first = numpy.cumsum(valid, axis=1) <= linear_points
+    linear = valid & first
+    counts = numpy.sum(linear, axis=1)
+    gain_db = numpy.where(linear, pout_dbm - pin_dbm, 0).sum(axis=1) / numpy.maximum(counts, 1)
+    gain_db[counts == 0] = numpy.nan
+
+    compression_db = pin_dbm + gain_db[:, numpy.newaxis] - pout_dbm
+
+    ip_dbm = {}
+    op_dbm = {}
+    for level in levels_db:
+        above = compression_db >= level
+
+        # Last step from below the level to at / above it, with both points measured
+        crossing = above[:, 1:] & ~above[:, :-1] & valid[:, 1:] & valid[:, :-1]
+        found = numpy.any(crossing, axis=1)
+        high = crossing.shape[1] - numpy.argmax(crossing[:, ::-1], axis=1)
+        low = high - 1
+
+        pin_low, pin_high = pin_dbm[curves, low], pin_dbm[curves, high]
+        c_low, c_high = compression_db[curves, low], compression_db[curves, high]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            fraction = numpy.clip((level - c_low) / (c_high - c_low), 0, 1)
+
+        ip = numpy.where(found, pin_low + fraction * (pin_high - pin_low), numpy.nan)
+        ip_dbm[level] = ip
+        op_dbm[level] = ip + gain_db - level
+
+    # Saturation is the highest output seen
+    measured = numpy.where(valid, pout_dbm, -numpy.inf)
+    peak = numpy.argmax(measured, axis=1)
+    has_points = numpy.any(valid, axis=1)
+    psat_dbm = numpy.where(has_points, measured[curves, peak], numpy.nan)
+    pin_sat_dbm = numpy.where(has_points, pin_dbm[curves, peak], numpy.nan)
+
+    return {'gain_db': gain_db, 'ip_dbm': ip_dbm, 'op_dbm': op_dbm, 'psat_dbm': psat_dbm, 'pin_sat_dbm': pin_sat_dbm}
+
+
+##########################################################################################################
+# Stack ragged curves into NaN padded (curves, points) arrays
+# params:   pin_lists, pout_lists
+# returns:  pin_dbm, pout_dbm
+##########################################################################################################
+def stack_curves(pin_lists, pout_lists):
+
+    points = max([len(pins) for pins in pin_lists] + [0])
+    pin_dbm = numpy.full((len(pin_lists), points), numpy.nan)
+    pout_dbm = numpy.full((len(pin_lists), points), numpy.nan)
+    for curve in range(0, len(pin_lists)):
+        pin_dbm[curve, :len(pin_lists[curve])] = pin_lists[curve]
+        pout_dbm[curve, :len(pout_lists[curve])] = pout_lists[curve]
+
+    return pin_dbm, pout_dbm
@@ -5,25 +5,48 @@ import xlsxwriter
 import datetime
 import time
 import sys
+import os
+import uuid
 import math
 import numpy
 
 from hw_qa_tools.visa_analyzer import SignalAnalyzer
 from hw_qa_tools.visa_generator import SignalGenerator
 
+from analyzer_planner import AnalyzerPlanner, describe
+from dispatch import Dispatcher
+from instrument_cache import CachedInstrument
+from list_sweep import ListSweep
+from loss_table import LossTable, loss_table
+from p1db_search import P1dbSearch
+from path_calibration import PathCalibration, bench_name, calibrate_paths, calibration_sheet
+from pipeline import RecordLog, Resume, latest_record_log
+from result_store import ResultStore
+from run_database import RunDatabase
+from scpi import identify
+from settling import Settler
+from simulated_instruments import SimulatedBench
+from source_leveling import SourceLeveler, level_paths
+from sweep_engine import TONE_METRICS, TONE_STORE, TWO_TONE_METRICS, TWO_TONE_STORE, run_sweep
+from tone_readers import MultiMarkerToneReader, TraceToneReader
+from warm_start import WarmStart
+
 
 ##########################################################################################################
 # Initialize the spreadsheet
 # Returns the workbook object and spreadsheet name
-# params:   spreadsheet_name_str
+# params:   spreadsheet_name_str, spreadsheet_name (full name to write again, the run being resumed)
 # returns:  workbook, spreadsheet_name
 ##########################################################################################################
-def spreadsheet_setup(spreadsheet_name_str):
+def spreadsheet_setup(spreadsheet_name_str, spreadsheet_name=None):
 
     # Create the spreadsheet
     current_time = datetime.datetime.now()
-    spreadsheet_name = str(spreadsheet_name_str) + '_' + current_time.strftime("%Y-%m-%d_%H-%M") + '.xlsx'
-    workbook = xlsxwriter.Workbook(spreadsheet_name)
+    if spreadsheet_name is None:
+        # To the second plus a run id, runs started together on one controller never share a name
+        spreadsheet_name = '{}_{}_{}.xlsx'.format(spreadsheet_name_str, current_time.strftime("%Y-%m-%d_%H-%M-%S"),
+                                                  uuid.uuid4().hex[:6])
+    workbook = xlsxwriter.Workbook(spreadsheet_name, {'constant_memory': True})
 
     # Return the spreadsheet object
     return workbook, spreadsheet_name
@@ -58,166 +81,78 @@ def spreadsheet_test_info(workbook, test_notes, spreadsheet_name):
 
 ##########################################################################################################
 # Sweeps the mixer to test upconversion gain
-# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
+# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler, dispatcher, list_sweep, record_log, result_store, resume
 # returns:  worksheet_upconversion
 ##########################################################################################################
-def upconversion_sweep(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
-
-    # Empty list for the measurements
-    if_power = []
-    if_frequencies = []
-    lo_frequencies = []
-    rf_frequencies = []
-    raw_pout = []
-    rf_losses = []
-
-    # Set the LO mxg
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
-    time.sleep(0.5)
-
-    # Turn on the mxgs
-    if_mxg.on()
-    lo_mxg.on()
-
-    for i in range(0, len(if_freq)):
-
-        # Set the IF mxg
-        if_mxg.set_frequency(if_freq[i]*1e9)
-        time.sleep(0.5)
-
-        for k in range(0, len(if_pin)):
-
-            # Set the mxg power levels
-            if_mxg.set_amplitude(if_pin[k] + if_loss)
-            time.sleep(0.5)
-
-            for j in range(0, len(rf_freq)):
-                # Set the specan frequency
-                specan.set_frequency(rf_freq[j] * 1e9)
-                time.sleep(0.5)
-
-                # Set the lo frequency
-                lo_freq = (rf_freq[j] + if_freq[i])
-                lo_mxg.set_frequency(lo_freq * 1e9)
-                time.sleep(0.5)
-
-                # Set the marker
-                specan.set_marker(1, rf_freq[j] * 1e9)
-                time.sleep(0.5)
-
-                raw_pout.append(specan.get_power(1))
-                if_power.append(if_pin[k])
-                lo_frequencies.append(lo_freq)
-                rf_frequencies.append(rf_freq[j])
-                if_frequencies.append(if_freq[i])
-                rf_losses.append(rf_loss[j])
-
-    # Add a new page to the workbook
-    worksheet_upconversion = workbook.add_worksheet('Up_Conversion')
-
-    # Write the header information
-    row = 0
-    worksheet_upconversion.write(row, 0, 'IF Frequency (GHz)')
-    worksheet_upconversion.write(row, 1, 'LO Frequency (GHz)')
-    worksheet_upconversion.write(row, 2, 'RF Frequency (GHz)')
-    worksheet_upconversion.write(row, 3, 'Specan Raw Pin (dBm)')
-    worksheet_upconversion.write(row, 4, 'Eval Board RF Pout (dBm)')
-    worksheet_upconversion.write(row, 5, 'Eval Board IF Pin (dBm)')
-    worksheet_upconversion.write(row, 6, 'Eval Board LO Pin (dBm)')
-    worksheet_upconversion.write(row, 7, 'Eval Board Conversion Gain (dB)')
-
-    # Dump the data into the worksheet
-    for i in range(0, len(raw_pout)):
-        row = row + 1
-        worksheet_upconversion.write(row, 0, if_frequencies[i])
-        worksheet_upconversion.write(row, 1, lo_frequencies[i])
-        worksheet_upconversion.write(row, 2, rf_frequencies[i])
-        worksheet_upconversion.write(row, 3, raw_pout[i])
-        worksheet_upconversion.write(row, 4, raw_pout[i] + rf_losses[i])
-        worksheet_upconversion.write(row, 5, if_power[i])
-        worksheet_upconversion.write(row, 6, lo_pin)
-        worksheet_upconversion.write(row, 7, raw_pout[i] + rf_losses[i] - if_power[i])
-
-    # Return the sheet
-    return worksheet_upconversion
+def upconversion_sweep(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler=None, dispatcher=None, list_sweep=None, record_log=None, result_store=None, resume=None):
+
+    # IF in at every power, RF out, the LO follows the IF and RF
+    spec = {
+        'test': 'UPCONVERT',
+        'dimensions': [('if', if_freq), ('pin', if_pin), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: point['rf'] + point['if'])],
+        'sources': [
+            {'instrument': if_mxg, 'frequency': 'if', 'level': 'pin', 'loss': if_loss, 'pin': 'pin'},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'pin': 'lo_pin',
+             'cost': 'lo_frequency'},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': rf_loss},
+        'measure': 'tone',
+        'metrics': TONE_METRICS,
+        'sheet': 'Up_Conversion',
+        'columns': [
+            ('IF Frequency (GHz)', 'if'),
+            ('LO Frequency (GHz)', 'lo'),
+            ('RF Frequency (GHz)', 'rf'),
+            ('Specan Raw Pin (dBm)', 'raw_pout'),
+            ('Eval Board RF Pout (dBm)', 'pout'),
+            ('Eval Board IF Pin (dBm)', 'pin'),
+            ('Eval Board LO Pin (dBm)', 'lo_pin'),
+            ('Eval Board Conversion Gain (dB)', 'gain'),
+        ],
+        'store': TONE_STORE,
+    }
+
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, list_sweep=list_sweep,
+                     record_log=record_log, result_store=result_store, resume=resume)
 
 
 ##########################################################################################################
 # Sweep the mixer to test downconversion gain
-# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
+# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler, dispatcher, list_sweep, record_log, result_store, resume
 # returns:  worksheet_downconversion
 ##########################################################################################################
-def downconversion_sweep(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
-
-    # Empty list for the measurements
-    if_frequencies = []
-    lo_frequencies = []
-    rf_frequencies = []
-    raw_pout = []
-    lo_power = []
-    raw_pout = []
-    rf_losses = []
-
-    # Set the mxg power levels
-    rf_mxg.set_amplitude(rf_pin + rf_loss)
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
-
-    # Turn on the mxgs
-    rf_mxg.on()
-    lo_mxg.on()
-
-    for i in range(0, len(if_freq)):
-        # Set the specan to the IF Frequency
-        specan.set_frequency(if_freq[i] * 1e9)
-        time.sleep(0.5)
-
-        for j in range(0, len(rf_freq)):
-            # Set the rf mxg
-            rf_mxg.set_frequency(rf_freq[j] * 1e9)
-            time.sleep(0.5)
-
-            # Set the lo frequency
-            lo_freq = (rf_freq[j] + if_freq[i])
-            lo_mxg.set_frequency(lo_freq * 1e9)
-            time.sleep(0.5)
-
-            # Set the marker
-            specan.set_marker(1, if_freq[i] * 1e9)
-            time.sleep(0.5)
-
-            raw_pout.append(specan.get_power(1))
-            if_frequencies.append(if_freq[i])
-            lo_frequencies.append(lo_freq)
-            rf_frequencies.append(rf_freq[j])
-
-    # Add a new page to the workbook
-    worksheet_downconversion = workbook.add_worksheet('Down_Conversion')
-
-    # Write the header information
-    row = 0
-    worksheet_downconversion.write(row, 0, 'IF Frequency (GHz)')
-    worksheet_downconversion.write(row, 1, 'LO Frequency (GHz)')
-    worksheet_downconversion.write(row, 2, 'RF Frequency (GHz)')
-    worksheet_downconversion.write(row, 3, 'Specan Raw Pin (dBm)')
-    worksheet_downconversion.write(row, 4, 'Eval Board IF Pout (dBm)')
-    worksheet_downconversion.write(row, 5, 'Eval Board RF Pin (dBm)')
-    worksheet_downconversion.write(row, 6, 'Eval Board LO Pin (dBm)')
-    worksheet_downconversion.write(row, 7, 'Eval Board Conversion Gain (dB)')
-
-    # Dump the data into the worksheet
-    for i in range(0, len(raw_pout)):
-        row = row + 1
-        worksheet_downconversion.write(row, 0, if_frequencies[i])
-        worksheet_downconversion.write(row, 1, lo_frequencies[i])
-        worksheet_downconversion.write(row, 2, rf_frequencies[i])
-        worksheet_downconversion.write(row, 3, raw_pout[i])
-        worksheet_downconversion.write(row, 4, raw_pout[i] + if_loss)
-        worksheet_downconversion.write(row, 5, rf_pin)
-        worksheet_downconversion.write(row, 6, lo_pin)
-        worksheet_downconversion.write(row, 7, raw_pout[i] + if_loss - rf_pin)
-
-    # Return the sheet
-    return worksheet_downconversion
+def downconversion_sweep(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler=None, dispatcher=None, list_sweep=None, record_log=None, result_store=None, resume=None):
+
+    # RF in, IF out, the LO follows the IF and RF
+    spec = {
+        'test': 'DOWNCONVERT',
+        'dimensions': [('if', if_freq), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: point['rf'] + point['if'])],
+        'sources': [
+            {'instrument': rf_mxg, 'frequency': 'rf', 'level': rf_pin, 'loss': rf_loss, 'pin': 'pin'},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'pin': 'lo_pin',
+             'cost': 'lo_frequency'},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'if', 'loss': if_loss},
+        'measure': 'tone',
+        'metrics': TONE_METRICS,
+        'sheet': 'Down_Conversion',
+        'columns': [
+            ('IF Frequency (GHz)', 'if'),
+            ('LO Frequency (GHz)', 'lo'),
+            ('RF Frequency (GHz)', 'rf'),
+            ('Specan Raw Pin (dBm)', 'raw_pout'),
+            ('Eval Board IF Pout (dBm)', 'pout'),
+            ('Eval Board RF Pin (dBm)', 'pin'),
+            ('Eval Board LO Pin (dBm)', 'lo_pin'),
+            ('Eval Board Conversion Gain (dB)', 'gain'),
+        ],
+        'store': TONE_STORE,
+    }
+
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, list_sweep=list_sweep,
+                     record_log=record_log, result_store=result_store, resume=resume)
 
 
 ##########################################################################################################
@@ -281,549 +216,226 @@ def power_sweep_range(start_dbm, stop_dbm, step, max_pin_dbm):
 
 
 ##########################################################################################################
-# Sweep the IF input power to see what the P1dB is
-# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
-# returns:  worksheet_upc_p1db, worksheet_upc_p1db_raw
+# P1dB test from the IF side, the IF mxg power moves at every IF / RF pair and the RF comes out
+# params:   if_freq, rf_freq, if_pin_start, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
+# returns:  spec, the caller adds the powers to step ('pins') or the search
 ##########################################################################################################
-def tx_p1db(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
-
-    # Set the mxg power levels
-    if_mxg.set_amplitude(if_pin[0] + if_loss)
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
+def tx_p1db_spec(if_freq, rf_freq, if_pin_start, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
+
+    return {
+        'test': 'TX_P1DB',
+        'dimensions': [('if', if_freq), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg, 'frequency': 'if', 'level': if_pin_start, 'loss': if_loss, 'pin': 'pin'},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'cost': 'lo_frequency'},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': rf_loss},
+        'measure': 'compression',
+        'metrics': TONE_METRICS,
+        'sheet': 'Up_Conversion_OP1dB',
+        'pin_label': 'IF Pin',
+        'store': TONE_STORE,
+    }
 
-    # Turn on the mxgs
-    if_mxg.on()
-    lo_mxg.on()
 
-    # Create the spreadsheet page
-    worksheet_upc_p1db = workbook.add_worksheet('Up_Conversion_OP1dB')
-    worksheet_upc_p1db_raw = workbook.add_worksheet('Up_Conversion_OP1dB_Raw')
-
-    # Write the header information
-    # One sheet is for the raw information and one is for the calibrated info
-    row = 0
-    worksheet_upc_p1db.write(row, 0, 'IF Pin (dBm)')
+##########################################################################################################
+# P1dB test from the RF side, the RF mxg power moves at every IF / RF pair and the IF comes out
+# params:   if_freq, rf_freq, rf_pin_start, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
+# returns:  spec, the caller adds the powers to step ('pins') or the search
+##########################################################################################################
+def rx_p1db_spec(if_freq, rf_freq, rf_pin_start, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
+
+    return {
+        'test': 'RX_P1DB',
+        'dimensions': [('if', if_freq), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': rf_mxg, 'frequency': 'rf', 'level': rf_pin_start, 'loss': rf_loss, 'pin': 'pin'},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'cost': 'lo_frequency'},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'if', 'loss': if_loss},
+        'measure': 'compression',
+        'metrics': TONE_METRICS,
+        'sheet': 'Down_Conversion_OP1dB',
+        'pin_label': 'RF Pin',
+        'store': TONE_STORE,
+    }
 
-    worksheet_upc_p1db_raw.write(row, 0, 'IF Pin (dBm)')
 
-    # Starting Column
-    col = 0  # Starting at 0 instead of 1 because it immediately increments
+##########################################################################################################
+# Sweep the IF input power to see what the P1dB is
+# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler, dispatcher, record_log, warm_start, result_store, resume
+# returns:  worksheet_upc_p1db, worksheet_upc_p1db_raw
+##########################################################################################################
+def tx_p1db(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler=None, dispatcher=None, record_log=None, warm_start=None, result_store=None, resume=None):
 
-    # Test loop
-    for i in range(0, len(if_freq)):
-        # Set the IF mxg
-        if_mxg.set_frequency(if_freq[i] * 1e9)
-        time.sleep(0.5)
+    # IF power stepped at every IF / RF pair, RF out
+    spec = tx_p1db_spec(if_freq, rf_freq, if_pin[0], lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss)
+    spec['pins'] = if_pin
 
-        for j in range(0, len(rf_freq)):
-            # Create / Blank the lists that store the data
-            if_frequencies = []
-            lo_frequencies = []
-            rf_frequencies = []
-            if_powers = []
-            raw_pout = []
-
-            # Reset the row for the current frequency
-            row = 0
-
-            # Increment to the next column
-            col = col + 1
-
-            # Set the specan frequency
-            specan.set_frequency(rf_freq[j] * 1e9)
-            time.sleep(0.5)
-
-            # Set the lo frequency
-            lo_freq = (rf_freq[j] + if_freq[i]) / 4
-            lo_mxg.set_frequency(lo_freq * 1e9)
-            time.sleep(0.5)
-
-            # Set the marker
-            specan.set_marker(1, rf_freq[j] * 1e9)
-            time.sleep(0.5)
-
-            # Write the column header information
-            header_info = "Pout(dBm), RF {}GHz, LO {}GHz, IF {}GHz".format(rf_freq[j], lo_freq, if_freq[i])
-            worksheet_upc_p1db.write(0, col, header_info)
-
-            header_info_raw = "Pout_raw(dBm), RF {}GHz, LO {}GHz, IF {}GHz".format(rf_freq[j], lo_freq, if_freq[i])
-            worksheet_upc_p1db_raw.write(0, col, header_info_raw)
-
-            for k in range(0, len(if_pin)):
-                # Sweep the IF power and set record the output power.
-                # Set the IF power
-                if_mxg.set_amplitude(if_pin[k] + if_loss)
-                time.sleep(1)
-
-                # Measure the output power
-                raw_pout.append(specan.get_power(1))
-                if_frequencies.append(if_freq[i])
-                lo_frequencies.append(lo_freq)
-                rf_frequencies.append(rf_freq[j])
-                if_powers.append(if_pin[k])
-
-                # Print the current Settings
-                debug = "IF {}dBm, RF {}GHz, LO {}GHz, IF {}GHz".format(if_pin[k], rf_freq[j], lo_freq, if_freq[i])
-                print(debug)
-
-            # Dump the data into the spreadsheet
-            for l in range(0, len(raw_pout)):
-                row = row + 1
-                worksheet_upc_p1db.write(row, 0, if_powers[l])
-                worksheet_upc_p1db.write(row, col, raw_pout[l] + rf_loss)
-
-                worksheet_upc_p1db_raw.write(row, 0, if_powers[l])
-                worksheet_upc_p1db_raw.write(row, col, raw_pout[l])
-
-            # Calculate the p1dB
-            P1dB_index, IP1dB, OP1dB = find_p1db(if_powers, raw_pout)
-
-            # Write the calculated P1dB information into the workbook
-            # worksheet_upc_p1db_raw.write(row, 0, 'P1dB Freq (GHz)')
-            # worksheet_upc_p1db.write(row, 0, 'P1dB Freq (GHz)')
-            # worksheet_upc_p1db_raw.write(row + 1, col, if_powers[P1dB_index])
-            # worksheet_upc_p1db.write(row, col, if_freq[P1dB_index])
-
-            worksheet_upc_p1db_raw.write(row + 1, 0, 'IP1dB (dBm)')
-            worksheet_upc_p1db.write(row + 1, 0, 'IP1dB (dBm)')
-            worksheet_upc_p1db_raw.write(row + 1, col, if_powers[P1dB_index])
-            worksheet_upc_p1db.write(row + 1, col, if_powers[P1dB_index])
-
-            worksheet_upc_p1db_raw.write(row + 2, 0, 'OP1dB (dBm)')
-            worksheet_upc_p1db.write(row + 2, 0, 'OP1dB (dBm)')
-            worksheet_upc_p1db_raw.write(row + 2, col, raw_pout[P1dB_index])
-            worksheet_upc_p1db.write(row + 2, col, raw_pout[P1dB_index] + rf_loss)
-
-    # Return the worksheet
-    return worksheet_upc_p1db, worksheet_upc_p1db_raw
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, record_log=record_log,
+                     warm_start=warm_start, result_store=result_store, resume=resume)
 
 
 ##########################################################################################################
 # Sweep the IF input power to see what the P1dB is
-# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss
+# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler, dispatcher, record_log, warm_start, result_store, resume
 # returns:  worksheet_dnc_p1db, worksheet_dnc_p1db_raw
 ##########################################################################################################
-def rx_p1db(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss):
-
-    # Set the mxg power levels
-    rf_mxg.set_amplitude(rf_pin[0] + rf_loss)
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
-
-    # Turn on the mxgs
-    rf_mxg.on()
-    lo_mxg.on()
+def rx_p1db(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, settler=None, dispatcher=None, record_log=None, warm_start=None, result_store=None, resume=None):
 
-    # Create the spreadsheet page
-    worksheet_dnc_p1db = workbook.add_worksheet('Down_Conversion_OP1dB')
-    worksheet_dnc_p1db_raw = workbook.add_worksheet('Down_Conversion_OP1dB_Raw')
+    # RF power stepped at every IF / RF pair, IF out
+    spec = rx_p1db_spec(if_freq, rf_freq, rf_pin[0], lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss)
+    spec['pins'] = rf_pin
 
-    # Write the header information
-    # One sheet is for the raw information and one is for the calibrated info
-    row = 0
-    worksheet_dnc_p1db.write(row, 0, 'RF Pin (dBm)')
-
-    worksheet_dnc_p1db_raw.write(row, 0, 'RF Pin (dBm)')
-
-    # Starting Column
-    col = 0  # Starting at 0 instead of 1 because it immediately increments
-
-    # Test loop
-    for i in range(0, len(if_freq)):
-        # Set the specan to IF frequency
-        specan.set_frequency(if_freq[i] * 1e9)
-        time.sleep(0.5)
-
-        # Set the marker
-        specan.set_marker(1, if_freq[i] * 1e9)
-        time.sleep(0.5)
-
-        for j in range(0, len(rf_freq)):
-            # Create / Blank the lists that store the data
-            if_frequencies = []
-            lo_frequencies = []
-            rf_frequencies = []
-            rf_powers = []
-            raw_pout = []
-
-            # Reset the row for the current frequency
-            row = 0
-
-            # Increment to the next column
-            col = col + 1
-
-            # Set the rf mxg frequency
-            rf_mxg.set_frequency(rf_freq[j] * 1e9)
-            time.sleep(0.5)
-
-            # Set the lo frequency
-            lo_freq = (rf_freq[j] + if_freq[i]) / 4
-            lo_mxg.set_frequency(lo_freq * 1e9)
-            time.sleep(0.5)
-
-            # Write the column header information
-            header_info = "Pout(dBm), RF {}GHz, LO {}GHz, IF {}GHz".format(rf_freq[j], lo_freq, if_freq[i])
-            worksheet_dnc_p1db.write(0, col, header_info)
-
-            header_info_raw = "Pou_raw(dBm), RF {}GHz, LO {}GHz, IF {}GHz".format(rf_freq[j], lo_freq, if_freq[i])
-            worksheet_dnc_p1db_raw.write(0, col, header_info_raw)
-
-            for k in range(0, len(rf_pin)):
-                # Sweep the RF power and set record the output power.
-                # Set the RF power
-                rf_mxg.set_amplitude(rf_pin[k] + if_loss)
-                time.sleep(1)
-
-                # Measure the output power
-                raw_pout.append(specan.get_power(1))
-                if_frequencies.append(if_freq[i])
-                lo_frequencies.append(lo_freq)
-                rf_frequencies.append(rf_freq[j])
-                rf_powers.append(rf_pin[k])
-
-                # Print the current Settings
-                debug = "IF {}dBm, RF {}GHz, LO {}GHz, IF {}GHz".format(rf_pin[k], rf_freq[j], lo_freq, if_freq[i])
-                print(debug)
-
-            # Dump the data into the spreadsheet
-            for l in range(0, len(raw_pout)):
-                row = row + 1
-                worksheet_dnc_p1db.write(row, 0, rf_powers[l])
-                worksheet_dnc_p1db.write(row, col, raw_pout[l] + rf_loss)
-
-                worksheet_dnc_p1db_raw.write(row, 0, rf_powers[l])
-                worksheet_dnc_p1db_raw.write(row, col, raw_pout[l])
-
-            # Calculate the p1dB
-            P1dB_index, IP1dB, OP1dB = find_p1db(rf_powers, raw_pout)
-
-            # Write the calculated P1dB information into the workbook
-            # worksheet_upc_p1db_raw.write(row, 0, 'P1dB Freq (GHz)')
-            # worksheet_upc_p1db.write(row, 0, 'P1dB Freq (GHz)')
-            # worksheet_upc_p1db_raw.write(row + 1, col, if_powers[P1dB_index])
-            # worksheet_upc_p1db.write(row, col, if_freq[P1dB_index])
-
-            worksheet_dnc_p1db_raw.write(row + 1, 0, 'IP1dB (dBm)')
-            worksheet_dnc_p1db.write(row + 1, 0, 'IP1dB (dBm)')
-            worksheet_dnc_p1db_raw.write(row + 1, col, rf_powers[P1dB_index])
-            worksheet_dnc_p1db.write(row + 1, col, rf_powers[P1dB_index])
-
-            worksheet_dnc_p1db_raw.write(row + 2, 0, 'OP1dB (dBm)')
-            worksheet_dnc_p1db.write(row + 2, 0, 'OP1dB (dBm)')
-            worksheet_dnc_p1db_raw.write(row + 2, col, raw_pout[P1dB_index])
-            worksheet_dnc_p1db.write(row + 2, col, raw_pout[P1dB_index] + rf_loss)
-
-    # Return the worksheet
-    return worksheet_dnc_p1db, worksheet_dnc_p1db_raw
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, record_log=record_log,
+                     warm_start=warm_start, result_store=result_store, resume=resume)
 
 
 ##########################################################################################################
-# Measure the OIP3 at all frequency combos
-# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg_1, if_mxg_2, lo_mxg, specan, if_loss_1, if_loss_2, lo_loss, rf_loss, tone_separation_mhz
-# returns:  worksheet_upconversion_ip3
+# Search the IF input power for the P1dB instead of sweeping every step
+# params:   workbook, if_freq, lo_freq, rf_freq, if_pin_start, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, search, settler, dispatcher, record_log, warm_start, result_store, resume
+# returns:  worksheet_upc_p1db, worksheet_upc_p1db_raw
 ##########################################################################################################
-def tx_oip3(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg_1, if_mxg_2, lo_mxg, specan, if_loss_1, if_loss_2, lo_loss, rf_loss, tone_separation_mhz):
-
-    # Empty list for the measurements
-    if_frequencies = []
-    lo_frequencies = []
-    rf_frequencies = []
-    raw_pout_im_low = []
-    raw_pout_tone_low = []
-    raw_pout_tone_high = []
-    raw_pout_im_high = []
-    test_tone_separation_mhz = []
-
-    # Set the mxg power levels
-    if_mxg_1.set_amplitude(if_pin + if_loss_1)
-    if_mxg_2.set_amplitude(if_pin + if_loss_2)
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
-
-    # Turn on the mxgs
-    if_mxg_1.on()
-    if_mxg_2.on()
-    lo_mxg.on()
-
-    for i in range(0, len(if_freq)):
-
-        for k in range(0, len(tone_separation_mhz)):
-            # Calculate the IF tones
-            if_low_hz = (if_freq[i] * 1e9) - (tone_separation_mhz[k] / 2 * 1e6)
-            if_high_hz = (if_freq[i] * 1e9) + (tone_separation_mhz[k] / 2 * 1e6)
-
-            # Set the IF mxg
-            if_mxg_1.set_frequency(if_low_hz)
-            time.sleep(0.5)
-
-            if_mxg_2.set_frequency(if_high_hz)
-            time.sleep(0.5)
-
-            # Set the specan span
-            specan.set_span(6 * tone_separation_mhz[k] * 1e6)
-
-            for j in range(0, len(rf_freq)):
-                # Set the specan frequency
-                specan.set_frequency(rf_freq[j] * 1e9)
-                time.sleep(0.5)
-
-                # Set the lo frequency
-                lo_freq = (rf_freq[j] + if_freq[i]) / 4
-                lo_mxg.set_frequency(lo_freq * 1e9)
-                time.sleep(1)
+def tx_p1db_search(workbook, if_freq, lo_freq, rf_freq, if_pin_start, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, search, settler=None, dispatcher=None, record_log=None, warm_start=None, result_store=None, resume=None):
 
-                # Calculate the tone frequencies
-                rf_low_im_hz = (rf_freq[j] * 1e9) - (tone_separation_mhz[k] * 1.5 * 1e6)
-                rf_low_tone_hz = (rf_freq[j] * 1e9) - (tone_separation_mhz[k] / 2 * 1e6)
-                rf_high_tone_hz = (rf_freq[j] * 1e9) + (tone_separation_mhz[k] / 2 * 1e6)
-                rf_high_im_hz = (rf_freq[j] * 1e9) + (tone_separation_mhz[k] * 1.5 * 1e6)
+    # The search starts every IF / RF pair from if_pin_start
+    spec = tx_p1db_spec(if_freq, rf_freq, if_pin_start, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss)
+    spec['search'] = search
 
-                # Set the marker to low im tone and get its power
-                specan.set_marker(1, rf_low_im_hz)
-                time.sleep(0.5)
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, record_log=record_log,
+                     warm_start=warm_start, result_store=result_store, resume=resume)
 
-                raw_pout_im_low.append(specan.get_power(1))
 
-                # Set the marker to low main tone and get its power
-                specan.set_marker(1, rf_low_tone_hz)
-                time.sleep(0.5)
-
-                raw_pout_tone_low.append(specan.get_power(1))
-
-                # Set the marker to high main tone and get its power
-                specan.set_marker(1, rf_high_tone_hz)
-                time.sleep(0.5)
-
-                raw_pout_tone_high.append(specan.get_power(1))
-
-                # Set the marker to low im tone and get its power
-                specan.set_marker(1, rf_high_im_hz)
-                time.sleep(0.5)
+##########################################################################################################
+# Search the RF input power for the P1dB instead of sweeping every step
+# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin_start, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, search, settler, dispatcher, record_log, warm_start, result_store, resume
+# returns:  worksheet_dnc_p1db, worksheet_dnc_p1db_raw
+##########################################################################################################
+def rx_p1db_search(workbook, if_freq, lo_freq, rf_freq, rf_pin_start, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss, search, settler=None, dispatcher=None, record_log=None, warm_start=None, result_store=None, resume=None):
 
-                raw_pout_im_high.append(specan.get_power(1))
+    # The search starts every IF / RF pair from rf_pin_start
+    spec = rx_p1db_spec(if_freq, rf_freq, rf_pin_start, lo_pin, rf_mxg, lo_mxg, specan, if_loss, lo_loss, rf_loss)
+    spec['search'] = search
 
-                # Append the frequency Data to the lists
-                if_frequencies.append(if_freq[i])
-                lo_frequencies.append(lo_freq)
-                rf_frequencies.append(rf_freq[j])
-                test_tone_separation_mhz.append(tone_separation_mhz[k])
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, record_log=record_log,
+                     warm_start=warm_start, result_store=result_store, resume=resume)
 
-    # Add a new page to the workbook
-    worksheet_upconversion_ip3 = workbook.add_worksheet('Up_Conversion_IP3')
 
-    # Write the header information
-    row = 0
-    worksheet_upconversion_ip3.write(row, 0, 'IF Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 1, 'LO Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 2, 'RF Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 3, 'IM Tone Separation (MHz)')
-    worksheet_upconversion_ip3.write(row, 4, 'Low IM Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 5, 'Low Main Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 6, 'High Main Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 7, 'High IM Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 8, 'MAMX-011054 TX Low OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 9, 'MAMX-011054 TX High OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 10, 'MAMX-011054 TX Average OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 11, 'MAMX-011054 TX Conversion Gain Low Tone (dB)')
-    worksheet_upconversion_ip3.write(row, 12, 'MAMX-011054 TX Conversion Gain High Tone OIP3 (dBm)')
-
-    # Dump the data into the worksheet
-    for i in range(0, len(raw_pout_tone_low)):
-        # Calculate the IP3 Values
-        low_oip3 = (raw_pout_tone_low[i] + rf_loss) + (raw_pout_tone_low[i] - raw_pout_im_low[i]) / 2
-        high_oip3 = (raw_pout_tone_high[i] + rf_loss) + (raw_pout_tone_high[i] - raw_pout_im_high[i]) / 2
-        ave_oip3 = (high_oip3 + low_oip3) / 2
-
-        row = row + 1
-        worksheet_upconversion_ip3.write(row, 0, if_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 1, lo_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 2, rf_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 3, test_tone_separation_mhz[i])
-        worksheet_upconversion_ip3.write(row, 4, raw_pout_im_low[i] + rf_loss)
-        worksheet_upconversion_ip3.write(row, 5, raw_pout_tone_low[i] + rf_loss)
-        worksheet_upconversion_ip3.write(row, 6, raw_pout_tone_high[i] + rf_loss)
-        worksheet_upconversion_ip3.write(row, 7, raw_pout_im_high[i] + rf_loss)
-        worksheet_upconversion_ip3.write(row, 8, low_oip3)
-        worksheet_upconversion_ip3.write(row, 9, high_oip3)
-        worksheet_upconversion_ip3.write(row, 10, ave_oip3)
-        worksheet_upconversion_ip3.write(row, 11, raw_pout_tone_low[i] + rf_loss - if_pin)
-        worksheet_upconversion_ip3.write(row, 12, raw_pout_tone_high[i] + rf_loss - if_pin)
-
-    # Return the sheet
-    return worksheet_upconversion_ip3
+##########################################################################################################
+# Sheet columns of the OIP3 tests
+# params:   board (board and side the OIP3 headers name)
+# returns:  columns, (header, point value)
+##########################################################################################################
+def oip3_columns(board):
+
+    return [
+        ('IF Frequency (GHz)', 'if'),
+        ('LO Frequency (GHz)', 'lo'),
+        ('RF Frequency (GHz)', 'rf'),
+        ('IM Tone Separation (MHz)', 'tone'),
+        ('Low IM Tone Pout (dBm)', 'im_low'),
+        ('Low Main Tone Pout (dBm)', 'tone_low'),
+        ('High Main Tone Pout (dBm)', 'tone_high'),
+        ('High IM Tone Pout (dBm)', 'im_high'),
+        ('{} Low OIP3 (dBm)'.format(board), 'low_oip3'),
+        ('{} High OIP3 (dBm)'.format(board), 'high_oip3'),
+        ('{} Average OIP3 (dBm)'.format(board), 'oip3'),
+        ('{} Conversion Gain Low Tone (dB)'.format(board), 'gain'),
+        ('{} Conversion Gain High Tone OIP3 (dBm)'.format(board), 'gain_high'),
+    ]
 
 
 ##########################################################################################################
 # Measure the OIP3 at all frequency combos
-# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg_1, rf_mxg_2, lo_mxg, specan, rf_loss_1, rf_loss_2, lo_loss, if_loss, tone_separation_mhz
+# params:   workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg_1, if_mxg_2, lo_mxg, specan, if_loss_1, if_loss_2, lo_loss, rf_loss, tone_separation_mhz, settler, dispatcher, tone_reader, record_log, analyzer_planner, result_store, resume
 # returns:  worksheet_upconversion_ip3
 ##########################################################################################################
-def rx_oip3(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg_1, rf_mxg_2, lo_mxg, specan, rf_loss_1, rf_loss_2, lo_loss, if_loss, tone_separation_mhz):
-
-    # Empty list for the measurements
-    if_frequencies = []
-    lo_frequencies = []
-    rf_frequencies = []
-    raw_pout_im_low = []
-    raw_pout_tone_low = []
-    raw_pout_tone_high = []
-    raw_pout_im_high = []
-    test_tone_separation_mhz = []
-
-    # Set the mxg power levels
-    rf_mxg_1.set_amplitude(rf_pin + rf_loss_1)
-    rf_mxg_2.set_amplitude(rf_pin + rf_loss_2)
-    lo_mxg.set_amplitude(lo_pin + lo_loss)
-
-    # Turn on the mxgs
-    rf_mxg_1.on()
-    rf_mxg_2.on()
-    lo_mxg.on()
-
-    for i in range(0, len(if_freq)):
-        # Set the specan frequency
-        specan.set_frequency(if_freq[i] * 1e9)
-        time.sleep(0.5)
-
-        for k in range(0, len(tone_separation_mhz)):
-            # Set the specan span
-            specan.set_span(6 * tone_separation_mhz[k] * 1e6)
-
-            for j in range(0, len(rf_freq)):
-                # Calculate the RF tones
-                rf_low_hz = (rf_freq[j] * 1e9) - (tone_separation_mhz[k] / 2 * 1e6)
-                rf_high_hz = (rf_freq[j] * 1e9) + (tone_separation_mhz[k] / 2 * 1e6)
-
-                # Set the IF mxg
-                rf_mxg_1.set_frequency(rf_low_hz)
-                time.sleep(0.5)
-
-                rf_mxg_2.set_frequency(rf_high_hz)
-                time.sleep(0.5)
-
-                # Set the lo frequency
-                lo_freq = (rf_freq[j] + if_freq[i]) / 4
-                lo_mxg.set_frequency(lo_freq * 1e9)
-                time.sleep(0.5)
-
-                # Calculate the tone frequencies
-                if_low_im_hz = (if_freq[i] * 1e9) - (tone_separation_mhz[k] * 1.5 * 1e6)
-                if_low_tone_hz = (if_freq[i] * 1e9) - (tone_separation_mhz[k] / 2 * 1e6)
-                if_high_tone_hz = (if_freq[i] * 1e9) + (tone_separation_mhz[k] / 2 * 1e6)
-                if_high_im_hz = (if_freq[i] * 1e9) + (tone_separation_mhz[k] * 1.5 * 1e6)
-
-                # Need a bit of time to let the specan sweep
-                time.sleep(1)
-
-                # Set the marker to low im tone and get its power
-                specan.set_marker(1, if_low_im_hz)
-                time.sleep(0.5)
-
-                raw_pout_im_low.append(specan.get_power(1))
-
-                # Set the marker to low main tone and get its power
-                specan.set_marker(1, if_low_tone_hz)
-                time.sleep(0.5)
-
-                raw_pout_tone_low.append(specan.get_power(1))
-
-                # Set the marker to high main tone and get its power
-                specan.set_marker(1, if_high_tone_hz)
-                time.sleep(0.5)
-
-                raw_pout_tone_high.append(specan.get_power(1))
-
-                # Set the marker to low im tone and get its power
-                specan.set_marker(1, if_high_im_hz)
-                time.sleep(0.5)
-
-                raw_pout_im_high.append(specan.get_power(1))
-
-                # Append the frequency Data to the lists
-                if_frequencies.append(if_freq[i])
-                lo_frequencies.append(lo_freq)
-                rf_frequencies.append(rf_freq[j])
-                test_tone_separation_mhz.append(tone_separation_mhz[k])
-
-    # Add a new page to the workbook
-    worksheet_upconversion_ip3 = workbook.add_worksheet('Up_Conversion_IP3')
-
-    # Write the header information
-    row = 0
-    worksheet_upconversion_ip3.write(row, 0, 'IF Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 1, 'LO Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 2, 'RF Frequency (GHz)')
-    worksheet_upconversion_ip3.write(row, 3, 'IM Tone Separation (MHz)')
-    worksheet_upconversion_ip3.write(row, 4, 'Low IM Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 5, 'Low Main Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 6, 'High Main Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 7, 'High IM Tone Pout (dBm)')
-    worksheet_upconversion_ip3.write(row, 8, 'MAMX-011054 RX Low OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 9, 'MAMX-011054 RX High OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 10, 'MAMX-011054 RX Average OIP3 (dBm)')
-    worksheet_upconversion_ip3.write(row, 11, 'MAMX-011054 RX Conversion Gain Low Tone (dB)')
-    worksheet_upconversion_ip3.write(row, 12, 'MAMX-011054 RX Conversion Gain High Tone OIP3 (dBm)')
-
-    # Dump the data into the worksheet
-    for i in range(0, len(raw_pout_tone_low)):
-        # Calculate the IP3 Values
-        low_oip3 = (raw_pout_tone_low[i] + if_loss) + (raw_pout_tone_low[i] - raw_pout_im_low[i]) / 2
-        high_oip3 = (raw_pout_tone_high[i] + if_loss) + (raw_pout_tone_high[i] - raw_pout_im_high[i]) / 2
-        ave_oip3 = (high_oip3 + low_oip3) / 2
-
-        row = row + 1
-        worksheet_upconversion_ip3.write(row, 0, if_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 1, lo_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 2, rf_frequencies[i])
-        worksheet_upconversion_ip3.write(row, 3, test_tone_separation_mhz[i])
-        worksheet_upconversion_ip3.write(row, 4, raw_pout_im_low[i] + if_loss)
-        worksheet_upconversion_ip3.write(row, 5, raw_pout_tone_low[i] + if_loss)
-        worksheet_upconversion_ip3.write(row, 6, raw_pout_tone_high[i] + if_loss)
-        worksheet_upconversion_ip3.write(row, 7, raw_pout_im_high[i] + if_loss)
-        worksheet_upconversion_ip3.write(row, 8, low_oip3)
-        worksheet_upconversion_ip3.write(row, 9, high_oip3)
-        worksheet_upconversion_ip3.write(row, 10, ave_oip3)
-        worksheet_upconversion_ip3.write(row, 11, raw_pout_tone_low[i] + if_loss - rf_pin)
-        worksheet_upconversion_ip3.write(row, 12, raw_pout_tone_high[i] + if_loss - rf_pin)
+def tx_oip3(workbook, if_freq, lo_freq, rf_freq, if_pin, lo_pin, if_mxg_1, if_mxg_2, lo_mxg, specan, if_loss_1, if_loss_2, lo_loss, rf_loss, tone_separation_mhz, settler=None, dispatcher=None, tone_reader=None, record_log=None, analyzer_planner=None, result_store=None, resume=None):
+
+    # Two IF tones around the IF frequency, the tones and IM3 products read around the RF
+    spec = {
+        'test': 'TX_OIP3',
+        'dimensions': [('if', if_freq), ('tone', tone_separation_mhz), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg_1, 'frequency': 'if', 'tone_offset': -0.5, 'level': if_pin, 'loss': if_loss_1,
+             'pin': 'pin'},
+            {'instrument': if_mxg_2, 'frequency': 'if', 'tone_offset': 0.5, 'level': if_pin, 'loss': if_loss_2},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'cost': 'lo_frequency',
+             'fallback_s': 1},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': rf_loss},
+        'measure': 'two_tone',
+        'metrics': TWO_TONE_METRICS,
+        'sheet': 'Up_Conversion_IP3',
+        'columns': oip3_columns('MAMX-011054 TX'),
+        'store': TWO_TONE_STORE,
+    }
+
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, tone_reader=tone_reader,
+                     analyzer_planner=analyzer_planner, record_log=record_log, result_store=result_store,
+                     resume=resume)
 
 
 ##########################################################################################################
-# From the provided power data determine the p1dB
-# Returns the calculated IP1dB and OP1dB as well as the index
-# params:   pin_list, pout_list
-# returns:  p1db_index, pin_list[p1db_index], pout_list[p1db_index]
+# Measure the OIP3 at all frequency combos
+# params:   workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg_1, rf_mxg_2, lo_mxg, specan, rf_loss_1, rf_loss_2, lo_loss, if_loss, tone_separation_mhz, settler, dispatcher, tone_reader, record_log, analyzer_planner, result_store, resume
+# returns:  worksheet_upconversion_ip3
 ##########################################################################################################
-def find_p1db(pin_list, pout_list):
-
-    # Tracking information for the loop
-    p1db_count = 0
-    pout_linear = -100
-    p1db_index = 0
-
-    # Loop through the power list to find the p1dB
-    for i in range(0, len(pout_list)):
-        pout = pout_list[i]
-
-        if p1db_count == 0:
-            pout_linear = pout
-
-        if p1db_count > 0:
-            pout_linear = pout_linear + 1
-
-        if pout_linear - pout > 1:
-            p1db_index = i - 1
-            break
-
-        # Increment the counter
-        p1db_count = p1db_count + 1
-
-    return p1db_index, pin_list[p1db_index], pout_list[p1db_index]
+def rx_oip3(workbook, if_freq, lo_freq, rf_freq, rf_pin, lo_pin, rf_mxg_1, rf_mxg_2, lo_mxg, specan, rf_loss_1, rf_loss_2, lo_loss, if_loss, tone_separation_mhz, settler=None, dispatcher=None, tone_reader=None, record_log=None, analyzer_planner=None, result_store=None, resume=None):
+
+    # Two RF tones around the RF frequency, the tones and IM3 products read around the IF after a full sweep
+    spec = {
+        'test': 'RX_OIP3',
+        'dimensions': [('if', if_freq), ('tone', tone_separation_mhz), ('rf', rf_freq)],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': rf_mxg_1, 'frequency': 'rf', 'tone_offset': -0.5, 'level': rf_pin, 'loss': rf_loss_1,
+             'pin': 'pin'},
+            {'instrument': rf_mxg_2, 'frequency': 'rf', 'tone_offset': 0.5, 'level': rf_pin, 'loss': rf_loss_2},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'cost': 'lo_frequency'},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'if', 'loss': if_loss, 'sweep_wait_s': 1},
+        'measure': 'two_tone',
+        'metrics': TWO_TONE_METRICS,
+        'sheet': 'Up_Conversion_IP3',
+        'columns': oip3_columns('MAMX-011054 RX'),
+        'store': TWO_TONE_STORE,
+    }
+
+    return run_sweep(workbook, spec, settler=settler, dispatcher=dispatcher, tone_reader=tone_reader,
+                     analyzer_planner=analyzer_planner, record_log=record_log, result_store=result_store,
+                     resume=resume)
+
+
+# Instrument addresses of this bench, main() can be pointed at another bench
+INSTRUMENTS = {
+    'if_rf_mxg': '10.13.23.221',
+    'lo_mxg': '10.13.23.217',
+    'specan': '10.13.23.222',
+    'if_rf_mxg2': 'CALIBRATION-SG.ginger.shivnet',
+}
+
+# Tests main() can run
+TESTS = ['UPCONVERT', 'DOWNCONVERT', 'TX_P1DB', 'RX_P1DB', 'TX_OIP3', 'RX_OIP3', 'CALIBRATE', 'LEVEL']
+
+# LO multiplier of the board as each test drives it: the conversion sweeps run the LO at RF + IF, the P1dB and OIP3
+# sweeps at (RF + IF) / 4
+LO_MULT = {'UPCONVERT': 1, 'DOWNCONVERT': 1, 'TX_P1DB': 4, 'RX_P1DB': 4, 'TX_OIP3': 4, 'RX_OIP3': 4}
 
 
 ##########################################################################################################
 # Start of the main function
-# params:   none
-# returns:  none
+# Asks for the test when none is given, simulate is 'fast' / 'realtime' (default from --simulate on the
+# command line), the DUT name goes into the spreadsheet name and notes
+# resume_log is the record log of a stopped run (--resume [record log], the newest one without a path), its points
+# go into the sheets again and only the rest are measured
+# params:   test, instruments, simulate, dut, resume_log
+# returns:  spreadsheet_name
 ##########################################################################################################
-def main():
+def main(test=None, instruments=None, simulate=None, dut=None, resume_log=None):
 
     # Defining the test parameters
 
@@ -842,17 +454,44 @@ def main():
     # RF or IF power max are both 20 dBm
     if_upc_input_dbm = [-30, -27, -25, -23, -20, -17, -15, -13, -10, -5, 0, 5, 7, 10]  # Upconvert IF power input, this is to match datasheet parameters
     rf_dnc_input_dbm = 0  # Downconvert RF power input, this is to match datasheet parameters
+    if_oip3_input_dbm = -20  # Upconvert IF power of each OIP3 tone, the conversion sweep steps the powers above
 
     if_tx_p1db_start_dbm = -15  # Adjusting the starting pin to save time
     rf_rx_p1db_start_dbm = -20
 
     tone_separation_mhz = [20, 80, 160, 200]
 
+    # OIP3 tone readout: 'markers' reads markers 1-4 from one sweep, 'trace' peak searches the whole trace
+    oip3_readout = 'markers'
+
+    # Conversion sweep stepping: 'step' retunes point by point, 'list' runs the grid from the mxg list memory
+    sweep_mode = 'step'
+
+    # P1dB: 'sweep' steps every power up to max_pin, 'search' brackets the 1 dB point to search_resolution_db
+    p1db_mode = 'sweep'
+    search_resolution_db = 0.1
+
+    # Warm start: measure each P1dB column around the P1dB of the previous column or of the last board's run
+    p1db_warm_start = False
+    p1db_prior_file = 'MAMX-011054_p1db_prior.json'
+
+    # Analyzer setup: 'fixed' keeps the preset span and 1 kHz RBW, 'planned' picks span, RBW, VBW, detector and
+    # points per measurement from the weakest signal it has to read above the analyzer noise floor, and reads the
+    # OIP3 tones in zero span one at a time wherever that is quicker than one wide sweep
+    analyzer_setup = 'fixed'
+    analyzer_danl_dbm_hz = -150
+
+    # Every run of either board also goes into this database next to the spreadsheets, None to skip it
+    run_database_file = 'runs.sqlite'
+
     # Define the cable loss parameters
     # Need to remeasure with the new cables
+    # A number is the same loss at every frequency, LossTable([GHz, ...], [dB, ...], name) interpolates between
+    # calibration points and stops a test that would run outside them before anything moves
     if_cable_loss_db = 0.6  # [0.64, 0.58]
     lo_cable_loss_db = 3
-    rf_cable_loss_db = [2.01, 2.18, 2.29, 2.47, 2.34, 2.60, 2.65, 2.55, 2.73, 2.70, 2.77, 2.90, 2.90, 2.93, 3.04, 3.14, 3.30, 3.45, 3.44, 3.32, 3.58, 3.51, 3.73, 4.08, 4.36, 4.43, 4.75, 5, 5.25, 5.5]
+    # Measured 18 to 47 GHz in 1 GHz steps, the sweep skips 41 GHz so the list no longer lines up with rf_freq_ghz
+    rf_cable_loss_db = LossTable(range(18, 48), [2.01, 2.18, 2.29, 2.47, 2.34, 2.60, 2.65, 2.55, 2.73, 2.70, 2.77, 2.90, 2.90, 2.93, 3.04, 3.14, 3.30, 3.45, 3.44, 3.32, 3.58, 3.51, 3.73, 4.08, 4.36, 4.43, 4.75, 5, 5.25, 5.5], 'rf_cable_loss_db')
 
     # Define the PCB loss parameters
     if_upc_pcb_loss_db = 0
@@ -869,19 +508,135 @@ def main():
     out_cable_loss_5 = 1
     out_cable_loss_40 = 1
 
+    if instruments is None:
+        instruments = INSTRUMENTS
+
+    # --simulate runs against the simulated mixer at full speed, --simulate-realtime with the bench delays
+    if simulate is None and '--simulate' in sys.argv:
+        simulate = 'fast'
+    if simulate is None and '--simulate-realtime' in sys.argv:
+        simulate = 'realtime'
+
+    # The calibration and leveling files belong to one set of instrument addresses, a simulated bench has its own
+    bench_key = bench_name(instruments, simulate)
+
+    # Path calibration: the CALIBRATE test measures each path below at the frequencies the tests use it at, with a
+    # thru in place of the eval board, and keeps the losses in calibration_file. Every test then uses a calibrated
+    # path in place of its typed loss above and flags a calibration older than calibration_max_age_days or one that
+    # misses a planned frequency or was measured with other instruments. The reference connection is read first and
+    # every path is taken relative to it, calibration_reference_loss_db is its loss (0 for a zero loss thru, a
+    # number or LossTable for a reference cable)
+    calibration_file = 'MAMX-011054_path_calibration_{}.json'.format(bench_key)
+    calibration_reference_loss_db = 0
+    calibration_max_age_days = 30
+    calibration_level_dbm = 0
+    # The conversion sweeps run the LO at RF + IF, the P1dB and OIP3 sweeps at (RF + IF) / 4
+    calibration_paths = {
+        'if_cable_loss_db': if_freq_ghz,
+        'lo_cable_loss_db': lo_freq_ghz + [freq / 4 for freq in lo_freq_ghz],
+        'rf_cable_loss_db': rf_freq_ghz,
+        'path1_loss_5': if_freq_ghz,
+        'path2_loss_5': if_freq_ghz,
+        'path1_loss_40': rf_freq_ghz,
+        'path2_loss_40': rf_freq_ghz,
+        'out_cable_loss_5': if_freq_ghz,
+        'out_cable_loss_40': rf_freq_ghz,
+    }
+
+    # The typed losses, the simulated bench models the paths with them
+    typed_losses = {
+        'if_cable_loss_db': if_cable_loss_db,
+        'lo_cable_loss_db': lo_cable_loss_db,
+        'rf_cable_loss_db': rf_cable_loss_db,
+        'path1_loss_5': path1_loss_5,
+        'path2_loss_5': path2_loss_5,
+        'path1_loss_40': path1_loss_40,
+        'path2_loss_40': path2_loss_40,
+        'out_cable_loss_5': out_cable_loss_5,
+        'out_cable_loss_40': out_cable_loss_40,
+    }
+
+    # Calibrated losses in place of the typed ones wherever the calibration covers the plan
+    calibration = PathCalibration(calibration_file, 'MAMX-011054', instruments)
+    if_cable_loss_db = calibration.loss('if_cable_loss_db', if_cable_loss_db, calibration_paths['if_cable_loss_db'])
+    lo_cable_loss_db = calibration.loss('lo_cable_loss_db', lo_cable_loss_db, calibration_paths['lo_cable_loss_db'])
+    rf_cable_loss_db = calibration.loss('rf_cable_loss_db', rf_cable_loss_db, calibration_paths['rf_cable_loss_db'])
+    path1_loss_5 = calibration.loss('path1_loss_5', path1_loss_5, calibration_paths['path1_loss_5'])
+    path2_loss_5 = calibration.loss('path2_loss_5', path2_loss_5, calibration_paths['path2_loss_5'])
+    path1_loss_40 = calibration.loss('path1_loss_40', path1_loss_40, calibration_paths['path1_loss_40'])
+    path2_loss_40 = calibration.loss('path2_loss_40', path2_loss_40, calibration_paths['path2_loss_40'])
+    out_cable_loss_5 = calibration.loss('out_cable_loss_5', out_cable_loss_5, calibration_paths['out_cable_loss_5'])
+    out_cable_loss_40 = calibration.loss('out_cable_loss_40', out_cable_loss_40, calibration_paths['out_cable_loss_40'])
+
+    # Source leveling: the LEVEL test sets each source so leveling_level_dbm arrives at the board end of its input
+    # path (thru in place of the eval board, read on the analyzer through the output cable), stepping the amplitude
+    # until it is within leveling_tolerance_db, and keeps the corrections per generator and frequency in
+    # leveling_file, one per bench like the calibration. With source_leveling on every test adds them to its input
+    # path losses
+    source_leveling = False
+    leveling_file = 'MAMX-011054_source_leveling_{}.json'.format(bench_key)
+    leveling_level_dbm = -10
+    leveling_tolerance_db = 0.05
+    leveling_paths = {
+        'if_cable_loss_db': {'generator': 'if_rf_mxg', 'freq_ghz': if_freq_ghz, 'loss': if_cable_loss_db,
+                             'output_loss': out_cable_loss_5},
+        'rf_cable_loss_db': {'generator': 'if_rf_mxg', 'freq_ghz': rf_freq_ghz, 'loss': rf_cable_loss_db,
+                             'output_loss': out_cable_loss_40},
+        'path1_loss_5': {'generator': 'if_rf_mxg', 'freq_ghz': if_freq_ghz, 'loss': path1_loss_5,
+                         'output_loss': out_cable_loss_5},
+        'path2_loss_5': {'generator': 'if_rf_mxg2', 'freq_ghz': if_freq_ghz, 'loss': path2_loss_5,
+                         'output_loss': out_cable_loss_5},
+        'path1_loss_40': {'generator': 'if_rf_mxg', 'freq_ghz': rf_freq_ghz, 'loss': path1_loss_40,
+                          'output_loss': out_cable_loss_40},
+        'path2_loss_40': {'generator': 'if_rf_mxg2', 'freq_ghz': rf_freq_ghz, 'loss': path2_loss_40,
+                          'output_loss': out_cable_loss_40},
+    }
+    leveler = SourceLeveler(leveling_file, 'MAMX-011054', leveling_tolerance_db)
+
     # Define the maximum input values
     upc_if_max_pin = 18  # There is not a set value for this
     dnc_rf_max_pin = 18  # There is not a set value for this
 
-    # Initialize the test equipment
-    if_rf_mxg = SignalGenerator('10.13.23.221')
-    lo_mxg = SignalGenerator('10.13.23.217')
-    specan = SignalAnalyzer('10.13.23.222')
-    if_rf_mxg2_name = 'CALIBRATION-SG.ginger.shivnet'
+    # Leveled input paths, the corrections belong to the generator they were measured with
+    if source_leveling:
+        if_cable_loss_db = leveler.apply('if_cable_loss_db', instruments.get(leveling_paths['if_cable_loss_db']['generator']), if_cable_loss_db)
+        rf_cable_loss_db = leveler.apply('rf_cable_loss_db', instruments.get(leveling_paths['rf_cable_loss_db']['generator']), rf_cable_loss_db)
+        path1_loss_5 = leveler.apply('path1_loss_5', instruments.get(leveling_paths['path1_loss_5']['generator']), path1_loss_5)
+        path2_loss_5 = leveler.apply('path2_loss_5', instruments.get(leveling_paths['path2_loss_5']['generator']), path2_loss_5)
+        path1_loss_40 = leveler.apply('path1_loss_40', instruments.get(leveling_paths['path1_loss_40']['generator']), path1_loss_40)
+        path2_loss_40 = leveler.apply('path2_loss_40', instruments.get(leveling_paths['path2_loss_40']['generator']), path2_loss_40)
+
+    if resume_log is None and '--resume' in sys.argv:
+        position = sys.argv.index('--resume') + 1
+        if position < len(sys.argv) and not sys.argv[position].startswith('--'):
+            resume_log = sys.argv[position]
+        else:
+            resume_log = latest_record_log('MAMX-011054')
+        if resume_log is None:
+            raise ValueError("No record log to resume")
+
+    # Same test as the stopped run unless told otherwise
+    resume = None
+    if resume_log is not None:
+        resume = Resume(resume_log)
+        if test is None:
+            test = resume.test()
+
+    bench = None
+    new_generator, new_analyzer = SignalGenerator, SignalAnalyzer
+    if simulate is not None:
+        bench = SimulatedBench(instruments['lo_mxg'], timing=simulate)
+        new_generator, new_analyzer = bench.generator, bench.analyzer
+
+    # Initialize the test equipment, the cache drops writes that would not change anything
+    if_rf_mxg = CachedInstrument(new_generator(instruments['if_rf_mxg']))
+    lo_mxg = CachedInstrument(new_generator(instruments['lo_mxg']))
+    specan = CachedInstrument(new_analyzer(instruments['specan']))
+    if_rf_mxg2_name = instruments.get('if_rf_mxg2')  # Only the OIP3 tests and LEVEL use the second IF/RF mxg
 
     # Set the default parameters on the test equipment
     if_rf_mxg.off()
-    if_rf_mxg.set_amplitude(if_upc_input_dbm)
+    if_rf_mxg.set_amplitude(if_oip3_input_dbm)
     lo_mxg.off()
     lo_mxg.set_amplitude(lo_input_dbm)
 
@@ -890,178 +645,490 @@ def main():
     specan.set_span(.1e9)
     specan.set_rbw(1e3)
 
-    # Set up the workbook
-    current_time = datetime.datetime.now()
-    spreadsheet_name_str = 'MAMX-011054_{}'.format(current_time.strftime("%Y-%m-%d_%H-%M"))
-    workbook, spreadsheet_name = spreadsheet_setup(spreadsheet_name_str)
-
-    # Create the test notes page
-    test_notes = 'MAMX-011054-EVALZ Test Board Characterization'
-    spreadsheet_test_info(
-        workbook,
-        test_notes,
-        spreadsheet_name)
+    # Wait on the instruments instead of the fixed delays
+    settler = Settler()
+    if bench is not None:
+        # Nothing to poll for on the simulated boxes beyond their own delays
+        settler.poll_interval_s = bench.timing['poll_interval_s']
 
-    # Ask what test to run
-    print("Test List: \nUPCONVERT \nDOWNCONVERT \nTX_P1DB \nTX_OIP3 \nRX_P1DB \nTX_OIP3 \nRX_OIP3")
-    test = input("Run what test? \n")
+    # Retune the separate instruments at the same time
+    dispatcher = Dispatcher(settler)
 
-    if test == "UPCONVERT":
+    # Hardware list sweep for the conversion sweeps, the MXG point trigger out drives the FSV trigger in
+    list_sweep = None
+    if sweep_mode == 'list':
+        list_sweep = ListSweep(specan, settler)
 
-        # Run the test
-        upconversion_sweep(
-            workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            if_upc_input_dbm,
-            lo_input_dbm,
-            if_rf_mxg,
-            lo_mxg,
-            specan,
-            if_cable_loss_db,
-            lo_cable_loss_db,
-            rf_cable_loss_db)
-
-    if test == "DOWNCONVERT":
-
-        # Run the test
-        downconversion_sweep(
-            workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            rf_dnc_input_dbm,
-            lo_input_dbm,
-            if_rf_mxg,
-            lo_mxg,
-            specan,
-            if_cable_loss_db,
-            lo_cable_loss_db,
-            rf_cable_loss_db)
-
-    if test == "TX_P1DB":
-        # Adjusting the cable loss values to use the ip3 setup
-        if_cable_loss_db = path1_loss_5
-        rf_cable_loss_db = out_cable_loss_40
-
-        # Calculate the range to sweep over
-        step = 1  # Power Step
-        if_pin = power_sweep_range(
-            if_tx_p1db_start_dbm,
-            if_tx_p1db_start_dbm + 30,
-            step,
-            upc_if_max_pin
-        )
-
-        # Run the sweep
-        tx_p1db(
-            workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            if_pin,
-            lo_input_dbm,
-            if_rf_mxg,
-            lo_mxg,
-            specan,
-            if_cable_loss_db,
-            lo_cable_loss_db,
-            rf_cable_loss_db
-        )
-
-    if test == "RX_P1DB":
-        # Adjusting the cable loss values to use the ip3 setup
-        if_cable_loss_db = path1_loss_40
-        rf_cable_loss_db = out_cable_loss_5
-
-        # Calculate the range to sweep over
-        step = 1  # Power Step
-        rf_pin = power_sweep_range(
-            rf_rx_p1db_start_dbm,
-            rf_rx_p1db_start_dbm + 30,
-            step,
-            dnc_rf_max_pin
-        )
-
-        # Run the sweep
-        rx_p1db(
-            workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            rf_pin,
-            lo_input_dbm,
-            if_rf_mxg,
-            lo_mxg,
-            specan,
-            if_cable_loss_db,
-            lo_cable_loss_db,
-            rf_cable_loss_db
-        )
-
-    if test == "TX_OIP3":
-        # Initialize the extra test equipment
-        if_rf_mxg2 = SignalGenerator(if_rf_mxg2_name)
-        if_rf_mxg2.off()
-
-        # Calculate the Loss Parameters
-        if_path_1_loss_db = path1_loss_5 + if_upc_pcb_loss_db
-        if_path_2_loss_db = path2_loss_5 + if_upc_pcb_loss_db
-        lo_path_loss_db = lo_cable_loss_db + lo_pcb_loss_db
-        rf_path_loss_db = out_cable_loss_40 + rf_pcb_loss_db
-
-        # Run the sweep
-        tx_oip3(
-            workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            if_upc_input_dbm,
-            lo_input_dbm,
-            if_rf_mxg,
-            if_rf_mxg2,
-            lo_mxg,
-            specan,
-            if_path_1_loss_db,
-            if_path_2_loss_db,
-            lo_path_loss_db,
-            rf_path_loss_db,
-            tone_separation_mhz
-        )
-
-    if test == "RX_OIP3":
-        # Initialize the extra test equipment
-        if_rf_mxg2 = SignalGenerator(if_rf_mxg2_name)
-        if_rf_mxg2.off()
-
-        # Calculate the Loss Parameters
-        rf_path_1_loss_db = path1_loss_40 + rf_pcb_loss_db
-        rf_path_2_loss_db = path2_loss_40 + rf_pcb_loss_db
-        lo_path_loss_db = lo_cable_loss_db + lo_pcb_loss_db
-        if_path_loss_db = out_cable_loss_5 + if_dnc_pcb_loss_db
-
-        # Run the sweep
-        rx_oip3(
+    # Set up the workbook
+    current_time = datetime.datetime.now()
+    spreadsheet_name_str = 'MAMX-011054'
+    if dut is not None:
+        # Several benches can run at once, keep their spreadsheets apart
+        spreadsheet_name_str = 'MAMX-011054_{}_{}'.format(dut, test)
+    if resume is not None:
+        # The workbook of the stopped run never got closed, it is written again under the same name
+        workbook, spreadsheet_name = spreadsheet_setup(spreadsheet_name_str, os.path.splitext(resume_log)[0] + '.xlsx')
+    else:
+        workbook, spreadsheet_name = spreadsheet_setup(spreadsheet_name_str)
+
+    # Raw records go to disk next to the workbook as they are measured, only a resumed run appends to its record log
+    record_log = RecordLog(os.path.splitext(spreadsheet_name)[0] + '.jsonl', resume=resume is not None)
+
+    # The record log and workbook are closed whether or not the test gets to the end, so every point measured
+    # before an error is in the journal for --resume
+    try:
+
+        # Create the test notes page
+        test_notes = 'MAMX-011054-EVALZ Test Board Characterization'
+        if dut is not None:
+            test_notes = test_notes + ', DUT {}'.format(dut)
+        worksheet_notes = spreadsheet_test_info(
             workbook,
-            if_freq_ghz,
-            lo_freq_ghz,
-            rf_freq_ghz,
-            rf_dnc_input_dbm,
-            lo_input_dbm,
-            if_rf_mxg,
-            if_rf_mxg2,
-            lo_mxg,
-            specan,
-            rf_path_1_loss_db,
-            rf_path_2_loss_db,
-            lo_path_loss_db,
-            if_path_loss_db,
-            tone_separation_mhz
-        )
-
-    # Closes the worksheet
-    workbook.close()
+            test_notes,
+            spreadsheet_name)
+
+        # Typed columns of every point next to the workbook, for analysis without the spreadsheet
+        result_store = ResultStore(spreadsheet_name.replace('.xlsx', '.results'), {
+            'board': 'MAMX-011054',
+            'dut': dut,
+            'spreadsheet': spreadsheet_name,
+            'started': current_time.isoformat(timespec='seconds'),
+            'test_notes': test_notes,
+            'simulate': simulate,
+            'resume_log': resume_log,
+            'rf_freq_ghz': rf_freq_ghz,
+            'losses': {
+                'if_cable_loss_db': loss_table(if_cable_loss_db).as_dict(),
+                'lo_cable_loss_db': loss_table(lo_cable_loss_db).as_dict(),
+                'rf_cable_loss_db': loss_table(rf_cable_loss_db).as_dict(),
+                'if_upc_pcb_loss_db': loss_table(if_upc_pcb_loss_db).as_dict(),
+                'if_dnc_pcb_loss_db': loss_table(if_dnc_pcb_loss_db).as_dict(),
+                'lo_pcb_loss_db': loss_table(lo_pcb_loss_db).as_dict(),
+                'rf_pcb_loss_db': loss_table(rf_pcb_loss_db).as_dict(),
+                'path1_loss_5': loss_table(path1_loss_5).as_dict(),
+                'path2_loss_5': loss_table(path2_loss_5).as_dict(),
+                'path1_loss_40': loss_table(path1_loss_40).as_dict(),
+                'path2_loss_40': loss_table(path2_loss_40).as_dict(),
+                'out_cable_loss_5': loss_table(out_cable_loss_5).as_dict(),
+                'out_cable_loss_40': loss_table(out_cable_loss_40).as_dict(),
+            },
+            'instruments': dict((name, {'address': address}) for name, address in instruments.items()),
+        })
+        for name, instrument in (('if_rf_mxg', if_rf_mxg), ('lo_mxg', lo_mxg), ('specan', specan)):
+            if name in result_store.metadata['instruments']:
+                result_store.metadata['instruments'][name]['idn'] = identify(instrument)
+
+        # Ask what test to run
+        if test is None:
+            print("Test List: \nUPCONVERT \nDOWNCONVERT \nTX_P1DB \nTX_OIP3 \nRX_P1DB \nTX_OIP3 \nRX_OIP3 \nCALIBRATE \nLEVEL")
+            test = input("Run what test? \n")
+        result_store.metadata['test'] = test
+
+        # The simulated board follows the LO the test plans
+        if bench is not None and test in LO_MULT:
+            bench.dut.lo_mult = LO_MULT[test]
+
+        # The OIP3 tests plan the analyzer per tone separation, the single tone tests once here
+        analyzer_planner = None
+        if analyzer_setup == 'planned':
+            analyzer_planner = AnalyzerPlanner(danl_dbm_hz=analyzer_danl_dbm_hz)
+            if test not in ('TX_OIP3', 'RX_OIP3'):
+                analyzer_settings = analyzer_planner.plan('tone')
+                dispatcher.tune(analyzer_planner.commands(specan, analyzer_settings))
+                analyzer_settings = analyzer_planner.sweep_time(specan, analyzer_settings, settler)
+
+                # Keep the setup with the results
+                worksheet_notes.write(3, 0, 'Analyzer Setup')
+                worksheet_notes.write(3, 1, describe(analyzer_settings))
+                record_log.write(test, dict(analyzer_settings, kind='analyzer'))
+                print(describe(analyzer_settings))
+
+        # Which losses the run uses, and whether the calibration needs doing again
+        calibration_stale = calibration.stale(calibration_paths, calibration_max_age_days)
+        for reason in calibration_stale:
+            print("Path calibration: " + reason)
+        result_store.metadata['calibration'] = {
+            'file': calibration_file,
+            'revision': calibration.revision,
+            'written': calibration.written,
+            'stale': calibration_stale,
+        }
+        result_store.metadata['leveling'] = {
+            'on': source_leveling,
+            'file': leveling_file,
+            'revision': leveler.revision,
+            'written': leveler.written,
+        }
+        worksheet_notes.write(4, 0, 'Path Calibration')
+        worksheet_notes.write(4, 1, calibration.describe())
+        if calibration_stale:
+            worksheet_notes.write(5, 0, 'Calibration Warnings')
+            worksheet_notes.write(5, 1, '; '.join(calibration_stale))
+
+        if test == "CALIBRATE":
+            # The operator is asked for every connection
+            connect = None
+            if bench is not None:
+                # Simulated thru with the reference loss, then with the typed loss of each path
+                def connect(name):
+                    if name == 'reference':
+                        freq_ghz = sorted(set(freq for path in calibration_paths.values() for freq in path))
+                        bench.connect_thru(numpy.mean(loss_table(calibration_reference_loss_db).loss(freq_ghz)))
+                    else:
+                        bench.connect_thru(numpy.mean(loss_table(typed_losses[name]).loss(calibration_paths[name])))
+
+            # The IF/RF mxg drives the analyzer through each path in turn, the LO stays off
+            calibration_tables = calibrate_paths(
+                calibration_paths,
+                if_rf_mxg,
+                specan,
+                settler,
+                dispatcher,
+                calibration_level_dbm,
+                ListSweep(specan, settler),
+                connect,
+                calibration_reference_loss_db)
+            calibration_sheet(workbook, calibration_tables)
+            revision = calibration.save(calibration_tables, calibration_level_dbm, result_store.metadata['instruments'])
+            print("Path calibration revision {} written to {}".format(revision, calibration_file))
+
+        if test == "LEVEL":
+            generators = {'if_rf_mxg': if_rf_mxg}
+            if any(path['generator'] == 'if_rf_mxg2' for path in leveling_paths.values()):
+                generators['if_rf_mxg2'] = CachedInstrument(new_generator(if_rf_mxg2_name))
+                generators['if_rf_mxg2'].off()
+
+            # The operator is asked to move the thru for every path
+            connect = None
+            if bench is not None:
+                # Simulated thru with the losses the script expects, 0.5 dB more in front so there is something to level
+                def connect(name):
+                    path = leveling_paths[name]
+                    bench.connect_thru(numpy.mean(loss_table(path['loss']).loss(path['freq_ghz'])) + 0.5,
+                                       numpy.mean(loss_table(path['output_loss']).loss(path['freq_ghz'])))
+
+            # Each source in turn, the LO stays off
+            level_paths(
+                leveling_paths,
+                generators,
+                instruments,
+                specan,
+                settler,
+                dispatcher,
+                leveler,
+                leveling_level_dbm,
+                connect)
+            revision = leveler.save()
+            print("Source leveling revision {} written to {}, {} reads for {} frequencies".format(
+                revision, leveling_file, leveler.reads, leveler.leveled))
+
+        if test == "UPCONVERT":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['if_cable_loss_db'], 'output': ['rf_cable_loss_db'],
+                                                   'input_ghz': 'if_ghz', 'output_ghz': 'rf_ghz'}
+
+            # Run the test
+            upconversion_sweep(
+                workbook,
+                if_freq_ghz,
+                lo_freq_ghz,
+                rf_freq_ghz,
+                if_upc_input_dbm,
+                lo_input_dbm,
+                if_rf_mxg,
+                lo_mxg,
+                specan,
+                if_cable_loss_db,
+                lo_cable_loss_db,
+                rf_cable_loss_db,
+                settler=settler,
+                dispatcher=dispatcher,
+                list_sweep=list_sweep,
+                record_log=record_log,
+                result_store=result_store,
+                resume=resume)
+
+        if test == "DOWNCONVERT":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['rf_cable_loss_db'], 'output': ['if_cable_loss_db'],
+                                                   'input_ghz': 'rf_ghz', 'output_ghz': 'if_ghz'}
+
+            # Run the test
+            downconversion_sweep(
+                workbook,
+                if_freq_ghz,
+                lo_freq_ghz,
+                rf_freq_ghz,
+                rf_dnc_input_dbm,
+                lo_input_dbm,
+                if_rf_mxg,
+                lo_mxg,
+                specan,
+                if_cable_loss_db,
+                lo_cable_loss_db,
+                rf_cable_loss_db,
+                settler=settler,
+                dispatcher=dispatcher,
+                list_sweep=list_sweep,
+                record_log=record_log,
+                result_store=result_store,
+                resume=resume)
+
+        if test == "TX_P1DB":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['path1_loss_5'], 'output': ['out_cable_loss_40'],
+                                                   'input_ghz': 'if_ghz', 'output_ghz': 'rf_ghz'}
+
+            # Adjusting the cable loss values to use the ip3 setup
+            if_cable_loss_db = path1_loss_5
+            rf_cable_loss_db = out_cable_loss_40
+
+            warm_start = None
+            if p1db_warm_start:
+                warm_start = WarmStart(p1db_prior_file, 'MAMX-011054', test)
+
+            if p1db_mode == 'search':
+                # Bracket the 1 dB point instead of stepping every power
+                tx_p1db_search(
+                    workbook,
+                    if_freq_ghz,
+                    lo_freq_ghz,
+                    rf_freq_ghz,
+                    if_tx_p1db_start_dbm,
+                    lo_input_dbm,
+                    if_rf_mxg,
+                    lo_mxg,
+                    specan,
+                    if_cable_loss_db,
+                    lo_cable_loss_db,
+                    rf_cable_loss_db,
+                    P1dbSearch(upc_if_max_pin, resolution_db=search_resolution_db),
+                    settler=settler,
+                    dispatcher=dispatcher,
+                    record_log=record_log,
+                    result_store=result_store,
+                    resume=resume,
+                    warm_start=warm_start
+                )
+            else:
+                # Calculate the range to sweep over
+                step = 1  # Power Step
+                if_pin = power_sweep_range(
+                    if_tx_p1db_start_dbm,
+                    if_tx_p1db_start_dbm + 30,
+                    step,
+                    upc_if_max_pin
+                )
+
+                # Run the sweep
+                tx_p1db(
+                    workbook,
+                    if_freq_ghz,
+                    lo_freq_ghz,
+                    rf_freq_ghz,
+                    if_pin,
+                    lo_input_dbm,
+                    if_rf_mxg,
+                    lo_mxg,
+                    specan,
+                    if_cable_loss_db,
+                    lo_cable_loss_db,
+                    rf_cable_loss_db,
+                    settler=settler,
+                    dispatcher=dispatcher,
+                    record_log=record_log,
+                    result_store=result_store,
+                    resume=resume,
+                    warm_start=warm_start
+                )
+
+            # The next board starts from this one's results
+            if warm_start is not None:
+                warm_start.save()
+
+        if test == "RX_P1DB":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['path1_loss_40'], 'output': ['out_cable_loss_5'],
+                                                   'input_ghz': 'rf_ghz', 'output_ghz': 'if_ghz'}
+
+            # Adjusting the cable loss values to use the ip3 setup
+            rf_cable_loss_db = path1_loss_40
+            if_cable_loss_db = out_cable_loss_5
+
+            warm_start = None
+            if p1db_warm_start:
+                warm_start = WarmStart(p1db_prior_file, 'MAMX-011054', test)
+
+            if p1db_mode == 'search':
+                # Bracket the 1 dB point instead of stepping every power
+                rx_p1db_search(
+                    workbook,
+                    if_freq_ghz,
+                    lo_freq_ghz,
+                    rf_freq_ghz,
+                    rf_rx_p1db_start_dbm,
+                    lo_input_dbm,
+                    if_rf_mxg,
+                    lo_mxg,
+                    specan,
+                    if_cable_loss_db,
+                    lo_cable_loss_db,
+                    rf_cable_loss_db,
+                    P1dbSearch(dnc_rf_max_pin, resolution_db=search_resolution_db),
+                    settler=settler,
+                    dispatcher=dispatcher,
+                    record_log=record_log,
+                    result_store=result_store,
+                    resume=resume,
+                    warm_start=warm_start
+                )
+            else:
+                # Calculate the range to sweep over
+                step = 1  # Power Step
+                rf_pin = power_sweep_range(
+                    rf_rx_p1db_start_dbm,
+                    rf_rx_p1db_start_dbm + 30,
+                    step,
+                    dnc_rf_max_pin
+                )
+
+                # Run the sweep
+                rx_p1db(
+                    workbook,
+                    if_freq_ghz,
+                    lo_freq_ghz,
+                    rf_freq_ghz,
+                    rf_pin,
+                    lo_input_dbm,
+                    if_rf_mxg,
+                    lo_mxg,
+                    specan,
+                    if_cable_loss_db,
+                    lo_cable_loss_db,
+                    rf_cable_loss_db,
+                    settler=settler,
+                    dispatcher=dispatcher,
+                    record_log=record_log,
+                    result_store=result_store,
+                    resume=resume,
+                    warm_start=warm_start
+                )
+
+            # The next board starts from this one's results
+            if warm_start is not None:
+                warm_start.save()
+
+        if test == "TX_OIP3":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['path1_loss_5', 'if_upc_pcb_loss_db'], 'output': ['out_cable_loss_40', 'rf_pcb_loss_db'],
+                                                   'input_ghz': 'if_ghz', 'output_ghz': 'rf_ghz'}
+
+            # Initialize the extra test equipment
+            if_rf_mxg2 = CachedInstrument(new_generator(if_rf_mxg2_name))
+            if_rf_mxg2.off()
+
+            if oip3_readout == 'trace':
+                tone_reader = TraceToneReader(specan, settler)
+            else:
+                tone_reader = MultiMarkerToneReader(specan, settler)
+
+            # Calculate the Loss Parameters
+            if_path_1_loss_db = path1_loss_5 + if_upc_pcb_loss_db
+            if_path_2_loss_db = path2_loss_5 + if_upc_pcb_loss_db
+            lo_path_loss_db = lo_cable_loss_db + lo_pcb_loss_db
+            rf_path_loss_db = out_cable_loss_40 + rf_pcb_loss_db
+
+            # Run the sweep
+            tx_oip3(
+                workbook,
+                if_freq_ghz,
+                lo_freq_ghz,
+                rf_freq_ghz,
+                if_oip3_input_dbm,
+                lo_input_dbm,
+                if_rf_mxg,
+                if_rf_mxg2,
+                lo_mxg,
+                specan,
+                if_path_1_loss_db,
+                if_path_2_loss_db,
+                lo_path_loss_db,
+                rf_path_loss_db,
+                tone_separation_mhz,
+                settler=settler,
+                dispatcher=dispatcher,
+                tone_reader=tone_reader,
+                record_log=record_log,
+                result_store=result_store,
+                resume=resume,
+                analyzer_planner=analyzer_planner
+            )
+
+        if test == "RX_OIP3":
+            # Loss settings in the input and output path, reprocess.py redoes the corrections with new ones
+            result_store.metadata['loss_paths'] = {'input': ['path1_loss_40', 'rf_pcb_loss_db'], 'output': ['out_cable_loss_5', 'if_dnc_pcb_loss_db'],
+                                                   'input_ghz': 'rf_ghz', 'output_ghz': 'if_ghz'}
+
+            # Initialize the extra test equipment
+            if_rf_mxg2 = CachedInstrument(new_generator(if_rf_mxg2_name))
+            if_rf_mxg2.off()
+
+            if oip3_readout == 'trace':
+                tone_reader = TraceToneReader(specan, settler)
+            else:
+                tone_reader = MultiMarkerToneReader(specan, settler)
+
+            # Calculate the Loss Parameters
+            rf_path_1_loss_db = path1_loss_40 + rf_pcb_loss_db
+            rf_path_2_loss_db = path2_loss_40 + rf_pcb_loss_db
+            lo_path_loss_db = lo_cable_loss_db + lo_pcb_loss_db
+            if_path_loss_db = out_cable_loss_5 + if_dnc_pcb_loss_db
+
+            # Run the sweep
+            rx_oip3(
+                workbook,
+                if_freq_ghz,
+                lo_freq_ghz,
+                rf_freq_ghz,
+                rf_dnc_input_dbm,
+                lo_input_dbm,
+                if_rf_mxg,
+                if_rf_mxg2,
+                lo_mxg,
+                specan,
+                rf_path_1_loss_db,
+                rf_path_2_loss_db,
+                lo_path_loss_db,
+                if_path_loss_db,
+                tone_separation_mhz,
+                settler=settler,
+                dispatcher=dispatcher,
+                tone_reader=tone_reader,
+                record_log=record_log,
+                result_store=result_store,
+                resume=resume,
+                analyzer_planner=analyzer_planner
+            )
+
+        print(settler.summary())
+        for instrument in (if_rf_mxg, lo_mxg, specan):
+            print(instrument.summary())
+    finally:
+        dispatcher.close()
+
+        # Closes the worksheet
+        record_log.close()
+        workbook.close()
+
+    result_store.close()
+
+    # Run details and every point into the run database
+    if run_database_file is not None:
+        run_database = RunDatabase(run_database_file)
+        run_database.add_run(result_store.metadata, result_store.results())
+        run_database.close()
+
+    return spreadsheet_name
 
 
 if __name__ == "__main__":
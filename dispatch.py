@@ -0,0 +1,117 @@
+## Concurrent command dispatch.
+## The MXGs and the FSV are separate boxes on the LAN, so a retune of each can run at the same time.
+## Commands to the same instrument still go out in order on one thread.
+## With batching on, the commands for one instrument go out as a single chained SCPI message ending in *OPC?.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from transaction import Transaction
+
+
+##########################################################################################################
+# Sends a set of instrument commands and settles them
+# concurrent=False runs every command followed by its own settle, exactly like the old loops
+# batch=True chains the commands per instrument when the settler is adaptive and every command has a SCPI form
+##########################################################################################################
+class Dispatcher:
+
+    ######################################################################################################
+    # params:   settler, concurrent, max_workers, batch
+    ######################################################################################################
+    def __init__(self, settler, concurrent=True, max_workers=8, batch=True):
+        self.settler = settler
+        self.concurrent = concurrent
+        self.batch = batch
+        self.pool = ThreadPoolExecutor(max_workers=max_workers) if concurrent else None
+
+        # Instruments a chained message failed on, they get one command at a time from then on
+        self.unbatched = set()
+
+    ######################################################################################################
+    # Run the commands and wait for every instrument to settle
+    # params:   commands, list of (instrument, method name, args, fallback_s)
+    # returns:  none
+    ######################################################################################################
+    def tune(self, commands):
+
+        if not commands:
+            return
+
+        if not self.concurrent:
+            for instrument, method, args, fallback_s in commands:
+                getattr(instrument, method)(*args)
+                self.settler.wait(instrument, method, fallback_s)
+            return
+
+        # Group per instrument, keeping the order inside each group
+        groups = []
+        for command in commands:
+            for group in groups:
+                if group[0][0] is command[0]:
+                    group.append(command)
+                    break
+            else:
+                groups.append([command])
+
+        # Each instrument runs its commands then settles once, all instruments at the same time
+        futures = [self.pool.submit(self._run_group, group) for group in groups]
+
+        # Re-raise any instrument error here
+        for future in futures:
+            future.result()
+
+    ######################################################################################################
+    # Commands for one instrument followed by a single settle on the longest fallback delay
+    # params:   group
+    # returns:  none
+    ######################################################################################################
+    def _run_group(self, group):
+
+        if self._run_batch(group):
+            return
+
+        for instrument, method, args, fallback_s in group:
+            getattr(instrument, method)(*args)
+
+        instrument, method = group[-1][0], group[-1][1]
+        self.settler.wait(instrument, method, max(command[3] for command in group))
+
+    ######################################################################################################
+    # Send the commands for one instrument as a single chained message
+    # params:   group
+    # returns:  True if done, False if the commands still need sending one at a time
+    ######################################################################################################
+    def _run_batch(self, group):
+
+        instrument = group[0][0]
+        if not self.batch or self.settler.mode != 'adaptive' or id(instrument) in self.unbatched:
+            return False
+
+        transaction = Transaction(instrument)
+        methods = [command[1] for command in group]
+        if not all(transaction.chainable(method) for method in methods):
+            return False
+
+        for instrument, method, args, fallback_s in group:
+            transaction.add(method, *args)
+
+        # Every write was dropped by the cache, the settler counts the skip
+        if not transaction.queued:
+            self.settler.wait(instrument, methods[-1], max(command[3] for command in group))
+            return True
+
+        if self.settler.commit(transaction, methods):
+            return True
+
+        print("Chained SCPI failed on {}, sending its commands one at a time".format(transaction.name))
+        self.unbatched.add(id(instrument))
+        return False
+
+    ######################################################################################################
+    # Stop the worker threads
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,170 @@
+## Write-through cache around the SignalGenerator / SignalAnalyzer wrappers.
+## Remembers the last value written for every setting and drops writes that would not change anything.
+## The settler skips the settle delay after a dropped write, preset() and raw SCPI writes invalidate the cache.
+## The analyzer settings the wrappers have no call for (VBW, detector, sweep points / time) are sent as raw SCPI.
+
+import scpi
+
+
+# Raw SCPI headers and the cached settings they can change
+SCPI_INVALIDATES = {
+    'FREQ': ('frequency', 'span'),
+    'POW': ('amplitude',),
+    'BAND': ('rbw', 'vbw'),
+    'BWID': ('rbw', 'vbw'),
+    'DET': ('detector',),
+    'SWE:POIN': ('sweep_points',),
+    'SWE:TIME': ('sweep_time',),
+    'MARK': ('marker', 'marker_state'),
+    'OUTP': ('output',),
+    'LIST': ('frequency', 'span', 'rbw', 'vbw', 'detector'),
+}
+
+
+##########################################################################################################
+# Caching proxy, everything not cached is passed straight to the wrapped instrument
+##########################################################################################################
+class CachedInstrument:
+
+    ######################################################################################################
+    # params:   instrument
+    ######################################################################################################
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.state = {}
+        self.hits = 0
+        self.misses = 0
+
+        # True when a write went out since the last settle
+        self.unsettled = False
+
+    ######################################################################################################
+    # Send the write only when the value differs from the cached one
+    # params:   key, value, write, args
+    # returns:  True if the write was sent
+    ######################################################################################################
+    def _write(self, key, value, write, *args):
+
+        if key in self.state and self.state[key] == value:
+            self.hits = self.hits + 1
+            return False
+
+        write(*args)
+        self.state[key] = value
+        self.misses = self.misses + 1
+        self.unsettled = True
+
+        return True
+
+    ######################################################################################################
+    # Record a setting sent some other way (a batched transaction) without writing it
+    # params:   method, args (as for the set_* call)
+    # returns:  True if the value changed and has to be sent
+    ######################################################################################################
+    def remember(self, method, args):
+
+        if method in ('on', 'off'):
+            key, value = ('output',), method == 'on'
+        elif method in ('set_marker', 'set_marker_state'):
+            key, value = (method[len('set_'):], args[0]), args[1]
+        else:
+            key, value = (method[len('set_'):],), args[0]
+
+        return self._write(key, value, lambda: None)
+
+    def set_frequency(self, frequency_hz):
+        return self._write(('frequency',), frequency_hz, self.instrument.set_frequency, frequency_hz)
+
+    def set_amplitude(self, amplitude_dbm):
+        return self._write(('amplitude',), amplitude_dbm, self.instrument.set_amplitude, amplitude_dbm)
+
+    def set_span(self, span_hz):
+        return self._write(('span',), span_hz, self.instrument.set_span, span_hz)
+
+    def set_rbw(self, rbw_hz):
+        return self._write(('rbw',), rbw_hz, self.instrument.set_rbw, rbw_hz)
+
+    def set_vbw(self, vbw_hz):
+        return self._write(('vbw',), vbw_hz, self._scpi, 'BAND:VID {}'.format(vbw_hz))
+
+    def set_detector(self, detector):
+        return self._write(('detector',), detector, self._scpi, 'DET {}'.format(detector))
+
+    def set_sweep_points(self, points):
+        return self._write(('sweep_points',), points, self._scpi, 'SWE:POIN {}'.format(points))
+
+    # None couples the sweep time to span and RBW again
+    def set_sweep_time(self, sweep_time_s):
+        command = 'SWE:TIME:AUTO ON' if sweep_time_s is None else 'SWE:TIME {}'.format(sweep_time_s)
+        return self._write(('sweep_time',), sweep_time_s, self._scpi, command)
+
+    def set_marker(self, marker, frequency_hz):
+        return self._write(('marker', marker), frequency_hz, self.instrument.set_marker, marker, frequency_hz)
+
+    def set_marker_state(self, marker, state):
+        return self._write(('marker_state', marker), state, self.instrument.set_marker_state, marker, state)
+
+    def on(self):
+        return self._write(('output',), True, self.instrument.on)
+
+    def off(self):
+        return self._write(('output',), False, self.instrument.off)
+
+    # SCPI straight to the wrapped instrument, so it does not invalidate what it just set
+    def _scpi(self, command):
+        scpi.write(self.instrument, command)
+
+    ######################################################################################################
+    # Preset puts every setting back to default, forget all of them
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def preset(self):
+        self.instrument.preset()
+        self.invalidate()
+        self.unsettled = True
+
+    ######################################################################################################
+    # Forget the cached settings, all of them or only the named ones
+    # params:   names (e.g. ('frequency', 'marker'))
+    # returns:  none
+    ######################################################################################################
+    def invalidate(self, names=None):
+
+        if names is None:
+            self.state = {}
+            return
+
+        for key in list(self.state):
+            if key[0] in names:
+                del self.state[key]
+
+    ######################################################################################################
+    # Called by scpi.write for raw commands that bypass the set_* calls
+    # params:   command
+    # returns:  none
+    ######################################################################################################
+    def scpi_written(self, command):
+
+        command = command.upper()
+        if '*RST' in command or 'SYST:PRES' in command:
+            self.invalidate()
+            return
+
+        for header, names in SCPI_INVALIDATES.items():
+            if header in command:
+                self.invalidate(names)
+
+    ######################################################################################################
+    # Hit / miss counters
+    # params:   none
+    # returns:  summary string
+    ######################################################################################################
+    def summary(self):
+        return "{}: {} writes sent, {} dropped".format(type(self.instrument).__name__, self.misses, self.hits)
+
+    # Raw SCPI goes to the wrapped instrument (scpi finds it under .instrument), everything else is passed on
+    def __getattr__(self, name):
+        if name in ('write', 'query', 'read_raw', 'instrument'):
+            raise AttributeError(name)
+        return getattr(self.instrument, name)
@@ -0,0 +1,108 @@
+## Hardware list sweep.
+## Loads the frequency / power steps into the MXG list memory once and lets the MXGs step on their own while the
+## FSV list power measurement captures one reading per step on the external trigger. All readings come back in
+## one bulk fetch instead of a VISA round trip (and settle) per point.
+##
+## Wiring: the first generator is the master and steps on its dwell timer, its point trigger out goes to the
+## trigger in of the other generators and of the analyzer.
+
+import scpi
+
+
+# The FSV list evaluation takes at most 200 entries per sequence
+MAX_ANALYZER_ENTRIES = 200
+
+
+##########################################################################################################
+# Runs lists of generator steps with a triggered analyzer capture
+##########################################################################################################
+class ListSweep:
+
+    ######################################################################################################
+    # params:   specan, settler, dwell_s, rbw_hz, meas_time_s, ref_level_dbm, attenuation_db
+    ######################################################################################################
+    def __init__(self, specan, settler, dwell_s=0.005, rbw_hz=1e5, meas_time_s=0.001, ref_level_dbm=10,
+                 attenuation_db=10):
+        self.specan = specan
+        self.settler = settler
+        self.dwell_s = dwell_s
+        self.rbw_hz = rbw_hz
+        self.meas_time_s = meas_time_s
+        self.ref_level_dbm = ref_level_dbm
+        self.attenuation_db = attenuation_db
+
+    ######################################################################################################
+    # Check the instruments can take raw SCPI, sweeps fall back to stepping point by point otherwise
+    # params:   generators
+    # returns:  True / False
+    ######################################################################################################
+    def available(self, generators):
+        return all(scpi.supports_scpi(instrument) for instrument in list(generators) + [self.specan])
+
+    ######################################################################################################
+    # Run the steps and return one analyzer reading per step
+    # params:   steps {generator: (frequencies_hz, amplitudes_dbm)}, master generator first
+    #           analyzer_hz (analyzer frequency for each step)
+    # returns:  powers_dbm
+    ######################################################################################################
+    def run(self, steps, analyzer_hz):
+
+        generators = list(steps)
+        for generator in generators:
+            frequencies_hz, amplitudes_dbm = steps[generator]
+            if len(frequencies_hz) != len(analyzer_hz) or len(amplitudes_dbm) != len(analyzer_hz):
+                raise ValueError('Every list needs one entry per analyzer step')
+
+        powers_dbm = []
+        for start in range(0, len(analyzer_hz), MAX_ANALYZER_ENTRIES):
+            stop = start + MAX_ANALYZER_ENTRIES
+            chunk = dict((generator, (steps[generator][0][start:stop], steps[generator][1][start:stop]))
+                         for generator in generators)
+            powers_dbm.extend(self._run_chunk(generators, chunk, analyzer_hz[start:stop]))
+
+        # Back to CW so the point by point sweeps work again
+        for generator in generators:
+            scpi.write(generator, 'FREQ:MODE CW;:POW:MODE FIX')
+
+        return powers_dbm
+
+    ######################################################################################################
+    # One analyzer sequence worth of steps
+    # params:   generators, steps, analyzer_hz
+    # returns:  powers_dbm
+    ######################################################################################################
+    def _run_chunk(self, generators, steps, analyzer_hz):
+
+        # Load the lists, the master runs on its dwell timer, the rest step on the master's trigger
+        for generator in generators:
+            frequencies_hz, amplitudes_dbm = steps[generator]
+            trigger = 'IMM' if generator is generators[0] else 'EXT'
+
+            scpi.write(generator, 'LIST:TYPE LIST;:LIST:FREQ {};:LIST:POW {};:LIST:DWEL {};:LIST:TRIG:SOUR {}'.format(
+                ','.join(str(value) for value in frequencies_hz),
+                ','.join(str(value) for value in amplitudes_dbm),
+                self.dwell_s, trigger))
+            scpi.write(generator, 'INIT:CONT OFF;:FREQ:MODE LIST;:POW:MODE LIST')
+
+        # Make sure every list is loaded before anything starts
+        for generator in generators:
+            self.settler.wait(generator, 'list', 1)
+
+        # Arm the analyzer list measurement on the external trigger
+        entries = []
+        for frequency_hz in analyzer_hz:
+            entries.append('{},{},{},0,NORM,{},{},{},0'.format(
+                frequency_hz, self.ref_level_dbm, self.attenuation_db, self.rbw_hz, self.rbw_hz, self.meas_time_s))
+        scpi.write(self.specan, 'LIST:POW:SET ON,OFF,OFF,EXT,POS,0,0')
+        scpi.write(self.specan, 'LIST:POW:SEQ ' + ','.join(entries))
+
+        # Slaves first so they are waiting on the master's first trigger
+        for generator in reversed(generators):
+            scpi.write(generator, 'INIT')
+
+        # The whole list takes len * dwell, wait for the analyzer to finish then fetch every reading at once
+        timeout_s = len(analyzer_hz) * self.dwell_s + self.settler.timeout('sweep')
+        scpi.query(self.specan, '*OPC?', timeout_s)
+        reply = scpi.query(self.specan, 'LIST:POW:RES?', timeout_s)
+
+        return [float(value) for value in reply.replace(';', ',').split(',')]
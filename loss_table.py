@@ -0,0 +1,160 @@
+## Path loss calibration tables.
+## A LossTable holds the loss of one path (IF, LO or RF cable, a combiner path, a PCB trace) against frequency
+## and gives the loss at a whole array of frequencies at once, linearly interpolated between the calibration
+## points. A frequency outside the calibrated range is an error instead of the end value held flat, so a sweep
+## checks every point it is about to run before the first instrument moves. A table made from one number
+## (loss_table(1.28)) is the same loss at every frequency, which is what the scripts used before. Tables of the
+## paths in series add up (path1_loss_5 + if_upc_pcb_loss_db). Sweeps look the same few frequencies up over and
+## over, so the loss at each frequency is kept once worked out.
+
+import numpy
+
+
+# Frequencies this close to the end of a table are still covered
+COVERAGE_TOLERANCE_GHZ = 1e-6
+
+
+##########################################################################################################
+# Loss against frequency of one path
+##########################################################################################################
+class LossTable:
+
+    ######################################################################################################
+    # params:   freq_ghz (calibration frequencies, None for one loss at every frequency),
+    #           loss_db (loss at each calibration frequency, or the one loss), name
+    ######################################################################################################
+    def __init__(self, freq_ghz, loss_db, name=None):
+        self.name = name
+
+        if freq_ghz is None:
+            self.freq_ghz = None
+            self.loss_db = float(loss_db)
+        else:
+            freq_ghz = numpy.asarray(freq_ghz, dtype=numpy.float64)
+            loss_db = numpy.asarray(loss_db, dtype=numpy.float64)
+            if freq_ghz.ndim != 1 or len(freq_ghz) == 0 or freq_ghz.shape != loss_db.shape:
+                raise ValueError("{}: {} frequencies for {} losses".format(self._label(), freq_ghz.size, loss_db.size))
+            order = numpy.argsort(freq_ghz)
+            self.freq_ghz = freq_ghz[order]
+            self.loss_db = loss_db[order]
+            if numpy.any(numpy.diff(self.freq_ghz) <= 0):
+                raise ValueError("{}: calibration frequencies repeat".format(self._label()))
+
+        # {frequency: loss} of every frequency looked up so far
+        self.cache = {}
+
+    def _label(self):
+        return "Loss table '{}'".format(self.name) if self.name is not None else "Loss table"
+
+    ######################################################################################################
+    # params:   freq_ghz (array)
+    # returns:  covered (bool array)
+    ######################################################################################################
+    def covers(self, freq_ghz):
+
+        freq_ghz = numpy.asarray(freq_ghz, dtype=numpy.float64)
+        if self.freq_ghz is None:
+            return numpy.ones(freq_ghz.shape, dtype=bool)
+
+        return ((freq_ghz >= self.freq_ghz[0] - COVERAGE_TOLERANCE_GHZ) &
+                (freq_ghz <= self.freq_ghz[-1] + COVERAGE_TOLERANCE_GHZ))
+
+    ######################################################################################################
+    # Raise when any frequency is outside the calibrated range
+    # params:   freq_ghz (array)
+    # returns:  none
+    ######################################################################################################
+    def check(self, freq_ghz):
+
+        freq_ghz = numpy.atleast_1d(numpy.asarray(freq_ghz, dtype=numpy.float64))
+        outside = numpy.unique(freq_ghz[~self.covers(freq_ghz)])
+        if len(outside):
+            raise ValueError("{} covers {:g} to {:g} GHz, not {} GHz".format(
+                self._label(), self.freq_ghz[0], self.freq_ghz[-1], ', '.join('{:g}'.format(f) for f in outside)))
+
+    ######################################################################################################
+    # Loss at each frequency, checked against the calibrated range
+    # params:   freq_ghz (number or array)
+    # returns:  loss_db (number or array, same shape)
+    ######################################################################################################
+    def loss(self, freq_ghz):
+
+        if numpy.ndim(freq_ghz) == 0:
+            freq_ghz = float(freq_ghz)
+            if freq_ghz not in self.cache:
+                self.cache[freq_ghz] = float(self.loss(numpy.array([freq_ghz]))[0])
+            return self.cache[freq_ghz]
+
+        freq_ghz = numpy.asarray(freq_ghz, dtype=numpy.float64)
+        if self.freq_ghz is None:
+            return numpy.full(freq_ghz.shape, self.loss_db)
+
+        self.check(freq_ghz)
+
+        # Each frequency once, the ones seen before straight from the cache
+        unique, inverse = numpy.unique(freq_ghz, return_inverse=True)
+        cached = numpy.array([self.cache.get(f, numpy.nan) for f in unique.tolist()])
+        missing = numpy.isnan(cached)
+        if numpy.any(missing):
+            cached[missing] = numpy.interp(unique[missing], self.freq_ghz, self.loss_db)
+            self.cache.update(zip(unique[missing].tolist(), cached[missing].tolist()))
+
+        return cached[inverse.reshape(freq_ghz.shape)]
+
+    ######################################################################################################
+    # Paths in series, the loss of both at every frequency both cover
+    # params:   other (LossTable or number)
+    # returns:  LossTable
+    ######################################################################################################
+    def __add__(self, other):
+
+        other = loss_table(other)
+        names = [table.name for table in (self, other) if table.name is not None]
+        name = ' + '.join(names) if names else None
+
+        if self.freq_ghz is None and other.freq_ghz is None:
+            return LossTable(None, self.loss_db + other.loss_db, name)
+
+        # Every calibration point of either table inside the range both cover
+        freq_ghz = numpy.unique(numpy.concatenate([table.freq_ghz for table in (self, other)
+                                                   if table.freq_ghz is not None]))
+        freq_ghz = freq_ghz[self.covers(freq_ghz) & other.covers(freq_ghz)]
+        if len(freq_ghz) == 0:
+            raise ValueError("{} and {} cover no frequency in common".format(self._label(), other._label()))
+
+        return LossTable(freq_ghz, self.loss(freq_ghz) + other.loss(freq_ghz), name)
+
+    def __radd__(self, other):
+        return loss_table(other) + self
+
+    ######################################################################################################
+    # For the run metadata, the one loss as a number
+    # params:   none
+    # returns:  loss_db or {'freq_ghz': [...], 'loss_db': [...]}
+    ######################################################################################################
+    def as_dict(self):
+
+        if self.freq_ghz is None:
+            return self.loss_db
+
+        return {'freq_ghz': self.freq_ghz.tolist(), 'loss_db': self.loss_db.tolist()}
+
+
+##########################################################################################################
+# A table from a setting: a LossTable as it is, a number as that loss at every frequency, or a stored
+# {'freq_ghz', 'loss_db'} table
+# params:   loss, name
+# returns:  LossTable
+##########################################################################################################
+def loss_table(loss, name=None):
+
+    if isinstance(loss, LossTable):
+        return loss
+
+    if isinstance(loss, dict):
+        return LossTable(loss['freq_ghz'], loss['loss_db'], name)
+
+    if isinstance(loss, (list, tuple)):
+        raise ValueError("A list of losses needs its frequencies, use LossTable(freq_ghz, loss_db)")
+
+    return LossTable(None, loss, name)
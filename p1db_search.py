@@ -0,0 +1,145 @@
+## Adaptive P1dB search.
+## Instead of stepping every power up to max_pin, the small signal gain comes from a few low power points, the
+## input power then climbs in coarse steps until the compression passes 1 dB and the bracket is narrowed by
+## secant steps (bisecting when a step would leave the bracket) until it is within the requested resolution.
+## Compression at a point is pin + small signal gain - pout, so the output loss drops out of the search.
+
+import math
+
+
+# Below this the measured compression is mostly noise, the secant steps stay linear
+MIN_LOG_COMPRESSION_DB = 0.05
+
+
+##########################################################################################################
+# Finds the input power where the gain has dropped by compression_db
+##########################################################################################################
+class P1dbSearch:
+
+    ######################################################################################################
+    # params:   max_pin_dbm (never measured above), resolution_db, compression_db, linear_points,
+    #           linear_step_db, bracket_step_db, max_points, window_db (either side of a warm start hint)
+    ######################################################################################################
+    def __init__(self, max_pin_dbm, resolution_db=0.1, compression_db=1, linear_points=2, linear_step_db=2,
+                 bracket_step_db=4, max_points=12, window_db=1):
+        self.max_pin_dbm = max_pin_dbm
+        self.resolution_db = resolution_db
+        self.compression_db = compression_db
+        self.linear_points = linear_points
+        self.linear_step_db = linear_step_db
+        self.bracket_step_db = bracket_step_db
+        self.max_points = max_points
+        self.window_db = window_db
+
+    ######################################################################################################
+    # Input power where the line through two (pin, compression) points reaches the target
+    # The compression in dB grows close to exponentially with the input power, so the line is drawn through
+    # the log of the compression when both points show some, and through the compression itself otherwise
+    # params:   a, b
+    # returns:  pin (None when the points do not give a rising line)
+    ######################################################################################################
+    def secant(self, a, b):
+
+        if a is None or b is None or a[0] == b[0]:
+            return None
+
+        target = self.compression_db
+        ya, yb = a[1], b[1]
+        if ya > MIN_LOG_COMPRESSION_DB and yb > MIN_LOG_COMPRESSION_DB:
+            target, ya, yb = math.log(target), math.log(ya), math.log(yb)
+
+        slope = (yb - ya) / (b[0] - a[0])
+        if slope <= 0:
+            return None
+
+        return b[0] + (target - yb) / slope
+
+    ######################################################################################################
+    # Run the search for one frequency pair
+    # With a hint (expected IP1dB, see warm_start.py) one low power point is enough for the gain and the search
+    # jumps to window_db below the hint, a wrong hint only costs the steps back to the 1 dB point
+    # params:   start_dbm (first input power, must be in the linear region), measure (pin -> raw pout), hint_dbm
+    # returns:  {'gain': small signal gain, 'ip1db', 'op1db' (None when max_pin is reached first),
+    #           'points': [(pin, pout)] in measurement order}
+    ######################################################################################################
+    def run(self, start_dbm, measure, hint_dbm=None):
+
+        if start_dbm > self.max_pin_dbm:
+            raise ValueError("Start power {} dBm is above max_pin {} dBm".format(start_dbm, self.max_pin_dbm))
+
+        points = []
+
+        def compression_at(pin):
+            pin = round(min(pin, self.max_pin_dbm), 2)
+            pout = measure(pin)
+            points.append((pin, pout))
+            return pin, pout
+
+        # Small signal gain from the first few points
+        linear_points = self.linear_points if hint_dbm is None else 1
+        gains = []
+        for k in range(0, linear_points):
+            pin, pout = compression_at(start_dbm + k * self.linear_step_db)
+            gains.append(pout - pin)
+            if pin >= self.max_pin_dbm:
+                break
+        gain = sum(gains) / len(gains)
+
+        # (pin, compression) below and at / above the target
+        low = (points[-1][0], points[-1][0] + gain - points[-1][1])
+        high = None
+
+        # Warm start, straight to just below the expected value then climb in window sized steps
+        bracket_step_db = self.bracket_step_db
+        if hint_dbm is not None:
+            bracket_step_db = 2 * self.window_db
+            if hint_dbm - self.window_db > low[0]:
+                pin, pout = compression_at(hint_dbm - self.window_db)
+                current = (pin, pin + gain - pout)
+                if current[1] >= self.compression_db:
+                    high = current
+                else:
+                    low = current
+
+        # Climb until the compression passes the target, aiming at it by extrapolation once it starts to show
+        previous = None
+        while high is None and low[0] < self.max_pin_dbm and len(points) < self.max_points:
+            step = bracket_step_db
+            pin = self.secant(previous, low)
+            if pin is not None:
+                step = min(step, max(self.resolution_db, pin - low[0]))
+
+            pin, pout = compression_at(low[0] + step)
+            current = (pin, pin + gain - pout)
+            if current[1] >= self.compression_db:
+                high = current
+            else:
+                previous, low = low, current
+
+        if high is None:
+            return {'gain': gain, 'ip1db': None, 'op1db': None, 'points': points}
+
+        # Secant on the last two points, bisect when it would leave the bracket
+        # Done once the bracket or the distance to the target (in input power) is within the resolution
+        recent = [low, high]
+        while high[0] - low[0] > self.resolution_db and len(points) < self.max_points:
+            pin = self.secant(*recent)
+            if pin is not None and abs(pin - recent[1][0]) <= self.resolution_db / 2:
+                break
+            if pin is None or not low[0] < pin < high[0]:
+                pin = (low[0] + high[0]) / 2
+
+            pin, pout = compression_at(pin)
+            current = (pin, pin + gain - pout)
+            if current[1] >= self.compression_db:
+                high = current
+            else:
+                low = current
+            recent = [recent[1], current]
+
+        # Interpolate the target between the bracket ends
+        ip1db = self.secant(low, high)
+        if ip1db is None or not low[0] <= ip1db <= high[0]:
+            ip1db = high[0]
+
+        return {'gain': gain, 'ip1db': ip1db, 'op1db': ip1db + gain - self.compression_db, 'points': points}
@@ -0,0 +1,312 @@
+## Path loss calibration.
+## With a thru in place of the eval board, the IF/RF generator drives the analyzer through the reference cable
+## once, then through each path in turn (a cable, a combiner path) across every frequency the tests will use it at.
+## The loss of a path is the reference reading less the path reading plus the known loss of the reference cable,
+## so the generator and analyzer level errors drop out. With a zero loss thru as the reference the reference loss is
+## 0, otherwise it has to be the measured loss of the reference cable or every path comes out that much low.
+## The grid runs from the mxg list memory when the instruments take raw SCPI, point by point otherwise.
+## The losses go into a cache file per bench next to the spreadsheets, named from bench_name():
+##
+##   {"format": 1, "revision": 3, "board": "ADMV1139", "written": "2026-10-18T09:12:00",
+##    "paths": {"path1_loss_5": {"freq_ghz": [...], "loss_db": [...], "measured": "...", "level_dbm": 0,
+##                               "instruments": {...}}, ...}}
+##
+## The revision goes up with every calibration, paths not measured again keep their last calibration. main() loads
+## the file on every run, uses a calibrated path instead of the typed loss when it covers the planned frequencies
+## and was measured with the instruments of this bench, and flags the calibration as stale otherwise or when it
+## is too old.
+
+import datetime
+import hashlib
+import json
+import os
+
+import numpy
+
+from loss_table import LossTable, loss_table
+
+
+# Version of the layout above
+CALIBRATION_FORMAT = 1
+
+
+##########################################################################################################
+# Name of a bench for its cache files, the same instrument addresses give the same name
+# A simulated bench opens the real addresses, it gets a name of its own so its results never land on the real one
+# params:   instruments ({role: address}), simulate
+# returns:  name
+##########################################################################################################
+def bench_name(instruments, simulate=None):
+
+    addresses = json.dumps(sorted(instruments.items()))
+    name = 'bench-' + hashlib.sha1(addresses.encode()).hexdigest()[:8]
+    if simulate is not None:
+        name = 'simulated-' + name
+
+    return name
+
+
+##########################################################################################################
+# Calibrated path losses of one bench, kept in a cache file
+##########################################################################################################
+class PathCalibration:
+
+    ######################################################################################################
+    # params:   path (cache file, need not exist yet), board, instruments ({role: address} of this bench, a path
+    #           calibrated with a box at another address is not used)
+    ######################################################################################################
+    def __init__(self, path, board=None, instruments=None):
+        self.path = path
+        self.board = board
+        self.instruments = instruments
+        self.revision = 0
+        self.written = None
+
+        # {name: {'freq_ghz', 'loss_db', 'measured', ...}}
+        self.paths = {}
+
+        # {name: reason} of the paths measured on another bench, kept in the file but not used
+        self.foreign = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path) as calibration_file:
+                stored = json.load(calibration_file)
+            if stored.get('format') != CALIBRATION_FORMAT:
+                raise ValueError("{} is calibration format {}, expected {}".format(
+                    path, stored.get('format'), CALIBRATION_FORMAT))
+            if board is not None and stored.get('board') not in (None, board):
+                raise ValueError("{} is the calibration of a {} bench, not {}".format(path, stored['board'], board))
+            self.revision = stored['revision']
+            self.written = stored.get('written')
+            self.paths = stored['paths']
+
+        for name in self.paths:
+            reason = self.mismatch(self.paths[name].get('instruments'))
+            if reason is not None:
+                self.foreign[name] = '{} was calibrated with {}, using its typed loss'.format(name, reason)
+
+    ######################################################################################################
+    # How the instruments a path was calibrated with differ from this bench
+    # params:   stored ({role: {'address', ...}} saved with the path)
+    # returns:  description, None when they match or either side is unknown
+    ######################################################################################################
+    def mismatch(self, stored):
+
+        if self.instruments is None or stored is None:
+            return None
+
+        for role in sorted(stored):
+            address = stored[role].get('address') if isinstance(stored[role], dict) else stored[role]
+            if role in self.instruments and address != self.instruments[role]:
+                return '{} at {}, this bench has {}'.format(role, address, self.instruments[role])
+
+        return None
+
+    ######################################################################################################
+    # params:   name
+    # returns:  LossTable, None when the path was never calibrated or was calibrated on another bench
+    ######################################################################################################
+    def table(self, name):
+
+        if name not in self.paths or name in self.foreign:
+            return None
+
+        return LossTable(self.paths[name]['freq_ghz'], self.paths[name]['loss_db'], name)
+
+    ######################################################################################################
+    # The calibrated loss of a path when it covers the frequencies the tests need, the typed loss otherwise
+    # params:   name, typed (loss the script would use without a calibration), freq_ghz (planned frequencies)
+    # returns:  LossTable or typed
+    ######################################################################################################
+    def loss(self, name, typed, freq_ghz):
+
+        table = self.table(name)
+        if table is None or not numpy.all(table.covers(freq_ghz)):
+            return typed
+
+        return table
+
+    ######################################################################################################
+    # Reasons the calibration should be run again, none when it is good to use
+    # params:   paths ({name: planned frequencies}), max_age_days, now
+    # returns:  [reason]
+    ######################################################################################################
+    def stale(self, paths, max_age_days, now=None):
+
+        if now is None:
+            now = datetime.datetime.now()
+
+        if not self.paths:
+            return ['No path calibration in {}, every path uses its typed loss'.format(self.path)]
+
+        reasons = []
+        for name in sorted(paths):
+            if name in self.foreign:
+                reasons.append(self.foreign[name])
+                continue
+
+            table = self.table(name)
+            if table is None:
+                reasons.append('{} was never calibrated, using its typed loss'.format(name))
+                continue
+
+            outside = sorted(set(numpy.asarray(paths[name], dtype=numpy.float64)[~table.covers(paths[name])].tolist()))
+            if outside:
+                reasons.append('{} is calibrated {:g} to {:g} GHz, not at {} GHz, using its typed loss'.format(
+                    name, table.freq_ghz[0], table.freq_ghz[-1], ', '.join('{:g}'.format(f) for f in outside)))
+
+            age_days = (now - datetime.datetime.fromisoformat(self.paths[name]['measured'])).total_seconds() / 86400
+            if age_days > max_age_days:
+                reasons.append('{} was calibrated {:.0f} days ago, more than {} days'.format(
+                    name, age_days, max_age_days))
+
+        return reasons
+
+    ######################################################################################################
+    # One line for the notes
+    # params:   none
+    # returns:  description
+    ######################################################################################################
+    def describe(self):
+
+        if not self.paths:
+            return 'Typed losses, no calibration in {}'.format(self.path)
+
+        return '{} revision {}, written {}, paths {}'.format(
+            self.path, self.revision, self.written, ', '.join(sorted(self.paths)))
+
+    ######################################################################################################
+    # Store newly measured paths as the next revision, the file is replaced in one step
+    # params:   tables ({name: LossTable}), level_dbm, instruments (names and IDs of the boxes used)
+    # returns:  revision
+    ######################################################################################################
+    def save(self, tables, level_dbm=None, instruments=None):
+
+        measured = datetime.datetime.now().isoformat(timespec='seconds')
+        for name in tables:
+            self.paths[name] = dict(tables[name].as_dict(), measured=measured, level_dbm=level_dbm,
+                                    instruments=instruments)
+            self.foreign.pop(name, None)
+        self.revision = self.revision + 1
+        self.written = measured
+
+        stored = {
+            'format': CALIBRATION_FORMAT,
+            'revision': self.revision,
+            'board': self.board,
+            'written': self.written,
+            'paths': self.paths,
+        }
+        with open(self.path + '.tmp', 'w') as calibration_file:
+            json.dump(stored, calibration_file, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+        return self.revision
+
+
+##########################################################################################################
+# Analyzer reading at each frequency with the generator at level_dbm, the generator drives the analyzer
+# through whatever is connected
+# params:   freq_ghz, level_dbm, generator, specan, settler, dispatcher, list_sweep
+# returns:  powers_dbm
+##########################################################################################################
+def measure_path(freq_ghz, level_dbm, generator, specan, settler, dispatcher, list_sweep=None):
+
+    if list_sweep is not None and list_sweep.available([generator]):
+        frequencies_hz = [freq * 1e9 for freq in freq_ghz]
+        return list_sweep.run({generator: (frequencies_hz, [level_dbm] * len(freq_ghz))}, frequencies_hz)
+
+    powers_dbm = []
+    for freq in freq_ghz:
+        dispatcher.tune([
+            (generator, 'set_frequency', (freq * 1e9,), 0.5),
+            (specan, 'set_frequency', (freq * 1e9,), 0.5),
+            (specan, 'set_marker', (1, freq * 1e9), 0.5),
+        ])
+        powers_dbm.append(settler.read_power(specan, 1))
+
+    return powers_dbm
+
+
+##########################################################################################################
+# Ask the operator to make the next connection
+# params:   name (path, 'reference' for the reference cable)
+# returns:  none
+##########################################################################################################
+def prompt_connection(name):
+
+    if name == 'reference':
+        name = 'the reference cable (a zero loss thru, or the cable whose loss is given as the reference loss)'
+    input("Connect {} from the generator to the analyzer through the thru, then press Enter".format(name))
+
+
+##########################################################################################################
+# Measure the loss of every path, the operator swaps the connection between them
+# The reference connection is read first, a path loss is the reference reading less the path reading plus
+# reference_loss, which is 0 only when the reference is a zero loss thru
+# params:   paths ({name: planned frequencies}), generator, specan, settler, dispatcher, level_dbm, list_sweep,
+#           connect (called with the name of the next connection, 'reference' first, returns once it is made),
+#           reference_loss (loss of the reference connection, a number or a LossTable)
+# returns:  {name: LossTable}
+##########################################################################################################
+def calibrate_paths(paths, generator, specan, settler, dispatcher, level_dbm=0, list_sweep=None, connect=None,
+                    reference_loss=0):
+
+    if connect is None:
+        connect = prompt_connection
+
+    # Every frequency any path needs once through the reference
+    freq_ghz = sorted(set(float(freq) for name in paths for freq in paths[name]))
+
+    generator.set_amplitude(level_dbm)
+    generator.on()
+
+    # Reading the path would give with no loss at all, the reference reading with the reference loss put back
+    connect('reference')
+    reference_db = (numpy.asarray(measure_path(freq_ghz, level_dbm, generator, specan, settler, dispatcher,
+                                               list_sweep), dtype=numpy.float64)
+                    + loss_table(reference_loss, 'reference').loss(freq_ghz))
+    reference = dict(zip(freq_ghz, reference_db.tolist()))
+
+    tables = {}
+    for name in sorted(paths):
+        path_ghz = sorted(set(float(freq) for freq in paths[name]))
+        connect(name)
+        powers_dbm = measure_path(path_ghz, level_dbm, generator, specan, settler, dispatcher, list_sweep)
+        tables[name] = LossTable(path_ghz, [reference[freq] - power for freq, power in zip(path_ghz, powers_dbm)],
+                                 name)
+        print("{}: {} points, {:g} to {:g} GHz, {:.2f} to {:.2f} dB".format(
+            name, len(path_ghz), path_ghz[0], path_ghz[-1], min(tables[name].loss_db), max(tables[name].loss_db)))
+
+    generator.off()
+
+    return tables
+
+
+##########################################################################################################
+# Calibration results on one sheet, a frequency and a loss column per path
+# The workbook streams its rows (constant_memory), so the sheet is written a row at a time
+# params:   workbook, tables ({name: LossTable})
+# returns:  worksheet
+##########################################################################################################
+def calibration_sheet(workbook, tables):
+
+    worksheet = workbook.add_worksheet('Path_Calibration')
+
+    names = sorted(tables)
+    header = []
+    for name in names:
+        header.extend(['{} Frequency (GHz)'.format(name), '{} Loss (dB)'.format(name)])
+    worksheet.write_row(0, 0, header)
+
+    rows = max(len(tables[name].freq_ghz) for name in names) if names else 0
+    for row in range(0, rows):
+        values = []
+        for name in names:
+            if row < len(tables[name].freq_ghz):
+                values.extend([float(tables[name].freq_ghz[row]), float(tables[name].loss_db[row])])
+            else:
+                values.extend([None, None])
+        worksheet.write_row(row + 1, 0, values)
+
+    return worksheet
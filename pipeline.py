@@ -0,0 +1,260 @@
+## Acquisition / processing pipeline for the sweeps.
+## The sweep loop only talks to the instruments and puts one record per measurement on a bounded queue.
+## A consumer thread does the loss correction, the derived numbers and the worksheet writes, and appends every
+## record to the record log on disk as it comes in, so the instruments never wait on xlsxwriter or the math.
+## The record log is the run's journal: a run that stops part way (instrument timeout, crash, power cut) is
+## started again with --resume, the points already in the journal go straight to the sheets and only the rest
+## are measured.
+
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+
+# Marks the end of the records on the queue
+_END = object()
+
+
+##########################################################################################################
+# Append-only log of the raw records, one JSON object per line
+# Every record is flushed to the OS as it comes in, so it survives the script dying. The file is fsynced every
+# sync_records records or sync_interval_s seconds, whichever comes first, so a power cut loses at most that batch
+# without paying for a disk sync per point.
+# A new run's journal must not exist yet, so two runs can never write into one journal. Only a resumed run
+# appends to the journal it was started from.
+##########################################################################################################
+class RecordLog:
+
+    ######################################################################################################
+    # params:   path, sync_records, sync_interval_s, resume (append to the journal of a stopped run)
+    ######################################################################################################
+    def __init__(self, path, sync_records=32, sync_interval_s=2, resume=False):
+        self.path = path
+        self.sync_records = sync_records
+        self.sync_interval_s = sync_interval_s
+        self.lock = threading.Lock()
+
+        if not resume:
+            self.file = open(path, 'x')
+        else:
+            # A journal cut off mid line gets its own line for the next record
+            torn = False
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                with open(path, 'rb') as log_file:
+                    log_file.seek(-1, os.SEEK_END)
+                    torn = log_file.read(1) != b'\n'
+
+            self.file = open(path, 'a')
+            if torn:
+                self.file.write('\n')
+
+        self.unsynced = 0
+        self.synced_at = time.time()
+
+    ######################################################################################################
+    # params:   test, record
+    # returns:  none
+    ######################################################################################################
+    def write(self, test, record):
+        with self.lock:
+            self.file.write(json.dumps(dict(record, test=test)) + '\n')
+            self.file.flush()
+
+            self.unsynced = self.unsynced + 1
+            if self.unsynced >= self.sync_records or time.time() - self.synced_at >= self.sync_interval_s:
+                self._sync()
+
+    ######################################################################################################
+    # Push everything written so far to the disk, lock held by the caller
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.time()
+
+    ######################################################################################################
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            self._sync()
+            self.file.close()
+
+
+##########################################################################################################
+# Read a record log back, a last line cut off by a crash is dropped
+# params:   path
+# returns:  records, in the order they were written
+##########################################################################################################
+def load_records(path):
+
+    records = []
+    with open(path) as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Only the line being written when the run stopped can be partial
+                continue
+
+    return records
+
+
+##########################################################################################################
+# Newest record log of a board in a directory, for --resume without a path
+# params:   prefix (spreadsheet name prefix, e.g. 'ADMV1139'), directory
+# returns:  path, None when there is none
+##########################################################################################################
+def latest_record_log(prefix, directory='.'):
+
+    paths = glob.glob(os.path.join(directory, '{}_*.jsonl'.format(prefix)))
+    if not paths:
+        return None
+
+    return max(paths, key=os.path.getmtime)
+
+
+##########################################################################################################
+# Points of an earlier run of the same sweep, taken from its record log
+# A point counts as done when the journal has a record with every field of the point equal (frequencies,
+# powers, index), so a sweep whose plan changed since simply measures the points that no longer match.
+##########################################################################################################
+class Resume:
+
+    ######################################################################################################
+    # params:   path (record log of the stopped run)
+    ######################################################################################################
+    def __init__(self, path):
+        self.path = path
+
+        # {test: [records]} and {(test, fields): {values: record}}
+        self.records = {}
+        for record in load_records(path):
+            self.records.setdefault(record.get('test'), []).append(record)
+        self.indices = {}
+
+    ######################################################################################################
+    # Test the stopped run was running
+    # params:   none
+    # returns:  test, None when the journal is empty
+    ######################################################################################################
+    def test(self):
+        tests = [test for test in self.records if test is not None]
+        return tests[-1] if tests else None
+
+    ######################################################################################################
+    # Journal record of a point
+    # params:   test, point (fields that identify the point)
+    # returns:  record, None when the point was not measured
+    ######################################################################################################
+    def find(self, test, point):
+
+        fields = tuple(sorted(point))
+        index = self.indices.get((test, fields))
+        if index is None:
+            index = {}
+            for record in self.records.get(test, []):
+                if all(field in record for field in fields):
+                    index[tuple(record[field] for field in fields)] = record
+            self.indices[(test, fields)] = index
+
+        return index.get(tuple(point[field] for field in fields))
+
+    ######################################################################################################
+    # Put the journal records of the points already measured on the pipeline, they are not logged again
+    # params:   pipeline, test, points, order (indices into points)
+    # returns:  order of the points still to measure
+    ######################################################################################################
+    def replay(self, pipeline, test, points, order):
+
+        remaining = []
+        for index in order:
+            record = self.find(test, dict(points[index], index=index))
+            if record is None:
+                remaining.append(index)
+            else:
+                pipeline.put(record, log=False)
+
+        if len(remaining) < len(order):
+            print("Resume: {} of {} {} points from {}".format(len(order) - len(remaining), len(order), test, self.path))
+
+        return remaining
+
+
+##########################################################################################################
+# Runs consume(record) on its own thread for every record put on the queue
+# put() blocks once max_records are waiting, close() waits for the consumer to finish. A consumer error is
+# raised again from the next put() or close() so the sweep stops instead of measuring into the void.
+##########################################################################################################
+class Pipeline:
+
+    ######################################################################################################
+    # params:   consume, test (name in the record log), record_log, max_records
+    ######################################################################################################
+    def __init__(self, consume, test=None, record_log=None, max_records=64):
+        self.consume = consume
+        self.test = test
+        self.record_log = record_log
+        self.records = queue.Queue(maxsize=max_records)
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run, name='pipeline-{}'.format(test))
+        self.thread.daemon = True
+        self.thread.start()
+
+    ######################################################################################################
+    # Consumer thread, keeps draining after an error so put() never blocks on a full queue
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def _run(self):
+
+        while True:
+            item = self.records.get()
+            if item is _END:
+                return
+            if self.error is not None:
+                continue
+
+            record, log = item
+            try:
+                if log and self.record_log is not None:
+                    self.record_log.write(self.test, record)
+                self.consume(record)
+            except Exception as error:
+                self.error = error
+
+    ######################################################################################################
+    # Hand a record to the consumer
+    # params:   record, log (False for records replayed from the record log)
+    # returns:  none
+    ######################################################################################################
+    def put(self, record, log=True):
+        if self.error is not None:
+            self.close()
+        self.records.put((record, log))
+
+    ######################################################################################################
+    # Wait for every record to be consumed
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def close(self):
+
+        if self.thread.is_alive():
+            self.records.put(_END)
+            self.thread.join()
+
+        if self.error is not None:
+            raise self.error
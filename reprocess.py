@@ -0,0 +1,254 @@
+## Offline re-processing of stored runs with new losses.
+## The result store keeps the raw analyzer readings of every point next to the losses they were corrected with,
+## and the metadata names the loss settings that went into the input and output path of the test and the frequency
+## column each path is looked up at (loss_paths).
+## Given a new loss configuration, the corrected columns of a run are worked out again for all points at once:
+## the source was set to pin + old input loss, so the board saw pin + old input loss - new input loss, and every
+## output power is the raw reading plus the new output loss. Gain and OIP3 follow from those, the P1dB tests get
+## their compression points from analyze_compression over every curve. The result is a new result store and an
+## xlsx report, no instrument is touched.
+##
+## Usage: python reprocess.py <losses.json> <run>.results [<run>.results ...]
+## losses.json: {"path1_loss_5": 8.1, "rf_cable_loss_db": {"freq_ghz": [...], "loss_db": [...]}, ...}, settings it
+##              leaves out keep the run's values
+
+import json
+import os
+import sys
+import time
+
+import numpy
+import xlsxwriter
+
+from compression import analyze_compression
+from loss_table import loss_table
+from result_store import COLUMNS, ResultStore, load_results
+
+
+# Frequencies match a swept frequency within this
+FREQUENCY_TOLERANCE_GHZ = 1e-6
+
+# Raw reading and the corrected output power worked out from it
+OUTPUT_COLUMNS = [
+    ('raw_pout_dbm', 'pout_dbm'),
+    ('raw_pout_high_dbm', 'pout_high_dbm'),
+    ('raw_im3_low_dbm', 'im3_low_dbm'),
+    ('raw_im3_high_dbm', 'im3_high_dbm'),
+]
+
+
+##########################################################################################################
+# Loss of one path at every point, the sum of the named loss settings in it
+# A setting is a number, a {'freq_ghz', 'loss_db'} table looked up at the path's frequency, or, from runs stored
+# before the loss tables, a list with one loss per swept RF frequency in the order of rf_freq_ghz
+# params:   losses ({name: setting}), names, freq_ghz (per point, the path's frequency), rf_ghz (per point),
+#           rf_freq_ghz (swept RF frequencies)
+# returns:  loss_db (per point)
+##########################################################################################################
+def path_loss(losses, names, freq_ghz, rf_ghz=None, rf_freq_ghz=None):
+
+    loss_db = numpy.zeros(len(freq_ghz))
+
+    for name in names:
+        if name not in losses:
+            raise ValueError("No loss setting '{}'".format(name))
+        value = losses[name]
+
+        if not isinstance(value, (list, tuple)):
+            loss_db = loss_db + loss_table(value, name).loss(numpy.asarray(freq_ghz, dtype=numpy.float64))
+            continue
+
+        rf_ghz = numpy.asarray(rf_ghz, dtype=numpy.float64)
+
+        if rf_freq_ghz is None or len(value) < len(rf_freq_ghz):
+            raise ValueError("Loss setting '{}' has no loss for every swept RF frequency".format(name))
+
+        # Position of each point's RF frequency in the swept list
+        freqs = numpy.asarray(rf_freq_ghz, dtype=numpy.float64)
+        order = numpy.argsort(freqs)
+        ascending = freqs[order]
+        above = numpy.clip(numpy.searchsorted(ascending, rf_ghz), 0, len(freqs) - 1)
+        below = numpy.clip(above - 1, 0, len(freqs) - 1)
+        nearest = numpy.where(numpy.abs(ascending[below] - rf_ghz) < numpy.abs(ascending[above] - rf_ghz), below, above)
+        positions = order[nearest]
+        if numpy.any(numpy.abs(freqs[positions] - rf_ghz) > FREQUENCY_TOLERANCE_GHZ):
+            raise ValueError("Points off the swept RF frequencies for loss setting '{}'".format(name))
+
+        loss_db = loss_db + numpy.asarray(value, dtype=numpy.float64)[positions]
+
+    return loss_db
+
+
+##########################################################################################################
+# Corrected columns of one test with new losses, raw readings and frequencies stay as stored
+# params:   columns ({column: array}), loss_paths ({'input': [names], 'output': [names], 'input_ghz': column,
+#           'output_ghz': column}), losses, rf_freq_ghz
+# returns:  {column: array}
+##########################################################################################################
+def correct(columns, loss_paths, losses, rf_freq_ghz=None):
+
+    corrected = dict((name, numpy.asarray(column, dtype=numpy.float64)) for name, column in columns.items())
+    rf_ghz = corrected['rf_ghz']
+
+    input_loss_db = path_loss(losses, loss_paths['input'], corrected[loss_paths.get('input_ghz', 'rf_ghz')], rf_ghz,
+                              rf_freq_ghz)
+    output_loss_db = path_loss(losses, loss_paths['output'], corrected[loss_paths.get('output_ghz', 'rf_ghz')], rf_ghz,
+                               rf_freq_ghz)
+
+    if 'pin_dbm' in corrected and 'input_loss_db' in corrected:
+        corrected['pin_dbm'] = corrected['pin_dbm'] + corrected['input_loss_db'] - input_loss_db
+    corrected['input_loss_db'] = input_loss_db
+    corrected['output_loss_db'] = output_loss_db
+
+    for raw, name in OUTPUT_COLUMNS:
+        if raw in corrected:
+            corrected[name] = corrected[raw] + output_loss_db
+
+    if 'pout_dbm' in corrected and 'pin_dbm' in corrected:
+        corrected['gain_db'] = corrected['pout_dbm'] - corrected['pin_dbm']
+
+    # Average of the low and high OIP3, same sums as the sweeps
+    if 'im3_low_dbm' in corrected and 'im3_high_dbm' in corrected:
+        low_oip3 = corrected['pout_dbm'] + (corrected['pout_dbm'] - corrected['im3_low_dbm']) / 2
+        high_oip3 = corrected['pout_high_dbm'] + (corrected['pout_high_dbm'] - corrected['im3_high_dbm']) / 2
+        corrected['oip3_dbm'] = (low_oip3 + high_oip3) / 2
+
+    return dict((name, column.astype(COLUMNS[name][0])) for name, column in corrected.items())
+
+
+##########################################################################################################
+# Compression points of every (IF, RF) power curve of a P1dB test
+# params:   columns ({column: array}, corrected)
+# returns:  {'if_ghz', 'rf_ghz', 'ip1db_dbm', 'op1db_dbm', 'ip0p1db_dbm', 'op0p1db_dbm', 'ip3db_dbm',
+#           'op3db_dbm', 'psat_dbm', 'gain_db'}, one entry per curve
+##########################################################################################################
+def p1db_summary(columns):
+
+    pin_dbm = numpy.asarray(columns['pin_dbm'], dtype=numpy.float64)
+    pout_dbm = numpy.asarray(columns['pout_dbm'], dtype=numpy.float64)
+    keys = numpy.stack([columns['if_ghz'], columns['rf_ghz']], axis=1).astype(numpy.float64)
+    pairs, curve = numpy.unique(keys, axis=0, return_inverse=True)
+    curve = curve.reshape(-1)
+
+    # Points of each curve in ascending input power, padded with NaN to the longest curve
+    order = numpy.lexsort((pin_dbm, curve))
+    counts = numpy.bincount(curve, minlength=len(pairs))
+    starts = numpy.cumsum(counts) - counts
+    position = numpy.arange(len(order)) - starts[curve[order]]
+    pin_curves = numpy.full((len(pairs), max(counts.max(initial=0), 1)), numpy.nan)
+    pout_curves = numpy.full(pin_curves.shape, numpy.nan)
+    pin_curves[curve[order], position] = pin_dbm[order]
+    pout_curves[curve[order], position] = pout_dbm[order]
+
+    compression = analyze_compression(pin_curves, pout_curves)
+
+    return {
+        'if_ghz': pairs[:, 0],
+        'rf_ghz': pairs[:, 1],
+        'ip1db_dbm': compression['ip_dbm'][1],
+        'op1db_dbm': compression['op_dbm'][1],
+        'ip0p1db_dbm': compression['ip_dbm'][0.1],
+        'op0p1db_dbm': compression['op_dbm'][0.1],
+        'ip3db_dbm': compression['ip_dbm'][3],
+        'op3db_dbm': compression['op_dbm'][3],
+        'psat_dbm': compression['psat_dbm'],
+        'gain_db': compression['gain_db'],
+    }
+
+
+##########################################################################################################
+# Write one sheet of columns, NaN as a blank cell
+# params:   workbook, name, header, columns (in header order)
+# returns:  worksheet
+##########################################################################################################
+def write_sheet(workbook, name, header, columns):
+
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, header)
+
+    rows = numpy.stack([numpy.asarray(column, dtype=numpy.float64) for column in columns], axis=1).tolist()
+    for row in range(0, len(rows)):
+        worksheet.write_row(row + 1, 0, [None if value != value else value for value in rows[row]])
+
+    return worksheet
+
+
+##########################################################################################################
+# Re-process one stored run with new losses
+# params:   path (<run>.results), losses ({name: dB}, overrides the run's settings), output (new result store
+#           path, <run>_reprocessed.results by default), report (also write <output>.xlsx)
+# returns:  output, {test: {column: array}}, {test: P1dB summary}
+##########################################################################################################
+def reprocess(path, losses, output=None, report=True):
+
+    metadata, results = load_results(path, mmap_mode=None)
+    if 'loss_paths' not in metadata or 'losses' not in metadata:
+        raise ValueError("{} has no loss settings stored, it was written before re-processing was possible".format(path))
+
+    new_losses = dict(metadata['losses'])
+    for name in losses:
+        if name not in new_losses:
+            raise ValueError("Invalid loss setting '{}'".format(name))
+        new_losses[name] = losses[name]
+
+    if output is None:
+        output = path.rstrip('/\\')
+        if output.endswith('.results'):
+            output = output[:-len('.results')]
+        output = output + '_reprocessed.results'
+
+    corrected = {}
+    summaries = {}
+    for test in sorted(results):
+        corrected[test] = correct(results[test], metadata['loss_paths'], new_losses, metadata.get('rf_freq_ghz'))
+        if test.endswith('P1DB'):
+            summaries[test] = p1db_summary(corrected[test])
+
+    store_metadata = dict((name, value) for name, value in metadata.items() if name not in ('tests', 'written'))
+    store_metadata.update({'losses': new_losses, 'reprocessed_from': path, 'original_losses': metadata['losses']})
+    result_store = ResultStore(output, store_metadata)
+    for test in sorted(corrected):
+        result_store.add_columns(test, corrected[test])
+    result_store.close()
+
+    if report:
+        workbook = xlsxwriter.Workbook(output[:-len('.results')] + '.xlsx', {'constant_memory': True})
+
+        # Settings first, the changed ones side by side
+        worksheet_notes = workbook.add_worksheet('Notes')
+        worksheet_notes.write_row(0, 0, ['Reprocessed from', path])
+        worksheet_notes.write_row(1, 0, ['Test Notes', metadata.get('test_notes')])
+        worksheet_notes.write_row(3, 0, ['Loss setting', 'Run', 'Reprocessed'])
+        names = sorted(new_losses)
+        for k in range(0, len(names)):
+            worksheet_notes.write_row(4 + k, 0, [names[k], json.dumps(metadata['losses'][names[k]]),
+                                                 json.dumps(new_losses[names[k]])])
+
+        for test in sorted(corrected):
+            names = [name for name in COLUMNS if name in corrected[test]]
+            header = ['{} ({})'.format(name, COLUMNS[name][1]) for name in names]
+            write_sheet(workbook, test, header, [corrected[test][name] for name in names])
+
+            if test in summaries:
+                names = list(summaries[test])
+                write_sheet(workbook, test + ' summary', names, [summaries[test][name] for name in names])
+
+        workbook.close()
+
+    return output, corrected, summaries
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python reprocess.py <losses.json> <run>.results [<run>.results ...]")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as losses_file:
+        losses = json.load(losses_file)
+
+    for path in sys.argv[2:]:
+        start = time.time()
+        output, corrected, summaries = reprocess(path, losses)
+        points = sum(len(corrected[test]['rf_ghz']) for test in corrected)
+        print("{}: {} points re-processed into {} in {:.2f} s".format(
+            os.path.basename(path.rstrip('/\\')), points, output, time.time() - start))
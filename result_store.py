@@ -0,0 +1,190 @@
+## Columnar result store.
+## Next to the xlsx report every run writes <name>.results/, one directory per test with one .npy file per
+## quantity and metadata.json on top with the run notes, the losses and the units, dtype and row count of every
+## column. Downstream scripts load a column with numpy.load(path, mmap_mode='r') (or load_results below) and
+## slice millions of points without parsing spreadsheets. Frequencies are float64, powers and gains float32,
+## NaN where a row has no value for a column.
+
+import array
+import datetime
+import json
+import os
+import threading
+
+import numpy
+
+
+# Version of the layout below, goes in the metadata
+STORE_FORMAT = 1
+
+# Every quantity a test can store: (dtype, unit, description)
+COLUMNS = {
+    'if_ghz': ('float64', 'GHz', 'IF frequency'),
+    'lo_ghz': ('float64', 'GHz', 'LO frequency'),
+    'rf_ghz': ('float64', 'GHz', 'RF frequency'),
+    'tone_mhz': ('float32', 'MHz', 'IM tone separation'),
+    'pin_dbm': ('float32', 'dBm', 'Eval board input power'),
+    'input_loss_db': ('float32', 'dB', 'Input path loss the source was set with (low tone source for OIP3)'),
+    'output_loss_db': ('float32', 'dB', 'Output path loss added to the analyzer reading'),
+    'raw_pout_dbm': ('float32', 'dBm', 'Analyzer reading of the wanted tone (low tone for OIP3)'),
+    'pout_dbm': ('float32', 'dBm', 'Eval board output power (low tone for OIP3)'),
+    'gain_db': ('float32', 'dB', 'Conversion gain (low tone for OIP3)'),
+    'raw_pout_high_dbm': ('float32', 'dBm', 'Analyzer reading of the high main tone'),
+    'pout_high_dbm': ('float32', 'dBm', 'Eval board output power of the high main tone'),
+    'raw_im3_low_dbm': ('float32', 'dBm', 'Analyzer reading of the low IM3 tone'),
+    'raw_im3_high_dbm': ('float32', 'dBm', 'Analyzer reading of the high IM3 tone'),
+    'im3_low_dbm': ('float32', 'dBm', 'Eval board output power of the low IM3 tone'),
+    'im3_high_dbm': ('float32', 'dBm', 'Eval board output power of the high IM3 tone'),
+    'oip3_dbm': ('float32', 'dBm', 'Average of the low and high OIP3'),
+}
+
+
+##########################################################################################################
+# Collects the rows of a run per test and writes them out as columns on close()
+# add() is called from the pipeline thread, so the buffers sit behind a lock
+##########################################################################################################
+class ResultStore:
+
+    ######################################################################################################
+    # params:   path (directory, created on close), metadata (run notes, losses, ... for metadata.json)
+    ######################################################################################################
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.lock = threading.Lock()
+
+        # {test: {column: array of doubles}} and {test: rows}
+        self.columns = {}
+        self.rows = {}
+
+    ######################################################################################################
+    # Add one row, columns the row has no value for are NaN
+    # params:   test, values ({column: value})
+    # returns:  none
+    ######################################################################################################
+    def add(self, test, values):
+
+        for name in values:
+            if name not in COLUMNS:
+                raise ValueError("Invalid result column '{}'".format(name))
+
+        with self.lock:
+            columns = self.columns.setdefault(test, {})
+            rows = self.rows.get(test, 0)
+
+            # A column first seen now is NaN for the rows before
+            for name in values:
+                if name not in columns:
+                    columns[name] = array.array('d', [numpy.nan]) * rows
+
+            for name in columns:
+                value = values.get(name)
+                columns[name].append(numpy.nan if value is None else float(value))
+            self.rows[test] = rows + 1
+
+    ######################################################################################################
+    # Add many rows at once, the same as add() for each row without the per row work
+    # params:   test, values ({column: array}, all the same length)
+    # returns:  none
+    ######################################################################################################
+    def add_columns(self, test, values):
+
+        for name in values:
+            if name not in COLUMNS:
+                raise ValueError("Invalid result column '{}'".format(name))
+        lengths = set(len(values[name]) for name in values)
+        if len(lengths) > 1:
+            raise ValueError("Columns of different lengths {}".format(sorted(lengths)))
+        added = lengths.pop() if lengths else 0
+
+        with self.lock:
+            columns = self.columns.setdefault(test, {})
+            rows = self.rows.get(test, 0)
+
+            for name in values:
+                if name not in columns:
+                    columns[name] = array.array('d', [numpy.nan]) * rows
+
+            for name in columns:
+                if name in values:
+                    columns[name].frombytes(numpy.asarray(values[name], dtype=numpy.float64).tobytes())
+                else:
+                    columns[name].extend(array.array('d', [numpy.nan]) * added)
+            self.rows[test] = rows + added
+
+    ######################################################################################################
+    # Columns collected so far, typed
+    # params:   none
+    # returns:  {test: {column: array}}
+    ######################################################################################################
+    def results(self):
+        with self.lock:
+            return dict(
+                (test, dict((name, numpy.frombuffer(column, dtype=numpy.float64).astype(COLUMNS[name][0]))
+                            for name, column in columns.items()))
+                for test, columns in self.columns.items())
+
+    ######################################################################################################
+    # Write every column and the metadata, tests stored by an earlier run into the same directory stay
+    # params:   none
+    # returns:  path
+    ######################################################################################################
+    def close(self):
+
+        results = self.results()
+
+        with self.lock:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+
+            metadata_path = os.path.join(self.path, 'metadata.json')
+            metadata = {'format': STORE_FORMAT, 'tests': {}}
+            if os.path.exists(metadata_path):
+                with open(metadata_path) as metadata_file:
+                    metadata = json.load(metadata_file)
+            metadata.update(self.metadata)
+            metadata['written'] = datetime.datetime.now().isoformat(timespec='seconds')
+
+            for test in sorted(results):
+                test_path = os.path.join(self.path, test)
+                if not os.path.isdir(test_path):
+                    os.makedirs(test_path)
+
+                stored = {}
+                for name in sorted(results[test]):
+                    dtype, unit, description = COLUMNS[name]
+                    numpy.save(os.path.join(test_path, name + '.npy'), results[test][name])
+                    stored[name] = {'dtype': dtype, 'unit': unit, 'description': description,
+                                    'file': '{}/{}.npy'.format(test, name)}
+
+                metadata['tests'][test] = {'rows': self.rows[test], 'columns': stored}
+
+            with open(metadata_path, 'w') as metadata_file:
+                json.dump(metadata, metadata_file, indent=2)
+
+        return self.path
+
+
+##########################################################################################################
+# Load a stored run, the columns memory mapped by default
+# params:   path, test (None for every test), mmap_mode (None reads the columns into memory)
+# returns:  metadata, {test: {column: array}} (or {column: array} when test is given)
+##########################################################################################################
+def load_results(path, test=None, mmap_mode='r'):
+
+    with open(os.path.join(path, 'metadata.json')) as metadata_file:
+        metadata = json.load(metadata_file)
+
+    tests = [test] if test is not None else sorted(metadata['tests'])
+    results = {}
+    for name in tests:
+        if name not in metadata['tests']:
+            raise ValueError("No {} results in {}".format(name, path))
+        results[name] = dict(
+            (column, numpy.load(os.path.join(path, stored['file']), mmap_mode=mmap_mode))
+            for column, stored in metadata['tests'][name]['columns'].items())
+
+    if test is not None:
+        return metadata, results[test]
+
+    return metadata, results
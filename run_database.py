@@ -0,0 +1,146 @@
+## Run database.
+## Every run of main() goes into one SQLite file next to the spreadsheets: a runs row with the board type, DUT,
+## test, notes, loss settings and instrument IDs, and one points row per measured point with the result store
+## columns. The points carry their run's board, test and time so the lookups below run straight off the
+## (board, test, rf_ghz, if_ghz, run_time) index without a join.
+
+import json
+import math
+import sqlite3
+
+import numpy
+
+from result_store import COLUMNS
+
+
+# Frequencies stored as floats, the lookups match within this
+FREQUENCY_TOLERANCE_GHZ = 1e-6
+
+# Run details the points repeat for the index
+RUN_FIELDS = ['board', 'dut', 'test', 'run_time']
+
+
+##########################################################################################################
+# One SQLite file of runs and points
+##########################################################################################################
+class RunDatabase:
+
+    ######################################################################################################
+    # Benches running in parallel share the file, a write waits up to timeout_s for another bench's transaction
+    # instead of failing with 'database is locked'
+    # params:   path, timeout_s
+    ######################################################################################################
+    def __init__(self, path, timeout_s=60):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout_s)
+        self._create()
+
+    ######################################################################################################
+    # Tables and indexes, a column the result store gained since the file was made is added to it
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def _create(self):
+
+        with self.connection:
+            # Write lock first, a bench opening the file at the same time sees the columns this one adds
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, board TEXT, dut TEXT, test TEXT, "
+                "run_time TEXT, notes TEXT, spreadsheet TEXT, losses TEXT, instruments TEXT, metadata TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS points (run_id INTEGER REFERENCES runs (run_id), board TEXT, dut TEXT, "
+                "test TEXT, run_time TEXT)")
+
+            existing = [row[1] for row in self.connection.execute("PRAGMA table_info(points)")]
+            for name in COLUMNS:
+                if name not in existing:
+                    self.connection.execute("ALTER TABLE points ADD COLUMN {} REAL".format(name))
+
+            self.connection.execute("CREATE INDEX IF NOT EXISTS runs_board ON runs (board, test, run_time)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS runs_dut ON runs (dut, test, run_time)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS points_board ON points (board, test, rf_ghz, if_ghz, run_time)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS points_dut ON points (dut, test, rf_ghz, if_ghz, run_time)")
+
+    ######################################################################################################
+    # Insert a run and its points in one transaction
+    # params:   metadata (result store metadata: board, dut, test, started, test_notes, spreadsheet, losses,
+    #           instruments), results ({test: {column: array}}, see ResultStore.results)
+    # returns:  run_id
+    ######################################################################################################
+    def add_run(self, metadata, results):
+
+        run = {
+            'board': metadata.get('board'),
+            'dut': metadata.get('dut'),
+            'test': metadata.get('test'),
+            'run_time': metadata.get('started'),
+        }
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (board, dut, test, run_time, notes, spreadsheet, losses, instruments, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run['board'], run['dut'], run['test'], run['run_time'], metadata.get('test_notes'),
+                 metadata.get('spreadsheet'), json.dumps(metadata.get('losses')),
+                 json.dumps(metadata.get('instruments')), json.dumps(metadata)))
+            run_id = cursor.lastrowid
+
+            for test in sorted(results):
+                columns = sorted(results[test])
+                if not columns:
+                    continue
+
+                fields = ['run_id'] + RUN_FIELDS + columns
+                fixed = [run_id, run['board'], run['dut'], test, run['run_time']]
+                rows = zip(*[numpy.asarray(results[test][name], dtype=numpy.float64).tolist() for name in columns])
+                self.connection.executemany(
+                    "INSERT INTO points ({}) VALUES ({})".format(', '.join(fields), ', '.join('?' * len(fields))),
+                    (fixed + [None if math.isnan(value) else value for value in row] for row in rows))
+
+        return run_id
+
+    ######################################################################################################
+    # One quantity at one frequency over the latest runs of a board, e.g. the gain at 28 GHz of the last 500
+    # params:   board, test, column, rf_ghz, if_ghz (None for every IF), runs (latest runs to look at)
+    # returns:  [(run_time, dut, if_ghz, value)] newest first
+    ######################################################################################################
+    def history(self, board, test, column, rf_ghz, if_ghz=None, runs=500):
+
+        if column not in COLUMNS:
+            raise ValueError("Invalid result column '{}'".format(column))
+
+        # Oldest run time among the latest runs, the points index then does the rest
+        since = self.connection.execute(
+            "SELECT MIN(run_time) FROM (SELECT run_time FROM runs WHERE board = ? AND test = ? "
+            "ORDER BY run_time DESC LIMIT ?)", (board, test, runs)).fetchone()[0]
+        if since is None:
+            return []
+
+        query = ("SELECT run_time, dut, if_ghz, {} FROM points WHERE board = ? AND test = ? "
+                 "AND rf_ghz BETWEEN ? AND ?".format(column))
+        params = [board, test, rf_ghz - FREQUENCY_TOLERANCE_GHZ, rf_ghz + FREQUENCY_TOLERANCE_GHZ]
+        if if_ghz is not None:
+            query = query + " AND if_ghz BETWEEN ? AND ?"
+            params.extend([if_ghz - FREQUENCY_TOLERANCE_GHZ, if_ghz + FREQUENCY_TOLERANCE_GHZ])
+        query = query + " AND run_time >= ? ORDER BY run_time DESC"
+        params.append(since)
+
+        return self.connection.execute(query, params).fetchall()
+
+    ######################################################################################################
+    # Any other question
+    # params:   sql, params
+    # returns:  rows
+    ######################################################################################################
+    def query(self, sql, params=()):
+        return self.connection.execute(sql, params).fetchall()
+
+    ######################################################################################################
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def close(self):
+        self.connection.close()
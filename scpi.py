@@ -0,0 +1,147 @@
+## Raw SCPI access to the hw_qa_tools instrument wrappers.
+## The SignalGenerator / SignalAnalyzer wrappers only expose the high level set_* / get_* calls, so anything
+## that needs *OPC? or a custom command goes through the helpers in here.
+
+
+# Attribute names the underlying pyvisa resource is looked up under
+VISA_ATTRIBUTES = ('inst', 'instrument', 'resource', 'visa', 'device')
+
+
+##########################################################################################################
+# Find the object that can take raw SCPI writes and queries for an instrument wrapper
+# Returns None when the wrapper does not expose one
+# params:   instrument
+# returns:  resource
+##########################################################################################################
+def visa_resource(instrument):
+
+    # The wrapper itself may already forward write / query
+    if hasattr(instrument, 'write') and hasattr(instrument, 'query'):
+        return instrument
+
+    # Otherwise look for the pyvisa resource it holds
+    for name in VISA_ATTRIBUTES:
+        resource = getattr(instrument, name, None)
+        if resource is not None and hasattr(resource, 'write') and hasattr(resource, 'query'):
+            return resource
+
+    return None
+
+
+##########################################################################################################
+# Check if raw SCPI can be sent to the instrument
+# params:   instrument
+# returns:  True / False
+##########################################################################################################
+def supports_scpi(instrument):
+    return visa_resource(instrument) is not None
+
+
+##########################################################################################################
+# Send a raw SCPI command
+# params:   instrument, command
+# returns:  none
+##########################################################################################################
+def write(instrument, command):
+
+    resource = visa_resource(instrument)
+    if resource is None:
+        raise AttributeError('{} does not expose a SCPI resource'.format(type(instrument).__name__))
+
+    resource.write(command)
+
+    # Let a caching proxy know its settings may have changed
+    written = getattr(instrument, 'scpi_written', None)
+    if written is not None:
+        written(command)
+
+
+##########################################################################################################
+# Send a raw SCPI query and return the stripped reply
+# The VISA timeout is changed for this query only when timeout_s is given
+# params:   instrument, command, timeout_s
+# returns:  reply
+##########################################################################################################
+def query(instrument, command, timeout_s=None):
+
+    resource = visa_resource(instrument)
+    if resource is None:
+        raise AttributeError('{} does not expose a SCPI resource'.format(type(instrument).__name__))
+
+    # pyvisa keeps its timeout in ms
+    old_timeout = getattr(resource, 'timeout', None)
+    if timeout_s is not None and old_timeout is not None:
+        resource.timeout = timeout_s * 1e3
+
+    try:
+        reply = resource.query(command)
+    finally:
+        if timeout_s is not None and old_timeout is not None:
+            resource.timeout = old_timeout
+
+    return str(reply).strip()
+
+
+##########################################################################################################
+# Strip the IEEE 488.2 definite length header ('#' <digits> <length>) off a binary block
+# params:   raw
+# returns:  payload bytes
+##########################################################################################################
+def block_payload(raw):
+
+    start = raw.find(b'#')
+    if start < 0:
+        raise ValueError('No binary block header in reply')
+
+    digits = int(raw[start + 1:start + 2])
+    if digits == 0:
+        # Indefinite length block, runs to the terminator
+        return raw[start + 2:].rstrip(b'\r\n')
+
+    length = int(raw[start + 2:start + 2 + digits])
+    payload = raw[start + 2 + digits:start + 2 + digits + length]
+    if len(payload) != length:
+        raise ValueError('Binary block is {} bytes, header says {}'.format(len(payload), length))
+
+    return payload
+
+
+##########################################################################################################
+# Send a query that answers with a binary block and return the block payload
+# params:   instrument, command, timeout_s
+# returns:  payload bytes
+##########################################################################################################
+def query_block(instrument, command, timeout_s=None):
+
+    resource = visa_resource(instrument)
+    if resource is None or not hasattr(resource, 'read_raw'):
+        raise AttributeError('{} does not expose a raw SCPI resource'.format(type(instrument).__name__))
+
+    old_timeout = getattr(resource, 'timeout', None)
+    if timeout_s is not None and old_timeout is not None:
+        resource.timeout = timeout_s * 1e3
+
+    try:
+        resource.write(command)
+        raw = resource.read_raw()
+    finally:
+        if timeout_s is not None and old_timeout is not None:
+            resource.timeout = old_timeout
+
+    return block_payload(raw)
+
+
+##########################################################################################################
+# Identification string of an instrument for the records
+# params:   instrument
+# returns:  *IDN? reply, None when the instrument cannot be asked
+##########################################################################################################
+def identify(instrument):
+
+    if not supports_scpi(instrument):
+        return None
+
+    try:
+        return query(instrument, '*IDN?')
+    except Exception:
+        return None
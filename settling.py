@@ -0,0 +1,169 @@
+## Settling for the sweep loops.
+## Replaces the fixed time.sleep() after every instrument write with an *OPC? wait, and the single marker read
+## with repeated reads until the power stops moving. Anything that fails falls back to the old fixed delay.
+
+import threading
+import time
+
+import scpi
+
+
+# Per command timeouts (s) for the *OPC? wait and the power convergence
+DEFAULT_TIMEOUTS_S = {
+    'set_frequency': 5,
+    'set_amplitude': 2,
+    'set_span': 5,
+    'set_rbw': 5,
+    'set_marker': 2,
+    'sweep': 10,
+    'list': 10,
+    'get_power': 5,
+    'default': 5,
+}
+
+
+##########################################################################################################
+# Waits for the instruments to settle after each command
+# mode 'fixed' keeps the old time.sleep() behaviour, mode 'adaptive' waits on *OPC? and power convergence
+##########################################################################################################
+class Settler:
+
+    ######################################################################################################
+    # params:   mode, timeouts_s, tolerance_db, max_reads, poll_interval_s
+    ######################################################################################################
+    def __init__(self, mode='adaptive', timeouts_s=None, tolerance_db=0.05, max_reads=10, poll_interval_s=0.05):
+
+        if mode not in ('fixed', 'adaptive'):
+            raise ValueError("Invalid settle mode '{}'".format(mode))
+
+        self.mode = mode
+        self.timeouts_s = dict(DEFAULT_TIMEOUTS_S)
+        if timeouts_s is not None:
+            self.timeouts_s.update(timeouts_s)
+        self.tolerance_db = tolerance_db
+        self.max_reads = max_reads
+        self.poll_interval_s = poll_interval_s
+
+        # Bookkeeping
+        self.waits = 0
+        self.skipped = 0
+        self.fallbacks = 0
+        self.wait_time_s = 0
+        self.lock = threading.Lock()  # waits can run on the dispatch threads
+
+    ######################################################################################################
+    # Timeout for a command, falling back to the default entry
+    # params:   command
+    # returns:  timeout_s
+    ######################################################################################################
+    def timeout(self, command):
+        return self.timeouts_s.get(command, self.timeouts_s['default'])
+
+    ######################################################################################################
+    # Wait for the instrument to finish the last command
+    # Uses *OPC? when available, otherwise (or on error / timeout) sleeps the fixed delay
+    # Nothing to wait for when a caching proxy dropped the write
+    # params:   instrument, command, fallback_s
+    # returns:  none
+    ######################################################################################################
+    def wait(self, instrument, command, fallback_s):
+
+        if command.startswith('set_') and not getattr(instrument, 'unsettled', True):
+            with self.lock:
+                self.skipped = self.skipped + 1
+            return
+
+        start = time.time()
+        fallback = False
+
+        if self.mode == 'fixed' or not scpi.supports_scpi(instrument):
+            time.sleep(fallback_s)
+
+        else:
+            try:
+                reply = scpi.query(instrument, '*OPC?', self.timeout(command))
+                complete = reply.startswith('1')
+            except Exception:
+                complete = False
+
+            if not complete:
+                # Only top up to the old fixed delay
+                fallback = True
+                time.sleep(max(0, fallback_s - (time.time() - start)))
+
+        if hasattr(instrument, 'unsettled'):
+            instrument.unsettled = False
+
+        self._record(start, fallback, wait=True)
+
+    ######################################################################################################
+    # Send a batched transaction, the *OPC? at the end of the message is the settle
+    # params:   transaction, commands (method names in the transaction, for the timeout)
+    # returns:  True if the instrument settled, False if the message failed and the commands need resending
+    ######################################################################################################
+    def commit(self, transaction, commands):
+
+        start = time.time()
+        try:
+            transaction.commit(max(self.timeout(command) for command in commands))
+        except Exception:
+            return False
+
+        self._record(start, False, wait=True)
+
+        return True
+
+    ######################################################################################################
+    # Read the marker power
+    # In adaptive mode the marker is read until two successive readings agree within tolerance_db
+    # params:   specan, marker
+    # returns:  power_dbm
+    ######################################################################################################
+    def read_power(self, specan, marker):
+
+        if self.mode == 'fixed':
+            return specan.get_power(marker)
+
+        start = time.time()
+        fallback = False
+        previous = specan.get_power(marker)
+
+        for i in range(1, self.max_reads):
+            if time.time() - start > self.timeout('get_power'):
+                fallback = True
+                break
+
+            time.sleep(self.poll_interval_s)
+            current = specan.get_power(marker)
+
+            if abs(current - previous) <= self.tolerance_db:
+                previous = current
+                break
+
+            previous = current
+
+        self._record(start, fallback, wait=False)
+
+        return previous
+
+    ######################################################################################################
+    # Update the bookkeeping
+    # params:   start, fallback, wait
+    # returns:  none
+    ######################################################################################################
+    def _record(self, start, fallback, wait):
+        with self.lock:
+            if wait:
+                self.waits = self.waits + 1
+            if fallback:
+                self.fallbacks = self.fallbacks + 1
+            self.wait_time_s = self.wait_time_s + time.time() - start
+
+    ######################################################################################################
+    # Summary of the time spent settling
+    # params:   none
+    # returns:  summary string
+    ######################################################################################################
+    def summary(self):
+        return "Settle mode {}: {} waits, {} skipped, {} fallbacks, {:.1f} s waiting".format(
+            self.mode, self.waits, self.skipped, self.fallbacks, self.wait_time_s)
@@ -0,0 +1,96 @@
+## Streaming worksheet output for the constant_memory workbook.
+## In constant_memory mode xlsxwriter writes a row out to disk as soon as a later row is started and drops anything
+## written to a row it has already passed, so memory stays flat however long the sweep runs and workbook.close()
+## has nothing left to build. The sweeps measure in planned order rather than row order, so SheetWriter holds the
+## cells of each row and writes the row with one write_row call once it is ended and every row above it is out.
+## Rows that are never ended go out in order on close().
+
+
+##########################################################################################################
+# Row buffer in front of one worksheet, takes the same write / write_row calls
+##########################################################################################################
+class SheetWriter:
+
+    ######################################################################################################
+    # params:   worksheet
+    ######################################################################################################
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+        # {row: {col: value}} not written out yet, rows above next_row are out
+        self.rows = {}
+        self.ended = set()
+        self.next_row = 0
+
+    ######################################################################################################
+    # Catch writes that constant_memory would drop without a word
+    # params:   row
+    # returns:  none
+    ######################################################################################################
+    def _check(self, row):
+        if row < self.next_row:
+            raise ValueError("Row {} of {} is already written out".format(row, self.worksheet.name))
+
+    ######################################################################################################
+    # params:   row, col, value
+    # returns:  none
+    ######################################################################################################
+    def write(self, row, col, value):
+        self._check(row)
+        self.rows.setdefault(row, {})[col] = value
+
+    ######################################################################################################
+    # params:   row, col (first column), data
+    # returns:  none
+    ######################################################################################################
+    def write_row(self, row, col, data):
+        self._check(row)
+        cells = self.rows.setdefault(row, {})
+        for offset in range(0, len(data)):
+            cells[col + offset] = data[offset]
+
+    ######################################################################################################
+    # Nothing more goes in this row, write out every ended row from the top down
+    # params:   row
+    # returns:  none
+    ######################################################################################################
+    def end_row(self, row):
+        self._check(row)
+        self.ended.add(row)
+
+        while self.next_row in self.ended:
+            self.ended.discard(self.next_row)
+            self._flush(self.next_row)
+            self.next_row = self.next_row + 1
+
+    ######################################################################################################
+    # One write_row call for the buffered cells of a row, gaps go in as blanks (which xlsxwriter skips)
+    # params:   row
+    # returns:  none
+    ######################################################################################################
+    def _flush(self, row):
+
+        cells = self.rows.pop(row, None)
+        if not cells:
+            return
+
+        first, last = min(cells), max(cells)
+        self.worksheet.write_row(row, first, [cells.get(col) for col in range(first, last + 1)])
+
+    ######################################################################################################
+    # Write out whatever is left in row order, call before workbook.close()
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def close(self):
+
+        for row in sorted(self.rows):
+            self._flush(row)
+            self.next_row = row + 1
+        self.ended = set()
+
+    # Anything else (set_column, name, ...) goes to the worksheet
+    def __getattr__(self, name):
+        if name == 'worksheet':
+            raise AttributeError(name)
+        return getattr(self.worksheet, name)
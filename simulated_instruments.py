@@ -0,0 +1,767 @@
+## Simulated stand-ins for the hw_qa_tools SignalGenerator / SignalAnalyzer.
+## They take the same calls as the real wrappers plus raw write / query, sleep a configurable command latency,
+## and only report a settled power once the settle time after the last change has passed.
+## MixerModel is the simulated DUT between the generators and the analyzer, SimulatedBench builds the boxes
+## for main() by address.
+
+import math
+import random
+import struct
+import time
+
+
+##########################################################################################################
+# Common behaviour of the simulated boxes: command latency, settling and *OPC?
+##########################################################################################################
+class SimulatedInstrument:
+
+    ######################################################################################################
+    # params:   name, latency_s, settle_s
+    ######################################################################################################
+    def __init__(self, name, latency_s=0.002, settle_s=0.05):
+        self.name = name
+        self.latency_s = latency_s
+        self.settle_s = settle_s
+        self.settled_at = 0
+        self.timeout = 2000  # ms, same as a pyvisa resource
+        self.log = []
+
+    # Every command costs one round trip
+    def _command(self, command):
+        self.log.append(command)
+        time.sleep(self.latency_s)
+
+    # A setting changed, restart the settle time
+    def _changed(self):
+        self.settled_at = time.time() + self.settle_s
+
+    # Time the instrument is busy until, *OPC? blocks until then
+    def busy_until(self):
+        return self.settled_at
+
+    def write(self, command):
+        self._command(command)
+        self._execute(command)
+
+    def query(self, command):
+        self._command(command)
+        replies = self._execute(command)
+        if not replies:
+            raise ValueError('{} got no reply to {}'.format(self.name, command))
+        return ';'.join(replies)
+
+    ######################################################################################################
+    # Run every ';' separated command of a message and collect the query replies
+    # params:   message
+    # returns:  replies
+    ######################################################################################################
+    def _execute(self, message):
+
+        replies = []
+        for part in message.split(';'):
+            part = part.strip().lstrip(':')
+            if not part:
+                continue
+
+            header, _, argument = part.partition(' ')
+            reply = self.handle(header.upper(), argument.strip())
+            if reply is not None:
+                replies.append(reply)
+
+        return replies
+
+    ######################################################################################################
+    # Handle one SCPI command, returns the reply for queries
+    # params:   header, argument
+    # returns:  reply or None
+    ######################################################################################################
+    def handle(self, header, argument):
+
+        if header == '*RST':
+            self._changed()
+            return None
+
+        if header == '*IDN?':
+            return 'Simulated,{},0,1.0'.format(self.name)
+
+        if header in ('*OPC?', '*WAI'):
+            remaining = self.busy_until() - time.time()
+            if remaining > self.timeout / 1e3:
+                time.sleep(self.timeout / 1e3)
+                raise TimeoutError('{} {} timed out'.format(self.name, header))
+            if remaining > 0:
+                time.sleep(remaining)
+            return '1' if header == '*OPC?' else None
+
+        raise ValueError('{} does not understand {}'.format(self.name, header))
+
+
+##########################################################################################################
+# Simulated MXG
+##########################################################################################################
+class SimulatedSignalGenerator(SimulatedInstrument):
+
+    def __init__(self, name, latency_s=0.002, settle_s=0.05):
+        SimulatedInstrument.__init__(self, name, latency_s, settle_s)
+        self.frequency_hz = 1e9
+        self.amplitude_dbm = -130
+        self.output = False
+
+        # List sweep memory
+        self.frequency_mode = 'CW'
+        self.power_mode = 'CW'
+        self.list_frequencies_hz = []
+        self.list_amplitudes_dbm = []
+        self.list_dwell_s = 0.002
+        self.list_trigger = 'IMM'
+        self.list_started_at = None
+
+    def set_frequency(self, frequency_hz):
+        self._command('FREQ {}'.format(frequency_hz))
+        self.frequency_hz = frequency_hz
+        self._changed()
+
+    def set_amplitude(self, amplitude_dbm):
+        self._command('POW {}'.format(amplitude_dbm))
+        self.amplitude_dbm = amplitude_dbm
+        self._changed()
+
+    def on(self):
+        self._command('OUTP ON')
+        self.output = True
+        self._changed()
+
+    def off(self):
+        self._command('OUTP OFF')
+        self.output = False
+        self._changed()
+
+    ######################################################################################################
+    # Frequency / amplitude the output is at, in CW or at one step of the loaded list
+    # params:   step (None for the CW setting)
+    # returns:  frequency_hz, amplitude_dbm
+    ######################################################################################################
+    def state(self, step=None):
+        if step is None or self.frequency_mode != 'LIST':
+            return self.frequency_hz, self.amplitude_dbm
+        return self.list_frequencies_hz[step], self.list_amplitudes_dbm[step]
+
+    # Busy while a started list is still stepping
+    def busy_until(self):
+        return max(self.settled_at, self.list_end())
+
+    ######################################################################################################
+    # Time the started list finishes stepping, 0 when no list is running
+    # params:   none
+    # returns:  time
+    ######################################################################################################
+    def list_end(self):
+        if self.list_started_at is None:
+            return 0
+        return self.list_started_at + len(self.list_frequencies_hz) * self.list_dwell_s
+
+    def handle(self, header, argument):
+
+        if header == 'FREQ':
+            self.frequency_hz = float(argument)
+            self._changed()
+            return None
+
+        if header == 'POW':
+            self.amplitude_dbm = float(argument)
+            self._changed()
+            return None
+
+        if header == 'OUTP':
+            self.output = argument.upper() in ('ON', '1')
+            self._changed()
+            return None
+
+        if header == 'LIST:TYPE':
+            return None
+
+        if header == 'LIST:FREQ':
+            self.list_frequencies_hz = [float(value) for value in argument.split(',')]
+            return None
+
+        if header == 'LIST:POW':
+            self.list_amplitudes_dbm = [float(value) for value in argument.split(',')]
+            return None
+
+        if header == 'LIST:DWEL':
+            self.list_dwell_s = float(argument)
+            return None
+
+        if header == 'LIST:TRIG:SOUR':
+            self.list_trigger = argument.upper()
+            return None
+
+        if header == 'INIT:CONT':
+            return None
+
+        if header in ('FREQ:MODE', 'POW:MODE'):
+            mode = 'LIST' if argument.upper() == 'LIST' else 'CW'
+            if header == 'FREQ:MODE':
+                self.frequency_mode = mode
+            else:
+                self.power_mode = mode
+            self.list_started_at = None
+            self._changed()
+            return None
+
+        if header == 'INIT':
+            if self.frequency_mode != 'LIST' or self.power_mode != 'LIST':
+                raise ValueError('{} started without list mode on'.format(self.name))
+            if len(self.list_frequencies_hz) != len(self.list_amplitudes_dbm):
+                raise ValueError('{} frequency and power lists differ in length'.format(self.name))
+            self.list_started_at = time.time()
+            return None
+
+        return SimulatedInstrument.handle(self, header, argument)
+
+
+##########################################################################################################
+# Simulated FSV
+# The marker reads level_dbm plus a small noise once the analyzer and every source have settled and a sweep
+# has run. Before that the reading is off by up to transient_db.
+##########################################################################################################
+class SimulatedSignalAnalyzer(SimulatedInstrument):
+
+    ######################################################################################################
+    # params:   name, sources, level_dbm, latency_s, settle_s, sweep_time_s, transient_db, noise_db, seed,
+    #           dut (MixerModel, the sources are then the DUT's), danl_dbm_hz,
+    #           swept (sweep time follows span / RBW^2 like a swept analyzer, sweep_time_s is then the shortest)
+    ######################################################################################################
+    def __init__(self, name, sources=(), level_dbm=-30, latency_s=0.002, settle_s=0.02, sweep_time_s=0.05,
+                 transient_db=3, noise_db=0.01, seed=0, dut=None, danl_dbm_hz=-150, swept=False):
+        SimulatedInstrument.__init__(self, name, latency_s, settle_s)
+        self.dut = dut
+        self.sources = dut.sources if dut is not None else list(sources)
+        self.level_dbm = level_dbm
+        self.danl_dbm_hz = danl_dbm_hz
+        self.sweep_time_s = sweep_time_s
+        self.swept = swept
+        self.transient_db = transient_db
+        self.noise_db = noise_db
+        self.random = random.Random(seed)
+
+        self.frequency_hz = 1e9
+        self.span_hz = 1e8
+        self.rbw_hz = 1e6
+        self.vbw_hz = 3e6
+        self.detector = 'POS'
+        self.manual_sweep_time_s = None
+        self.markers = {}
+        self.marker_states = {}
+        self.continuous = True
+        self.sweep_end = 0
+        self.sweep_points = 691
+        self.pending_block = None
+
+        # List power measurement
+        self.list_trigger = 'IMM'
+        self.list_frequencies_hz = []
+        self.list_armed_at = None
+
+    def preset(self):
+        self.write('*RST')
+        self.markers = {}
+        self.marker_states = {}
+        self.continuous = True
+
+    def set_frequency(self, frequency_hz):
+        self._command('FREQ:CENT {}'.format(frequency_hz))
+        self.frequency_hz = frequency_hz
+        self._changed()
+
+    def set_span(self, span_hz):
+        self._command('FREQ:SPAN {}'.format(span_hz))
+        self.span_hz = span_hz
+        self._changed()
+
+    def set_rbw(self, rbw_hz):
+        self._command('BAND {}'.format(rbw_hz))
+        self.rbw_hz = rbw_hz
+        self._changed()
+
+    def set_marker_state(self, marker, state):
+        self._command('CALC:MARK{} {}'.format(marker, state))
+        self.marker_states[marker] = state
+
+    def set_marker(self, marker, frequency_hz):
+        self._command('CALC:MARK{}:X {}'.format(marker, frequency_hz))
+        self.markers[marker] = frequency_hz
+
+    ######################################################################################################
+    # Time one sweep takes with the current span / RBW / VBW
+    # params:   none
+    # returns:  sweep_time_s
+    ######################################################################################################
+    def sweep_duration(self):
+
+        if not self.swept:
+            return self.sweep_time_s
+        if self.manual_sweep_time_s is not None:
+            return max(self.sweep_time_s, self.manual_sweep_time_s)
+
+        return max(self.sweep_time_s, 2.5 * self.span_hz / (self.rbw_hz * min(self.rbw_hz, self.vbw_hz)))
+
+    ######################################################################################################
+    # Time a reading is valid from: last change on any box plus one sweep
+    # params:   none
+    # returns:  time
+    ######################################################################################################
+    def valid_at(self):
+        last_change = max([self.settled_at] + [source.settled_at for source in self.sources])
+        return last_change + self.sweep_duration()
+
+    ######################################################################################################
+    # Power the marker would read if everything has settled
+    # params:   marker
+    # returns:  power_dbm
+    ######################################################################################################
+    def marker_level(self, marker):
+
+        # Zero span markers sit on a time, they read the centre frequency
+        if self.span_hz == 0:
+            return self.level_at(self.frequency_hz)
+
+        return self.level_at(self.markers.get(marker, self.frequency_hz))
+
+    ######################################################################################################
+    # Settled power the analyzer sees at a frequency, with the sources at their CW setting or at a list step
+    # Without a DUT every frequency reads level_dbm. With one, the DUT output tones go through a gaussian RBW
+    # filter on top of the noise floor, tones within width_hz / 2 read at full level (peak detector on a bin)
+    # params:   frequency_hz, step, width_hz
+    # returns:  power_dbm
+    ######################################################################################################
+    def level_at(self, frequency_hz, step=None, width_hz=0):
+
+        if self.dut is None:
+            return self.level_dbm
+
+        return self.filtered_level(frequency_hz, self.dut.output_tones(step), width_hz)
+
+    ######################################################################################################
+    # Noise floor plus every tone through the RBW filter
+    # params:   frequency_hz, tones [(frequency_hz, power_dbm)], width_hz
+    # returns:  power_dbm
+    ######################################################################################################
+    def filtered_level(self, frequency_hz, tones, width_hz=0):
+
+        total_mw = 10 ** ((self.danl_dbm_hz + 10 * math.log10(self.rbw_hz)) / 10)
+        for tone_hz, power_dbm in tones:
+            offset_hz = max(0, abs(tone_hz - frequency_hz) - width_hz / 2)
+            filter_db = 3.01 * (2 * offset_hz / self.rbw_hz) ** 2
+            if filter_db < 200:
+                total_mw = total_mw + 10 ** ((power_dbm - filter_db) / 10)
+
+        return 10 * math.log10(total_mw)
+
+    ######################################################################################################
+    # Trace as the analyzer would send it, same transient as the markers
+    # params:   none
+    # returns:  trace_dbm
+    ######################################################################################################
+    def trace(self):
+
+        bin_hz = self.span_hz / (self.sweep_points - 1)
+        tones = self.dut.output_tones() if self.dut is not None else None
+
+        trace_dbm = []
+        for point in range(0, self.sweep_points):
+            frequency_hz = self.frequency_hz - self.span_hz / 2 + point * bin_hz
+            if tones is None:
+                level_dbm = self.level_at(frequency_hz)
+            else:
+                level_dbm = self.filtered_level(frequency_hz, tones, bin_hz)
+            trace_dbm.append(level_dbm + self.random.gauss(0, self.noise_db))
+
+        remaining = self.valid_at() - time.time()
+        if remaining > 0:
+            offset = self.transient_db * min(1, remaining / max(self.sweep_duration(), 1e-9))
+            trace_dbm = [power - offset for power in trace_dbm]
+
+        return trace_dbm
+
+    # Binary block replies are picked up with read_raw, like a pyvisa resource
+    def read_raw(self):
+        block, self.pending_block = self.pending_block, None
+        if block is None:
+            raise TimeoutError('{} has nothing to read'.format(self.name))
+        return block
+
+    # *OPC? also waits for a triggered single sweep or list measurement
+    def busy_until(self):
+        return max(self.settled_at, self.sweep_end, self.list_end())
+
+    ######################################################################################################
+    # Sources stepping through a list, the master runs on its own timer, the others on its trigger
+    # params:   none
+    # returns:  master, slaves
+    ######################################################################################################
+    def list_sources(self):
+
+        stepping = [source for source in self.sources if getattr(source, 'frequency_mode', 'CW') == 'LIST']
+        masters = [source for source in stepping if source.list_trigger == 'IMM']
+        if len(masters) != 1:
+            raise RuntimeError('{} expects one list master, found {}'.format(self.name, len(masters)))
+
+        return masters[0], [source for source in stepping if source is not masters[0]]
+
+    ######################################################################################################
+    # Time the armed list measurement takes its last reading, never when nothing triggers it
+    # params:   none
+    # returns:  time
+    ######################################################################################################
+    def list_end(self):
+
+        if self.list_armed_at is None:
+            return 0
+        if self.list_trigger != 'EXT':
+            return self.list_armed_at + len(self.list_frequencies_hz) * self.sweep_time_s
+
+        master, slaves = self.list_sources()
+        if master.list_started_at is None:
+            return float('inf')
+        return master.list_end()
+
+    ######################################################################################################
+    # Readings of a finished list measurement, checks the boxes were started in the right order
+    # params:   none
+    # returns:  powers_dbm
+    ######################################################################################################
+    def list_readings(self):
+
+        if self.list_armed_at is None:
+            raise RuntimeError('{} list results requested without a list measurement'.format(self.name))
+        if time.time() < self.list_end():
+            raise RuntimeError('{} list results requested before the list finished'.format(self.name))
+
+        steps = len(self.list_frequencies_hz)
+        master, slaves = self.list_sources()
+        if master.list_started_at < self.list_armed_at:
+            raise RuntimeError('{} started stepping before {} was armed'.format(master.name, self.name))
+        for source in [master] + slaves:
+            if len(source.list_frequencies_hz) != steps:
+                raise RuntimeError('{} list has {} steps, {} expects {}'.format(
+                    source.name, len(source.list_frequencies_hz), self.name, steps))
+        for source in slaves:
+            if source.list_started_at is None or source.list_started_at > master.list_started_at:
+                raise RuntimeError('{} was not waiting for the first trigger from {}'.format(source.name, master.name))
+
+        # Sources still moving when the trigger comes read low, same as a marker read taken too early
+        settle_s = max([self.settle_s] + [source.settle_s for source in [master] + slaves])
+        offset = self.transient_db * max(0, 1 - master.list_dwell_s / max(settle_s, 1e-9))
+
+        powers_dbm = []
+        for step, frequency_hz in enumerate(self.list_frequencies_hz):
+            power = self.level_at(frequency_hz, step) + self.random.gauss(0, self.noise_db) - offset
+            powers_dbm.append(round(power, 3))
+
+        self.list_armed_at = None
+
+        return powers_dbm
+
+    ######################################################################################################
+    # Marker reading, off by up to transient_db when taken before the sweep finished
+    # params:   marker
+    # returns:  power_dbm
+    ######################################################################################################
+    def marker_reading(self, marker):
+
+        power = self.marker_level(marker) + self.random.gauss(0, self.noise_db)
+
+        remaining = self.valid_at() - time.time()
+        if remaining > 0:
+            power = power - self.transient_db * min(1, remaining / max(self.sweep_duration(), 1e-9))
+
+        return round(power, 3)
+
+    def get_power(self, marker):
+        self._command('CALC:MARK{}:Y?'.format(marker))
+        return self.marker_reading(marker)
+
+    def handle(self, header, argument):
+
+        if header == 'INIT:CONT':
+            self.continuous = argument.upper() in ('ON', '1')
+            return None
+
+        if header in ('INIT', 'INIT:IMM'):
+            self.sweep_end = self.valid_at()
+            return None
+
+        if header == 'FORM':
+            return None
+
+        if header == 'FREQ:CENT':
+            self.frequency_hz = float(argument)
+            self._changed()
+            return None
+
+        if header == 'FREQ:SPAN':
+            self.span_hz = float(argument)
+            self._changed()
+            return None
+
+        if header in ('BAND', 'BWID'):
+            self.rbw_hz = float(argument)
+            self._changed()
+            return None
+
+        if header in ('BAND:VID', 'BWID:VID'):
+            self.vbw_hz = float(argument)
+            self._changed()
+            return None
+
+        if header == 'DET':
+            self.detector = argument.upper()
+            return None
+
+        if header == 'SWE:POIN':
+            self.sweep_points = int(float(argument))
+            return None
+
+        if header == 'SWE:TIME':
+            self.manual_sweep_time_s = float(argument)
+            return None
+
+        if header == 'SWE:TIME:AUTO':
+            if argument.upper() in ('ON', '1'):
+                self.manual_sweep_time_s = None
+            return None
+
+        if header == 'SWE:TIME?':
+            return str(self.sweep_duration())
+
+        if header == 'FREQ:STAR?':
+            return str(self.frequency_hz - self.span_hz / 2)
+
+        if header == 'FREQ:STOP?':
+            return str(self.frequency_hz + self.span_hz / 2)
+
+        if header == 'SWE:POIN?':
+            return str(self.sweep_points)
+
+        if header == 'TRAC?':
+            data = struct.pack('<{}f'.format(self.sweep_points), *self.trace())
+            length = str(len(data))
+            self.pending_block = '#{}{}'.format(len(length), length).encode() + data + b'\n'
+            return None
+
+        if header == 'LIST:POW:SET':
+            self.list_trigger = argument.split(',')[3].strip().upper()
+            return None
+
+        if header in ('LIST:POW', 'LIST:POW:SEQ'):
+            # Nine fields per entry, the first one is the frequency
+            fields = argument.split(',')
+            if len(fields) % 9:
+                raise ValueError('{} list entries need nine fields each'.format(self.name))
+            self.list_frequencies_hz = [float(value) for value in fields[0::9]]
+            self.list_armed_at = time.time()
+            return None
+
+        if header in ('LIST:POW:RES?', 'LIST:POW:RES'):
+            return ','.join(str(power) for power in self.list_readings())
+
+        if header.startswith('CALC:MARK'):
+            marker = int(header[len('CALC:MARK'):].split(':')[0] or 1)
+            if header.endswith(':X'):
+                self.markers[marker] = float(argument)
+                return None
+            if header.endswith(':Y?'):
+                return str(self.marker_reading(marker))
+            if header.endswith(':MAX'):
+                # Peak search, only used in zero span where every point of the trace is the centre frequency
+                self.markers[marker] = self.frequency_hz
+                return None
+            self.marker_states[marker] = argument
+            return None
+
+        return SimulatedInstrument.handle(self, header, argument)
+
+
+##########################################################################################################
+# Simulated mixer DUT
+# Input tones from the signal generators are mixed with lo_mult times the LO frequency. The wanted product
+# lands at |lo_mult * lo - f_in| with the conversion gain, the image at lo_mult * lo + f_in is image_rejection_db
+# lower. Compression follows a Rapp model set by the output P1dB, every pair of input tones gives IM3 products
+# set by the OIP3 and im3_slope, and the LO and input tones leak through with finite isolation.
+##########################################################################################################
+class MixerModel:
+
+    ######################################################################################################
+    # params:   lo_mult, gain_db, gain_slope_db_ghz, ripple_db, ripple_period_ghz, lo_drive_dbm, p1db_out_dbm,
+    #           rapp_smoothness, oip3_dbm, im3_slope, image_rejection_db, lo_isolation_db, input_isolation_db,
+    #           input_loss_db, output_loss_db, seed, thru (a thru in place of the board, see output_tones)
+    ######################################################################################################
+    def __init__(self, lo_mult=4, gain_db=-8, gain_slope_db_ghz=-0.1, ripple_db=0.5, ripple_period_ghz=3,
+                 lo_drive_dbm=12, p1db_out_dbm=-5, rapp_smoothness=2, oip3_dbm=5, im3_slope=3,
+                 image_rejection_db=25, lo_isolation_db=35, input_isolation_db=40, input_loss_db=0,
+                 output_loss_db=0, seed=0, thru=False):
+        self.lo_mult = lo_mult
+        self.gain_db = gain_db
+        self.gain_slope_db_ghz = gain_slope_db_ghz
+        self.ripple_db = ripple_db
+        self.ripple_period_ghz = ripple_period_ghz
+        self.lo_drive_dbm = lo_drive_dbm
+        self.p1db_out_dbm = p1db_out_dbm
+        self.rapp_smoothness = rapp_smoothness
+        self.oip3_dbm = oip3_dbm
+        self.im3_slope = im3_slope
+        self.image_rejection_db = image_rejection_db
+        self.lo_isolation_db = lo_isolation_db
+        self.input_isolation_db = input_isolation_db
+        self.input_loss_db = input_loss_db
+        self.output_loss_db = output_loss_db
+        self.thru = thru
+
+        # The seed picks where the gain ripple sits, a different seed is a different board
+        self.ripple_phase = random.Random(seed).uniform(0, 2 * math.pi)
+
+        # Saturated output power that puts the 1 dB compression point at p1db_out_dbm
+        s = rapp_smoothness
+        self.psat_mw = 10 ** ((p1db_out_dbm + 1) / 10) / (10 ** (0.1 * s) - 1) ** (1 / s)
+
+        # Filled in by SimulatedBench (or by hand): every generator, and the one of them driving the LO
+        self.sources = []
+        self.lo = None
+
+    ######################################################################################################
+    # Small signal conversion gain for an RF frequency and LO drive
+    # params:   rf_hz, lo_dbm
+    # returns:  gain_db
+    ######################################################################################################
+    def conversion_gain(self, rf_hz, lo_dbm):
+
+        rf_ghz = rf_hz / 1e9
+        gain_db = self.gain_db + self.gain_slope_db_ghz * (rf_ghz - 18)
+        gain_db = gain_db + self.ripple_db * math.sin(2 * math.pi * rf_ghz / self.ripple_period_ghz + self.ripple_phase)
+
+        # Starved LO, the gain drops dB for dB
+        return gain_db - max(0, self.lo_drive_dbm - lo_dbm)
+
+    ######################################################################################################
+    # Gain compression for a small signal output power
+    # params:   linear_out_dbm
+    # returns:  compression_db (positive)
+    ######################################################################################################
+    def compression(self, linear_out_dbm):
+        s = self.rapp_smoothness
+        ratio = 10 ** (linear_out_dbm / 10) / self.psat_mw
+        return 10 * math.log10(1 + ratio ** s) / s
+
+    ######################################################################################################
+    # Every tone at the DUT output, with the sources at their CW setting or at a list step
+    # params:   step
+    # returns:  [(frequency_hz, power_dbm)]
+    ######################################################################################################
+    def output_tones(self, step=None):
+
+        inputs = []
+        for source in self.sources:
+            if source is not self.lo and source.output:
+                frequency_hz, amplitude_dbm = source.state(step)
+                inputs.append((frequency_hz, amplitude_dbm - self.input_loss_db))
+
+        # A thru passes the inputs straight to the output, the LO port is left open
+        if self.thru:
+            return [(frequency_hz, power_dbm - self.output_loss_db) for frequency_hz, power_dbm in inputs]
+
+        tones = [(frequency_hz, power_dbm - self.input_isolation_db) for frequency_hz, power_dbm in inputs]
+        if self.lo is None or not self.lo.output:
+            return [(frequency_hz, power_dbm - self.output_loss_db) for frequency_hz, power_dbm in tones]
+
+        lo_hz, lo_dbm = self.lo.state(step)
+        lo_hz = lo_hz * self.lo_mult
+        tones.append((lo_hz, lo_dbm - self.lo_isolation_db))
+
+        # Compression is set by the total drive, the same for every tone
+        total_in_mw = sum(10 ** (power_dbm / 10) for frequency_hz, power_dbm in inputs)
+        if total_in_mw > 0:
+            # Gain is set by the frequency on the RF side, whichever of input and output is higher
+            input_hz = max(frequency_hz for frequency_hz, power_dbm in inputs)
+            rf_hz = max(input_hz, abs(lo_hz - input_hz))
+            gain_db = self.conversion_gain(rf_hz, lo_dbm)
+            gain_db = gain_db - self.compression(10 * math.log10(total_in_mw) + gain_db)
+
+            wanted = []
+            for frequency_hz, power_dbm in inputs:
+                wanted.append((frequency_hz, power_dbm + gain_db))
+                tones.append((abs(lo_hz - frequency_hz), power_dbm + gain_db))
+                tones.append((lo_hz + frequency_hz, power_dbm + gain_db - self.image_rejection_db))
+
+            # Third order products of every pair, 2 * f_a - f_b
+            for frequency_a_hz, power_a_dbm in wanted:
+                for frequency_b_hz, power_b_dbm in wanted:
+                    if frequency_a_hz == frequency_b_hz:
+                        continue
+                    power_dbm = self.im3_slope * (2 * power_a_dbm + power_b_dbm) / 3
+                    power_dbm = power_dbm - (self.im3_slope - 1) * self.oip3_dbm
+                    tones.append((abs(lo_hz - (2 * frequency_a_hz - frequency_b_hz)), power_dbm))
+
+        return [(frequency_hz, power_dbm - self.output_loss_db) for frequency_hz, power_dbm in tones]
+
+
+# Instrument timing for SimulatedBench: 'fast' runs at full speed, 'realtime' is close to the bench on the LAN
+# poll_interval_s is what the settler should poll the power reading at
+TIMINGS = {
+    'fast': {'latency_s': 0, 'generator_settle_s': 0, 'analyzer_settle_s': 0, 'sweep_time_s': 0,
+             'poll_interval_s': 0},
+    'realtime': {'latency_s': 0.002, 'generator_settle_s': 0.05, 'analyzer_settle_s': 0.02, 'sweep_time_s': 0.05,
+                 'poll_interval_s': 0.05},
+}
+
+
+##########################################################################################################
+# Drop-in replacement for SignalGenerator(address) / SignalAnalyzer(address) wired through one MixerModel
+# The generator opened at lo_address drives the LO, every other one drives the DUT input
+##########################################################################################################
+class SimulatedBench:
+
+    ######################################################################################################
+    # params:   lo_address, lo_mult, timing ('fast' / 'realtime'), seed, mixer (MixerModel parameters)
+    ######################################################################################################
+    def __init__(self, lo_address, lo_mult=4, timing='fast', seed=0, **mixer):
+
+        if timing not in TIMINGS:
+            raise ValueError("Invalid timing '{}'".format(timing))
+
+        self.lo_address = lo_address
+        self.timing = TIMINGS[timing]
+        self.seed = seed
+        self.dut = MixerModel(lo_mult=lo_mult, seed=seed, **mixer)
+
+    ######################################################################################################
+    # params:   address
+    # returns:  SimulatedSignalGenerator
+    ######################################################################################################
+    def generator(self, address):
+
+        mxg = SimulatedSignalGenerator(address, self.timing['latency_s'], self.timing['generator_settle_s'])
+        self.dut.sources.append(mxg)
+        if address == self.lo_address:
+            self.dut.lo = mxg
+
+        return mxg
+
+    ######################################################################################################
+    # Put a thru in place of the board, with these losses in front of it and behind it
+    # params:   input_loss_db, output_loss_db
+    # returns:  none
+    ######################################################################################################
+    def connect_thru(self, input_loss_db=0, output_loss_db=0):
+        self.dut.thru = True
+        self.dut.input_loss_db = input_loss_db
+        self.dut.output_loss_db = output_loss_db
+
+    ######################################################################################################
+    # params:   address
+    # returns:  SimulatedSignalAnalyzer
+    ######################################################################################################
+    def analyzer(self, address):
+        return SimulatedSignalAnalyzer(address, latency_s=self.timing['latency_s'],
+                                       settle_s=self.timing['analyzer_settle_s'],
+                                       sweep_time_s=self.timing['sweep_time_s'], seed=self.seed, dut=self.dut)
@@ -0,0 +1,236 @@
+## Closed loop source leveling.
+## The sweeps set a source to pin + input path loss and trust it, so any error in the loss or in the generator's
+## level accuracy goes straight into the gain. Leveling measures the power that actually arrives at the eval board
+## input (the reference plane) with a thru in place of the board, read on the analyzer through the output cable,
+## and steps the generator amplitude until it is within the tolerance of the target. What the amplitude had to
+## be moved by is kept per generator and frequency for each input path in a cache file per bench (a simulated
+## bench has its own file, see path_calibration.bench_name):
+##
+##   {"format": 1, "revision": 2, "board": "ADMV1139", "written": "2026-10-18T09:40:00",
+##    "paths": {"path1_loss_5": {"generator": "MXG2.ginger.shivnet", "freq_ghz": [...], "correction_db": [...],
+##                               "leveled": "..."}, ...}}
+##
+## A frequency already in the cache starts from its correction and only needs the read that confirms it, a new
+## one starts from the nearest frequency leveled on the same path. With source leveling on, main() adds the
+## corrections to the input path losses of every test.
+
+import datetime
+import json
+import os
+
+import numpy
+
+from loss_table import LossTable, loss_table
+
+
+# Version of the layout above
+LEVELING_FORMAT = 1
+
+
+##########################################################################################################
+# Leveling corrections of one bench, kept in a cache file
+##########################################################################################################
+class SourceLeveler:
+
+    ######################################################################################################
+    # params:   path (cache file, need not exist yet), board, tolerance_db, max_steps (reads per frequency),
+    #           max_correction_db (larger means a bad connection, not a level error)
+    ######################################################################################################
+    def __init__(self, path, board=None, tolerance_db=0.05, max_steps=6, max_correction_db=6):
+        self.path = path
+        self.board = board
+        self.tolerance_db = tolerance_db
+        self.max_steps = max_steps
+        self.max_correction_db = max_correction_db
+        self.revision = 0
+        self.written = None
+
+        # {name: {'generator', 'corrections': {freq_ghz: correction_db}, 'leveled'}}
+        self.paths = {}
+
+        # Reads taken and frequencies leveled since this was made
+        self.reads = 0
+        self.leveled = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path) as leveling_file:
+                stored = json.load(leveling_file)
+            if stored.get('format') != LEVELING_FORMAT:
+                raise ValueError("{} is leveling format {}, expected {}".format(
+                    path, stored.get('format'), LEVELING_FORMAT))
+            if board is not None and stored.get('board') not in (None, board):
+                raise ValueError("{} is the leveling of a {} bench, not {}".format(path, stored['board'], board))
+            self.revision = stored['revision']
+            self.written = stored.get('written')
+            for name, entry in stored['paths'].items():
+                self.paths[name] = {
+                    'generator': entry['generator'],
+                    'corrections': dict(zip(entry['freq_ghz'], entry['correction_db'])),
+                    'leveled': entry['leveled'],
+                }
+
+    ######################################################################################################
+    # Correction to start a frequency from: the cached one, else the one of the nearest leveled frequency
+    # params:   name (input path), generator (address), freq_ghz
+    # returns:  correction_db, cached (True when this frequency was leveled before)
+    ######################################################################################################
+    def correction(self, name, generator, freq_ghz):
+
+        entry = self.paths.get(name)
+        if entry is None or entry['generator'] != generator or not entry['corrections']:
+            return 0, False
+
+        nearest = min(entry['corrections'], key=lambda freq: abs(freq - freq_ghz))
+
+        return entry['corrections'][nearest], nearest == freq_ghz
+
+    ######################################################################################################
+    # Step the amplitude until the power at the reference plane is on target
+    # params:   name (input path), generator (address), freq_ghz, target_dbm, input_loss_db,
+    #           set_amplitude (amplitude_dbm -> none), read (-> power at the reference plane)
+    # returns:  correction_db, reads
+    ######################################################################################################
+    def level(self, name, generator, freq_ghz, target_dbm, input_loss_db, set_amplitude, read):
+
+        correction_db, cached = self.correction(name, generator, freq_ghz)
+
+        for step in range(1, self.max_steps + 1):
+            set_amplitude(target_dbm + input_loss_db + correction_db)
+            error_db = target_dbm - read()
+            if abs(error_db) <= self.tolerance_db:
+                break
+            correction_db = correction_db + error_db
+            if abs(correction_db) > self.max_correction_db:
+                raise ValueError("Leveling {} at {:g} GHz needs {:.1f} dB, more than {} dB, check the connection".format(
+                    name, freq_ghz, correction_db, self.max_correction_db))
+        else:
+            print("Leveling {} at {:g} GHz still {:.2f} dB off after {} reads".format(
+                name, freq_ghz, error_db, self.max_steps))
+
+        entry = self.paths.get(name)
+        if entry is None or entry['generator'] != generator:
+            # A different generator on the path, its corrections start over
+            entry = {'generator': generator, 'corrections': {}}
+            self.paths[name] = entry
+        entry['corrections'][freq_ghz] = correction_db
+        entry['leveled'] = datetime.datetime.now().isoformat(timespec='seconds')
+
+        self.reads = self.reads + step
+        self.leveled = self.leveled + 1
+
+        return correction_db, step
+
+    ######################################################################################################
+    # params:   name (input path), generator (address)
+    # returns:  LossTable of the corrections, None when the path was not leveled with this generator
+    ######################################################################################################
+    def table(self, name, generator):
+
+        entry = self.paths.get(name)
+        if entry is None or entry['generator'] != generator or not entry['corrections']:
+            return None
+
+        freq_ghz = sorted(entry['corrections'])
+        return LossTable(freq_ghz, [entry['corrections'][freq] for freq in freq_ghz], name + ' leveling')
+
+    ######################################################################################################
+    # Input path loss with the leveling corrections on top, as it is when the path was not leveled
+    # params:   name (input path), generator (address), loss
+    # returns:  LossTable or loss
+    ######################################################################################################
+    def apply(self, name, generator, loss):
+
+        table = self.table(name, generator)
+        if table is None:
+            print("Source leveling: {} was not leveled with {}, using its loss alone".format(name, generator))
+            return loss
+
+        return loss_table(loss, name) + table
+
+    ######################################################################################################
+    # Store the corrections as the next revision, the file is replaced in one step
+    # params:   none
+    # returns:  revision
+    ######################################################################################################
+    def save(self):
+
+        self.revision = self.revision + 1
+        self.written = datetime.datetime.now().isoformat(timespec='seconds')
+
+        paths = {}
+        for name, entry in self.paths.items():
+            freq_ghz = sorted(entry['corrections'])
+            paths[name] = {
+                'generator': entry['generator'],
+                'freq_ghz': freq_ghz,
+                'correction_db': [entry['corrections'][freq] for freq in freq_ghz],
+                'leveled': entry['leveled'],
+            }
+
+        stored = {
+            'format': LEVELING_FORMAT,
+            'revision': self.revision,
+            'board': self.board,
+            'written': self.written,
+            'paths': paths,
+        }
+        with open(self.path + '.tmp', 'w') as leveling_file:
+            json.dump(stored, leveling_file, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+        return self.revision
+
+
+##########################################################################################################
+# Level every input path, the operator moves the thru between them
+# params:   paths ({name: {'generator': role, 'freq_ghz', 'loss', 'output_loss'}}), generators ({role: mxg}),
+#           addresses ({role: address}), specan, settler, dispatcher, leveler, level_dbm,
+#           connect (called with the path name, returns once the thru is in place)
+# returns:  {name: LossTable of the corrections}
+##########################################################################################################
+def level_paths(paths, generators, addresses, specan, settler, dispatcher, leveler, level_dbm=-10, connect=None):
+
+    if connect is None:
+        connect = prompt_connection
+
+    tables = {}
+    for name in sorted(paths):
+        role = paths[name]['generator']
+        generator = generators[role]
+        input_loss = loss_table(paths[name]['loss'], name)
+        output_loss = loss_table(paths[name]['output_loss'])
+        freq_ghz = sorted(set(float(freq) for freq in paths[name]['freq_ghz']))
+
+        connect(name)
+        generator.on()
+
+        reads = 0
+        for freq in freq_ghz:
+            dispatcher.tune([
+                (generator, 'set_frequency', (freq * 1e9,), 0.5),
+                (specan, 'set_frequency', (freq * 1e9,), 0.5),
+                (specan, 'set_marker', (1, freq * 1e9), 0.5),
+            ])
+            output_loss_db = output_loss.loss(freq)
+            correction_db, steps = leveler.level(
+                name, addresses[role], freq, level_dbm, input_loss.loss(freq),
+                lambda amplitude_dbm: dispatcher.tune([(generator, 'set_amplitude', (amplitude_dbm,), 0.5)]),
+                lambda: settler.read_power(specan, 1) + output_loss_db)
+            reads = reads + steps
+
+        generator.off()
+
+        tables[name] = leveler.table(name, addresses[role])
+        print("{}: {} points, {} reads, corrections {:.2f} to {:.2f} dB".format(
+            name, len(freq_ghz), reads, min(tables[name].loss_db), max(tables[name].loss_db)))
+
+    return tables
+
+
+##########################################################################################################
+# Ask the operator to move the thru
+# params:   name (input path)
+# returns:  none
+##########################################################################################################
+def prompt_connection(name):
+    input("Connect the far end of {} through the thru to the output cable, then press Enter".format(name))
@@ -0,0 +1,728 @@
+## Declarative sweep engine.
+## Every test is a spec: the swept dimensions in report order, the values derived from them (the LO), the sources
+## and the point value each one follows, the analyzer, what is measured at a point and the metrics, sheet columns
+## and result store columns worked out from each reading. compile_sweep turns a spec into a plan (every point, the
+## order with the fewest retunes, the path loss and source level of every point at once) and run_sweep runs the
+## plan with the shared machinery: batched concurrent retunes through the dispatcher, the list sweep fast path,
+## the pipeline thread, the record log and resume. A new optimization goes in here once and every test gets it.
+##
+##   spec = {
+##       'test': 'UPCONVERT',
+##       'dimensions': [('if', if_freq), ('rf', rf_freq)],        # report order, outer first
+##       'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+##       'sources': [                                              # the first one drives the board input
+##           {'instrument': if_mxg, 'frequency': 'if', 'level': if_pin, 'loss': if_loss, 'pin': 'pin'},
+##           {'instrument': lo_mxg, 'frequency': 'lo', 'level': lo_pin, 'loss': lo_loss, 'pin': 'lo_pin',
+##            'cost': 'lo_frequency'},
+##       ],
+##       'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': rf_loss},
+##       'measure': 'tone',                                        # 'tone', 'two_tone' or 'compression'
+##       'metrics': TONE_METRICS,                                  # (name, value of the point values)
+##       'sheet': 'Up_Conversion',
+##       'columns': [('IF Frequency (GHz)', 'if'), ...],           # (header, point value)
+##       'store': TONE_STORE,                                      # (result store column, point value)
+##   }
+##
+## Source keys besides those: 'level' may name a dimension instead of a power, 'tone_offset' moves the frequency
+## by that many tone separations (two tone tests), 'cost' is the RETUNE_COSTS_S entry of a frequency change
+## ('source_frequency' by default) and 'fallback_s' the fixed settle of its commands (0.5 by default). The analyzer
+## takes 'sweep_wait_s' to wait for a sweep before reading. A compression test steps the first source over 'pins'
+## at every frequency point, or has 'search' (P1dbSearch) bracket the 1 dB point from the first source's level,
+## 'pin_label' heads the power column.
+## The point values are the point, its raw readings, the level of every source under its 'pin' name, input_loss
+## (first source path), output_loss (analyzer path) and the metrics in the order given.
+
+import itertools
+
+import numpy
+
+from compression import analyze_compression, stack_curves
+from dispatch import Dispatcher
+from loss_table import loss_table
+from pipeline import Pipeline
+from settling import Settler
+from sheet_writer import SheetWriter
+from sweep_planner import RETUNE_COSTS_S, plan_order, changed_keys
+from tone_readers import MarkerToneReader, ZeroSpanToneReader
+
+
+# Output power and gain of a single tone reading
+TONE_METRICS = [
+    ('pout', lambda values: values['raw_pout'] + values['output_loss']),
+    ('gain', lambda values: values['pout'] - values['pin']),
+]
+
+TONE_STORE = [
+    ('if_ghz', 'if'),
+    ('lo_ghz', 'lo'),
+    ('rf_ghz', 'rf'),
+    ('pin_dbm', 'pin'),
+    ('input_loss_db', 'input_loss'),
+    ('output_loss_db', 'output_loss'),
+    ('raw_pout_dbm', 'raw_pout'),
+    ('pout_dbm', 'pout'),
+    ('gain_db', 'gain'),
+]
+
+# Tone and IM3 powers of a two tone reading, the OIP3 of each side and their average
+TWO_TONE_METRICS = [
+    ('im_low', lambda values: values['raw_pout_im_low'] + values['output_loss']),
+    ('tone_low', lambda values: values['raw_pout_tone_low'] + values['output_loss']),
+    ('tone_high', lambda values: values['raw_pout_tone_high'] + values['output_loss']),
+    ('im_high', lambda values: values['raw_pout_im_high'] + values['output_loss']),
+    ('low_oip3', lambda values: values['tone_low'] + (values['raw_pout_tone_low'] - values['raw_pout_im_low']) / 2),
+    ('high_oip3', lambda values: values['tone_high'] + (values['raw_pout_tone_high'] - values['raw_pout_im_high']) / 2),
+    ('oip3', lambda values: (values['high_oip3'] + values['low_oip3']) / 2),
+    ('gain', lambda values: values['tone_low'] - values['pin']),
+    ('gain_high', lambda values: values['tone_high'] - values['pin']),
+]
+
+TWO_TONE_STORE = [
+    ('if_ghz', 'if'),
+    ('lo_ghz', 'lo'),
+    ('rf_ghz', 'rf'),
+    ('tone_mhz', 'tone'),
+    ('pin_dbm', 'pin'),
+    ('input_loss_db', 'input_loss'),
+    ('output_loss_db', 'output_loss'),
+    ('raw_pout_dbm', 'raw_pout_tone_low'),
+    ('raw_pout_high_dbm', 'raw_pout_tone_high'),
+    ('raw_im3_low_dbm', 'raw_pout_im_low'),
+    ('raw_im3_high_dbm', 'raw_pout_im_high'),
+    ('pout_dbm', 'tone_low'),
+    ('pout_high_dbm', 'tone_high'),
+    ('im3_low_dbm', 'im_low'),
+    ('im3_high_dbm', 'im_high'),
+    ('oip3_dbm', 'oip3'),
+    ('gain_db', 'gain'),
+]
+
+# Analyzer setup columns of a two tone point when the planner picks it
+ANALYZER_COLUMNS = [
+    ('Span (MHz)', lambda analyzer: analyzer['span_hz'] / 1e6),
+    ('RBW (kHz)', lambda analyzer: analyzer['rbw_hz'] / 1e3),
+    ('VBW (kHz)', lambda analyzer: analyzer['vbw_hz'] / 1e3),
+    ('Detector', lambda analyzer: analyzer['detector']),
+    ('Sweep Points', lambda analyzer: analyzer['points']),
+    ('Sweep Time (ms)', lambda analyzer: analyzer['sweep_time_s'] * 1e3),
+    ('Analyzer Mode', lambda analyzer: analyzer['mode']),
+]
+
+# Compression points under the power sweep, output powers get the output loss on the calibrated sheet
+SUMMARY_COLUMNS = [
+    ('IP1dB (dBm)', 'ip_dbm', 1, False),
+    ('OP1dB (dBm)', 'op_dbm', 1, True),
+    ('IP0.1dB (dBm)', 'ip_dbm', 0.1, False),
+    ('OP0.1dB (dBm)', 'op_dbm', 0.1, True),
+    ('IP3dB (dBm)', 'ip_dbm', 3, False),
+    ('OP3dB (dBm)', 'op_dbm', 3, True),
+    ('Psat (dBm)', 'psat_dbm', None, True),
+    ('Gain (dB)', 'gain_db', None, True),
+]
+
+
+##########################################################################################################
+# Point keys a source retunes its frequency on
+# params:   source
+# returns:  keys
+##########################################################################################################
+def frequency_keys(source):
+
+    if source.get('tone_offset'):
+        return [source['frequency'], 'tone']
+
+    return [source['frequency']]
+
+
+##########################################################################################################
+# Every measurement point in report order, the derived values worked out for each
+# params:   spec
+# returns:  points
+##########################################################################################################
+def sweep_points(spec):
+
+    keys = [key for key, values in spec['dimensions']]
+
+    points = []
+    for values in itertools.product(*[values for key, values in spec['dimensions']]):
+        point = dict(zip(keys, values))
+        for key, derive in spec.get('derived', []):
+            point[key] = derive(point)
+        points.append(point)
+
+    return points
+
+
+##########################################################################################################
+# Retune cost of each point key, the cost of every setting that follows it
+# params:   spec
+# returns:  costs_s
+##########################################################################################################
+def retune_costs(spec):
+
+    costs_s = {}
+
+    def add(key, cost_s):
+        costs_s[key] = costs_s.get(key, 0) + cost_s
+
+    for source in spec['sources']:
+        for key in frequency_keys(source):
+            add(key, RETUNE_COSTS_S[source.get('cost', 'source_frequency')])
+        if isinstance(source['level'], str):
+            add(source['level'], RETUNE_COSTS_S['amplitude'])
+
+    if spec['measure'] == 'two_tone':
+        add(spec['analyzer']['frequency'], RETUNE_COSTS_S['specan_frequency'])
+        add('tone', RETUNE_COSTS_S['span'])
+    else:
+        add(spec['analyzer']['frequency'], RETUNE_COSTS_S['specan_frequency'] + RETUNE_COSTS_S['marker'])
+
+    return costs_s
+
+
+##########################################################################################################
+# Execution plan of a spec
+# Path losses of every point at once, checked against the calibrated range before anything moves. They are plain
+# floats (tolist) so the instrument cache compares them as numbers.
+# params:   spec
+# returns:  {'points', 'dimensions', 'order', 'costs_s', 'levels' (per source, per point),
+#           'losses' (per source, per point), 'output_losses' (per point), 'index_of' ({dimension values: index})}
+##########################################################################################################
+def compile_sweep(spec):
+
+    points = sweep_points(spec)
+    dimensions = [key for key, values in spec['dimensions']]
+    costs_s = retune_costs(spec)
+
+    levels = []
+    losses = []
+    for source in spec['sources']:
+        level = source['level']
+        levels.append([point[level] if isinstance(level, str) else level for point in points])
+        losses.append(loss_table(source['loss']).loss([point[source['frequency']] for point in points]).tolist())
+
+    analyzer = spec['analyzer']
+    output_losses = loss_table(analyzer['loss']).loss([point[analyzer['frequency']] for point in points]).tolist()
+
+    return {
+        'points': points,
+        'dimensions': dimensions,
+        'order': plan_order(points, dimensions, costs_s),
+        'costs_s': costs_s,
+        'levels': levels,
+        'losses': losses,
+        'output_losses': output_losses,
+        'index_of': dict((tuple(point[key] for key in dimensions), index) for index, point in enumerate(points)),
+    }
+
+
+##########################################################################################################
+# params:   source, point
+# returns:  frequency_hz
+##########################################################################################################
+def source_frequency_hz(source, point):
+
+    if source.get('tone_offset'):
+        return (point[source['frequency']] * 1e9) + (point['tone'] * 1e6 * source['tone_offset'])
+
+    return point[source['frequency']] * 1e9
+
+
+##########################################################################################################
+# Commands that take the bench from the previous point to this one, the analyzer span is up to the caller
+# A source frequency moves when its point keys change, its amplitude follows its frequency (the loss moves with
+# it) and its level
+# params:   spec, plan, index, changed (point keys), swept (sources whose amplitude the measurement sets)
+# returns:  commands, as for dispatcher.tune
+##########################################################################################################
+def point_commands(spec, plan, index, changed, swept=()):
+
+    point = plan['points'][index]
+
+    commands = []
+    for s in range(0, len(spec['sources'])):
+        source = spec['sources'][s]
+        fallback_s = source.get('fallback_s', 0.5)
+
+        keys = frequency_keys(source)
+        if changed.intersection(keys):
+            commands.append((source['instrument'], 'set_frequency', (source_frequency_hz(source, point),), fallback_s))
+
+        if isinstance(source['level'], str):
+            keys = keys + [source['level']]
+        if s not in swept and changed.intersection(keys):
+            amplitude_dbm = plan['levels'][s][index] + plan['losses'][s][index]
+            commands.append((source['instrument'], 'set_amplitude', (amplitude_dbm,), fallback_s))
+
+    analyzer = spec['analyzer']
+    if analyzer['frequency'] in changed:
+        frequency_hz = point[analyzer['frequency']] * 1e9
+        commands.append((analyzer['instrument'], 'set_frequency', (frequency_hz,), 0.5))
+        if spec['measure'] != 'two_tone':
+            commands.append((analyzer['instrument'], 'set_marker', (1, frequency_hz), 0.5))
+
+    return commands
+
+
+##########################################################################################################
+# Values of one record for the sheet and the result store
+# params:   spec, plan, record
+# returns:  values
+##########################################################################################################
+def point_values(spec, plan, record):
+
+    index = plan['index_of'][tuple(record[key] for key in plan['dimensions'])]
+
+    values = dict(record)
+    for s in range(0, len(spec['sources'])):
+        name = spec['sources'][s].get('pin')
+        if name is not None and name not in values:
+            values[name] = plan['levels'][s][index]
+    values['input_loss'] = plan['losses'][0][index]
+    values['output_loss'] = plan['output_losses'][index]
+
+    for name, metric in spec['metrics']:
+        values[name] = metric(values)
+
+    return values
+
+
+##########################################################################################################
+# Run a test from its spec
+# params:   workbook, spec, settler, dispatcher, list_sweep, tone_reader, analyzer_planner, record_log,
+#           warm_start, result_store, resume
+# returns:  worksheet, (worksheet, worksheet_raw) for a compression test
+##########################################################################################################
+def run_sweep(workbook, spec, settler=None, dispatcher=None, list_sweep=None, tone_reader=None, analyzer_planner=None,
+              record_log=None, warm_start=None, result_store=None, resume=None):
+
+    # Default to the old fixed delays
+    if settler is None:
+        settler = Settler('fixed')
+    if dispatcher is None:
+        dispatcher = Dispatcher(settler, concurrent=False)
+
+    plan = compile_sweep(spec)
+
+    # Set the mxg power levels
+    first = plan['order'][0]
+    for s in range(0, len(spec['sources'])):
+        spec['sources'][s]['instrument'].set_amplitude(plan['levels'][s][first] + plan['losses'][s][first])
+
+    # Turn on the mxgs
+    for source in spec['sources']:
+        source['instrument'].on()
+
+    if spec['measure'] == 'compression' and spec.get('search') is not None:
+        return run_search(workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume)
+    if spec['measure'] == 'compression':
+        return run_compression(workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume)
+
+    return run_grid(workbook, spec, plan, settler, dispatcher, list_sweep, tone_reader, analyzer_planner, record_log,
+                    result_store, resume)
+
+
+##########################################################################################################
+# One reading per point, a row per point in report order
+# params:   workbook, spec, plan, settler, dispatcher, list_sweep, tone_reader, analyzer_planner, record_log,
+#           result_store, resume
+# returns:  worksheet
+##########################################################################################################
+def run_grid(workbook, spec, plan, settler, dispatcher, list_sweep, tone_reader, analyzer_planner, record_log,
+             result_store, resume):
+
+    points = plan['points']
+    order = plan['order']
+    specan = spec['analyzer']['instrument']
+    two_tone = spec['measure'] == 'two_tone'
+
+    # Add a new page to the workbook
+    worksheet = SheetWriter(workbook.add_worksheet(spec['sheet']))
+
+    # Write the header information
+    row = 0
+    worksheet.write_row(row, 0, [header for header, key in spec['columns']])
+
+    # Analyzer setup of each point when the planner picks it
+    if two_tone and analyzer_planner is not None:
+        worksheet.write_row(row, len(spec['columns']), [header for header, value in ANALYZER_COLUMNS])
+
+    worksheet.end_row(row)
+
+    # Loss correction, derived numbers and the worksheet row for one point, runs on the pipeline thread
+    def write_point(record):
+        values = point_values(spec, plan, record)
+
+        row = record['index'] + 1
+        worksheet.write_row(row, 0, [values[key] for header, key in spec['columns']])
+
+        analyzer = record.get('analyzer')
+        if analyzer:
+            worksheet.write_row(row, len(spec['columns']), [value(analyzer) for header, value in ANALYZER_COLUMNS])
+        worksheet.end_row(row)
+
+        if result_store is not None:
+            result_store.add(spec['test'], dict((column, values[key]) for column, key in spec['store']))
+
+    pipeline = Pipeline(write_point, spec['test'], record_log)
+
+    # Points the stopped run already measured go straight to the sheet
+    if resume is not None:
+        order = resume.replay(pipeline, spec['test'], points, order)
+
+    try:
+        generators = [source['instrument'] for source in spec['sources']]
+        if two_tone:
+            run_two_tone(spec, plan, order, pipeline, settler, dispatcher, tone_reader, analyzer_planner)
+        elif list_sweep is not None and list_sweep.available(generators):
+            # Load the whole grid into the mxg list memory, the other sources step on the first one's trigger
+            steps = {}
+            for s in range(0, len(spec['sources'])):
+                source = spec['sources'][s]
+                steps[source['instrument']] = ([source_frequency_hz(source, points[index]) for index in order],
+                                               [plan['levels'][s][index] + plan['losses'][s][index] for index in order])
+            frequency = spec['analyzer']['frequency']
+            powers = list_sweep.run(steps, [points[index][frequency] * 1e9 for index in order])
+            for index, power in zip(order, powers):
+                pipeline.put(dict(points[index], index=index, raw_pout=power))
+        else:
+            previous = None
+            for index in order:
+                point = points[index]
+
+                # Retune everything at once
+                dispatcher.tune(point_commands(spec, plan, index, changed_keys(previous, point)))
+
+                pipeline.put(dict(point, index=index, raw_pout=settler.read_power(specan, 1)))
+                previous = point
+    finally:
+        # Wait for the last rows, every point measured goes into the record log also when the sweep stops
+        pipeline.close()
+        worksheet.close()
+
+    return worksheet
+
+
+##########################################################################################################
+# Two tone points: the tones and their IM3 products read at every point, the analyzer set up per tone separation
+# params:   spec, plan, order, pipeline, settler, dispatcher, tone_reader, analyzer_planner
+# returns:  none
+##########################################################################################################
+def run_two_tone(spec, plan, order, pipeline, settler, dispatcher, tone_reader, analyzer_planner):
+
+    specan = spec['analyzer']['instrument']
+    if tone_reader is None:
+        tone_reader = MarkerToneReader(specan, settler)
+
+    # Analyzer setup of the current tone separation, empty with the old fixed span
+    analyzer_settings = {}
+
+    # Tones read one at a time in zero span when the planner finds that quicker than one wide sweep
+    zero_span_reader = ZeroSpanToneReader(specan, settler)
+
+    try:
+        previous = None
+        for index in order:
+            point = plan['points'][index]
+            changed = changed_keys(previous, point)
+            tone_separation_hz = point['tone'] * 1e6
+
+            commands = point_commands(spec, plan, index, changed)
+
+            if 'tone' in changed and analyzer_planner is None:
+                # Set the specan span
+                commands.append((specan, 'set_span', (6 * tone_separation_hz,), 0))
+
+            if 'tone' in changed and analyzer_planner is not None:
+                # Span, RBW, VBW, detector and points for this tone separation
+                analyzer_settings = analyzer_planner.plan('two_tone', tone_separation_hz)
+                commands.extend(analyzer_planner.commands(specan, analyzer_settings))
+
+            # Retune everything at once
+            dispatcher.tune(commands)
+
+            if 'tone' in changed and analyzer_planner is not None:
+                # Sweep time the analyzer picked for the new setup
+                analyzer_settings = analyzer_planner.sweep_time(specan, analyzer_settings, settler)
+
+            # Low IM, low main, high main and high IM tones around the analyzer frequency
+            centre_hz = point[spec['analyzer']['frequency']] * 1e9
+            tones_hz = [
+                centre_hz - (tone_separation_hz * 1.5),
+                centre_hz - (tone_separation_hz / 2),
+                centre_hz + (tone_separation_hz / 2),
+                centre_hz + (tone_separation_hz * 1.5),
+            ]
+
+            if 'sweep_wait_s' in spec['analyzer']:
+                # Need a bit of time to let the specan sweep
+                settler.wait(specan, 'sweep', spec['analyzer']['sweep_wait_s'])
+
+            reader = zero_span_reader if analyzer_settings.get('mode') == 'narrow' else tone_reader
+            powers = reader.read(tones_hz)
+            while analyzer_planner is not None:
+                # IM3 products closer to the noise floor than planned, narrow the RBW and read them again
+                replanned = analyzer_planner.update(analyzer_settings, min(powers))
+                if replanned is None:
+                    break
+                dispatcher.tune(analyzer_planner.commands(specan, replanned))
+                analyzer_settings = analyzer_planner.sweep_time(specan, replanned, settler)
+                reader = zero_span_reader if analyzer_settings['mode'] == 'narrow' else tone_reader
+                powers = reader.read(tones_hz)
+            pipeline.put(dict(point, index=index, raw_pout_im_low=powers[0], raw_pout_tone_low=powers[1],
+                              raw_pout_tone_high=powers[2], raw_pout_im_high=powers[3],
+                              analyzer=analyzer_settings))
+
+            previous = point
+    finally:
+        # Back to a free running analyzer also when the sweep stops
+        tone_reader.finish()
+        zero_span_reader.finish()
+
+
+##########################################################################################################
+# Step the first source over every power at each frequency point, a row per point with the output power at every
+# input power and its compression points
+# params:   workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume
+# returns:  worksheet, worksheet_raw
+##########################################################################################################
+def run_compression(workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume):
+
+    source = spec['sources'][0]['instrument']
+    pins = spec['pins']
+
+    # Create the spreadsheet page
+    worksheet = SheetWriter(workbook.add_worksheet(spec['sheet']))
+    worksheet_raw = SheetWriter(workbook.add_worksheet(spec['sheet'] + '_Raw'))
+
+    # Write the header information
+    # One sheet is for the raw information and one is for the calibrated info
+    row = 0
+    frequencies = ['RF (GHz)', 'LO (GHz)', 'IF (GHz)']
+    powers = ['{} {}dBm'.format(spec['pin_label'], pin) for pin in pins]
+    summary = [name for name, result, level_db, output in SUMMARY_COLUMNS]
+    worksheet.write_row(row, 0, frequencies + ['Pout(dBm), ' + power for power in powers] + summary)
+    worksheet_raw.write_row(row, 0, frequencies + ['Pout_raw(dBm), ' + power for power in powers] + summary)
+    worksheet.end_row(row)
+    worksheet_raw.end_row(row)
+
+    # Raw output power at each input power of the frequency point being measured, {pin index: raw_pout}
+    current = {'index': None, 'raw_pouts': {}}
+
+    # Loss correction and compression points of the frequency point once all its powers are in, the rows go out
+    # in report order like run_grid
+    def write_current():
+        index = current['index']
+        if index is None:
+            return
+
+        point = plan['points'][index]
+        raw_pouts = current['raw_pouts']
+        output_loss_db = plan['output_losses'][index]
+
+        measured = sorted(raw_pouts)
+        pin_dbm, pout_dbm = stack_curves([[pins[k] for k in measured]], [[raw_pouts[k] for k in measured]])
+        compression = analyze_compression(pin_dbm, pout_dbm)
+
+        # Powers that were not measured and compression the curve never reached are left blank
+        raw_values = [raw_pouts.get(k) for k in range(0, len(pins))]
+        values = [None if raw_pout is None else raw_pout + output_loss_db for raw_pout in raw_values]
+
+        # Input powers are written as set, output powers get the loss correction on the calibrated sheet
+        for name, result, level_db, output in SUMMARY_COLUMNS:
+            value = compression[result][level_db][0] if level_db is not None else compression[result][0]
+            if numpy.isnan(value):
+                raw_values.append(None)
+                values.append(None)
+            else:
+                raw_values.append(float(value))
+                values.append(float(value) + output_loss_db if output else float(value))
+
+        row = index + 1
+        frequencies = [point['rf'], point['lo'], point['if']]
+        worksheet.write_row(row, 0, frequencies + values)
+        worksheet_raw.write_row(row, 0, frequencies + raw_values)
+        worksheet.end_row(row)
+        worksheet_raw.end_row(row)
+
+    # Runs on the pipeline thread, a frequency point's row is written once the next one starts
+    def write_point(record):
+        if record['col'] - 1 != current['index']:
+            write_current()
+            current['index'] = record['col'] - 1
+            current['raw_pouts'] = {}
+
+        current['raw_pouts'][record['index']] = record['raw_pout']
+
+        # Print the current Settings
+        print("{} {}dBm, RF {}GHz, LO {}GHz, IF {}GHz".format(spec['pin_label'], record['pin'], record['rf'],
+                                                             record['lo'], record['if']))
+
+        if result_store is not None:
+            values = point_values(spec, plan, record)
+            result_store.add(spec['test'], dict((column, values[key]) for column, key in spec['store']))
+
+    pipeline = Pipeline(write_point, spec['test'], record_log)
+
+    try:
+        previous = None
+        for index in plan['order']:
+            point = plan['points'][index]
+
+            # Retune everything at once, the power is set for each measurement
+            dispatcher.tune(point_commands(spec, plan, index, changed_keys(previous, point), swept=(0,)))
+            previous = point
+
+            # Record key of the frequency point, its index in report order from 1
+            col = index + 1
+
+            # Set the input power and measure the output power, the pipeline thread does the rest
+            def measure(k):
+                step = dict(point, col=col, index=k, pin=pins[k])
+
+                # Already in the record log of the stopped run
+                record = resume.find(spec['test'], step) if resume is not None else None
+                if record is not None:
+                    pipeline.put(record, log=False)
+                    return record['raw_pout']
+
+                source.set_amplitude(pins[k] + plan['losses'][0][index])
+                settler.wait(source, 'set_amplitude', 1)
+
+                raw_pout = settler.read_power(spec['analyzer']['instrument'], 1)
+                pipeline.put(dict(step, raw_pout=raw_pout))
+                return raw_pout
+
+            # Every power, or a window around the P1dB expected from the neighbouring column / the prior run
+            if warm_start is None:
+                for k in range(0, len(pins)):
+                    measure(k)
+            else:
+                measured = {}
+                for k in warm_start.window(pins, warm_start.hint(point['if'], point['rf'])):
+                    measured[k] = measure(k)
+                warm_start.record(point['if'], point['rf'], warm_start.extend(pins, measured, measure))
+    finally:
+        # Wait for the last points, every point measured goes into the record log also when the sweep stops
+        pipeline.close()
+
+    # The last frequency point, then anything still held behind a row above it
+    write_current()
+    worksheet.close()
+    worksheet_raw.close()
+
+    return worksheet, worksheet_raw
+
+
+##########################################################################################################
+# Search the first source's power for the P1dB at each frequency point instead of stepping every power
+# One row per frequency point with the result, the raw sheet has every point the search measured
+# params:   workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume
+# returns:  worksheet, worksheet_raw
+##########################################################################################################
+def run_search(workbook, spec, plan, settler, dispatcher, record_log, warm_start, result_store, resume):
+
+    source = spec['sources'][0]['instrument']
+    search = spec['search']
+
+    # Create the spreadsheet page
+    worksheet = SheetWriter(workbook.add_worksheet(spec['sheet']))
+    worksheet_raw = SheetWriter(workbook.add_worksheet(spec['sheet'] + '_Raw'))
+
+    # Write the header information
+    row = 0
+    worksheet.write_row(row, 0, ['RF (GHz)', 'LO (GHz)', 'IF (GHz)', 'Gain (dB)', 'IP1dB (dBm)', 'OP1dB (dBm)', 'Points'])
+    worksheet_raw.write_row(row, 0, ['RF (GHz)', 'LO (GHz)', 'IF (GHz)', '{} (dBm)'.format(spec['pin_label']),
+                                     'Pout_raw (dBm)'])
+    worksheet.end_row(row)
+    worksheet_raw.end_row(row)
+
+    # Loss correction and the worksheet writes, runs on the pipeline thread
+    # Rows go in report order like run_grid: the P1dB row of a point at its index, its raw rows below those of every
+    # point above it, held until that point and every one above it are done
+    raw_rows = {}
+    done = set()
+    raw_next = {'index': 0, 'row': 1}
+
+    def write_point(record):
+        index = plan['index_of'][tuple(record[key] for key in plan['dimensions'])]
+
+        if record['kind'] == 'point':
+            # Print the current Settings
+            print("{} {}dBm, RF {}GHz, LO {}GHz, IF {}GHz".format(spec['pin_label'], record['pin'], record['rf'],
+                                                                 record['lo'], record['if']))
+
+            raw_rows.setdefault(index, []).append([record['rf'], record['lo'], record['if'], record['pin'],
+                                                   record['raw_pout']])
+
+            if result_store is not None:
+                values = point_values(spec, plan, record)
+                result_store.add(spec['test'], dict((column, values[key]) for column, key in spec['store']))
+            return
+
+        row = index + 1
+        output_loss_db = plan['output_losses'][index]
+        worksheet.write_row(row, 0, [record['rf'], record['lo'], record['if'], record['gain'] + output_loss_db])
+        if record['ip1db'] is None:
+            # Not compressed by max_pin
+            worksheet.write(row, 4, '> {}'.format(search.max_pin_dbm))
+        else:
+            worksheet.write(row, 4, record['ip1db'])
+            worksheet.write(row, 5, record['op1db'] + output_loss_db)
+        worksheet.write(row, 6, record['points'])
+        worksheet.end_row(row)
+
+        done.add(index)
+        while raw_next['index'] in done:
+            for values in raw_rows.pop(raw_next['index'], []):
+                worksheet_raw.write_row(raw_next['row'], 0, values)
+                worksheet_raw.end_row(raw_next['row'])
+                raw_next['row'] = raw_next['row'] + 1
+            raw_next['index'] = raw_next['index'] + 1
+
+    pipeline = Pipeline(write_point, spec['test'], record_log)
+
+    try:
+        previous = None
+        for index in plan['order']:
+            point = plan['points'][index]
+
+            # Retune everything at once, the search sets the power
+            dispatcher.tune(point_commands(spec, plan, index, changed_keys(previous, point), swept=(0,)))
+            previous = point
+
+            # Set the input power and measure the output power, the search picks the next power
+            def measure(pin):
+                # Already in the record log of the stopped run
+                record = resume.find(spec['test'], dict(point, kind='point', pin=pin)) if resume is not None else None
+                if record is not None:
+                    pipeline.put(record, log=False)
+                    return record['raw_pout']
+
+                source.set_amplitude(pin + plan['losses'][0][index])
+                settler.wait(source, 'set_amplitude', 1)
+
+                raw_pout = settler.read_power(spec['analyzer']['instrument'], 1)
+                pipeline.put(dict(point, kind='point', pin=pin, raw_pout=raw_pout))
+                return raw_pout
+
+            # A warm start begins next to the P1dB expected from the neighbouring column / the prior run
+            hint_dbm = warm_start.hint(point['if'], point['rf']) if warm_start is not None else None
+            result = search.run(spec['sources'][0]['level'], measure, hint_dbm)
+            if warm_start is not None:
+                warm_start.record(point['if'], point['rf'], result['ip1db'])
+
+            # The search of a point the stopped run finished replays from its record log, so does the result
+            record = resume.find(spec['test'], dict(point, kind='p1db')) if resume is not None else None
+            if record is not None:
+                pipeline.put(record, log=False)
+            else:
+                pipeline.put(dict(point, kind='p1db', gain=result['gain'], ip1db=result['ip1db'],
+                                  op1db=result['op1db'], points=len(result['points'])))
+    finally:
+        # Wait for the last rows, every point measured goes into the record log also when the sweep stops
+        pipeline.close()
+        worksheet.close()
+        worksheet_raw.close()
+
+    return worksheet, worksheet_raw
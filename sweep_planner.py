@@ -0,0 +1,108 @@
+## Sweep order planning.
+## Takes every measurement point of a sweep and picks the loop nesting (outer to inner, serpentine) that costs
+## the least retune and settle time. The sweeps run the points in that order and store each result back at its
+## index, so the report still comes out in the original order.
+
+import itertools
+
+
+# Rough cost (s) of changing one instrument setting, including its settle time
+RETUNE_COSTS_S = {
+    'lo_frequency': 1.0,
+    'source_frequency': 0.5,
+    'specan_frequency': 0.5,
+    'marker': 0.5,
+    'span': 0.5,
+    'amplitude': 0.1,
+}
+
+
+##########################################################################################################
+# Order the points by the given nesting, outer dimension first
+# Every level runs back and forth (serpentine) so only one dimension moves between neighbouring points
+# params:   points, dimensions
+# returns:  order (list of point indices)
+##########################################################################################################
+def serpentine_order(points, dimensions):
+
+    order = []
+
+    # Direction of each level flips every time the level is walked
+    reverse = [False] * len(dimensions)
+
+    def walk(indices, level):
+        if level == len(dimensions):
+            order.extend(indices)
+            return
+
+        dimension = dimensions[level]
+        groups = {}
+        for index in indices:
+            groups.setdefault(points[index][dimension], []).append(index)
+
+        for value in sorted(groups, reverse=reverse[level]):
+            walk(groups[value], level + 1)
+
+        reverse[level] = not reverse[level]
+
+    walk(list(range(0, len(points))), 0)
+
+    return order
+
+
+##########################################################################################################
+# Total cost of running the points in the given order
+# A key costs its entry in costs_s every time its value differs from the previous point
+# params:   points, order, costs_s
+# returns:  cost_s
+##########################################################################################################
+def order_cost(points, order, costs_s):
+
+    cost_s = 0
+    previous = None
+
+    for index in order:
+        point = points[index]
+        for key in costs_s:
+            if previous is None or point[key] != previous[key]:
+                cost_s = cost_s + costs_s[key]
+        previous = point
+
+    return cost_s
+
+
+##########################################################################################################
+# Find the cheapest execution order for a set of measurement points
+# Tries every nesting of the swept dimensions and keeps the one with the lowest order_cost
+# params:   points (list of dicts, report order), dimensions, costs_s
+# returns:  order (list of point indices)
+##########################################################################################################
+def plan_order(points, dimensions, costs_s):
+
+    # Dimensions with a single value never move, leave them out of the search
+    swept = [dimension for dimension in dimensions if len(set(point[dimension] for point in points)) > 1]
+
+    best_order = list(range(0, len(points)))
+    best_cost = order_cost(points, best_order, costs_s)
+
+    for nesting in itertools.permutations(swept):
+        order = serpentine_order(points, nesting)
+        cost = order_cost(points, order, costs_s)
+        if cost < best_cost:
+            best_order = order
+            best_cost = cost
+
+    return best_order
+
+
+##########################################################################################################
+# Keys whose value changed since the previous point, everything counts as changed for the first point
+# params:   previous, point
+# returns:  set of keys
+##########################################################################################################
+def changed_keys(previous, point):
+
+    if previous is None:
+        return set(point)
+
+    return set(key for key in point if point[key] != previous[key])
@@ -0,0 +1,61 @@
+## Analyzer setup planner: the setups it picks and the commands it sends
+
+import pytest
+
+from analyzer_planner import AnalyzerPlanner
+from dispatch import Dispatcher
+from instrument_cache import CachedInstrument
+from settling import Settler
+from simulated_instruments import SimulatedSignalAnalyzer
+
+
+# An analyzer wrapper with only the high level calls, no VISA resource to send raw SCPI through
+class WrapperOnlyAnalyzer:
+    def __init__(self):
+        self.calls = []
+
+    def set_span(self, span_hz):
+        self.calls.append(('set_span', span_hz))
+
+    def set_rbw(self, rbw_hz):
+        self.calls.append(('set_rbw', rbw_hz))
+
+
+def test_wrapper_without_scpi_gets_span_and_rbw_only():
+    wrapper = WrapperOnlyAnalyzer()
+    specan = CachedInstrument(wrapper)
+    planner = AnalyzerPlanner()
+    settings = planner.plan('tone')
+
+    commands = planner.commands(specan, settings)
+    Dispatcher(Settler('fixed'), concurrent=False).tune(commands)
+
+    assert [command[1] for command in commands] == ['set_span', 'set_rbw']
+    assert wrapper.calls == [('set_span', settings['span_hz']), ('set_rbw', settings['rbw_hz'])]
+
+
+def test_scpi_analyzer_gets_the_whole_setup():
+    specan = CachedInstrument(SimulatedSignalAnalyzer('SIM-FSV', latency_s=0, settle_s=0, sweep_time_s=0))
+    planner = AnalyzerPlanner()
+    settings = planner.plan('two_tone', 20e6, mode='narrow')
+
+    Dispatcher(Settler('adaptive', poll_interval_s=0), concurrent=False).tune(planner.commands(specan, settings))
+
+    assert specan.span_hz == 0
+    assert specan.rbw_hz == settings['rbw_hz']
+    assert specan.vbw_hz == settings['vbw_hz']
+    assert specan.detector == 'RMS'
+    assert specan.sweep_points == settings['points']
+    assert specan.manual_sweep_time_s == pytest.approx(settings['sweep_time_s'])
+
+
+def test_rbw_narrows_with_the_weakest_level():
+    planner = AnalyzerPlanner(danl_dbm_hz=-150, margin_db=10)
+
+    loud = planner.plan('tone')
+    quiet = AnalyzerPlanner(min_levels_dbm={'tone': -100}).plan('tone')
+
+    assert quiet['rbw_hz'] < loud['rbw_hz']
+    assert quiet['sweep_time_s'] >= loud['sweep_time_s']
+    with pytest.raises(ValueError):
+        planner.plan('two_tone')
@@ -0,0 +1,61 @@
+## Bench scheduler: benches running at once share the P1dB prior file and the run database
+
+import json
+import os
+import sqlite3
+
+import bench_scheduler
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for main(): every job saves a warm start prior and adds a run to the database, over and over
+SCRIPT = '''
+import sys
+sys.path.insert(0, {repo!r})
+
+from run_database import RunDatabase
+from warm_start import WarmStart
+
+TESTS = ['SHARED']
+
+
+def main(test=None, instruments=None, simulate=None, dut=None):
+    for k in range(0, {saves}):
+        warm_start = WarmStart('prior.json', 'BOARD', '{{}}_{{}}'.format(dut, k))
+        warm_start.record(5.25, 18, k)
+        warm_start.save()
+
+        run_database = RunDatabase('runs.sqlite')
+        run_database.add_run({{'board': 'BOARD', 'dut': dut, 'test': test, 'started': str(k)}},
+                             {{test: {{'if_ghz': [5.25], 'rf_ghz': [18], 'gain_db': [-8.0]}}}})
+        run_database.close()
+
+    return None
+'''
+
+
+def test_two_benches_write_the_shared_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    saves = 40
+    script_path = tmp_path / 'script.py'
+    script_path.write_text(SCRIPT.format(repo=REPO, saves=saves))
+
+    benches = [{'name': 'bench1', 'instruments': {}}, {'name': 'bench2', 'instruments': {}}]
+    jobs = [{'dut': 'SN001', 'test': 'SHARED', 'bench': 'bench1'},
+            {'dut': 'SN002', 'test': 'SHARED', 'bench': 'bench2'}]
+    results = bench_scheduler.run(str(script_path), benches, jobs, job_timeout_s=60, poll_interval_s=0.05)
+
+    assert [result['state'] for result in results] == ['done', 'done'], [result.get('error') for result in results]
+
+    # No bench's prior run lost to the other's save
+    with open('prior.json') as prior_file:
+        stored = json.load(prior_file)
+    assert sorted(stored['BOARD']) == sorted('{}_{}'.format(dut, k) for dut in ('SN001', 'SN002')
+                                             for k in range(0, saves))
+    assert not os.path.exists('prior.json.lock')
+
+    connection = sqlite3.connect('runs.sqlite')
+    assert connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2 * saves
+    assert connection.execute("SELECT dut, COUNT(*) FROM points GROUP BY dut").fetchall() == [('SN001', saves),
+                                                                                             ('SN002', saves)]
+    connection.close()
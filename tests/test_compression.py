@@ -0,0 +1,59 @@
+## Compression analysis on Rapp curves with a known 1 dB point
+
+import numpy
+
+from compression import analyze_compression, stack_curves
+from simulated_instruments import MixerModel
+
+
+# Output power of a Rapp compressed stage, and the input power of its 1 dB point
+def rapp_curve(pin_dbm, gain_db, p1db_out_dbm, smoothness=2):
+    model = MixerModel(p1db_out_dbm=p1db_out_dbm, rapp_smoothness=smoothness)
+    pout_dbm = [pin + gain_db - model.compression(pin + gain_db) for pin in pin_dbm]
+    return numpy.array(pout_dbm), p1db_out_dbm + 1 - gain_db
+
+
+def test_ip1db_of_a_rapp_curve():
+    pin_dbm = numpy.arange(-40, 11, 1.0)
+    pout_dbm, ip1db_dbm = rapp_curve(pin_dbm, -8, -5)
+
+    result = analyze_compression(pin_dbm, pout_dbm)
+
+    assert abs(result['gain_db'][0] - -8) < 0.01
+    assert abs(result['ip_dbm'][1][0] - ip1db_dbm) < 0.05
+    assert abs(result['op_dbm'][1][0] - -5) < 0.05
+    assert result['ip_dbm'][0.1][0] < result['ip_dbm'][1][0] < result['ip_dbm'][3][0]
+
+
+def test_uneven_steps_and_a_batch_of_ragged_curves():
+    pin_lists = [[-40, -35, -30, -22, -17, -10, -4, -1, 1.5, 3, 4.5, 6, 9], list(numpy.arange(-40, 16, 2.0))]
+    curves = [rapp_curve(pin_lists[0], -8, -5), rapp_curve(pin_lists[1], 2, 8, smoothness=3)]
+
+    pin_dbm, pout_dbm = stack_curves(pin_lists, [pout for pout, ip1db in curves])
+    result = analyze_compression(pin_dbm, pout_dbm)
+
+    assert pin_dbm.shape == (2, len(pin_lists[1]))
+    assert numpy.isnan(pout_dbm[0, -1])
+    for curve in range(0, 2):
+        # Linear interpolation between steps of up to 2 dB
+        assert abs(result['ip_dbm'][1][curve] - curves[curve][1]) < 0.25
+
+
+def test_noisy_point_over_the_level_does_not_end_the_curve():
+    pin_dbm = numpy.arange(-40, 11, 1.0)
+    pout_dbm, ip1db_dbm = rapp_curve(pin_dbm, -8, -5)
+    pout_dbm[10] = pout_dbm[10] - 1.5
+
+    result = analyze_compression(pin_dbm, pout_dbm)
+
+    assert abs(result['ip_dbm'][1][0] - ip1db_dbm) < 0.05
+
+
+def test_curve_that_never_compresses():
+    pin_dbm = numpy.arange(-40, -20, 1.0)
+    pout_dbm, ip1db_dbm = rapp_curve(pin_dbm, -8, 10)
+
+    result = analyze_compression(pin_dbm, pout_dbm)
+
+    assert numpy.isnan(result['ip_dbm'][1][0])
+    assert result['pin_sat_dbm'][0] == pin_dbm[-1]
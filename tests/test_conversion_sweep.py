@@ -0,0 +1,41 @@
+## conversion-sweep.py end to end on the simulated bench: every test reads a real output tone, not the noise floor
+
+import importlib.util
+import os
+
+import pytest
+
+from pipeline import load_records
+
+# The script drives the bench through hw_qa_tools
+pytest.importorskip('hw_qa_tools')
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'conversion-sweep.py')
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location('conversion_sweep', SCRIPT)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+@pytest.mark.parametrize('test, raw', [
+    ('UPCONVERT', 'raw_pout'),
+    ('DOWNCONVERT', 'raw_pout'),
+    ('TX_P1DB', 'raw_pout'),
+    ('RX_P1DB', 'raw_pout'),
+    ('TX_OIP3', 'raw_pout_tone_low'),
+    ('RX_OIP3', 'raw_pout_tone_low'),
+])
+def test_simulated_run_reads_the_output_tone(tmp_path, monkeypatch, test, raw):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('sys.argv', ['conversion-sweep.py'])
+
+    spreadsheet_name = load_script().main(test=test, simulate='fast')
+
+    records = [record for record in load_records(os.path.splitext(spreadsheet_name)[0] + '.jsonl') if raw in record]
+    assert records
+
+    # The analyzer noise floor is around -120 dBm
+    assert min(record[raw] for record in records) > -60
@@ -0,0 +1,130 @@
+## Dispatcher: per instrument command order, instruments retuned at the same time, chained SCPI and its fallback
+
+import threading
+import time
+
+import pytest
+
+from dispatch import Dispatcher
+from settling import Settler
+from simulated_instruments import SimulatedSignalGenerator
+
+
+# Wrapper without raw SCPI access, every call takes busy_s and goes in the shared log
+class SlowInstrument:
+    def __init__(self, name, log, busy_s=0):
+        self.name = name
+        self.log = log
+        self.busy_s = busy_s
+
+    def _call(self, method, value):
+        time.sleep(self.busy_s)
+        self.log.append((self.name, method, value, threading.current_thread().name))
+
+    def set_frequency(self, frequency_hz):
+        self._call('set_frequency', frequency_hz)
+
+    def set_amplitude(self, amplitude_dbm):
+        self._call('set_amplitude', amplitude_dbm)
+
+
+# Stands in for a box that drops off the LAN
+class BrokenInstrument(SlowInstrument):
+    def set_frequency(self, frequency_hz):
+        raise RuntimeError('{} timed out'.format(self.name))
+
+
+# Simulated MXG whose firmware rejects ';' chained messages
+class UnchainedGenerator(SimulatedSignalGenerator):
+    def query(self, command):
+        if ';:' in command:
+            self._command(command)
+            raise ValueError('{} does not understand {}'.format(self.name, command))
+        return SimulatedSignalGenerator.query(self, command)
+
+
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_commands_keep_their_order_per_instrument(concurrent):
+    log = []
+    lo, source, specan = SlowInstrument('LO', log), SlowInstrument('IF', log), SlowInstrument('FSV', log)
+    dispatcher = Dispatcher(Settler('fixed'), concurrent=concurrent)
+
+    dispatcher.tune([
+        (lo, 'set_frequency', (5e9,), 0),
+        (source, 'set_frequency', (6e9,), 0),
+        (lo, 'set_amplitude', (12,), 0),
+        (specan, 'set_frequency', (18e9,), 0),
+        (source, 'set_amplitude', (-20,), 0),
+        (lo, 'set_frequency', (5.5e9,), 0),
+    ])
+    dispatcher.close()
+
+    calls = dict((name, [(method, value) for call_name, method, value, thread in log if call_name == name])
+                 for name in ('LO', 'IF', 'FSV'))
+    assert calls['LO'] == [('set_frequency', 5e9), ('set_amplitude', 12), ('set_frequency', 5.5e9)]
+    assert calls['IF'] == [('set_frequency', 6e9), ('set_amplitude', -20)]
+    assert calls['FSV'] == [('set_frequency', 18e9)]
+
+    # One thread per instrument
+    for name in calls:
+        assert len(set(thread for call_name, method, value, thread in log if call_name == name)) == 1
+
+
+def test_instruments_retune_at_the_same_time():
+    log = []
+    instruments = [SlowInstrument(name, log, busy_s=0.1) for name in ('LO', 'IF', 'FSV')]
+    commands = [(instrument, 'set_frequency', (5e9,), 0) for instrument in instruments]
+
+    elapsed_s = {}
+    for concurrent in (True, False):
+        dispatcher = Dispatcher(Settler('fixed'), concurrent=concurrent)
+        start = time.time()
+        dispatcher.tune(commands)
+        elapsed_s[concurrent] = time.time() - start
+        dispatcher.close()
+
+    assert elapsed_s[False] >= 0.3
+    assert elapsed_s[True] < 0.2
+
+
+def test_commands_for_one_instrument_go_out_as_one_chained_message():
+    mxg = SimulatedSignalGenerator('MXG', latency_s=0, settle_s=0.01)
+    dispatcher = Dispatcher(Settler('adaptive'))
+
+    dispatcher.tune([(mxg, 'set_frequency', (5e9,), 1), (mxg, 'set_amplitude', (-20,), 1)])
+    dispatcher.close()
+
+    assert mxg.log == ['FREQ 5000000000.0;:POW -20;*OPC?']
+    assert mxg.frequency_hz == 5e9
+    assert mxg.amplitude_dbm == -20
+
+
+def test_chained_message_failure_falls_back_to_one_command_at_a_time():
+    mxg = UnchainedGenerator('MXG', latency_s=0, settle_s=0.01)
+    dispatcher = Dispatcher(Settler('adaptive'))
+
+    dispatcher.tune([(mxg, 'set_frequency', (5e9,), 1), (mxg, 'set_amplitude', (-20,), 1)])
+    assert id(mxg) in dispatcher.unbatched
+    assert mxg.frequency_hz == 5e9
+    assert mxg.amplitude_dbm == -20
+
+    # No second try at chaining, the commands go out on their own with a plain *OPC? settle
+    del mxg.log[:]
+    dispatcher.tune([(mxg, 'set_frequency', (6e9,), 1), (mxg, 'set_amplitude', (-10,), 1)])
+    dispatcher.close()
+
+    assert mxg.log == ['FREQ 6000000000.0', 'POW -10', '*OPC?']
+    assert mxg.frequency_hz == 6e9
+
+
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_instrument_error_reaches_the_caller(concurrent):
+    log = []
+    dispatcher = Dispatcher(Settler('fixed'), concurrent=concurrent)
+
+    with pytest.raises(RuntimeError, match='LO timed out'):
+        dispatcher.tune([
+            (SlowInstrument('IF', log), 'set_frequency', (6e9,), 0),
+            (BrokenInstrument('LO', log), 'set_frequency', (5e9,), 0),
+        ])
+    dispatcher.close()
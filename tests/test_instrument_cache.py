@@ -0,0 +1,100 @@
+## Instrument cache: repeated settings dropped, raw SCPI and preset forget what they may have changed
+
+import scpi
+from instrument_cache import CachedInstrument
+from settling import Settler
+from simulated_instruments import SimulatedSignalAnalyzer, SimulatedSignalGenerator
+
+
+def generator():
+    return CachedInstrument(SimulatedSignalGenerator('MXG', latency_s=0, settle_s=0))
+
+
+def analyzer():
+    return CachedInstrument(SimulatedSignalAnalyzer('FSV', latency_s=0, settle_s=0, sweep_time_s=0))
+
+
+def test_repeated_settings_are_dropped():
+    mxg = generator()
+
+    assert mxg.set_frequency(5.25e9)
+    assert mxg.set_amplitude(-20)
+    assert not mxg.set_frequency(5.25e9)
+    assert not mxg.set_amplitude(-20)
+    assert mxg.set_amplitude(-19)
+
+    assert mxg.instrument.log == ['FREQ 5250000000.0', 'POW -20', 'POW -19']
+    assert (mxg.misses, mxg.hits) == (3, 2)
+    assert mxg.summary() == 'SimulatedSignalGenerator: 3 writes sent, 2 dropped'
+
+
+def test_markers_are_cached_one_by_one():
+    specan = analyzer()
+
+    assert specan.set_marker(1, 18e9)
+    assert specan.set_marker(2, 18e9)
+    assert not specan.set_marker(1, 18e9)
+    assert specan.set_marker(1, 19e9)
+
+
+def test_dropped_write_skips_the_settle():
+    mxg = generator()
+    settler = Settler('adaptive')
+
+    mxg.set_frequency(5.25e9)
+    settler.wait(mxg, 'set_frequency', 1)
+    mxg.set_frequency(5.25e9)
+    settler.wait(mxg, 'set_frequency', 1)
+
+    assert settler.skipped == 1
+    assert mxg.instrument.log == ['FREQ 5250000000.0', '*OPC?']
+
+
+def test_raw_scpi_write_forgets_what_it_touches():
+    mxg = generator()
+    mxg.set_frequency(5.25e9)
+    mxg.set_amplitude(-20)
+
+    scpi.write(mxg, 'FREQ 6e9')
+
+    # The frequency goes out again, the amplitude is still known
+    assert mxg.set_frequency(5.25e9)
+    assert not mxg.set_amplitude(-20)
+    assert mxg.instrument.frequency_hz == 5.25e9
+
+
+def test_reset_and_preset_forget_everything():
+    specan = analyzer()
+    specan.set_frequency(18e9)
+    specan.set_rbw(1e3)
+
+    scpi.write(specan, '*RST')
+    assert specan.state == {}
+
+    specan.set_frequency(18e9)
+    specan.preset()
+    assert specan.state == {}
+    assert specan.unsettled
+
+
+def test_sweep_time_none_couples_it_again():
+    specan = analyzer()
+
+    assert specan.set_sweep_time(0.01)
+    assert specan.set_sweep_time(None)
+    assert not specan.set_sweep_time(None)
+    assert specan.set_sweep_time(0.01)
+
+    assert specan.instrument.log == ['SWE:TIME 0.01', 'SWE:TIME:AUTO ON', 'SWE:TIME 0.01']
+
+
+def test_raw_scpi_settings_do_not_forget_themselves():
+    specan = analyzer()
+
+    assert specan.set_vbw(3e3)
+    assert specan.set_detector('RMS')
+    assert not specan.set_vbw(3e3)
+    assert not specan.set_detector('RMS')
+
+    assert specan.instrument.vbw_hz == 3e3
+    assert specan.instrument.detector == 'RMS'
@@ -0,0 +1,150 @@
+## Hardware list sweep: the same readings as stepping point by point, chunking, the point by point fallback
+
+import pytest
+import xlsxwriter
+
+from list_sweep import MAX_ANALYZER_ENTRIES, ListSweep
+from settling import Settler
+from simulated_instruments import SimulatedBench
+from sweep_engine import TONE_METRICS, TONE_STORE, run_sweep
+from tone_readers import MarkerToneReader
+
+
+# An analyzer wrapper with only the high level calls, no VISA resource to send raw SCPI through
+class WrapperOnlyAnalyzer:
+    def __init__(self, specan):
+        self.specan = specan
+
+    def get_power(self, marker):
+        return self.specan.get_power(marker)
+
+
+# Keeps the stored rows in the order the sweep hands them over
+class Store:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, test, row):
+        self.rows.append(row)
+
+
+# Simulated board with an IF and an LO generator, no noise on the analyzer so both ways read the same
+def bench():
+
+    simulated = SimulatedBench('LO')
+    if_mxg = simulated.generator('IF')
+    lo_mxg = simulated.generator('LO')
+    specan = simulated.analyzer('FSV')
+    specan.noise_db = 0
+
+    return if_mxg, lo_mxg, specan
+
+
+def settler():
+    return Settler('adaptive', poll_interval_s=0)
+
+
+# Up conversion over a few IF / RF points, the LO 4x below the RF
+def upconvert_spec(if_mxg, lo_mxg, specan):
+    return {
+        'test': 'UPCONVERT',
+        'dimensions': [('if', [5.25, 6.25]), ('rf', [18, 19, 20, 21])],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg, 'frequency': 'if', 'level': -20, 'loss': 1.5, 'pin': 'pin', 'fallback_s': 0},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': 12, 'loss': 1, 'pin': 'lo_pin',
+             'cost': 'lo_frequency', 'fallback_s': 0},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': 2},
+        'measure': 'tone',
+        'metrics': TONE_METRICS,
+        'sheet': 'Up_Conversion',
+        'columns': [('RF Frequency (GHz)', 'rf'), ('Eval Board RF Pout (dBm)', 'pout')],
+        'store': TONE_STORE,
+    }
+
+
+# IF and LO steps with the lower sideband RF they give
+def steps(count):
+    if_hz = [5.25e9 + 0.01e9 * (k % 10) for k in range(0, count)]
+    lo_hz = [4.5e9 + 0.05e9 * (k // 10) for k in range(0, count)]
+    rf_hz = [4 * lo - if_ for if_, lo in zip(if_hz, lo_hz)]
+    return if_hz, lo_hz, rf_hz
+
+
+def test_list_readings_match_stepped_readings():
+    if_mxg, lo_mxg, specan = bench()
+    if_hz, lo_hz, rf_hz = steps(12)
+    specan.set_span(1e6)
+
+    stepped = []
+    reader = MarkerToneReader(specan, settler())
+    if_mxg.on()
+    lo_mxg.on()
+    for k in range(0, len(rf_hz)):
+        if_mxg.set_frequency(if_hz[k])
+        if_mxg.set_amplitude(-20)
+        lo_mxg.set_frequency(lo_hz[k])
+        lo_mxg.set_amplitude(12)
+        specan.set_frequency(rf_hz[k])
+        stepped.extend(reader.read([rf_hz[k]]))
+
+    list_sweep = ListSweep(specan, settler(), dwell_s=0.001)
+    powers = list_sweep.run({if_mxg: (if_hz, [-20] * 12), lo_mxg: (lo_hz, [12] * 12)}, rf_hz)
+
+    # Converted tones well above the floor, not two sets of noise
+    assert min(stepped) > -40
+    assert powers == pytest.approx(stepped, abs=0.01)
+
+    # The generators are back in CW for the next point by point sweep
+    assert (if_mxg.frequency_mode, lo_mxg.frequency_mode) == ('CW', 'CW')
+
+
+def test_long_list_runs_in_analyzer_sized_chunks():
+    if_mxg, lo_mxg, specan = bench()
+    count = MAX_ANALYZER_ENTRIES + 30
+    if_hz, lo_hz, rf_hz = steps(count)
+    if_mxg.on()
+    lo_mxg.on()
+
+    powers = ListSweep(specan, settler(), dwell_s=0.0005).run(
+        {if_mxg: (if_hz, [-20] * count), lo_mxg: (lo_hz, [12] * count)}, rf_hz)
+
+    assert len(powers) == count
+    assert len([command for command in specan.log if command.startswith('LIST:POW:SEQ')]) == 2
+
+
+def test_lists_of_the_wrong_length_are_refused():
+    if_mxg, lo_mxg, specan = bench()
+    if_hz, lo_hz, rf_hz = steps(4)
+
+    with pytest.raises(ValueError):
+        ListSweep(specan, settler()).run({if_mxg: (if_hz[:3], [-20] * 3), lo_mxg: (lo_hz, [12] * 4)}, rf_hz)
+    assert if_mxg.log == []
+
+
+def test_sweep_rows_match_the_stepped_sweep(tmp_path):
+    rows = {}
+    for mode in ('step', 'list'):
+        if_mxg, lo_mxg, specan = bench()
+        store = Store()
+        list_sweep = ListSweep(specan, settler(), dwell_s=0.001) if mode == 'list' else None
+
+        workbook = xlsxwriter.Workbook(str(tmp_path / '{}.xlsx'.format(mode)))
+        run_sweep(workbook, upconvert_spec(if_mxg, lo_mxg, specan), settler=settler(), list_sweep=list_sweep,
+                  result_store=store)
+        workbook.close()
+        assert (mode == 'list') == any(command.startswith('LIST:POW:SEQ') for command in specan.log)
+        rows[mode] = sorted((row['if_ghz'], row['rf_ghz'], row['gain_db']) for row in store.rows)
+
+    assert len(rows['list']) == 8
+    for stepped, listed in zip(rows['step'], rows['list']):
+        assert listed[:2] == stepped[:2]
+        assert listed[2] == pytest.approx(stepped[2], abs=0.01)
+
+
+def test_wrapper_without_scpi_falls_back_to_stepping():
+    if_mxg, lo_mxg, specan = bench()
+
+    assert ListSweep(specan, settler()).available([if_mxg, lo_mxg])
+    assert not ListSweep(WrapperOnlyAnalyzer(specan), settler()).available([if_mxg, lo_mxg])
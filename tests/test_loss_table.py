@@ -0,0 +1,65 @@
+## Loss tables: interpolation, coverage and paths in series
+
+import numpy
+import pytest
+
+from loss_table import LossTable, loss_table
+
+
+def test_interpolates_between_calibration_points():
+    table = LossTable([20, 18, 22], [3.0, 2.0, 5.0], 'rf_cable_loss_db')
+
+    assert table.loss(18) == 2.0
+    assert table.loss(19) == pytest.approx(2.5)
+    numpy.testing.assert_allclose(table.loss([21, 18.5, 21]), [4.0, 2.25, 4.0])
+    numpy.testing.assert_allclose(table.loss(numpy.array([[18, 22], [20, 21.5]])), [[2.0, 5.0], [3.0, 4.5]])
+
+
+def test_frequency_outside_the_table_is_an_error():
+    table = LossTable([18, 22], [2.0, 5.0], 'rf_cable_loss_db')
+
+    with pytest.raises(ValueError, match="'rf_cable_loss_db' covers 18 to 22 GHz, not 17.5, 40 GHz"):
+        table.loss([18, 17.5, 40, 20])
+    with pytest.raises(ValueError):
+        table.loss(22.5)
+
+    assert table.covers([17.5, 18, 22 + 1e-9, 22.1]).tolist() == [False, True, True, False]
+
+
+def test_one_number_is_the_same_loss_everywhere():
+    table = loss_table(1.28)
+
+    assert table.loss(100) == 1.28
+    numpy.testing.assert_allclose(table.loss([1, 50]), [1.28, 1.28])
+    assert table.as_dict() == 1.28
+    assert loss_table(table) is table
+
+
+def test_paths_in_series_add_up_where_both_cover():
+    cable = LossTable([18, 20, 22], [2.0, 3.0, 5.0], 'cable')
+    pcb = LossTable([19, 23], [1.0, 2.0], 'pcb')
+
+    total = cable + pcb + 0.5
+
+    assert total.name == 'cable + pcb'
+    assert total.freq_ghz.tolist() == [19, 20, 22]
+    assert total.loss(20) == pytest.approx(3.0 + 1.25 + 0.5)
+    with pytest.raises(ValueError):
+        total.loss(18)
+
+
+def test_invalid_tables():
+    with pytest.raises(ValueError):
+        LossTable([18, 19], [1.0])
+    with pytest.raises(ValueError):
+        LossTable([18, 18], [1.0, 1.1])
+    with pytest.raises(ValueError):
+        loss_table([1.0, 1.1])
+    with pytest.raises(ValueError):
+        LossTable([18], [1.0]) + LossTable([20], [1.0])
+
+
+def test_stored_table_round_trip():
+    table = LossTable([18, 22], [2.0, 5.0])
+
+    assert loss_table(table.as_dict()).loss(20) == table.loss(20)
@@ -0,0 +1,58 @@
+## Adaptive P1dB search against a Rapp curve with a known 1 dB point
+
+import pytest
+
+from p1db_search import P1dbSearch
+from simulated_instruments import MixerModel
+
+
+# Measure function of a Rapp compressed stage and the input power of its 1 dB point
+def rapp_stage(gain_db, p1db_out_dbm, smoothness=2):
+    model = MixerModel(p1db_out_dbm=p1db_out_dbm, rapp_smoothness=smoothness)
+    return (lambda pin: pin + gain_db - model.compression(pin + gain_db)), p1db_out_dbm + 1 - gain_db
+
+
+@pytest.mark.parametrize('gain_db, p1db_out_dbm, smoothness', [(-8, -5, 2), (2, 8, 3), (-12, 0, 1)])
+@pytest.mark.parametrize('resolution_db', [0.5, 0.1, 0.02])
+def test_search_converges_within_the_resolution(gain_db, p1db_out_dbm, smoothness, resolution_db):
+    measure, ip1db_dbm = rapp_stage(gain_db, p1db_out_dbm, smoothness)
+    search = P1dbSearch(max_pin_dbm=20, resolution_db=resolution_db, max_points=20)
+
+    result = search.run(-30, measure)
+
+    assert abs(result['ip1db'] - ip1db_dbm) <= resolution_db
+    assert abs(result['op1db'] - p1db_out_dbm) <= resolution_db + 0.05
+    assert len(result['points']) <= 20
+
+
+def test_search_takes_fewer_points_than_a_1_db_sweep():
+    measure, ip1db_dbm = rapp_stage(-8, -5)
+
+    result = P1dbSearch(max_pin_dbm=20).run(-30, measure)
+
+    assert len(result['points']) < (ip1db_dbm - -30) / 1
+
+
+def test_warm_start_hint():
+    measure, ip1db_dbm = rapp_stage(-8, -5)
+    search = P1dbSearch(max_pin_dbm=20)
+
+    cold = search.run(-30, measure)
+    warm = search.run(-30, measure, hint_dbm=ip1db_dbm + 0.5)
+
+    assert abs(warm['ip1db'] - ip1db_dbm) <= search.resolution_db
+    assert len(warm['points']) <= len(cold['points'])
+
+
+def test_max_pin_reached_before_compression():
+    measure, ip1db_dbm = rapp_stage(-8, 15)
+
+    result = P1dbSearch(max_pin_dbm=5).run(-30, measure)
+
+    assert result['ip1db'] is None
+    assert max(pin for pin, pout in result['points']) == 5
+
+
+def test_start_above_max_pin():
+    with pytest.raises(ValueError):
+        P1dbSearch(max_pin_dbm=0).run(5, lambda pin: pin)
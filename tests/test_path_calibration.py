@@ -0,0 +1,109 @@
+## Path calibration: losses measured through the simulated thru, the per bench cache file and its revisions,
+## the typed loss whenever the calibration does not fit
+
+import datetime
+import os
+
+import numpy
+import pytest
+
+from dispatch import Dispatcher
+from loss_table import LossTable
+from path_calibration import PathCalibration, bench_name, calibrate_paths
+from settling import Settler
+from simulated_instruments import SimulatedBench
+
+INSTRUMENTS = {'if_rf_mxg': 'TCPIP0::192.168.1.11::inst0::INSTR', 'lo_mxg': 'TCPIP0::192.168.1.12::inst0::INSTR',
+               'specan': 'TCPIP0::192.168.1.20::inst0::INSTR'}
+
+# Loss of every connection the operator makes
+LOSSES = {'reference': 0.8, 'path1_loss_5': 7.96, 'path1_loss_40': 15, 'out_cable_loss_40': 3.3}
+
+
+def calibrate(paths, reference_loss):
+
+    simulated = SimulatedBench('LO')
+    generator = simulated.generator('IF')
+    specan = simulated.analyzer('FSV')
+    specan.noise_db = 0
+    settler = Settler('adaptive', poll_interval_s=0)
+
+    def connect(name):
+        simulated.connect_thru(LOSSES[name])
+
+    return calibrate_paths(paths, generator, specan, settler, Dispatcher(settler), -30, connect=connect,
+                           reference_loss=reference_loss)
+
+
+def test_each_bench_gets_its_own_file():
+    moved = dict(INSTRUMENTS, specan='TCPIP0::192.168.1.21::inst0::INSTR')
+
+    assert bench_name(INSTRUMENTS) == bench_name(dict(INSTRUMENTS))
+    assert bench_name(moved) != bench_name(INSTRUMENTS)
+
+    # The simulated bench opens the same addresses and still never shares the real bench's file
+    assert bench_name(INSTRUMENTS, 'fast') == 'simulated-' + bench_name(INSTRUMENTS)
+
+
+def test_calibration_finds_the_loss_of_every_path():
+    paths = {'path1_loss_5': [5.25, 5.57], 'path1_loss_40': [18, 24, 30], 'out_cable_loss_40': [18, 30]}
+
+    tables = calibrate(paths, LOSSES['reference'])
+
+    assert sorted(tables) == sorted(paths)
+    for name in paths:
+        assert tables[name].freq_ghz.tolist() == paths[name]
+        assert tables[name].loss_db == pytest.approx([LOSSES[name]] * len(paths[name]), abs=0.01)
+
+    # Taking the reference cable for a zero loss thru puts every path low by its loss
+    tables = calibrate({'path1_loss_5': [5.25]}, 0)
+    assert tables['path1_loss_5'].loss_db == pytest.approx([LOSSES['path1_loss_5'] - LOSSES['reference']], abs=0.01)
+
+
+def test_every_calibration_is_the_next_revision(tmp_path):
+    path = str(tmp_path / '{}.json'.format(bench_name(INSTRUMENTS)))
+    calibration = PathCalibration(path, 'ADMV1139', INSTRUMENTS)
+    assert calibration.revision == 0
+    assert calibration.describe().startswith('Typed losses')
+
+    tables = calibrate({'path1_loss_5': [5.25, 5.57], 'path1_loss_40': [18, 30]}, LOSSES['reference'])
+    assert calibration.save(tables, -30, INSTRUMENTS) == 1
+
+    # Only one path measured again, the other keeps its last calibration
+    tables = calibrate({'path1_loss_40': [18, 24, 30]}, LOSSES['reference'])
+    assert calibration.save(tables, -30, INSTRUMENTS) == 2
+
+    loaded = PathCalibration(path, 'ADMV1139', INSTRUMENTS)
+    assert loaded.revision == 2
+    assert sorted(loaded.paths) == ['path1_loss_40', 'path1_loss_5']
+    assert loaded.table('path1_loss_40').freq_ghz.tolist() == [18, 24, 30]
+    assert loaded.table('path1_loss_5').loss(5.25) == pytest.approx(LOSSES['path1_loss_5'], abs=0.01)
+    assert os.listdir(str(tmp_path)) == [os.path.basename(path)]
+
+    with pytest.raises(ValueError):
+        PathCalibration(path, 'MAMX-011054', INSTRUMENTS)
+
+
+def test_typed_loss_when_the_calibration_does_not_fit(tmp_path):
+    path = str(tmp_path / 'calibration.json')
+    PathCalibration(path, 'ADMV1139', INSTRUMENTS).save(
+        {'path1_loss_40': LossTable([18, 30], [14.8, 15.4], 'path1_loss_40')}, -30, INSTRUMENTS)
+    calibration = PathCalibration(path, 'ADMV1139', INSTRUMENTS)
+
+    table = calibration.loss('path1_loss_40', 15, [18, 24, 30])
+    assert table.loss(numpy.array([18, 24, 30])).tolist() == pytest.approx([14.8, 15.1, 15.4])
+
+    # Planned frequencies outside the calibration, a path never calibrated
+    assert calibration.loss('path1_loss_40', 15, [18, 36]) == 15
+    assert calibration.loss('path1_loss_5', 7.96, [5.25]) == 7.96
+    assert calibration.stale({'path1_loss_40': [18, 30]}, 30) == []
+    assert len(calibration.stale({'path1_loss_40': [18, 36], 'path1_loss_5': [5.25]}, 30)) == 2
+
+    # Too old to trust is flagged, the table is still the best there is
+    later = datetime.datetime.now() + datetime.timedelta(days=45)
+    assert 'days ago' in calibration.stale({'path1_loss_40': [18, 30]}, 30, later)[0]
+
+    # Measured with another analyzer, the typed loss until it is calibrated on this bench
+    moved = PathCalibration(path, 'ADMV1139', dict(INSTRUMENTS, specan='TCPIP0::192.168.1.21::inst0::INSTR'))
+    assert moved.loss('path1_loss_40', 15, [18, 30]) == 15
+    assert 'specan' in moved.stale({'path1_loss_40': [18, 30]}, 30)[0]
@@ -0,0 +1,168 @@
+## Record log, resume from a journal cut off part way through a line, the consumer thread and its queue
+
+import json
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, RecordLog, Resume, load_records
+
+
+# A run that died while writing its third record
+def torn_journal(path):
+    with open(path, 'w') as log_file:
+        log_file.write(json.dumps({'test': 'UPCONVERT', 'if': 5.25, 'rf': 18, 'index': 0, 'raw_pout': -30.1}) + '\n')
+        log_file.write(json.dumps({'test': 'UPCONVERT', 'if': 5.25, 'rf': 19, 'index': 1, 'raw_pout': -30.4}) + '\n')
+        log_file.write('{"test": "UPCONVERT", "if": 5.25, "rf": 20, "ind')
+
+
+class FakePipeline:
+    def __init__(self):
+        self.records = []
+
+    def put(self, record, log=True):
+        assert not log
+        self.records.append(record)
+
+
+# Consumer that fails on one frequency
+class FailingConsumer:
+    def __init__(self, fail_rf):
+        self.fail_rf = fail_rf
+        self.records = []
+
+    def __call__(self, record):
+        if record['rf'] == self.fail_rf:
+            raise ValueError('No loss at {} GHz'.format(record['rf']))
+        self.records.append(record)
+
+
+# Consumer that holds every record until it is released
+class BlockedConsumer:
+    def __init__(self):
+        self.release = threading.Event()
+        self.records = []
+
+    def __call__(self, record):
+        self.release.wait(5)
+        self.records.append(record)
+
+
+def test_load_records_drops_the_torn_line(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    torn_journal(path)
+
+    records = load_records(path)
+
+    assert [record['rf'] for record in records] == [18, 19]
+
+
+def test_resume_finds_only_complete_points(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    torn_journal(path)
+    resume = Resume(path)
+
+    assert resume.test() == 'UPCONVERT'
+    assert resume.find('UPCONVERT', {'if': 5.25, 'rf': 19, 'index': 1})['raw_pout'] == -30.4
+    assert resume.find('UPCONVERT', {'if': 5.25, 'rf': 20, 'index': 2}) is None
+    assert resume.find('DOWNCONVERT', {'if': 5.25, 'rf': 18, 'index': 0}) is None
+
+
+def test_replay_returns_the_points_left_to_measure(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    torn_journal(path)
+    points = [{'if': 5.25, 'rf': rf} for rf in (18, 19, 20, 21)]
+    pipeline = FakePipeline()
+
+    remaining = Resume(path).replay(pipeline, 'UPCONVERT', points, [3, 1, 0, 2])
+
+    assert remaining == [3, 2]
+    assert [record['index'] for record in pipeline.records] == [1, 0]
+
+
+def test_resumed_log_starts_a_new_line_after_the_torn_one(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    torn_journal(path)
+
+    record_log = RecordLog(path, resume=True)
+    record_log.write('UPCONVERT', {'if': 5.25, 'rf': 20, 'index': 2, 'raw_pout': -30.9})
+    record_log.close()
+
+    records = load_records(path)
+    assert [record['rf'] for record in records] == [18, 19, 20]
+    assert Resume(path).find('UPCONVERT', {'if': 5.25, 'rf': 20, 'index': 2})['raw_pout'] == -30.9
+
+
+def test_new_log_never_appends_to_another_run(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    torn_journal(path)
+
+    with pytest.raises(FileExistsError):
+        RecordLog(path)
+
+
+def test_records_consumed_and_logged_in_order(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    record_log = RecordLog(path)
+    consumed = []
+    pipeline = Pipeline(consumed.append, 'UPCONVERT', record_log)
+
+    for rf in (18, 19, 20):
+        pipeline.put({'rf': rf})
+    pipeline.put({'rf': 17}, log=False)
+    pipeline.close()
+    record_log.close()
+
+    assert [record['rf'] for record in consumed] == [18, 19, 20, 17]
+    assert [record['rf'] for record in load_records(path)] == [18, 19, 20]
+
+
+def test_consumer_error_raised_again_from_close():
+    consumer = FailingConsumer(19)
+    pipeline = Pipeline(consumer, 'UPCONVERT')
+
+    for rf in (18, 19, 20):
+        pipeline.put({'rf': rf})
+    with pytest.raises(ValueError, match='No loss at 19 GHz'):
+        pipeline.close()
+
+    # Nothing after the failed record reaches the consumer
+    assert [record['rf'] for record in consumer.records] == [18]
+
+
+def test_consumer_error_raised_again_from_put():
+    consumer = FailingConsumer(18)
+    pipeline = Pipeline(consumer, 'UPCONVERT')
+
+    pipeline.put({'rf': 18})
+    deadline = time.time() + 5
+    while pipeline.error is None and time.time() < deadline:
+        time.sleep(0.001)
+
+    with pytest.raises(ValueError, match='No loss at 18 GHz'):
+        pipeline.put({'rf': 19})
+    assert consumer.records == []
+
+
+def test_put_blocks_once_the_queue_is_full():
+    consumer = BlockedConsumer()
+    pipeline = Pipeline(consumer, 'UPCONVERT', max_records=2)
+    put = []
+
+    def sweep():
+        for rf in range(18, 24):
+            pipeline.put({'rf': rf})
+            put.append(rf)
+    thread = threading.Thread(target=sweep)
+    thread.start()
+
+    # One record with the consumer and two waiting, the fourth put waits for room
+    time.sleep(0.2)
+    assert put == [18, 19, 20]
+    assert thread.is_alive()
+
+    consumer.release.set()
+    thread.join(5)
+    pipeline.close()
+    assert [record['rf'] for record in consumer.records] == list(range(18, 24))
@@ -0,0 +1,107 @@
+## Re-processing a stored run with new losses: the corrected columns move by the loss difference, the raw ones stay
+
+import os
+
+import numpy
+import pytest
+
+from reprocess import reprocess
+from result_store import ResultStore, load_results
+
+
+OUTPUT_TABLE = {'freq_ghz': [18, 30], 'loss_db': [2, 4]}
+
+
+# An up conversion run and a TX OIP3 run corrected with 1.5 dB on the IF side and OUTPUT_TABLE on the RF side
+def stored_run(path):
+
+    if_ghz = numpy.array([5.25, 5.25, 5.25, 6.25])
+    rf_ghz = numpy.array([18, 24, 30, 27])
+    input_loss_db = numpy.full(4, 1.5)
+    output_loss_db = 2 + (rf_ghz - 18) / 6
+    raw_pout_dbm = numpy.array([-31, -32, -33, -34])
+    pin_dbm = numpy.full(4, -20.0)
+
+    store = ResultStore(path, {
+        'board': 'ADMV1139',
+        'test_notes': 'LO 12 dBm',
+        'losses': {'path1_loss_5': 1.5, 'out_cable_loss_40': OUTPUT_TABLE},
+        'loss_paths': {'input': ['path1_loss_5'], 'output': ['out_cable_loss_40'], 'input_ghz': 'if_ghz',
+                       'output_ghz': 'rf_ghz'},
+    })
+    store.add_columns('UPCONVERT', {
+        'if_ghz': if_ghz, 'rf_ghz': rf_ghz, 'pin_dbm': pin_dbm, 'input_loss_db': input_loss_db,
+        'output_loss_db': output_loss_db, 'raw_pout_dbm': raw_pout_dbm, 'pout_dbm': raw_pout_dbm + output_loss_db,
+        'gain_db': raw_pout_dbm + output_loss_db - pin_dbm,
+    })
+    store.add_columns('TX_OIP3', {
+        'if_ghz': if_ghz, 'rf_ghz': rf_ghz, 'pin_dbm': pin_dbm, 'input_loss_db': input_loss_db,
+        'output_loss_db': output_loss_db, 'raw_pout_dbm': raw_pout_dbm, 'raw_pout_high_dbm': raw_pout_dbm - 0.5,
+        'raw_im3_low_dbm': raw_pout_dbm - 40, 'raw_im3_high_dbm': raw_pout_dbm - 41,
+    })
+
+    return store.close()
+
+
+def test_new_output_table_shifts_every_output_by_the_loss_difference(tmp_path):
+    path = stored_run(str(tmp_path / 'run.results'))
+    metadata, before = load_results(path, mmap_mode=None)
+
+    # 1 dB more at 18 GHz, 3 dB more at 30 GHz
+    output, corrected, summaries = reprocess(path, {'out_cable_loss_40': {'freq_ghz': [18, 30], 'loss_db': [3, 7]}})
+
+    difference_db = numpy.array([1, 2, 3, 2.5])
+    upconvert = corrected['UPCONVERT']
+    assert upconvert['pout_dbm'] - before['UPCONVERT']['pout_dbm'] == pytest.approx(difference_db)
+    assert upconvert['gain_db'] - before['UPCONVERT']['gain_db'] == pytest.approx(difference_db)
+    assert upconvert['output_loss_db'] == pytest.approx([3, 5, 7, 6])
+    assert upconvert['pin_dbm'] == pytest.approx(before['UPCONVERT']['pin_dbm'])
+    assert upconvert['raw_pout_dbm'] == pytest.approx(before['UPCONVERT']['raw_pout_dbm'])
+
+    # Main tones and IM3 products all move with the output loss, and the OIP3 with them
+    tx_oip3 = corrected['TX_OIP3']
+    assert tx_oip3['pout_high_dbm'] - tx_oip3['raw_pout_high_dbm'] == pytest.approx([3, 5, 7, 6])
+    assert tx_oip3['im3_low_dbm'] - tx_oip3['raw_im3_low_dbm'] == pytest.approx([3, 5, 7, 6])
+    assert tx_oip3['oip3_dbm'] == pytest.approx(tx_oip3['raw_pout_dbm'] + [3, 5, 7, 6] + (20 + 19.75) / 2)
+
+    assert summaries == {}
+
+
+def test_new_input_loss_moves_the_board_input_power(tmp_path):
+    path = stored_run(str(tmp_path / 'run.results'))
+
+    output, corrected, summaries = reprocess(path, {'path1_loss_5': 2.5}, report=False)
+
+    # The source was set for 1.5 dB, with 2.5 dB the board saw 1 dB less and the gain is 1 dB higher
+    upconvert = corrected['UPCONVERT']
+    assert upconvert['pin_dbm'] == pytest.approx([-21] * 4)
+    assert upconvert['input_loss_db'] == pytest.approx([2.5] * 4)
+    assert upconvert['gain_db'] == pytest.approx(upconvert['pout_dbm'] + 21)
+
+
+def test_reprocessed_run_written_next_to_the_original(tmp_path):
+    path = stored_run(str(tmp_path / 'run.results'))
+
+    output, corrected, summaries = reprocess(path, {'path1_loss_5': 2.5})
+
+    assert output == str(tmp_path / 'run_reprocessed.results')
+    assert os.path.exists(str(tmp_path / 'run_reprocessed.xlsx'))
+
+    metadata, results = load_results(output, 'UPCONVERT')
+    assert metadata['reprocessed_from'] == path
+    assert metadata['original_losses']['path1_loss_5'] == 1.5
+    assert metadata['losses'] == {'path1_loss_5': 2.5, 'out_cable_loss_40': OUTPUT_TABLE}
+    assert results['pin_dbm'].tolist() == corrected['UPCONVERT']['pin_dbm'].tolist()
+
+
+def test_unknown_loss_setting_and_runs_without_loss_paths_are_refused(tmp_path):
+    path = stored_run(str(tmp_path / 'run.results'))
+    with pytest.raises(ValueError, match="Invalid loss setting 'path9_loss_5'"):
+        reprocess(path, {'path9_loss_5': 1}, report=False)
+
+    older = str(tmp_path / 'older.results')
+    store = ResultStore(older)
+    store.add('UPCONVERT', {'rf_ghz': 18, 'raw_pout_dbm': -31})
+    store.close()
+    with pytest.raises(ValueError, match='no loss settings stored'):
+        reprocess(older, {'path1_loss_5': 1}, report=False)
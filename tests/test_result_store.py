@@ -0,0 +1,100 @@
+## Result store: rows written as typed columns, read back with load_results, runs sharing a directory
+
+import numpy
+import pytest
+
+from result_store import STORE_FORMAT, ResultStore, load_results
+
+
+def upconversion_rows():
+    return [
+        {'if_ghz': 5.25, 'rf_ghz': 18, 'pout_dbm': -28.25, 'gain_db': -8.25},
+        {'if_ghz': 5.25, 'rf_ghz': 19, 'pout_dbm': -28.5, 'gain_db': -8.5},
+        {'if_ghz': 6.25, 'rf_ghz': 18, 'pout_dbm': -29.0, 'gain_db': None},
+    ]
+
+
+def test_rows_round_trip_through_the_directory(tmp_path):
+    path = str(tmp_path / 'run.results')
+    store = ResultStore(path, {'notes': 'board 3', 'if_loss': 1.5})
+    for row in upconversion_rows():
+        store.add('UPCONVERT', row)
+
+    assert store.close() == path
+    metadata, results = load_results(path, 'UPCONVERT')
+
+    assert metadata['format'] == STORE_FORMAT
+    assert (metadata['notes'], metadata['if_loss']) == ('board 3', 1.5)
+    assert metadata['tests']['UPCONVERT']['rows'] == 3
+    assert metadata['tests']['UPCONVERT']['columns']['pout_dbm']['unit'] == 'dBm'
+
+    assert results['rf_ghz'].tolist() == [18, 19, 18]
+    assert results['pout_dbm'].tolist() == [-28.25, -28.5, -29.0]
+    assert results['gain_db'][:2].tolist() == [-8.25, -8.5]
+    assert numpy.isnan(results['gain_db'][2])
+
+    # Frequencies keep float64, powers and gains are float32, memory mapped on the way back
+    assert results['if_ghz'].dtype == numpy.float64
+    assert results['pout_dbm'].dtype == numpy.float32
+    assert isinstance(results['pout_dbm'], numpy.memmap)
+
+
+def test_column_first_seen_later_is_nan_before(tmp_path):
+    store = ResultStore(str(tmp_path / 'run.results'))
+    store.add('TX_OIP3', {'rf_ghz': 18, 'pout_dbm': -30})
+    store.add('TX_OIP3', {'rf_ghz': 20, 'pout_dbm': -31, 'oip3_dbm': 4.5})
+
+    results = store.results()['TX_OIP3']
+
+    assert numpy.isnan(results['oip3_dbm'][0])
+    assert results['oip3_dbm'][1] == 4.5
+
+
+def test_add_columns_stores_the_same_as_add(tmp_path):
+    rows = upconversion_rows()
+    by_row = ResultStore(str(tmp_path / 'rows.results'))
+    for row in rows:
+        by_row.add('UPCONVERT', row)
+
+    by_column = ResultStore(str(tmp_path / 'columns.results'))
+    by_column.add_columns('UPCONVERT', dict(
+        (name, [numpy.nan if row[name] is None else row[name] for row in rows]) for name in rows[0]))
+
+    expected = by_row.results()['UPCONVERT']
+    results = by_column.results()['UPCONVERT']
+    assert sorted(results) == sorted(expected)
+    for name in expected:
+        numpy.testing.assert_array_equal(results[name], expected[name])
+    assert by_column.rows['UPCONVERT'] == 3
+
+
+def test_second_run_keeps_the_tests_already_stored(tmp_path):
+    path = str(tmp_path / 'run.results')
+    store = ResultStore(path, {'notes': 'board 3'})
+    store.add('UPCONVERT', {'rf_ghz': 18, 'gain_db': -8})
+    store.close()
+
+    store = ResultStore(path)
+    store.add('DOWNCONVERT', {'rf_ghz': 19, 'gain_db': -9})
+    store.close()
+
+    metadata, results = load_results(path, mmap_mode=None)
+    assert sorted(results) == ['DOWNCONVERT', 'UPCONVERT']
+    assert results['UPCONVERT']['gain_db'].tolist() == [-8]
+    assert results['DOWNCONVERT']['gain_db'].tolist() == [-9]
+    assert metadata['notes'] == 'board 3'
+
+
+def test_unknown_columns_and_tests_are_refused(tmp_path):
+    path = str(tmp_path / 'run.results')
+    store = ResultStore(path)
+
+    with pytest.raises(ValueError):
+        store.add('UPCONVERT', {'rf': 18})
+    with pytest.raises(ValueError):
+        store.add_columns('UPCONVERT', {'rf_ghz': [18, 19], 'gain_db': [-8]})
+
+    store.add('UPCONVERT', {'rf_ghz': 18})
+    store.close()
+    with pytest.raises(ValueError):
+        load_results(path, 'TX_P1DB')
@@ -0,0 +1,99 @@
+## Run database: the schema, a run and its points, the per board history lookup
+
+import sqlite3
+
+import numpy
+import pytest
+
+from result_store import COLUMNS
+from run_database import RunDatabase
+
+
+def metadata(board, dut, started):
+    return {'board': board, 'dut': dut, 'test': 'UPCONVERT', 'started': started, 'test_notes': 'LO 12 dBm',
+            'spreadsheet': 'ADMV1139_{}_UPCONVERT.xlsx'.format(dut), 'losses': {'if': 1.5, 'rf': 2},
+            'instruments': {'FSV': 'Rohde&Schwarz,FSV-40'}}
+
+
+# Two IFs at the same RF frequencies, the gain a little lower for every run
+def results(gain_db):
+    return {'UPCONVERT': {
+        'if_ghz': numpy.array([5.25, 5.25, 6.25, 6.25]),
+        'rf_ghz': numpy.array([18, 28, 18, 28], dtype=numpy.float64),
+        'gain_db': numpy.array([gain_db, gain_db - 1, gain_db - 0.5, numpy.nan], dtype=numpy.float32),
+    }}
+
+
+def test_schema_has_every_result_column(tmp_path):
+    database = RunDatabase(str(tmp_path / 'runs.sqlite'))
+
+    tables = [row[0] for row in database.query("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    indexes = [row[0] for row in database.query("SELECT name FROM sqlite_master WHERE type = 'index'")]
+    columns = [row[1] for row in database.query("PRAGMA table_info(points)")]
+
+    assert sorted(tables) == ['points', 'runs']
+    assert sorted(indexes) == ['points_board', 'points_dut', 'runs_board', 'runs_dut']
+    assert columns[:5] == ['run_id', 'board', 'dut', 'test', 'run_time']
+    assert sorted(columns[5:]) == sorted(COLUMNS)
+    database.close()
+
+
+def test_older_file_gains_the_new_columns(tmp_path):
+    path = str(tmp_path / 'runs.sqlite')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE points (run_id INTEGER, board TEXT, dut TEXT, test TEXT, run_time TEXT, "
+                       "rf_ghz REAL, gain_db REAL)")
+    connection.execute("INSERT INTO points VALUES (1, 'ADMV1139', '3', 'UPCONVERT', '2026-01-01', 18, -8)")
+    connection.commit()
+    connection.close()
+
+    database = RunDatabase(path)
+
+    columns = [row[1] for row in database.query("PRAGMA table_info(points)")]
+    assert sorted(columns[5:]) == sorted(COLUMNS)
+    assert database.query("SELECT rf_ghz, gain_db, oip3_dbm FROM points") == [(18, -8, None)]
+    database.close()
+
+
+def test_run_and_points_inserted(tmp_path):
+    database = RunDatabase(str(tmp_path / 'runs.sqlite'))
+
+    run_id = database.add_run(metadata('ADMV1139', '3', '2026-10-01T09:00:00'), results(-8))
+
+    runs = database.query("SELECT run_id, board, dut, test, notes, losses FROM runs")
+    assert runs == [(run_id, 'ADMV1139', '3', 'UPCONVERT', 'LO 12 dBm', '{"if": 1.5, "rf": 2}')]
+
+    points = database.query("SELECT board, test, run_time, if_ghz, rf_ghz, gain_db FROM points WHERE run_id = ? "
+                            "ORDER BY if_ghz, rf_ghz", (run_id,))
+    assert points == [
+        ('ADMV1139', 'UPCONVERT', '2026-10-01T09:00:00', 5.25, 18, -8),
+        ('ADMV1139', 'UPCONVERT', '2026-10-01T09:00:00', 5.25, 28, -9),
+        ('ADMV1139', 'UPCONVERT', '2026-10-01T09:00:00', 6.25, 18, -8.5),
+        ('ADMV1139', 'UPCONVERT', '2026-10-01T09:00:00', 6.25, 28, None),
+    ]
+    database.close()
+
+
+def test_history_of_one_board_newest_first(tmp_path):
+    database = RunDatabase(str(tmp_path / 'runs.sqlite'))
+    for day in range(1, 5):
+        database.add_run(metadata('ADMV1139', str(day), '2026-10-0{}T09:00:00'.format(day)), results(-8 - day))
+    database.add_run(metadata('MAMX-011054', '7', '2026-10-09T09:00:00'), results(-3))
+
+    history = database.history('ADMV1139', 'UPCONVERT', 'gain_db', 18.0000001, if_ghz=5.25)
+    assert history == [
+        ('2026-10-04T09:00:00', '4', 5.25, -12),
+        ('2026-10-03T09:00:00', '3', 5.25, -11),
+        ('2026-10-02T09:00:00', '2', 5.25, -10),
+        ('2026-10-01T09:00:00', '1', 5.25, -9),
+    ]
+
+    # Only the latest runs, every IF when none is given
+    history = database.history('ADMV1139', 'UPCONVERT', 'gain_db', 18, runs=2)
+    assert [run_time[:10] for run_time, dut, if_ghz, value in history] == ['2026-10-04'] * 2 + ['2026-10-03'] * 2
+    assert sorted(if_ghz for run_time, dut, if_ghz, value in history) == [5.25, 5.25, 6.25, 6.25]
+
+    assert database.history('ADMV1139', 'DOWNCONVERT', 'gain_db', 18) == []
+    with pytest.raises(ValueError):
+        database.history('ADMV1139', 'UPCONVERT', 'gain', 18)
+    database.close()
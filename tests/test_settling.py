@@ -0,0 +1,87 @@
+## Settling against the simulated instruments: waits only as long as the box needs, falls back to the fixed delay
+
+import time
+
+from settling import Settler
+from simulated_instruments import SimulatedSignalAnalyzer, SimulatedSignalGenerator
+
+
+# Stands in for a box whose *OPC? never answers
+class SilentGenerator(SimulatedSignalGenerator):
+    def query(self, command):
+        raise TimeoutError('{} timed out'.format(command))
+
+
+# A few retunes of a generator / analyzer pair, the way the sweeps step them
+def sweep(settler, fallback_s, points=3):
+
+    mxg = SimulatedSignalGenerator('SIM-MXG', latency_s=0, settle_s=0.02)
+    specan = SimulatedSignalAnalyzer('SIM-FSV', sources=[mxg], latency_s=0, settle_s=0.02, sweep_time_s=0.02)
+    mxg.set_amplitude(-20)
+    mxg.on()
+
+    start = time.time()
+    powers = []
+    for k in range(0, points):
+        mxg.set_frequency((18 + k) * 1e9)
+        settler.wait(mxg, 'set_frequency', fallback_s)
+        specan.set_frequency((18 + k) * 1e9)
+        settler.wait(specan, 'set_frequency', fallback_s)
+        specan.set_marker(1, (18 + k) * 1e9)
+        powers.append(settler.read_power(specan, 1))
+
+    return time.time() - start, powers
+
+
+def test_adaptive_settling_beats_the_fixed_delays():
+    fixed_s, fixed_powers = sweep(Settler('fixed'), 0.2)
+    adaptive_s, adaptive_powers = sweep(Settler('adaptive', poll_interval_s=0.005), 0.2)
+
+    # Six fixed 0.2 s delays against six 20 ms settles
+    assert fixed_s >= 1.2
+    assert adaptive_s < fixed_s / 2
+    for fixed, adaptive in zip(fixed_powers, adaptive_powers):
+        assert abs(fixed - adaptive) < 0.1
+
+
+def test_wait_returns_once_the_box_has_settled():
+    mxg = SimulatedSignalGenerator('SIM-MXG', latency_s=0, settle_s=0.05)
+    settler = Settler('adaptive')
+
+    mxg.set_frequency(20e9)
+    start = time.time()
+    settler.wait(mxg, 'set_frequency', 1)
+    elapsed_s = time.time() - start
+
+    assert 0.03 <= elapsed_s < 0.5
+    assert settler.fallbacks == 0
+    assert settler.waits == 1
+
+
+def test_wait_falls_back_to_the_fixed_delay():
+    mxg = SilentGenerator('SIM-MXG', latency_s=0, settle_s=0)
+    settler = Settler('adaptive')
+
+    start = time.time()
+    settler.wait(mxg, 'set_frequency', 0.1)
+
+    assert time.time() - start >= 0.1
+    assert settler.fallbacks == 1
+
+
+def test_read_power_waits_out_the_transient():
+    mxg = SimulatedSignalGenerator('SIM-MXG', latency_s=0, settle_s=0)
+    specan = SimulatedSignalAnalyzer('SIM-FSV', sources=[mxg], latency_s=0, settle_s=0, sweep_time_s=0.1,
+                                     transient_db=3)
+    settler = Settler('adaptive', tolerance_db=0.05, max_reads=50, poll_interval_s=0.01)
+    mxg.on()
+
+    # Read straight after the change, the readings climb for one sweep
+    mxg.set_amplitude(-10)
+    first_dbm = specan.get_power(1)
+    power_dbm = settler.read_power(specan, 1)
+
+    time.sleep(0.2)
+    settled_dbm = specan.get_power(1)
+    assert settled_dbm - first_dbm > 2
+    assert abs(power_dbm - settled_dbm) < 0.2
@@ -0,0 +1,118 @@
+## Source leveling through the simulated thru: the loop converges on the real path loss, cached corrections need one
+## read, a simulated bench levels into its own file
+
+import os
+
+import pytest
+
+from dispatch import Dispatcher
+from path_calibration import bench_name
+from settling import Settler
+from simulated_instruments import SimulatedBench
+from source_leveling import SourceLeveler, level_paths
+
+INSTRUMENTS = {'if_rf_mxg': 'TCPIP0::192.168.1.11::inst0::INSTR', 'lo_mxg': 'TCPIP0::192.168.1.12::inst0::INSTR',
+               'specan': 'TCPIP0::192.168.1.20::inst0::INSTR'}
+
+# Typed losses, the thru puts 0.7 dB more in front of the board than typed on the IF path
+PATHS = {
+    'path1_loss_5': {'generator': 'if_rf_mxg', 'freq_ghz': [5.25, 5.57, 6.25], 'loss': 7.96, 'output_loss': 1},
+    'path1_loss_40': {'generator': 'if_rf_mxg', 'freq_ghz': [18, 24, 30], 'loss': 15, 'output_loss': 3.3},
+}
+ACTUAL_LOSSES = {'path1_loss_5': 8.66, 'path1_loss_40': 15}
+
+
+def level(leveler, paths=PATHS):
+
+    simulated = SimulatedBench('LO')
+    generator = simulated.generator('IF')
+    specan = simulated.analyzer('FSV')
+    specan.noise_db = 0
+    settler = Settler('adaptive', poll_interval_s=0)
+
+    def connect(name):
+        simulated.connect_thru(ACTUAL_LOSSES[name], paths[name]['output_loss'])
+
+    return level_paths(paths, {'if_rf_mxg': generator}, INSTRUMENTS, specan, settler, Dispatcher(settler), leveler,
+                       -10, connect)
+
+
+def test_loop_converges_on_the_real_path_loss(tmp_path):
+    leveler = SourceLeveler(str(tmp_path / 'leveling.json'), 'ADMV1139', tolerance_db=0.05)
+
+    tables = level(leveler)
+
+    assert tables['path1_loss_5'].loss_db == pytest.approx([0.7] * 3, abs=0.05)
+    assert tables['path1_loss_40'].loss_db == pytest.approx([0] * 3, abs=0.05)
+    assert leveler.leveled == 6
+
+    # Only the first IF frequency needs a second read, the next ones start from its correction
+    assert leveler.reads == (2 + 1 + 1) + 3
+
+    # The sweeps then set the source for the leveled loss
+    loss = leveler.apply('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 7.96)
+    assert loss.loss(5.57) == pytest.approx(8.66, abs=0.05)
+
+
+def test_cached_corrections_need_one_read(tmp_path):
+    path = str(tmp_path / 'leveling.json')
+    leveler = SourceLeveler(path, 'ADMV1139')
+    level(leveler)
+    assert leveler.save() == 1
+
+    cached = SourceLeveler(path, 'ADMV1139')
+    assert cached.correction('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 5.57) == (
+        pytest.approx(0.7, abs=0.05), True)
+
+    level(cached)
+    assert cached.reads == 6
+    assert cached.save() == 2
+
+    # A new frequency starts from its nearest leveled one and is on target with the first read too
+    paths = {'path1_loss_5': dict(PATHS['path1_loss_5'], freq_ghz=[5.4])}
+    assert cached.correction('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 5.4)[1] is False
+    level(cached, paths)
+    assert cached.reads == 7
+
+
+def test_another_generator_starts_over(tmp_path):
+    leveler = SourceLeveler(str(tmp_path / 'leveling.json'), 'ADMV1139')
+    level(leveler)
+
+    other = 'TCPIP0::192.168.1.13::inst0::INSTR'
+    assert leveler.correction('path1_loss_5', other, 5.25) == (0, False)
+    assert leveler.table('path1_loss_5', other) is None
+    assert leveler.apply('path1_loss_5', other, 7.96) == 7.96
+
+
+def test_open_connection_is_not_leveled_away(tmp_path):
+    leveler = SourceLeveler(str(tmp_path / 'leveling.json'), 'ADMV1139', max_correction_db=6)
+
+    with pytest.raises(ValueError, match='check the connection'):
+        leveler.level('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 5.25, -10, 7.96, lambda amplitude_dbm: None,
+                      lambda: -60)
+
+
+def test_simulated_bench_levels_into_its_own_file(tmp_path):
+    real_path = str(tmp_path / 'ADMV1139_source_leveling_{}.json'.format(bench_name(INSTRUMENTS)))
+    simulated_path = str(tmp_path / 'ADMV1139_source_leveling_{}.json'.format(bench_name(INSTRUMENTS, 'fast')))
+
+    # The real path has 0.2 dB more loss than typed
+    amplitude = []
+    real = SourceLeveler(real_path, 'ADMV1139')
+    real.level('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 5.25, -10, 7.96, amplitude.append,
+               lambda: amplitude[-1] - 8.16)
+    real.save()
+
+    simulated = SourceLeveler(simulated_path, 'ADMV1139')
+    level(simulated)
+    simulated.save()
+
+    assert simulated_path != real_path
+    assert sorted(os.listdir(str(tmp_path))) == sorted([os.path.basename(real_path), os.path.basename(simulated_path)])
+
+    # The real bench still has only its own correction
+    real = SourceLeveler(real_path, 'ADMV1139')
+    assert real.revision == 1
+    assert sorted(real.paths) == ['path1_loss_5']
+    assert real.correction('path1_loss_5', INSTRUMENTS['if_rf_mxg'], 5.25) == (pytest.approx(0.2), True)
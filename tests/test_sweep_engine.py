@@ -0,0 +1,447 @@
+## Sweep engine against the simulated bench
+
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+import xlsxwriter
+
+from compression import analyze_compression
+from dispatch import Dispatcher
+from pipeline import RecordLog, load_records
+from settling import Settler
+from simulated_instruments import SimulatedBench, SimulatedSignalAnalyzer
+from p1db_search import P1dbSearch
+from pipeline import Resume
+from sweep_engine import (SUMMARY_COLUMNS, TONE_METRICS, TONE_STORE, TWO_TONE_METRICS, TWO_TONE_STORE, compile_sweep,
+                          run_sweep)
+
+XLSX = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+# Stands in for an analyzer that drops off the LAN once the sweep gets to one frequency
+class FailingAnalyzer(SimulatedSignalAnalyzer):
+    def __init__(self, fail_hz, **analyzer):
+        SimulatedSignalAnalyzer.__init__(self, **analyzer)
+        self.fail_hz = fail_hz
+
+    def get_power(self, marker):
+        if self.frequency_hz == self.fail_hz:
+            raise RuntimeError('{} timed out'.format(self.name))
+        return SimulatedSignalAnalyzer.get_power(self, marker)
+
+
+# Result store slower than the bench, the pipeline thread is still writing when the sweep stops
+class SlowStore:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, test, row):
+        time.sleep(0.02)
+        self.rows.append(row)
+
+
+# Simulated board with an IF and an LO generator, the analyzer on the RF side
+def bench(analyzer=None, **analyzer_args):
+
+    simulated = SimulatedBench('LO')
+    if_mxg = simulated.generator('IF')
+    lo_mxg = simulated.generator('LO')
+    if analyzer is None:
+        specan = simulated.analyzer('FSV')
+    else:
+        specan = analyzer(name='FSV', latency_s=0, settle_s=0, sweep_time_s=0, dut=simulated.dut, **analyzer_args)
+
+    return if_mxg, lo_mxg, specan
+
+
+# The up conversion spec the way main builds it, with no settle delays
+def upconvert_spec(if_mxg, lo_mxg, specan, if_freq=(5.25, 6.25), rf_freq=(18, 19, 20, 21)):
+    return {
+        'test': 'UPCONVERT',
+        'dimensions': [('if', list(if_freq)), ('rf', list(rf_freq))],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg, 'frequency': 'if', 'level': -20, 'loss': 1.5, 'pin': 'pin', 'fallback_s': 0},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': 12, 'loss': 1, 'pin': 'lo_pin',
+             'cost': 'lo_frequency', 'fallback_s': 0},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': 2},
+        'measure': 'tone',
+        'metrics': TONE_METRICS,
+        'sheet': 'Up_Conversion',
+        'columns': [
+            ('IF Frequency (GHz)', 'if'),
+            ('LO Frequency (GHz)', 'lo'),
+            ('RF Frequency (GHz)', 'rf'),
+            ('Specan Raw Pin (dBm)', 'raw_pout'),
+            ('Eval Board RF Pout (dBm)', 'pout'),
+            ('Eval Board IF Pin (dBm)', 'pin'),
+            ('Eval Board LO Pin (dBm)', 'lo_pin'),
+            ('Eval Board Conversion Gain (dB)', 'gain'),
+        ],
+        'store': TONE_STORE,
+    }
+
+
+# The down conversion spec the way main builds it, RF in and IF out
+def downconvert_spec(rf_mxg, lo_mxg, specan, if_freq=(5.25, 6.25), rf_freq=(18, 19, 20, 21)):
+    return {
+        'test': 'DOWNCONVERT',
+        'dimensions': [('if', list(if_freq)), ('rf', list(rf_freq))],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': rf_mxg, 'frequency': 'rf', 'level': -20, 'loss': 2, 'pin': 'pin', 'fallback_s': 0},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': 12, 'loss': 1, 'pin': 'lo_pin',
+             'cost': 'lo_frequency', 'fallback_s': 0},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'if', 'loss': 1.5},
+        'measure': 'tone',
+        'metrics': TONE_METRICS,
+        'sheet': 'Down_Conversion',
+        'columns': [('IF Frequency (GHz)', 'if'), ('Eval Board IF Pout (dBm)', 'pout')],
+        'store': TONE_STORE,
+    }
+
+
+# The TX OIP3 spec the way main builds it, two IF tones around each IF
+def tx_oip3_spec(if_mxg_1, if_mxg_2, lo_mxg, specan, if_freq=(5.25, 6.25), tones=(20, 80), rf_freq=(18, 20)):
+    return {
+        'test': 'TX_OIP3',
+        'dimensions': [('if', list(if_freq)), ('tone', list(tones)), ('rf', list(rf_freq))],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg_1, 'frequency': 'if', 'tone_offset': -0.5, 'level': -20, 'loss': 1.5,
+             'pin': 'pin', 'fallback_s': 0},
+            {'instrument': if_mxg_2, 'frequency': 'if', 'tone_offset': 0.5, 'level': -20, 'loss': 1.6,
+             'fallback_s': 0},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': 12, 'loss': 1, 'cost': 'lo_frequency',
+             'fallback_s': 0},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': 2},
+        'measure': 'two_tone',
+        'metrics': TWO_TONE_METRICS,
+        'sheet': 'Up_Conversion_IP3',
+        'columns': [('IF Frequency (GHz)', 'if'), ('IM Tone Separation (MHz)', 'tone'), ('OIP3 (dBm)', 'oip3')],
+        'store': TWO_TONE_STORE,
+    }
+
+
+# The TX P1dB spec the way main builds it, stepping the IF power
+def tx_p1db_spec(if_mxg, lo_mxg, specan, pins, if_freq=(5.25, 6.25), rf_freq=(18, 20, 22)):
+    return {
+        'test': 'TX_P1DB',
+        'dimensions': [('if', list(if_freq)), ('rf', list(rf_freq))],
+        'derived': [('lo', lambda point: (point['rf'] + point['if']) / 4)],
+        'sources': [
+            {'instrument': if_mxg, 'frequency': 'if', 'level': pins[0], 'loss': 0, 'pin': 'pin', 'fallback_s': 0},
+            {'instrument': lo_mxg, 'frequency': 'lo', 'level': 12, 'loss': 0, 'cost': 'lo_frequency',
+             'fallback_s': 0},
+        ],
+        'analyzer': {'instrument': specan, 'frequency': 'rf', 'loss': 2},
+        'measure': 'compression',
+        'metrics': TONE_METRICS,
+        'sheet': 'Up_Conversion_OP1dB',
+        'pin_label': 'IF Pin',
+        'store': TONE_STORE,
+        'pins': pins,
+    }
+
+
+def settler():
+    return Settler('adaptive', poll_interval_s=0)
+
+
+# Passes everything through to the instrument and keeps the set_ calls in order
+class Recorder:
+    def __init__(self, instrument, calls):
+        self.instrument = instrument
+        self.calls = calls
+
+    def __getattr__(self, name):
+        attribute = getattr(self.instrument, name)
+        if not name.startswith('set_'):
+            return attribute
+
+        def call(*args):
+            self.calls.append((self.instrument.name, name, args))
+            return attribute(*args)
+        return call
+
+
+# Keeps every cell written, the way xlsxwriter would put them in the sheet
+class Sheet:
+    def __init__(self, name):
+        self.name = name
+        self.cells = {}
+
+    def write(self, row, col, value):
+        self.cells[(row, col)] = value
+
+    def write_row(self, row, col, data):
+        for offset in range(0, len(data)):
+            self.cells[(row, col + offset)] = data[offset]
+
+    def rows(self):
+        return [[self.cells.get((row, col)) for col in range(0, 1 + max(c for r, c in self.cells))]
+                for row in range(0, 1 + max(r for r, c in self.cells))]
+
+
+class Workbook:
+    def __init__(self):
+        self.sheets = {}
+
+    def add_worksheet(self, name):
+        self.sheets[name] = Sheet(name)
+        return self.sheets[name]
+
+
+# The up conversion sweep as main ran it before the engine, less the fixed delays
+def hand_written_upconversion(workbook, if_freq, rf_freq, if_pin, lo_pin, if_mxg, lo_mxg, specan, if_loss, lo_loss,
+                              rf_loss):
+
+    if_frequencies = []
+    lo_frequencies = []
+    rf_frequencies = []
+    raw_pout = []
+
+    if_mxg.set_amplitude(if_pin + if_loss)
+    lo_mxg.set_amplitude(lo_pin + lo_loss)
+    if_mxg.on()
+    lo_mxg.on()
+
+    for i in range(0, len(if_freq)):
+        if_mxg.set_frequency(if_freq[i] * 1e9)
+        for j in range(0, len(rf_freq)):
+            specan.set_frequency(rf_freq[j] * 1e9)
+            lo_freq = (rf_freq[j] + if_freq[i]) / 4
+            lo_mxg.set_frequency(lo_freq * 1e9)
+            specan.set_marker(1, rf_freq[j] * 1e9)
+
+            raw_pout.append(specan.get_power(1))
+            if_frequencies.append(if_freq[i])
+            lo_frequencies.append(lo_freq)
+            rf_frequencies.append(rf_freq[j])
+
+    worksheet = workbook.add_worksheet('Up_Conversion')
+    row = 0
+    worksheet.write(row, 0, 'IF Frequency (GHz)')
+    worksheet.write(row, 1, 'LO Frequency (GHz)')
+    worksheet.write(row, 2, 'RF Frequency (GHz)')
+    worksheet.write(row, 3, 'Specan Raw Pin (dBm)')
+    worksheet.write(row, 4, 'Eval Board RF Pout (dBm)')
+    worksheet.write(row, 5, 'Eval Board IF Pin (dBm)')
+    worksheet.write(row, 6, 'Eval Board LO Pin (dBm)')
+    worksheet.write(row, 7, 'Eval Board Conversion Gain (dB)')
+
+    for i in range(0, len(raw_pout)):
+        row = row + 1
+        worksheet.write(row, 0, if_frequencies[i])
+        worksheet.write(row, 1, lo_frequencies[i])
+        worksheet.write(row, 2, rf_frequencies[i])
+        worksheet.write(row, 3, raw_pout[i])
+        worksheet.write(row, 4, raw_pout[i] + rf_loss)
+        worksheet.write(row, 5, if_pin)
+        worksheet.write(row, 6, lo_pin)
+        worksheet.write(row, 7, raw_pout[i] + rf_loss - if_pin)
+
+    return worksheet
+
+
+# Rows of one sheet of a closed workbook, as the xlsx has them (numbers, inline or shared strings, None for a gap)
+def read_sheet(path, sheet):
+
+    with zipfile.ZipFile(path) as xlsx:
+        shared = []
+        if 'xl/sharedStrings.xml' in xlsx.namelist():
+            for item in ElementTree.fromstring(xlsx.read('xl/sharedStrings.xml')).iter(XLSX + 'si'):
+                shared.append(''.join(text.text or '' for text in item.iter(XLSX + 't')))
+        root = ElementTree.fromstring(xlsx.read('xl/worksheets/sheet{}.xml'.format(sheet)))
+
+    rows = []
+    for row in root.iter(XLSX + 'row'):
+        cells = {}
+        for cell in row.iter(XLSX + 'c'):
+            letters = re.match('[A-Z]+', cell.get('r')).group(0)
+            col = 0
+            for letter in letters:
+                col = col * 26 + ord(letter) - ord('A') + 1
+            if cell.get('t') == 'inlineStr':
+                cells[col - 1] = ''.join(text.text or '' for text in cell.iter(XLSX + 't'))
+            elif cell.get('t') == 's':
+                cells[col - 1] = shared[int(cell.find(XLSX + 'v').text)]
+            elif cell.find(XLSX + 'v') is not None:
+                cells[col - 1] = float(cell.find(XLSX + 'v').text)
+        rows.append([cells.get(col) for col in range(0, max(cells) + 1)] if cells else [])
+
+    return rows
+
+
+def test_sweep_that_stops_part_way_keeps_every_measured_point(tmp_path):
+    if_mxg, lo_mxg, specan = bench(FailingAnalyzer, fail_hz=20e9)
+    spec = upconvert_spec(if_mxg, lo_mxg, specan)
+    plan = compile_sweep(spec)
+
+    # Every point measured before the analyzer stops answering
+    first_failure = [plan['points'][index]['rf'] for index in plan['order']].index(20)
+    measured = plan['order'][:first_failure]
+    assert measured
+
+    workbook = xlsxwriter.Workbook(str(tmp_path / 'run.xlsx'), {'constant_memory': True})
+    record_log = RecordLog(str(tmp_path / 'run.jsonl'))
+    try:
+        with pytest.raises(RuntimeError):
+            run_sweep(workbook, spec, settler(), Dispatcher(settler(), concurrent=False), record_log=record_log,
+                      result_store=SlowStore())
+    finally:
+        record_log.close()
+        workbook.close()
+
+    records = load_records(str(tmp_path / 'run.jsonl'))
+    assert [record['index'] for record in records] == measured
+    assert all(record['test'] == 'UPCONVERT' for record in records)
+
+
+def test_p1db_sheets_have_a_row_per_frequency_point(tmp_path):
+    if_mxg, lo_mxg, specan = bench()
+    pins = list(range(-20, 12, 2))
+    spec = tx_p1db_spec(if_mxg, lo_mxg, specan, pins)
+    plan = compile_sweep(spec)
+
+    path = str(tmp_path / 'run.xlsx')
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    run_sweep(workbook, spec, settler(), Dispatcher(settler(), concurrent=False))
+    workbook.close()
+
+    calibrated = read_sheet(path, 1)
+    raw = read_sheet(path, 2)
+    summary = [name for name, result, level_db, output in SUMMARY_COLUMNS]
+    powers = ['Pout(dBm), IF Pin {}dBm'.format(pin) for pin in pins]
+    assert calibrated[0] == ['RF (GHz)', 'LO (GHz)', 'IF (GHz)'] + powers + summary
+    assert raw[0][3] == 'Pout_raw(dBm), IF Pin -20dBm'
+
+    # Report order, whatever order the points were measured in
+    assert len(calibrated) == len(raw) == len(plan['points']) + 1
+    for point, row, raw_row in zip(plan['points'], calibrated[1:], raw[1:]):
+        assert row[:3] == raw_row[:3] == [point['rf'], point['lo'], point['if']]
+
+        # Output powers and points get the 2 dB output loss, input powers are as set
+        raw_pouts = raw_row[3:3 + len(pins)]
+        assert row[3:3 + len(pins)] == pytest.approx([raw_pout + 2 for raw_pout in raw_pouts])
+
+        compression = analyze_compression(pins, raw_pouts)
+        ip1db, op1db = row[3 + len(pins)], row[4 + len(pins)]
+        assert ip1db is not None
+        assert ip1db == pytest.approx(compression['ip_dbm'][1][0])
+        assert op1db == pytest.approx(compression['op_dbm'][1][0] + 2)
+        assert raw_row[3 + len(pins)] == pytest.approx(ip1db)
+
+
+@pytest.mark.parametrize('build, dimensions', [
+    (lambda if_mxg, if_mxg_2, lo_mxg, specan: upconvert_spec(if_mxg, lo_mxg, specan), ['if', 'rf']),
+    (lambda if_mxg, if_mxg_2, lo_mxg, specan: downconvert_spec(if_mxg, lo_mxg, specan), ['if', 'rf']),
+    (lambda if_mxg, if_mxg_2, lo_mxg, specan: tx_p1db_spec(if_mxg, lo_mxg, specan, [-10, -5, 0]), ['if', 'rf']),
+    (lambda if_mxg, if_mxg_2, lo_mxg, specan: tx_oip3_spec(if_mxg, if_mxg_2, lo_mxg, specan), ['if', 'tone', 'rf']),
+])
+def test_compile_every_spec(build, dimensions):
+    simulated = SimulatedBench('LO')
+    spec = build(simulated.generator('IF'), simulated.generator('IF2'), simulated.generator('LO'),
+                 simulated.analyzer('FSV'))
+    plan = compile_sweep(spec)
+
+    sizes = [len(values) for key, values in spec['dimensions']]
+    count = 1
+    for size in sizes:
+        count = count * size
+    assert plan['dimensions'] == dimensions
+    assert len(plan['points']) == count
+    assert sorted(plan['order']) == list(range(0, count))
+
+    # Report order, the LO worked out at every point
+    for index, point in enumerate(plan['points']):
+        assert plan['index_of'][tuple(point[key] for key in dimensions)] == index
+        assert point['lo'] == pytest.approx((point['rf'] + point['if']) / 4)
+
+    # A level and a loss per source and point, the analyzer loss per point
+    for s in range(0, len(spec['sources'])):
+        assert plan['levels'][s] == [spec['sources'][s]['level']] * count
+        assert plan['losses'][s] == [spec['sources'][s]['loss']] * count
+    assert plan['output_losses'] == [spec['analyzer']['loss']] * count
+
+
+def test_commands_follow_the_planned_order():
+    if_mxg, lo_mxg, specan = bench()
+    calls = []
+    spec = upconvert_spec(Recorder(if_mxg, calls), Recorder(lo_mxg, calls), Recorder(specan, calls))
+    plan = compile_sweep(spec)
+
+    run_sweep(Workbook(), spec, settler(), Dispatcher(settler(), concurrent=False))
+
+    # The first point's source powers, then only what changed from one point to the next
+    points = [plan['points'][index] for index in plan['order']]
+    expected = [('IF', 'set_amplitude', (-18.5,)), ('LO', 'set_amplitude', (13,))]
+    previous = None
+    for point in points:
+        if previous is None or point['if'] != previous['if']:
+            expected.append(('IF', 'set_frequency', (point['if'] * 1e9,)))
+            expected.append(('IF', 'set_amplitude', (-18.5,)))
+        if previous is None or point['lo'] != previous['lo']:
+            expected.append(('LO', 'set_frequency', (point['lo'] * 1e9,)))
+            expected.append(('LO', 'set_amplitude', (13,)))
+        if previous is None or point['rf'] != previous['rf']:
+            expected.append(('FSV', 'set_frequency', (point['rf'] * 1e9,)))
+            expected.append(('FSV', 'set_marker', (1, point['rf'] * 1e9)))
+        previous = point
+    assert calls == expected
+
+    # Fewer retunes than the report order the hand written loops stepped in
+    assert plan['order'] != list(range(0, len(plan['points'])))
+
+
+def test_rows_match_the_hand_written_sweep():
+    rows = []
+    for run in ('engine', 'hand written'):
+        if_mxg, lo_mxg, specan = bench()
+        specan.noise_db = 0
+        workbook = Workbook()
+        if run == 'engine':
+            run_sweep(workbook, upconvert_spec(if_mxg, lo_mxg, specan), settler(),
+                      Dispatcher(settler(), concurrent=False))
+        else:
+            hand_written_upconversion(workbook, [5.25, 6.25], [18, 19, 20, 21], -20, 12, if_mxg, lo_mxg, specan,
+                                      1.5, 1, 2)
+        rows.append(workbook.sheets['Up_Conversion'].rows())
+
+    engine, hand_written = rows
+    assert engine[0] == hand_written[0]
+    assert len(engine) == len(hand_written) == 9
+    for engine_row, hand_written_row in zip(engine[1:], hand_written[1:]):
+        assert engine_row == pytest.approx(hand_written_row)
+
+
+def test_resumed_search_does_not_log_its_results_again(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    rows = []
+    for resume in (None, path):
+        if_mxg, lo_mxg, specan = bench()
+        spec = tx_p1db_spec(if_mxg, lo_mxg, specan, [-10])
+        spec['search'] = P1dbSearch(max_pin_dbm=15, resolution_db=0.25)
+        del spec['pins']
+
+        workbook = Workbook()
+        record_log = RecordLog(path, resume=resume is not None)
+        try:
+            run_sweep(workbook, spec, settler(), Dispatcher(settler(), concurrent=False), record_log=record_log,
+                      resume=Resume(resume) if resume is not None else None)
+        finally:
+            record_log.close()
+        rows.append(workbook.sheets['Up_Conversion_OP1dB'].rows())
+
+    # Every point of the finished run came back from the record log, nothing was measured or logged twice
+    records = load_records(path)
+    summaries = [record for record in records if record['kind'] == 'p1db']
+    assert len(summaries) == len(compile_sweep(spec)['points'])
+    assert len(records) == len(set(tuple(sorted(record.items())) for record in records))
+    assert rows[0] == rows[1]
@@ -0,0 +1,91 @@
+## Sweep order planning: serpentine nesting, every point once, fewer LO / source changes than row-major
+
+import itertools
+
+import pytest
+
+from sweep_planner import RETUNE_COSTS_S, changed_keys, order_cost, plan_order, serpentine_order
+
+
+# Up conversion points in report order, the LO follows the IF and RF
+def upconversion_points(if_freq, rf_freq):
+    points = []
+    for if_ghz, rf_ghz in itertools.product(if_freq, rf_freq):
+        points.append({'if': if_ghz, 'rf': rf_ghz, 'lo': (rf_ghz + if_ghz) / 4})
+    return points
+
+
+UPCONVERSION_COSTS_S = {
+    'if': RETUNE_COSTS_S['source_frequency'],
+    'lo': RETUNE_COSTS_S['lo_frequency'],
+    'rf': RETUNE_COSTS_S['specan_frequency'] + RETUNE_COSTS_S['marker'],
+}
+
+
+# Number of times a key changes value along the order
+def changes(points, order, key):
+    return len([k for k in range(1, len(order)) if points[order[k]][key] != points[order[k - 1]][key]])
+
+
+def test_serpentine_moves_one_dimension_at_a_time():
+    points = [{'a': a, 'b': b, 'c': c} for a, b, c in itertools.product([1, 2, 3], [10, 20], [5, 6, 7])]
+
+    order = serpentine_order(points, ['a', 'b', 'c'])
+
+    assert sorted(order) == list(range(0, len(points)))
+    for k in range(1, len(order)):
+        assert len(changed_keys(points[order[k - 1]], points[order[k]])) == 1
+
+    # The inner level turns back at the end of each run instead of jumping to its start
+    assert [points[index]['c'] for index in order[:6]] == [5, 6, 7, 7, 6, 5]
+
+
+@pytest.mark.parametrize('if_freq, rf_freq', [
+    ([5.25], [18, 19, 20]),
+    ([5.25, 5.57, 6.25], [18, 19, 20, 21, 22]),
+    ([5.25, 6.25, 7.25, 8.25, 9.25], [18, 20]),
+])
+def test_plan_is_a_permutation_of_the_points(if_freq, rf_freq):
+    points = upconversion_points(if_freq, rf_freq)
+
+    order = plan_order(points, ['if', 'rf'], UPCONVERSION_COSTS_S)
+
+    assert sorted(order) == list(range(0, len(points)))
+
+
+def test_plan_retunes_the_lo_less_than_row_major():
+    # Fixed LO steps with the IF outside them in report order, row-major moves the LO at every point
+    points = [{'if': if_ghz, 'lo': lo_ghz} for if_ghz, lo_ghz in itertools.product([5.25, 5.57, 6.25], [5, 6, 7, 8])]
+    costs_s = {'if': RETUNE_COSTS_S['source_frequency'], 'lo': RETUNE_COSTS_S['lo_frequency']}
+    row_major = list(range(0, len(points)))
+
+    order = plan_order(points, ['if', 'lo'], costs_s)
+
+    assert changes(points, row_major, 'lo') == 11
+    assert changes(points, order, 'lo') == 3
+    assert order_cost(points, order, costs_s) < order_cost(points, row_major, costs_s)
+
+
+def test_plan_costs_less_than_row_major():
+    points = upconversion_points([5.25, 5.57, 6.25], [18, 19, 20, 21, 22, 23])
+    row_major = list(range(0, len(points)))
+
+    order = plan_order(points, ['if', 'rf'], UPCONVERSION_COSTS_S)
+
+    # The analyzer and marker move less, the cheap IF source more
+    assert order_cost(points, order, UPCONVERSION_COSTS_S) < order_cost(points, row_major, UPCONVERSION_COSTS_S)
+    assert changes(points, order, 'rf') < changes(points, row_major, 'rf')
+
+
+def test_single_valued_dimension_keeps_the_report_order():
+    points = upconversion_points([5.25], [18, 19, 20])
+
+    assert plan_order(points, ['if', 'rf'], UPCONVERSION_COSTS_S) == [0, 1, 2]
+
+
+def test_order_cost_counts_every_setting_of_the_first_point():
+    points = upconversion_points([5.25], [18, 19])
+
+    assert order_cost(points, [0], UPCONVERSION_COSTS_S) == pytest.approx(sum(UPCONVERSION_COSTS_S.values()))
+    assert order_cost(points, [0, 1], UPCONVERSION_COSTS_S) == pytest.approx(
+        sum(UPCONVERSION_COSTS_S.values()) + UPCONVERSION_COSTS_S['lo'] + UPCONVERSION_COSTS_S['rf'])
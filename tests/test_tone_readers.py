@@ -0,0 +1,190 @@
+## Tone readers for the two tone sweeps against the simulated analyzer
+
+import numpy
+import pytest
+
+from settling import Settler
+from simulated_instruments import SimulatedBench, SimulatedSignalAnalyzer
+from tone_readers import MarkerToneReader, MultiMarkerToneReader, TraceToneReader, fetch_trace, peak_powers
+
+TONES_HZ = [18e9, 18.02e9, 18.04e9]
+
+
+# An analyzer wrapper with only the high level calls, no VISA resource to send raw SCPI through
+class WrapperOnlyAnalyzer:
+    def __init__(self, specan):
+        self.specan = specan
+
+    def set_marker_state(self, marker, state):
+        self.specan.set_marker_state(marker, state)
+
+    def set_marker(self, marker, frequency_hz):
+        self.specan.set_marker(marker, frequency_hz)
+
+    def get_power(self, marker):
+        return self.specan.get_power(marker)
+
+
+# Simulated analyzer whose firmware answers a multi-marker query with one comma separated reply
+class CommaAnalyzer(SimulatedSignalAnalyzer):
+    def query(self, command):
+        return SimulatedSignalAnalyzer.query(self, command).replace(';', ',')
+
+
+# Simulated analyzer that reports one sweep point more than it sends
+class ShortTraceAnalyzer(SimulatedSignalAnalyzer):
+    def query(self, command):
+        reply = SimulatedSignalAnalyzer.query(self, command)
+        if command.endswith('SWE:POIN?'):
+            values = reply.split(';')
+            reply = ';'.join(values[:-1] + [str(int(values[-1]) + 1)])
+        return reply
+
+
+# Two generator tones through a thru, 20 MHz apart at -20 / -30 dBm, nothing at the third tone
+def analyzer(analyzer_class=None):
+
+    simulated = SimulatedBench('LO')
+    tones = [(simulated.generator('A'), TONES_HZ[0], -20), (simulated.generator('B'), TONES_HZ[1], -30)]
+    simulated.connect_thru()
+    if analyzer_class is None:
+        specan = simulated.analyzer('FSV')
+    else:
+        specan = analyzer_class('FSV', latency_s=0, settle_s=0, sweep_time_s=0, dut=simulated.dut)
+    specan.noise_db = 0
+
+    for generator, frequency_hz, amplitude_dbm in tones:
+        generator.set_frequency(frequency_hz)
+        generator.set_amplitude(amplitude_dbm)
+        generator.on()
+    specan.set_frequency(TONES_HZ[1])
+    specan.set_span(100e6)
+    specan.set_rbw(1e5)
+    del specan.log[:]
+
+    return specan
+
+
+def settler():
+    return Settler('adaptive', poll_interval_s=0)
+
+
+def test_multi_marker_reads_the_same_as_one_marker_at_a_time():
+    specan = analyzer()
+
+    one_at_a_time = MarkerToneReader(specan, settler()).read(TONES_HZ)
+    powers = MultiMarkerToneReader(specan, settler()).read(TONES_HZ)
+
+    assert powers == pytest.approx(one_at_a_time)
+    assert powers[:2] == pytest.approx([-20, -30], abs=0.01)
+
+
+def test_markers_placed_and_read_in_one_message_each():
+    specan = analyzer()
+    reader = MultiMarkerToneReader(specan, settler())
+
+    reader.read(TONES_HZ)
+    assert specan.log == [
+        'CALC:MARK1 ON',
+        'CALC:MARK2 ON',
+        'CALC:MARK3 ON',
+        'INIT:CONT OFF',
+        'CALC:MARK1:X 18000000000.0;:CALC:MARK2:X 18020000000.0;:CALC:MARK3:X 18040000000.0',
+        'INIT:IMM;*OPC?',
+        'CALC:MARK1:Y?;:CALC:MARK2:Y?;:CALC:MARK3:Y?',
+    ]
+
+    # The markers stay on and the analyzer in single sweep for the next point
+    del specan.log[:]
+    reader.read(TONES_HZ[:2])
+    assert specan.log == [
+        'CALC:MARK1:X 18000000000.0;:CALC:MARK2:X 18020000000.0',
+        'INIT:IMM;*OPC?',
+        'CALC:MARK1:Y?;:CALC:MARK2:Y?',
+    ]
+
+    reader.finish()
+    assert specan.log[-1] == 'INIT:CONT ON'
+    assert specan.continuous
+
+
+def test_comma_separated_marker_reply():
+    specan = analyzer(CommaAnalyzer)
+
+    powers = MultiMarkerToneReader(specan, settler()).read(TONES_HZ)
+
+    assert len(powers) == 3
+    assert powers[:2] == pytest.approx([-20, -30], abs=0.01)
+
+
+def test_wrapper_without_scpi_reads_marker_by_marker():
+    specan = analyzer()
+
+    powers = MultiMarkerToneReader(WrapperOnlyAnalyzer(specan), settler()).read(TONES_HZ)
+
+    assert powers[:2] == pytest.approx([-20, -30], abs=0.01)
+    assert not [command for command in specan.log if command.startswith('INIT')]
+    assert specan.markers == dict(zip([1, 2, 3], TONES_HZ))
+
+
+def test_peak_window_edges():
+    frequencies_hz = numpy.arange(0, 11) * 1e6
+    trace_dbm = numpy.full(11, -100.0)
+    trace_dbm[3] = -20
+    trace_dbm[7] = -30
+
+    # A peak right on the edge of the window is in it, one bin further is not
+    peak_dbm, peak_hz = peak_powers(frequencies_hz, trace_dbm, [5e6, 5e6, 0], 2e6)
+    assert peak_dbm.tolist() == [-20, -20, -100]
+    assert peak_hz.tolist() == [3e6, 3e6, 0]
+
+    peak_dbm, peak_hz = peak_powers(frequencies_hz, trace_dbm, [5e6, 9e6], 1e6)
+    assert peak_dbm.tolist() == [-100, -100]
+
+    # Expected frequencies at the first and last point of the trace
+    peak_dbm, peak_hz = peak_powers(frequencies_hz, trace_dbm, [0, 10e6], 3e6)
+    assert peak_dbm.tolist() == [-20, -30]
+    assert peak_hz.tolist() == [3e6, 7e6]
+
+
+def test_expected_frequency_outside_the_trace():
+    frequencies_hz = numpy.arange(0, 11) * 1e6
+    trace_dbm = numpy.full(11, -100.0)
+
+    with pytest.raises(ValueError, match='outside the trace'):
+        peak_powers(frequencies_hz, trace_dbm, [5e6, 12.5e6], 2e6)
+
+
+def test_fetch_trace_axis_and_levels():
+    specan = analyzer()
+    specan.write('INIT:CONT OFF;:FORM REAL,32')
+
+    frequencies_hz, trace_dbm = fetch_trace(specan)
+
+    assert len(frequencies_hz) == len(trace_dbm) == specan.sweep_points
+    assert frequencies_hz[0] == pytest.approx(TONES_HZ[1] - 50e6)
+    assert frequencies_hz[-1] == pytest.approx(TONES_HZ[1] + 50e6)
+
+    # REAL,32 keeps the levels to float precision
+    peak_dbm, peak_hz = peak_powers(frequencies_hz, trace_dbm, TONES_HZ[:2], 1e6)
+    assert peak_dbm == pytest.approx([-20, -30], abs=0.01)
+
+
+def test_trace_length_mismatch():
+    specan = analyzer(ShortTraceAnalyzer)
+    specan.write('INIT:CONT OFF;:FORM REAL,32')
+
+    with pytest.raises(ValueError, match='Trace has 691 points, analyzer reports 692'):
+        fetch_trace(specan)
+
+
+def test_trace_reader_reads_the_same_as_the_markers():
+    specan = analyzer()
+
+    markers = MarkerToneReader(specan, settler()).read(TONES_HZ[:2])
+    reader = TraceToneReader(specan, settler())
+    powers = reader.read(TONES_HZ[:2])
+    reader.finish()
+
+    assert powers == pytest.approx(markers, abs=0.01)
+    assert specan.log[-1] == 'INIT:CONT ON;:FORM ASC'
@@ -0,0 +1,117 @@
+## Batched SCPI transactions: the chained message, what cannot be chained, the cache around a commit
+
+import pytest
+
+from dispatch import Dispatcher
+from instrument_cache import CachedInstrument
+from settling import Settler
+from simulated_instruments import SimulatedSignalAnalyzer, SimulatedSignalGenerator
+from transaction import Transaction
+
+
+# Wrapper with the set_* calls and no raw SCPI access
+class WrapperOnlyGenerator:
+    def __init__(self):
+        self.calls = []
+
+    def set_frequency(self, frequency_hz):
+        self.calls.append(('set_frequency', frequency_hz))
+
+
+# Simulated MXG that never answers a chained message
+class SilentGenerator(SimulatedSignalGenerator):
+    def query(self, command):
+        self._command(command)
+        raise TimeoutError('{} timed out'.format(self.name))
+
+
+def generator():
+    return SimulatedSignalGenerator('MXG', latency_s=0, settle_s=0)
+
+
+def analyzer():
+    return SimulatedSignalAnalyzer('FSV', latency_s=0, settle_s=0, sweep_time_s=0)
+
+
+def test_generator_settings_go_out_as_one_message_ending_in_opc():
+    mxg = generator()
+    transaction = Transaction(mxg)
+
+    assert transaction.add('set_frequency', 5.25e9)
+    assert transaction.add('set_amplitude', -18.5)
+    assert transaction.add('on')
+    assert transaction.commit(1)
+
+    assert mxg.log == ['FREQ 5250000000.0;:POW -18.5;:OUTP ON;*OPC?']
+    assert (mxg.frequency_hz, mxg.amplitude_dbm, mxg.output) == (5.25e9, -18.5, True)
+
+
+def test_analyzer_marker_and_span_in_one_message():
+    specan = analyzer()
+    transaction = Transaction(specan)
+
+    transaction.add('set_frequency', 18e9)
+    transaction.add('set_span', 1e6)
+    transaction.add('set_marker', 1, 18e9)
+    transaction.commit(1)
+
+    assert specan.log == ['FREQ:CENT 18000000000.0;:FREQ:SPAN 1000000.0;:CALC:MARK1:X 18000000000.0;*OPC?']
+    assert specan.markers[1] == 18e9
+
+
+def test_nothing_queued_sends_nothing():
+    mxg = generator()
+
+    assert not Transaction(mxg).commit(1)
+    assert mxg.log == []
+
+
+def test_call_without_a_scpi_form_is_not_chainable():
+    transaction = Transaction(analyzer())
+
+    # The sweep time has no entry in SCPI_COMMANDS, the wrapper call is used
+    assert not transaction.chainable('set_sweep_time')
+    with pytest.raises(ValueError):
+        transaction.add('set_sweep_time', 0.01)
+
+    # Nothing is chainable on a wrapper without raw SCPI
+    assert not Transaction(WrapperOnlyGenerator()).chainable('set_frequency')
+
+
+def test_dispatcher_sends_unchainable_commands_one_at_a_time():
+    specan = CachedInstrument(analyzer())
+    dispatcher = Dispatcher(Settler('adaptive'))
+
+    dispatcher.tune([(specan, 'set_frequency', (18e9,), 1), (specan, 'set_sweep_time', (0.01,), 1)])
+    dispatcher.close()
+
+    # The group falls back whole, the settler's *OPC? is the settle
+    assert specan.instrument.log == ['FREQ:CENT 18000000000.0', 'SWE:TIME 0.01', '*OPC?']
+    assert id(specan) not in dispatcher.unbatched
+
+
+def test_cache_drops_settings_already_made():
+    mxg = CachedInstrument(generator())
+    mxg.set_frequency(5.25e9)
+    del mxg.instrument.log[:]
+
+    transaction = Transaction(mxg)
+    assert not transaction.add('set_frequency', 5.25e9)
+    assert transaction.add('set_amplitude', -20)
+    transaction.commit(1)
+
+    assert mxg.instrument.log == ['POW -20;*OPC?']
+    assert not mxg.unsettled
+
+
+def test_failed_commit_forgets_the_cached_settings():
+    mxg = CachedInstrument(SilentGenerator('MXG', latency_s=0, settle_s=0))
+    transaction = Transaction(mxg)
+    transaction.add('set_frequency', 5.25e9)
+
+    with pytest.raises(TimeoutError):
+        transaction.commit(1)
+
+    # The box may or may not have the new frequency, the next set_frequency goes out
+    assert mxg.state == {}
+    assert mxg.set_frequency(5.25e9)
@@ -0,0 +1,91 @@
+## Warm started P1dB: where the expected 1 dB point comes from, the power window, the prior run file
+
+import json
+import os
+
+from warm_start import WarmStart
+
+
+# Prior run of the board with its 1 dB point 2 dB higher at 20 GHz than at 18 GHz
+def prior_file(path):
+    with open(path, 'w') as stored:
+        json.dump({
+            'ADMV1139': {'TX_P1DB': [[5.25, 18, 4.0], [5.25, 20, 6.0], [6.25, 18, 3.0]],
+                         'RX_P1DB': [[5.25, 18, -1.0]]},
+            'MAMX-011054': {'TX_P1DB': [[5.25, 18, 9.0]]},
+        }, stored)
+
+
+def test_nothing_to_go_on():
+    warm_start = WarmStart()
+
+    assert warm_start.hint(5.25, 18) is None
+    assert warm_start.window([-10, -5, 0, 5, 10], None) == [0, 1, 2, 3, 4]
+
+
+def test_first_column_takes_the_prior_run(tmp_path):
+    path = str(tmp_path / 'prior.json')
+    prior_file(path)
+
+    warm_start = WarmStart(path, 'ADMV1139', 'TX_P1DB')
+
+    assert warm_start.hint(5.25, 18) == 4.0
+    assert warm_start.hint(6.25, 18) == 3.0
+    assert warm_start.hint(5.25, 22) is None
+
+
+def test_neighbouring_column_comes_before_the_prior_run(tmp_path):
+    path = str(tmp_path / 'prior.json')
+    prior_file(path)
+    warm_start = WarmStart(path, 'ADMV1139', 'TX_P1DB')
+
+    # This board is 1 dB below the prior one at 18 GHz, the prior run's step to 20 GHz is added
+    warm_start.record(5.25, 18, 3.0)
+    assert warm_start.hint(5.25, 20) == 5.0
+
+    # No prior at 22 GHz, the closest column as it is
+    warm_start.record(5.25, 20, 5.5)
+    assert warm_start.hint(5.25, 22) == 5.5
+
+    # A column at another IF is no neighbour
+    assert warm_start.hint(6.25, 18) == 3.0
+
+    # A column that did not compress is no neighbour either
+    warm_start.record(6.25, 20, None)
+    assert warm_start.hint(6.25, 22) is None
+
+
+def test_window_around_the_hint_keeps_the_linear_points():
+    warm_start = WarmStart(window_db=1.5, linear_points=2)
+    pins = list(range(-10, 11))
+
+    assert warm_start.window(pins, 4.2) == [0, 1, 13, 14, 15]
+
+
+def test_saved_run_is_the_next_prior(tmp_path):
+    path = str(tmp_path / 'prior.json')
+    prior_file(path)
+
+    warm_start = WarmStart(path, 'ADMV1139', 'TX_P1DB')
+    warm_start.record(5.25, 18, 3.5)
+    warm_start.record(5.25, 20, 5.5)
+    warm_start.save()
+
+    assert WarmStart(path, 'ADMV1139', 'TX_P1DB').prior == {(5.25, 18): 3.5, (5.25, 20): 5.5}
+
+    # Other tests and boards stay, no lock or temporary file is left behind
+    assert WarmStart(path, 'ADMV1139', 'RX_P1DB').prior == {(5.25, 18): -1.0}
+    assert WarmStart(path, 'MAMX-011054', 'TX_P1DB').prior == {(5.25, 18): 9.0}
+    assert os.listdir(str(tmp_path)) == ['prior.json']
+
+
+def test_save_without_results_leaves_the_file_alone(tmp_path):
+    path = str(tmp_path / 'prior.json')
+
+    WarmStart(path, 'ADMV1139', 'TX_P1DB').save()
+    assert not os.path.exists(path)
+
+    warm_start = WarmStart(path, 'ADMV1139', 'TX_P1DB')
+    warm_start.record(5.25, 18, 3.5)
+    warm_start.save()
+    assert WarmStart(path, 'ADMV1139', 'TX_P1DB').hint(5.25, 18) == 3.5
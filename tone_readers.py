@@ -0,0 +1,288 @@
+## Tone power readout for the two tone (OIP3) sweeps.
+## A tone reader takes the list of tone frequencies for one tuned state and returns their powers in order.
+## MarkerToneReader is the old one-marker-at-a-time readout, MultiMarkerToneReader places every marker at once
+## and reads them all from a single completed sweep, TraceToneReader pulls the whole trace and peak searches it.
+## ZeroSpanToneReader reads each tone in zero span on its own frequency (see analyzer_planner.py for when).
+
+import numpy
+
+import scpi
+
+
+##########################################################################################################
+# Moves marker 1 to each tone and reads it, settling after every move
+##########################################################################################################
+class MarkerToneReader:
+
+    ######################################################################################################
+    # params:   specan, settler
+    ######################################################################################################
+    def __init__(self, specan, settler):
+        self.specan = specan
+        self.settler = settler
+
+    ######################################################################################################
+    # params:   frequencies_hz
+    # returns:  powers_dbm
+    ######################################################################################################
+    def read(self, frequencies_hz):
+
+        powers_dbm = []
+        for frequency_hz in frequencies_hz:
+            self.specan.set_marker(1, frequency_hz)
+            self.settler.wait(self.specan, 'set_marker', 0.5)
+
+            powers_dbm.append(self.settler.read_power(self.specan, 1))
+
+        return powers_dbm
+
+    ######################################################################################################
+    # Nothing to restore
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def finish(self):
+        pass
+
+
+##########################################################################################################
+# Places markers 1..n on the tones, triggers one single sweep and reads every marker in one query
+# Falls back to setting / reading each marker through the wrapper when raw SCPI is not available
+##########################################################################################################
+class MultiMarkerToneReader:
+
+    ######################################################################################################
+    # params:   specan, settler
+    ######################################################################################################
+    def __init__(self, specan, settler):
+        self.specan = specan
+        self.settler = settler
+        self.markers_on = 0
+        self.single_sweep = False
+
+    ######################################################################################################
+    # params:   frequencies_hz
+    # returns:  powers_dbm
+    ######################################################################################################
+    def read(self, frequencies_hz):
+
+        markers = range(1, len(frequencies_hz) + 1)
+
+        # Turn on any marker that is not on yet
+        for marker in markers:
+            if marker > self.markers_on:
+                self.specan.set_marker_state(marker, 'ON')
+        self.markers_on = max(self.markers_on, len(frequencies_hz))
+
+        if not scpi.supports_scpi(self.specan):
+            for marker, frequency_hz in zip(markers, frequencies_hz):
+                self.specan.set_marker(marker, frequency_hz)
+            self.settler.wait(self.specan, 'set_marker', 0.5)
+
+            return [self.settler.read_power(self.specan, marker) for marker in markers]
+
+        # Single sweep mode so *OPC? waits for a full sweep
+        if not self.single_sweep:
+            scpi.write(self.specan, 'INIT:CONT OFF')
+            self.single_sweep = True
+
+        # Place every marker in one message
+        scpi.write(self.specan, ';:'.join(
+            'CALC:MARK{}:X {}'.format(marker, frequency_hz) for marker, frequency_hz in zip(markers, frequencies_hz)))
+
+        # One sweep with everything tuned
+        try:
+            scpi.query(self.specan, 'INIT:IMM;*OPC?', self.settler.timeout('sweep'))
+        except Exception:
+            # Sweep did not report complete, give it the old marker delay
+            self.settler.wait(self.specan, 'sweep', 0.5)
+
+        # Read every marker in one query
+        reply = scpi.query(self.specan, ';:'.join('CALC:MARK{}:Y?'.format(marker) for marker in markers))
+
+        return [float(value) for value in reply.replace(',', ';').split(';')]
+
+    ######################################################################################################
+    # Put the analyzer back in continuous sweep
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def finish(self):
+        if self.single_sweep:
+            scpi.write(self.specan, 'INIT:CONT ON')
+            self.single_sweep = False
+
+
+##########################################################################################################
+# Centres the analyzer on each tone in zero span, triggers one single sweep and reads marker 1
+# Span 0 and the RBW / sweep time are set beforehand (analyzer_planner.py), this only moves the centre frequency.
+# In zero span the marker X is a time, so wherever the last span or tone left it means nothing: marker 1 is put on
+# the peak of the sweep before it is read.
+# At the end the analyzer goes back to the middle of the tones, where the wide span readers expect it.
+##########################################################################################################
+class ZeroSpanToneReader:
+
+    ######################################################################################################
+    # params:   specan, settler
+    ######################################################################################################
+    def __init__(self, specan, settler):
+        self.specan = specan
+        self.settler = settler
+        self.single_sweep = False
+
+    ######################################################################################################
+    # params:   frequencies_hz
+    # returns:  powers_dbm
+    ######################################################################################################
+    def read(self, frequencies_hz):
+
+        self.specan.set_marker_state(1, 'ON')
+
+        powers_dbm = []
+        for frequency_hz in frequencies_hz:
+            self.specan.set_frequency(frequency_hz)
+
+            if not scpi.supports_scpi(self.specan):
+                # No peak search through the wrapper, the marker goes to the start of the sweep time instead, a CW
+                # tone is the same level all the way across
+                self.specan.set_marker(1, 0)
+                self.settler.wait(self.specan, 'set_frequency', 0.5)
+                powers_dbm.append(self.settler.read_power(self.specan, 1))
+                continue
+
+            # Single sweep mode so *OPC? waits for a full sweep
+            if not self.single_sweep:
+                scpi.write(self.specan, 'INIT:CONT OFF')
+                self.single_sweep = True
+
+            try:
+                scpi.query(self.specan, 'INIT:IMM;*OPC?', self.settler.timeout('sweep'))
+            except Exception:
+                self.settler.wait(self.specan, 'sweep', 0.5)
+
+            powers_dbm.append(float(scpi.query(self.specan, 'CALC:MARK1:MAX;:CALC:MARK1:Y?')))
+
+        self.specan.set_frequency((min(frequencies_hz) + max(frequencies_hz)) / 2)
+
+        return powers_dbm
+
+    ######################################################################################################
+    # Put the analyzer back in continuous sweep
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def finish(self):
+        if self.single_sweep:
+            scpi.write(self.specan, 'INIT:CONT ON')
+            self.single_sweep = False
+
+
+##########################################################################################################
+# Fetch the current trace as REAL,32 in one binary transfer, along with its frequency axis
+# params:   specan, timeout_s
+# returns:  frequencies_hz, trace_dbm (numpy arrays)
+##########################################################################################################
+def fetch_trace(specan, timeout_s=None):
+
+    # Frequency axis of the trace
+    start_hz, stop_hz, points = scpi.query(specan, 'FREQ:STAR?;:FREQ:STOP?;:SWE:POIN?').replace(',', ';').split(';')
+    frequencies_hz = numpy.linspace(float(start_hz), float(stop_hz), int(float(points)))
+
+    # Trace data, the FSV sends little endian floats by default
+    payload = scpi.query_block(specan, 'TRAC? TRACE1', timeout_s)
+    trace_dbm = numpy.frombuffer(payload, dtype='<f4').astype(numpy.float64)
+
+    if len(trace_dbm) != len(frequencies_hz):
+        raise ValueError('Trace has {} points, analyzer reports {}'.format(len(trace_dbm), len(frequencies_hz)))
+
+    return frequencies_hz, trace_dbm
+
+
+##########################################################################################################
+# Peak power within +-window_hz of each expected frequency
+# params:   frequencies_hz, trace_dbm, expected_hz, window_hz
+# returns:  peak_dbm, peak_hz (numpy arrays, one entry per expected frequency)
+##########################################################################################################
+def peak_powers(frequencies_hz, trace_dbm, expected_hz, window_hz):
+
+    expected_hz = numpy.asarray(expected_hz, dtype=numpy.float64)
+
+    # One row per expected frequency, trace points outside the window are masked out
+    in_window = numpy.abs(frequencies_hz[numpy.newaxis, :] - expected_hz[:, numpy.newaxis]) <= window_hz
+    windowed = numpy.where(in_window, trace_dbm[numpy.newaxis, :], -numpy.inf)
+
+    peak_index = numpy.argmax(windowed, axis=1)
+    peak_dbm = windowed[numpy.arange(len(expected_hz)), peak_index]
+
+    if not numpy.all(numpy.isfinite(peak_dbm)):
+        raise ValueError('Expected frequency outside the trace')
+
+    return peak_dbm, frequencies_hz[peak_index]
+
+
+##########################################################################################################
+# Triggers one single sweep, fetches the whole trace and peak searches a window around every tone
+# The last trace is kept so extra products can be read off it with products()
+##########################################################################################################
+class TraceToneReader:
+
+    ######################################################################################################
+    # params:   specan, settler, window_hz (default a quarter of the closest tone spacing)
+    ######################################################################################################
+    def __init__(self, specan, settler, window_hz=None):
+        self.specan = specan
+        self.settler = settler
+        self.window_hz = window_hz
+        self.single_sweep = False
+        self.frequencies_hz = None
+        self.trace_dbm = None
+
+    ######################################################################################################
+    # params:   frequencies_hz
+    # returns:  powers_dbm
+    ######################################################################################################
+    def read(self, frequencies_hz):
+
+        # Single sweep mode and binary float transfer, set once
+        if not self.single_sweep:
+            scpi.write(self.specan, 'INIT:CONT OFF;:FORM REAL,32')
+            self.single_sweep = True
+
+        try:
+            scpi.query(self.specan, 'INIT:IMM;*OPC?', self.settler.timeout('sweep'))
+        except Exception:
+            self.settler.wait(self.specan, 'sweep', 0.5)
+
+        self.frequencies_hz, self.trace_dbm = fetch_trace(self.specan, self.settler.timeout('sweep'))
+
+        return self.products(frequencies_hz).tolist()
+
+    ######################################################################################################
+    # Peak powers of any products on the last trace, no instrument time
+    # params:   frequencies_hz
+    # returns:  powers_dbm (numpy array)
+    ######################################################################################################
+    def products(self, frequencies_hz):
+
+        # Never narrower than one trace bin
+        bin_hz = self.frequencies_hz[1] - self.frequencies_hz[0]
+
+        window_hz = self.window_hz
+        if window_hz is None:
+            spacing_hz = numpy.diff(numpy.sort(frequencies_hz))
+            spacing_hz = spacing_hz[spacing_hz > 0]
+            window_hz = spacing_hz.min() / 4 if len(spacing_hz) else bin_hz
+
+        peak_dbm, peak_hz = peak_powers(self.frequencies_hz, self.trace_dbm, frequencies_hz, max(window_hz, bin_hz))
+
+        return peak_dbm
+
+    ######################################################################################################
+    # Put the analyzer back in continuous sweep and ASCII transfer
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def finish(self):
+        if self.single_sweep:
+            scpi.write(self.specan, 'INIT:CONT ON;:FORM ASC')
+            self.single_sweep = False
@@ -0,0 +1,109 @@
+## Batched SCPI transactions.
+## Queues several set_* calls for one instrument and sends them as a single ';' chained message that ends in
+## *OPC?, so a retune costs one round trip per instrument instead of one per setting plus one for the settle.
+## Calls without a SCPI equivalent, and wrappers without raw SCPI access, are not chainable and go through the
+## normal set_* calls instead.
+
+import scpi
+from instrument_cache import CachedInstrument
+
+
+# SCPI for the set_* calls of the MXG and the FSV, the arguments are filled in with format()
+SCPI_COMMANDS = {
+    'generator': {
+        'set_frequency': 'FREQ {}',
+        'set_amplitude': 'POW {}',
+        'on': 'OUTP ON',
+        'off': 'OUTP OFF',
+    },
+    'analyzer': {
+        'set_frequency': 'FREQ:CENT {}',
+        'set_span': 'FREQ:SPAN {}',
+        'set_rbw': 'BAND {}',
+        'set_vbw': 'BAND:VID {}',
+        'set_detector': 'DET {}',
+        'set_sweep_points': 'SWE:POIN {}',
+        'set_marker': 'CALC:MARK{}:X {}',
+        'set_marker_state': 'CALC:MARK{} {}',
+    },
+}
+
+
+##########################################################################################################
+# Tell the analyzer from the generators, only the analyzer wrapper reads power
+# params:   instrument
+# returns:  'generator' / 'analyzer'
+##########################################################################################################
+def instrument_kind(instrument):
+
+    if isinstance(instrument, CachedInstrument):
+        instrument = instrument.instrument
+
+    return 'analyzer' if hasattr(instrument, 'get_power') else 'generator'
+
+
+##########################################################################################################
+# One chained message worth of settings for an instrument
+##########################################################################################################
+class Transaction:
+
+    ######################################################################################################
+    # params:   instrument
+    ######################################################################################################
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.name = type(instrument.instrument if isinstance(instrument, CachedInstrument) else instrument).__name__
+        self.commands = SCPI_COMMANDS[instrument_kind(instrument)]
+        self.queued = []
+
+    ######################################################################################################
+    # Check if a call can go in the chained message
+    # params:   method
+    # returns:  True / False
+    ######################################################################################################
+    def chainable(self, method):
+        return method in self.commands and scpi.supports_scpi(self.instrument)
+
+    ######################################################################################################
+    # Queue a set_* call, a caching proxy drops it when the value is already set
+    # params:   method, args
+    # returns:  True if the call was queued
+    ######################################################################################################
+    def add(self, method, *args):
+
+        if not self.chainable(method):
+            raise ValueError("{} cannot be chained for {}".format(method, self.name))
+
+        if isinstance(self.instrument, CachedInstrument) and not self.instrument.remember(method, args):
+            return False
+
+        self.queued.append(self.commands[method].format(*args))
+        return True
+
+    ######################################################################################################
+    # Send the queued settings and wait for them to complete in the same message
+    # On an error the cached settings can no longer be trusted and are dropped
+    # params:   timeout_s
+    # returns:  True if the instrument reported complete, False if nothing was queued
+    ######################################################################################################
+    def commit(self, timeout_s=None):
+
+        if not self.queued:
+            return False
+
+        message = ';:'.join(self.queued) + ';*OPC?'
+        self.queued = []
+
+        try:
+            reply = scpi.query(self.instrument, message, timeout_s)
+            if not reply.endswith('1'):
+                raise ValueError("{} answered '{}' to {}".format(self.name, reply, message))
+        except Exception:
+            if isinstance(self.instrument, CachedInstrument):
+                self.instrument.invalidate()
+            raise
+
+        if isinstance(self.instrument, CachedInstrument):
+            self.instrument.unsettled = False
+
+        return True
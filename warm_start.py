@@ -0,0 +1,175 @@
+## Warm started P1dB measurements.
+## The compression point moves by a dB or two between neighbouring RF frequencies, so once one column is done the
+## next one only needs a few powers around where its P1dB is expected. The expected value comes from the previous
+## column at the same IF, shifted by how much a stored prior run of the same board type moved between the two
+## frequencies, or from the prior run alone for the first column. The window widens a step at a time when the
+## 1 dB point turns out to be outside it.
+
+import json
+import os
+import time
+
+import numpy
+
+from compression import analyze_compression
+
+
+##########################################################################################################
+# Expected P1dB per frequency pair and the power window to measure around it
+##########################################################################################################
+class WarmStart:
+
+    ######################################################################################################
+    # params:   path (prior run file, None to only use this run), board, test, window_db,
+    #           linear_points (lowest powers always measured for the small signal gain), compression_db
+    ######################################################################################################
+    def __init__(self, path=None, board=None, test=None, window_db=1.5, linear_points=3, compression_db=1):
+        self.path = path
+        self.board = board
+        self.test = test
+        self.window_db = window_db
+        self.linear_points = linear_points
+        self.compression_db = compression_db
+
+        # {(if_ghz, rf_ghz): ip1db_dbm} from the stored run and from this one
+        self.prior = {}
+        self.found = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path) as prior_file:
+                stored = json.load(prior_file)
+            for if_ghz, rf_ghz, ip1db_dbm in stored.get(board, {}).get(test, []):
+                self.prior[(if_ghz, rf_ghz)] = ip1db_dbm
+
+    ######################################################################################################
+    # Expected IP1dB for a frequency pair
+    # params:   if_ghz, rf_ghz
+    # returns:  ip1db_dbm, None when there is nothing to go on
+    ######################################################################################################
+    def hint(self, if_ghz, rf_ghz):
+
+        # Closest RF already measured at this IF
+        neighbours = [rf for (if_found, rf) in self.found if if_found == if_ghz]
+        if not neighbours:
+            return self.prior.get((if_ghz, rf_ghz))
+
+        rf_near = min(neighbours, key=lambda rf: abs(rf - rf_ghz))
+        hint_dbm = self.found[(if_ghz, rf_near)]
+        if (if_ghz, rf_ghz) in self.prior and (if_ghz, rf_near) in self.prior:
+            hint_dbm = hint_dbm + self.prior[(if_ghz, rf_ghz)] - self.prior[(if_ghz, rf_near)]
+
+        return hint_dbm
+
+    ######################################################################################################
+    # Remember the IP1dB of a frequency pair for the next ones and the stored run
+    # params:   if_ghz, rf_ghz, ip1db_dbm (None when it did not compress)
+    # returns:  none
+    ######################################################################################################
+    def record(self, if_ghz, rf_ghz, ip1db_dbm):
+        if ip1db_dbm is not None:
+            self.found[(if_ghz, rf_ghz)] = float(ip1db_dbm)
+
+    ######################################################################################################
+    # Indices of the powers to measure first: the lowest few and the ones within window_db of the hint
+    # params:   pins, hint_dbm
+    # returns:  indices, ascending
+    ######################################################################################################
+    def window(self, pins, hint_dbm):
+
+        if hint_dbm is None:
+            return list(range(0, len(pins)))
+
+        indices = set(range(0, min(self.linear_points, len(pins))))
+        indices.update(k for k in range(0, len(pins)) if abs(pins[k] - hint_dbm) <= self.window_db)
+
+        return sorted(indices)
+
+    ######################################################################################################
+    # Measure more powers next to the window until the 1 dB point is inside it
+    # Widens down while the bottom of the window is already compressed and up while the top is not
+    # params:   pins, measured ({index: raw pout}, filled in by measure), measure (index -> raw pout)
+    # returns:  ip1db_dbm, None when the powers run out first
+    ######################################################################################################
+    def extend(self, pins, measured, measure):
+
+        while True:
+            indices = sorted(measured)
+            results = analyze_compression([pins[k] for k in indices], [measured[k] for k in indices],
+                                          levels_db=(self.compression_db,), linear_points=self.linear_points)
+            gain_db = results['gain_db'][0]
+
+            # Contiguous block of measured powers at the top
+            top = indices[-1]
+            bottom = top
+            while bottom - 1 in measured:
+                bottom = bottom - 1
+
+            if pins[bottom] + gain_db - measured[bottom] >= self.compression_db and bottom > 0:
+                measured[bottom - 1] = measure(bottom - 1)
+                continue
+
+            if pins[top] + gain_db - measured[top] < self.compression_db and top + 1 < len(pins):
+                measured[top + 1] = measure(top + 1)
+                continue
+
+            ip1db_dbm = results['ip_dbm'][self.compression_db][0]
+            return None if numpy.isnan(ip1db_dbm) else float(ip1db_dbm)
+
+    ######################################################################################################
+    # Store this run's results as the prior run for the next board, other boards and tests are kept
+    # params:   none
+    # returns:  none
+    ######################################################################################################
+    def save(self):
+
+        if self.path is None or not self.found:
+            return
+
+        # Benches running in parallel share the file, one at a time reads it and puts it back with its results
+        lock_path = acquire_lock(self.path)
+        try:
+            stored = {}
+            if os.path.exists(self.path):
+                with open(self.path) as prior_file:
+                    stored = json.load(prior_file)
+
+            stored.setdefault(self.board, {})[self.test] = [
+                [if_ghz, rf_ghz, ip1db_dbm] for (if_ghz, rf_ghz), ip1db_dbm in sorted(self.found.items())]
+
+            # Readers without the lock see the old file or the new one, never half of it
+            temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(temporary_path, 'w') as prior_file:
+                json.dump(stored, prior_file)
+            os.replace(temporary_path, self.path)
+        finally:
+            os.remove(lock_path)
+
+
+##########################################################################################################
+# Take <path>.lock for a read-modify-write of a file other processes share, the bench scheduler runs a process per
+# bench. A lock older than stale_s was left by a bench killed part way through and is taken over.
+# params:   path, timeout_s, stale_s, poll_interval_s
+# returns:  lock_path, remove it to release the lock
+##########################################################################################################
+def acquire_lock(path, timeout_s=60, stale_s=30, poll_interval_s=0.05):
+
+    lock_path = path + '.lock'
+    start = time.time()
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return lock_path
+        except FileExistsError:
+            pass
+
+        try:
+            if time.time() - os.path.getmtime(lock_path) > stale_s:
+                os.remove(lock_path)
+                continue
+        except OSError:
+            # Released in the meantime
+            continue
+
+        if time.time() - start > timeout_s:
+            raise TimeoutError("{} is still held after {} s".format(lock_path, timeout_s))
+        time.sleep(poll_interval_s)